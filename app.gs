@@ -4,6 +4,9 @@
 // Root folder ID where all laboratory folders will be created
 const ROOT_FOLDER_ID = "1N3u88Knrz1otgDVykS8iJVO5M5d3eshN";
 
+// Largest byte range returned by a single getFileChunk request
+const MAX_CHUNK_BYTES = 8 * 1024 * 1024;
+
 /**
  * Main function that handles HTTP requests
  */
@@ -32,10 +35,14 @@ function doPost(e) {
       return handleUploadFichaSeguridad(requestData);
     } else if (requestData.action === "sendEmail") {
       return handleSendEmail(requestData);
+    } else if (requestData.action === "sendEmails") {
+      return handleSendEmails(requestData);
     } else if (requestData.action === "downloadFile") {
       return handleDownloadFile(requestData);
     } else if (requestData.action === "getFileStreamUrl") {
       return handleGetFileStreamUrl(requestData);
+    } else if (requestData.action === "getFileChunk") {
+      return handleGetFileChunk(requestData);
     } else {
       return createErrorResponse("Unknown action");
     }
@@ -313,7 +320,7 @@ function getMimeType(extension) {
 }
 
 /**
- * Handles sending emails through Gmail
+ * Handles sending emails with MailApp (script.send_mail scope, no access to the mailbox)
  */
 function handleSendEmail(data) {
   // Validate required fields
@@ -322,8 +329,8 @@ function handleSendEmail(data) {
   }
   
   try {
-    // Send the email using GmailApp
-    GmailApp.sendEmail(
+    // Send the email using MailApp
+    MailApp.sendEmail(
       data.to,
       data.subject,
       "", // Plain text body (empty because we're using HTML)
@@ -345,6 +352,53 @@ function handleSendEmail(data) {
   }
 }
 
+/**
+ * Handles sending a batch of emails with MailApp in a single request.
+ * Each message is sent independently: a failure (invalid address, exhausted daily
+ * quota) is reported in its result and does not stop the rest of the batch.
+ */
+function handleSendEmails(data) {
+  if (!data.messages || !Array.isArray(data.messages)) {
+    return createErrorResponse("Missing required field: messages");
+  }
+  
+  var results = [];
+  for (var i = 0; i < data.messages.length; i++) {
+    var message = data.messages[i];
+    if (!message.to || !message.subject || !message.htmlBody) {
+      results.push({ id: message.id, success: false, error: "Missing required email fields: to, subject, and htmlBody" });
+      continue;
+    }
+    if (MailApp.getRemainingDailyQuota() <= 0) {
+      results.push({ id: message.id, success: false, error: "Daily email quota exceeded", quotaExceeded: true });
+      continue;
+    }
+    
+    try {
+      MailApp.sendEmail(
+        message.to,
+        message.subject,
+        "", // Plain text body (empty because we're using HTML)
+        {
+          htmlBody: message.htmlBody,
+          name: message.senderName || "Sistema de Gestión de Laboratorios CRUB",
+          replyTo: message.replyTo || "no-reply@crub.edu.ar"
+        }
+      );
+      results.push({ id: message.id, success: true });
+    } catch (error) {
+      console.error("Error sending email to " + message.to + ": " + error);
+      // "Service invoked too many times for one day: email." when the quota runs out mid-batch
+      const quotaExceeded = error.toString().indexOf("too many times") !== -1;
+      results.push({ id: message.id, success: false, error: error.toString(), quotaExceeded: quotaExceeded });
+    }
+  }
+  
+  return createSuccessResponse({
+    results: results
+  });
+}
+
 /**
  * Handles downloading files from Google Drive
  */
@@ -387,6 +441,75 @@ function handleDownloadFile(data) {
   }
 }
 
+/**
+ * Handles reading a byte range of a file, base64 encoded
+ * The server downloads large files range by range instead of receiving the whole file
+ * in a single base64 response. The range is read from the Drive API with the script's
+ * own OAuth token, which never leaves the script.
+ */
+function handleGetFileChunk(data) {
+  // Validate required fields
+  if (!data.fileId) {
+    return createErrorResponse("Missing required field: fileId");
+  }
+  
+  const offset = Math.max(0, parseInt(data.offset, 10) || 0);
+  const length = Math.min(MAX_CHUNK_BYTES, Math.max(1, parseInt(data.length, 10) || MAX_CHUNK_BYTES));
+  
+  try {
+    const file = DriveApp.getFileById(data.fileId);
+    const mimeType = file.getMimeType();
+    
+    // Native Google files (Docs, Sheets...) have no bytes to download: they must be
+    // exported, which downloadFile does through getBlob()
+    if (mimeType.indexOf("application/vnd.google-apps.") === 0) {
+      return ContentService.createTextOutput(JSON.stringify({
+        success: false,
+        exportRequired: true,
+        error: "Native Google file, use downloadFile"
+      })).setMimeType(ContentService.MimeType.JSON);
+    }
+    
+    const fileSize = file.getSize();
+    let bytes = [];
+    if (offset < fileSize) {
+      const end = Math.min(offset + length, fileSize) - 1;
+      const response = UrlFetchApp.fetch(
+        "https://www.googleapis.com/drive/v3/files/" + encodeURIComponent(data.fileId) +
+        "?alt=media&supportsAllDrives=true",
+        {
+          headers: {
+            Authorization: "Bearer " + ScriptApp.getOAuthToken(),
+            Range: "bytes=" + offset + "-" + end
+          },
+          muteHttpExceptions: true
+        }
+      );
+      const status = response.getResponseCode();
+      if (status !== 206 && status !== 200) {
+        return createErrorResponse("Drive API error reading range: HTTP " + status);
+      }
+      bytes = response.getContent();
+      // A 200 means the Range header was ignored and the whole file came back
+      if (status === 200) {
+        bytes = bytes.slice(offset, end + 1);
+      }
+    }
+    
+    return createSuccessResponse({
+      fileName: file.getName(),
+      mimeType: mimeType,
+      fileSize: fileSize,
+      offset: offset,
+      data: Utilities.base64Encode(bytes)
+    });
+    
+  } catch (error) {
+    console.error("Error reading file range: " + error);
+    return createErrorResponse("Error reading file range: " + error.toString());
+  }
+}
+
 /**
  * Handles getting a streaming URL for a file
  */
@@ -53,6 +53,46 @@ def create_app(config_class=Config):
     sess.init_app(app)
     migrate = Migrate(app, db)
     
+    # Register SQLAlchemy event listeners (stock ledger, row counts, search index) and configure the caches
+    from app.utils import stock_service  # noqa: F401
+    from app.utils import count_service  # noqa: F401
+    from app.utils import search_service  # noqa: F401
+    from app.utils import product_index  # noqa: F401
+    from app.utils import product_import, movement_import, report_service, upload_outbox, email_outbox  # noqa: F401 (registran trabajos)
+    from app.utils.catalog_cache import catalog_cache
+    from app.utils.shared_cache import shared_cache, create_backend, cache_namespace
+    from app.utils.stock_cache import stock_cache
+    shared_cache.configure(
+        create_backend(app.config, app.instance_path),
+        default_ttl=app.config.get('CACHE_DEFAULT_TTL', 300),
+        namespace=cache_namespace(app.config)
+    )
+    stock_cache.configure(
+        max_espacios=app.config.get('STOCK_CACHE_MAX_LABS', 64),
+        ttl=app.config.get('STOCK_CACHE_TTL', 300),
+        enabled=app.config.get('STOCK_CACHE_ENABLED', True),
+        shared=shared_cache
+    )
+    catalog_cache.configure(
+        ttl=app.config.get('CATALOG_CACHE_TTL', 600),
+        enabled=app.config.get('CATALOG_CACHE_ENABLED', True)
+    )
+    from app.utils.id_service import movement_ids
+    movement_ids.configure(bloque=app.config.get('ID_BLOCK_SIZE', 20))
+    from app.integrations.google_drive import apps_script_session
+    apps_script_session.configure(
+        pool_size=app.config.get('GOOGLE_SCRIPT_POOL_SIZE', 10),
+        max_retries=app.config.get('GOOGLE_SCRIPT_MAX_RETRIES', 3),
+        backoff=app.config.get('GOOGLE_SCRIPT_RETRY_BACKOFF', 0.5)
+    )
+    from app.utils.drive_file_cache import drive_file_cache
+    drive_file_cache.configure(
+        directorio=app.config.get('DRIVE_CACHE_DIR') or os.path.join(app.instance_path, 'drive_cache'),
+        max_bytes=app.config.get('DRIVE_CACHE_MAX_MB', 500) * 1024 * 1024,
+        ttl=app.config.get('DRIVE_CACHE_TTL', 7 * 24 * 3600),
+        enabled=app.config.get('DRIVE_CACHE_ENABLED', True)
+    )
+    
     # Initialize Keycloak integration
     from app.integrations.keycloak_oidc import keycloak_oidc
     from app.integrations.keycloak_admin_client import keycloak_admin
@@ -70,6 +110,24 @@ def create_app(config_class=Config):
     app.register_blueprint(tecnicos_bp, url_prefix='/tecnicos')
     app.register_blueprint(main_bp)
     
+    # Start the background job workers with the first request (not in CLI commands)
+    if app.config.get('JOBS_RUN_IN_APP', True):
+        from app.utils.job_service import job_runner
+        
+        @app.before_request
+        def start_job_runner():
+            if not job_runner.running:
+                job_runner.start(
+                    app,
+                    hilos=app.config.get('JOBS_WORKER_THREADS', 2),
+                    intervalo=app.config.get('JOBS_POLL_INTERVAL', 5),
+                    latido=app.config.get('JOBS_HEARTBEAT_SECONDS', 60)
+                )
+    
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
+    
     # Add template context processors
     from datetime import datetime
     from flask_wtf.csrf import generate_csrf
@@ -100,6 +158,16 @@ def create_app(config_class=Config):
             db.session.commit()
             app.logger.info("Usuario administrador creado: ADMIN001")
         
+        # Poblar el ledger de stock en bases que todavía no lo tienen
+        from app.utils.stock_service import ensure_stock_ledger
+        if ensure_stock_ledger():
+            app.logger.info("Ledger de stock reconstruido desde los movimientos")
+        
+        # Crear (y poblar si hace falta) el índice de búsqueda de productos
+        from app.utils.search_service import ensure_search_index
+        if ensure_search_index():
+            app.logger.info("Índice de búsqueda de productos reconstruido")
+        
         app.logger.info("Aplicación CRUB inicializada correctamente")
     
     return app
\ No newline at end of file
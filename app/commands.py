@@ -0,0 +1,89 @@
+"""
+Comandos CLI de mantenimiento (flask <grupo> <comando>)
+"""
+import click
+from datetime import datetime
+from flask.cli import AppGroup
+from app.models.models import db
+
+stock_cli = AppGroup('stock', help='Mantenimiento del ledger de stock')
+
+@stock_cli.command('rebuild')
+@click.option('--producto', 'product_id', default=None, help='Reconstruir solo este producto')
+@click.option('--laboratorio', 'lab_id', default=None, help='Reconstruir solo este laboratorio')
+def rebuild_stock(product_id, lab_id):
+    """Reconstruye la tabla Stock a partir del historial de movimientos."""
+    from app.utils.stock_service import recalculate_stock_from_movements
+    
+    saldos = recalculate_stock_from_movements(product_id=product_id, lab_id=lab_id)
+    db.session.commit()
+    click.echo(f'Ledger de stock reconstruido: {saldos} saldos (laboratorio, producto)')
+
+@stock_cli.command('checkpoint')
+@click.option('--hasta', default=None, help='Fecha de corte YYYY-MM-DD (por defecto, hoy a las 00:00)')
+def checkpoint_stock(hasta):
+    """Avanza los checkpoints de stock hasta la fecha de corte indicada."""
+    from app.utils.stock_service import roll_forward_checkpoints
+    
+    if hasta:
+        try:
+            fecha_corte = datetime.strptime(hasta, '%Y-%m-%d')
+        except ValueError:
+            raise click.BadParameter('Use el formato YYYY-MM-DD', param_hint='--hasta')
+    else:
+        fecha_corte = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    
+    checkpoints = roll_forward_checkpoints(fecha_corte)
+    db.session.commit()
+    click.echo(f'Checkpoints de stock al {fecha_corte:%Y-%m-%d %H:%M}: {checkpoints} saldos')
+
+counts_cli = AppGroup('counts', help='Mantenimiento de los contadores de filas')
+
+@counts_cli.command('rebuild')
+def rebuild_counts_command():
+    """Recalcula de forma exacta los contadores de los listados."""
+    from app.utils.count_service import rebuild_counts
+    
+    contadores = rebuild_counts()
+    db.session.commit()
+    click.echo(f'Contadores de filas recalculados: {contadores}')
+
+jobs_cli = AppGroup('jobs', help='Trabajos en segundo plano')
+
+@jobs_cli.command('worker')
+@click.option('--hilos', default=None, type=int, help='Trabajos en paralelo (por defecto, JOBS_WORKER_THREADS)')
+def jobs_worker(hilos):
+    """Ejecuta los trabajos encolados hasta que se interrumpa con Ctrl+C."""
+    import time
+    from flask import current_app
+    from app.utils.job_service import job_runner
+    
+    app = current_app._get_current_object()
+    hilos = hilos or app.config.get('JOBS_WORKER_THREADS', 2)
+    job_runner.start(app, hilos=hilos, intervalo=app.config.get('JOBS_POLL_INTERVAL', 5),
+                     latido=app.config.get('JOBS_HEARTBEAT_SECONDS', 60))
+    click.echo(f'Worker de trabajos iniciado con {hilos} hilos')
+    try:
+        while job_runner.running:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        job_runner.stop(timeout=30)
+        click.echo('Worker de trabajos detenido')
+
+@jobs_cli.command('purge')
+@click.option('--dias', default=7, show_default=True, help='Antigüedad mínima de los trabajos terminados')
+def jobs_purge(dias):
+    """Elimina los trabajos terminados y sus archivos, y los correos ya enviados."""
+    from flask import current_app
+    from app.utils.job_service import purge_jobs
+    from app.utils.email_outbox import purge_sent_emails
+    
+    eliminados = purge_jobs(current_app._get_current_object(), dias)
+    click.echo(f'Trabajos eliminados: {eliminados}')
+    click.echo(f'Correos eliminados: {purge_sent_emails(dias)}')
+
+def register_commands(app):
+    """Registra los grupos de comandos CLI en la aplicación"""
+    app.cli.add_command(stock_cli)
+    app.cli.add_command(counts_cli)
+    app.cli.add_command(jobs_cli)
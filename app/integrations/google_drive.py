@@ -1,7 +1,174 @@
 import requests
+import base64
 import json
 import os
 import logging
+import random
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds per Apps Script action
+ACTION_TIMEOUTS = {
+    'createLabFolders': (5, 30),
+    'deleteLabFolders': (5, 30),
+    'uploadMovimientoDocumento': (5, 120),
+    'uploadFichaSeguridad': (5, 120),
+    'sendEmail': (5, 30),
+    'sendEmails': (5, 120),
+    'downloadFile': (5, 120),
+    'getFileStreamUrl': (5, 30),
+    'getFileChunk': (5, 60),
+}
+DEFAULT_TIMEOUT = (5, 30)
+
+# Actions that can be safely repeated when the response is lost or the server fails.
+# Creating folders, uploading files and sending emails are not: a retry after a read
+# timeout could duplicate them, so those only retry failed connections (request not sent).
+IDEMPOTENT_ACTIONS = {'deleteLabFolders', 'downloadFile', 'getFileStreamUrl', 'getFileChunk'}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Bytes read per chunk when relaying a streamed download
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+# Bytes requested per getFileChunk call (the script caps ranges at 8 MB)
+DOWNLOAD_RANGE_SIZE = 4 * 1024 * 1024
+
+class DownloadTooLargeError(Exception):
+    """The file exceeds the size allowed for a single download"""
+
+class AppsScriptSession:
+    """
+    Shared HTTP session for the Apps Script web app: pooled keep-alive connections,
+    per-action timeouts, bounded exponential-backoff retries for idempotent actions and
+    latency metrics per action. Safe to share between threads (cookies are disabled,
+    so requests do not mutate session state).
+    """
+    
+    def __init__(self, pool_size=10, max_retries=3, backoff=0.5, max_backoff=8.0):
+        self._lock = threading.Lock()
+        self._session = None
+        self._metrics = {}
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.logger = logging.getLogger(__name__)
+    
+    def configure(self, pool_size=None, max_retries=None, backoff=None):
+        """Adjust the pool and retry settings (called from create_app)"""
+        with self._lock:
+            if pool_size is not None:
+                self.pool_size = pool_size
+            if max_retries is not None:
+                self.max_retries = max_retries
+            if backoff is not None:
+                self.backoff = backoff
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+    
+    def _get_session(self):
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+                # Connection errors happen before the request is sent, so they are
+                # retried for every action; read and status retries are handled in post()
+                adapter = HTTPAdapter(
+                    pool_connections=2,
+                    pool_maxsize=self.pool_size,
+                    max_retries=Retry(total=None, connect=2, read=0, status=0, other=0,
+                                      backoff_factor=0.2, allowed_methods=None),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Content-Type': 'application/json'})
+                self._session = session
+            return self._session
+    
+    def _record(self, action, elapsed_ms, failed, retries):
+        with self._lock:
+            metric = self._metrics.setdefault(action, {
+                'calls': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'last_ms': 0.0
+            })
+            metric['calls'] += 1
+            metric['errors'] += int(failed)
+            metric['retries'] += retries
+            metric['total_ms'] += elapsed_ms
+            metric['max_ms'] = max(metric['max_ms'], elapsed_ms)
+            metric['last_ms'] = elapsed_ms
+    
+    def _send(self, action, send, idempotent):
+        """
+        Run `send()` applying the retry policy and record the metrics for `action`.
+        
+        Returns:
+            requests.Response: The last response received
+        
+        Raises:
+            requests.RequestException: When the request fails after the allowed retries
+        """
+        attempts = 1 + (self.max_retries if idempotent else 0)
+        start = time.monotonic()
+        retries = 0
+        try:
+            for attempt in range(attempts):
+                last_attempt = attempt == attempts - 1
+                try:
+                    response = send()
+                except (requests.ConnectionError, requests.Timeout) as e:
+                    if last_attempt:
+                        raise
+                    self.logger.warning(f"Apps Script {action} failed ({e.__class__.__name__}), retrying")
+                else:
+                    if response.status_code not in RETRY_STATUSES or last_attempt:
+                        self._record(action, (time.monotonic() - start) * 1000,
+                                     response.status_code != 200, retries)
+                        return response
+                    self.logger.warning(f"Apps Script {action} returned HTTP {response.status_code}, retrying")
+                    # Release the connection before retrying
+                    response.close()
+                retries += 1
+                # Exponential backoff with jitter, bounded by max_backoff
+                delay = min(self.max_backoff, self.backoff * (2 ** attempt))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        except requests.RequestException:
+            self._record(action, (time.monotonic() - start) * 1000, True, retries)
+            raise
+    
+    def post(self, url, data, timeout=None):
+        """
+        POST a JSON payload to the Apps Script web app.
+        
+        Args:
+            url (str): Deployment URL
+            data (dict): Payload; data['action'] selects the timeout and retry policy
+            timeout (tuple, optional): (connect, read) override
+        
+        Returns:
+            requests.Response: The last response received
+        
+        Raises:
+            requests.RequestException: When the request fails after the allowed retries
+        """
+        action = data.get('action', 'unknown')
+        timeout = timeout or ACTION_TIMEOUTS.get(action, DEFAULT_TIMEOUT)
+        session = self._get_session()
+        return self._send(action, lambda: session.post(url, json=data, timeout=timeout),
+                          action in IDEMPOTENT_ACTIONS)
+    
+    def stats(self):
+        """Per-action call counts and latency (ms) for diagnostics"""
+        with self._lock:
+            return {
+                action: dict(metric, avg_ms=round(metric['total_ms'] / metric['calls'], 1) if metric['calls'] else 0.0)
+                for action, metric in self._metrics.items()
+            }
+
+# Shared by every GoogleDriveIntegration call in the process
+apps_script_session = AppsScriptSession()
 
 class GoogleDriveIntegration:
     """
@@ -13,7 +180,8 @@ class GoogleDriveIntegration:
         self.script_url = os.environ.get('GOOGLE_SCRIPT_URL')
         self.secure_token = os.environ.get('GOOGLE_DRIVE_SECURE_TOKEN', '1250')
         self.logger = logging.getLogger(__name__)
-        
+        self.http = apps_script_session
+    
     def _get_script_url(self):
         """Get the script URL, checking environment first, then Flask config if available"""
         if self.script_url:
@@ -36,7 +204,7 @@ class GoogleDriveIntegration:
         Args:
             lab_id (str): The laboratory ID
             lab_name (str): The laboratory name
-            
+        
         Returns:
             dict: Dictionary with folder IDs or None if there was an error
         """
@@ -44,7 +212,7 @@ class GoogleDriveIntegration:
         if not script_url:
             self.logger.error("Google Script URL not configured")
             return None
-            
+        
         try:
             # Prepare the request data
             data = {
@@ -58,11 +226,7 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending request to Google Script: {data}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'}
-            )
+            response = self.http.post(script_url, data)
             
             # Check response
             if response.status_code == 200:
@@ -78,11 +242,11 @@ class GoogleDriveIntegration:
             else:
                 self.logger.error(f"HTTP Error: {response.status_code}, Response: {response.text}")
                 return None
-                
+        
         except Exception as e:
             self.logger.error(f"Exception in Google Drive integration: {str(e)}")
             return None
-            
+    
     def delete_laboratory_folders(self, folder_ids):
         """
         Deletes laboratory folders from Google Drive
@@ -91,19 +255,19 @@ class GoogleDriveIntegration:
             folder_ids (dict): Dictionary containing folder IDs to delete
                 - lab_folder_id: ID of the main laboratory folder
                 - movimientos_folder_id: ID of the movements folder
-                
+        
         Returns:
             bool: True if deletion was successful, False otherwise
         """
-        if not self.script_url:
+        if not self._get_script_url():
             self.logger.error("Google Script URL not configured")
             return False
-            
+        
         # If folder IDs are None or empty, return True (nothing to delete)
         if not folder_ids or (not folder_ids.get('lab_folder_id') and not folder_ids.get('movimientos_folder_id')):
             self.logger.info("No folder IDs provided for deletion")
             return True
-            
+        
         try:
             # Prepare the request data
             data = {
@@ -117,11 +281,7 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending folder deletion request to Google Script: {data}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                self.script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'}
-            )
+            response = self.http.post(self._get_script_url(), data)
             
             # Check response
             if response.status_code == 200:
@@ -135,11 +295,11 @@ class GoogleDriveIntegration:
             else:                
                 self.logger.error(f"HTTP Error: {response.status_code}, Response: {response.text}")
                 return False
-                
+        
         except Exception as e:
             self.logger.error(f"Exception in Google Drive folder deletion: {str(e)}")
             return False
-            
+    
     def upload_movimiento_documento(self, lab_id, movimiento_id, file_data, file_name, file_type):
         """
         Uploads a document for a movement to Google Drive
@@ -150,14 +310,14 @@ class GoogleDriveIntegration:
             file_data (str): Base64 encoded file data
             file_name (str): Original file name
             file_type (str): MIME type of the file
-            
+        
         Returns:
             dict: Dictionary with file ID and URL or None if there was an error
         """
-        if not self.script_url:
+        if not self._get_script_url():
             self.logger.error("Google Script URL not configured")
             return None
-            
+        
         try:
             # Get current date for folder name
             from datetime import datetime
@@ -180,12 +340,7 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending document upload request to Google Script: {log_data}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                self.script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=60  # Longer timeout for file uploads
-            )
+            response = self.http.post(self._get_script_url(), data)
             
             # Check response
             if response.status_code == 200:
@@ -201,11 +356,11 @@ class GoogleDriveIntegration:
             else:
                 self.logger.error(f"HTTP Error: {response.status_code}, Response: {response.text}")
                 return None
-                
+        
         except Exception as e:
             self.logger.error(f"Exception in Google Drive document upload: {str(e)}")
             return None
-            
+    
     def send_email(self, to, subject, html_body, sender_name=None, reply_to=None):
         """
         Sends an email using the Google Apps Script
@@ -216,14 +371,14 @@ class GoogleDriveIntegration:
             html_body (str): HTML content of the email
             sender_name (str, optional): Name of the sender
             reply_to (str, optional): Reply-to email address
-            
+        
         Returns:
             bool: True if email was sent successfully, False otherwise
         """
-        if not self.script_url:
+        if not self._get_script_url():
             self.logger.error("Google Script URL not configured")
             return False
-            
+        
         try:
             # Prepare the request data
             data = {
@@ -244,11 +399,7 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending email request to Google Script: {to}, subject: {subject}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                self.script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'}
-            )
+            response = self.http.post(self._get_script_url(), data)
               # Check response
             if response.status_code == 200:
                 result = response.json()
@@ -261,11 +412,63 @@ class GoogleDriveIntegration:
             else:
                 self.logger.error(f"HTTP Error: {response.status_code}, Response: {response.text}")
                 return False
-                
+        
         except Exception as e:
             self.logger.error(f"Exception in email sending: {str(e)}")
             return False
+    
+    def send_emails(self, messages):
+        """
+        Sends a batch of emails in a single Apps Script request
+        
+        Args:
+            messages (list): Dicts with 'id', 'to', 'subject', 'htmlBody' and optionally
+                'senderName' and 'replyTo'
+        
+        Returns:
+            dict: {'results': {id: error message or None if sent}, 'quota_exceeded': set of
+                  ids not sent because the daily MailApp quota is exhausted} or
+                  {'error': message} if the whole batch failed. {'error': 'Unknown action'}
+                  means the deployed script predates sendEmails.
+        """
+        if not self._get_script_url():
+            self.logger.error("Google Script URL not configured")
+            return {'error': 'Google Script URL not configured'}
+        
+        try:
+            data = {
+                'action': 'sendEmails',
+                'token': str(self.secure_token),
+                'messages': messages
+            }
+            response = self.http.post(self._get_script_url(), data)
+            if response.status_code != 200:
+                error_msg = f"HTTP Error: {response.status_code}"
+                self.logger.error(error_msg)
+                return {'error': error_msg}
             
+            result = response.json()
+            if not result.get('success'):
+                error_msg = result.get('error', 'Unknown error')
+                if error_msg != 'Unknown action':
+                    self.logger.error(f"Google Script Error: {error_msg}")
+                return {'error': error_msg}
+            
+            results = {}
+            quota_exceeded = set()
+            for item in result.get('results', []):
+                results[item.get('id')] = None if item.get('success') else (item.get('error') or 'Unknown error')
+                if item.get('quotaExceeded'):
+                    quota_exceeded.add(item.get('id'))
+            self.logger.info(f"Email batch sent: {sum(1 for e in results.values() if e is None)}/{len(messages)} delivered")
+            if quota_exceeded:
+                self.logger.warning(f"Daily email quota exhausted, {len(quota_exceeded)} emails not sent")
+            return {'results': results, 'quota_exceeded': quota_exceeded}
+        
+        except Exception as e:
+            self.logger.error(f"Exception in batch email sending: {str(e)}")
+            return {'error': str(e)}
+    
     def upload_ficha_seguridad(self, producto_id, file_data, file_extension):
         """
         Uploads a safety datasheet file to Google Drive
@@ -274,14 +477,14 @@ class GoogleDriveIntegration:
             producto_id (str): The product ID
             file_data (str): Base64 encoded file data
             file_extension (str): File extension (pdf, jpg, png, etc.)
-            
+        
         Returns:
             dict: Dictionary with file ID and URL or None if there was an error
         """
-        if not self.script_url:
+        if not self._get_script_url():
             self.logger.error("Google Script URL not configured")
             return None
-            
+        
         try:
             # Prepare the request data
             file_name = f"ficha_seg_{producto_id}.{file_extension}"
@@ -299,12 +502,9 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending ficha seguridad upload request to Google Script: {log_data}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                self.script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=60  # Longer timeout for file uploads
-            )            # Check response
+            response = self.http.post(self._get_script_url(), data)
+            
+            # Check response
             if response.status_code == 200:
                 result = response.json()
                 if result.get('success'):
@@ -321,26 +521,26 @@ class GoogleDriveIntegration:
                 error_msg = f"HTTP Error: {response.status_code}, Response: {response.text}"
                 self.logger.error(error_msg)
                 return {'error': error_msg}
-                
+        
         except Exception as e:
             error_msg = f"Exception in ficha seguridad upload: {str(e)}"
             self.logger.error(error_msg)
             return {'error': error_msg}
-        
+    
     def download_file(self, file_id):
         """
         Downloads a file from Google Drive using the Google Apps Script
         
         Args:
             file_id (str): The Google Drive file ID
-            
+        
         Returns:
             dict: Dictionary with file data and metadata or None if there was an error
         """
-        if not self.script_url:
+        if not self._get_script_url():
             self.logger.error("Google Script URL not configured")
             return None
-            
+        
         try:
             # Prepare the request data
             data = {
@@ -353,12 +553,7 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending file download request to Google Script: {data}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                self.script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=60  # Longer timeout for file downloads
-            )
+            response = self.http.post(self._get_script_url(), data)
             
             # Check response
             if response.status_code == 200:
@@ -379,26 +574,134 @@ class GoogleDriveIntegration:
                 error_msg = f"HTTP Error: {response.status_code}, Response: {response.text}"
                 self.logger.error(error_msg)
                 return {'error': error_msg}
-                
+        
         except Exception as e:
             error_msg = f"Exception in file download: {str(e)}"
             self.logger.error(error_msg)
             return {'error': error_msg}
-
+    
+    def open_file_stream(self, file_id, max_bytes, chunk_size=DOWNLOAD_CHUNK_SIZE,
+                         range_size=DOWNLOAD_RANGE_SIZE):
+        """
+        Opens a file from Google Drive as a stream of chunks, without holding the whole
+        file in memory. The bytes are read through the script in bounded base64 ranges
+        (getFileChunk action): only the first range is read here, the rest as the
+        chunks are consumed.
+        
+        Falls back to the base64 downloadFile action when the deployed script does not
+        know getFileChunk yet, or for native Google files that must be exported.
+        
+        Args:
+            file_id (str): The Google Drive file ID
+            max_bytes (int): Largest file allowed; bigger files are rejected before
+                downloading
+            chunk_size (int): Bytes per chunk
+            range_size (int): Bytes requested from the script per call
+        
+        Returns:
+            dict: {'chunks', 'file_name', 'mime_type', 'file_size'} where 'chunks' is an
+                  iterator of bytes that raises IOError if a later range cannot be read,
+                  or {'error': message, 'status': http_status} if the file cannot be opened
+        """
+        if not self._get_script_url():
+            self.logger.error("Google Script URL not configured")
+            return {'error': 'Google Script URL not configured', 'status': 503}
+        
+        try:
+            first = self._get_file_chunk(file_id, 0, range_size)
+            if 'error' in first:
+                if first['error'] == 'Unknown action' or first.get('exportRequired'):
+                    return self._legacy_file_stream(file_id, max_bytes, chunk_size)
+                self.logger.error(f"Drive API Error: {first['error']}")
+                return {'error': first['error'], 'status': first['status']}
+            
+            file_size = int(first['fileSize'])
+            if file_size > max_bytes:
+                return {'error': f"File too large ({file_size} bytes, limit {max_bytes})", 'status': 413}
+        
+        except Exception as e:
+            error_msg = f"Exception opening file stream: {str(e)}"
+            self.logger.error(error_msg)
+            return {'error': error_msg, 'status': 502}
+        
+        def chunks():
+            data, offset = first['data'][:file_size], 0
+            while True:
+                view = memoryview(data)
+                for start in range(0, len(data), chunk_size):
+                    yield bytes(view[start:start + chunk_size])
+                offset += len(data)
+                if offset >= file_size:
+                    return
+                next_range = self._get_file_chunk(file_id, offset, range_size)
+                if 'error' in next_range or not next_range['data']:
+                    raise IOError(f"Could not read {file_id} at offset {offset}: "
+                                  f"{next_range.get('error', 'empty range')}")
+                # The file cannot grow past the size checked against max_bytes
+                data = next_range['data'][:file_size - offset]
+        
+        return {
+            'chunks': chunks(),
+            'file_name': first.get('fileName'),
+            'mime_type': first.get('mimeType'),
+            'file_size': file_size,
+        }
+    
+    def _get_file_chunk(self, file_id, offset, length):
+        """
+        Reads a byte range of a file through the getFileChunk action
+        
+        Returns:
+            dict: The script response with 'data' decoded to bytes, or the failed
+                  response with 'error' and 'status' added
+        """
+        data = {
+            'action': 'getFileChunk',
+            'token': str(self.secure_token),
+            'fileId': file_id,
+            'offset': offset,
+            'length': length
+        }
+        response = self.http.post(self._get_script_url(), data)
+        if response.status_code != 200:
+            return {'error': f"HTTP Error: {response.status_code}", 'status': 502}
+        
+        result = response.json()
+        if not result.get('success'):
+            return dict(result, error=result.get('error', 'Unknown error'), status=404)
+        result['data'] = base64.b64decode(result.get('data') or '')
+        return result
+    
+    def _legacy_file_stream(self, file_id, max_bytes, chunk_size):
+        """open_file_stream() on top of the base64 downloadFile action"""
+        file_result = self.download_file(file_id)
+        if not file_result or 'error' in file_result:
+            return {'error': file_result.get('error') if file_result else 'File not found', 'status': 404}
+        file_data = base64.b64decode(file_result['file_data'])
+        if len(file_data) > max_bytes:
+            return {'error': f"File too large ({len(file_data)} bytes, limit {max_bytes})", 'status': 413}
+        view = memoryview(file_data)
+        return {
+            'chunks': (bytes(view[start:start + chunk_size]) for start in range(0, len(file_data), chunk_size)),
+            'file_name': file_result.get('file_name'),
+            'mime_type': file_result.get('mime_type'),
+            'file_size': len(file_data),
+        }
+    
     def get_file_stream_url(self, file_id):
         """
         Gets a streaming URL for a file from Google Drive for direct embedding
         
         Args:
             file_id (str): The Google Drive file ID
-            
+        
         Returns:
             dict: Dictionary with streaming URL or None if there was an error
         """
-        if not self.script_url:
+        if not self._get_script_url():
             self.logger.error("Google Script URL not configured")
             return None
-            
+        
         try:
             # Prepare the request data
             data = {
@@ -411,12 +714,7 @@ class GoogleDriveIntegration:
             self.logger.info(f"Sending file stream URL request to Google Script: {data}")
             
             # Send request to Google Apps Script
-            response = requests.post(
-                self.script_url,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
+            response = self.http.post(self._get_script_url(), data)
             
             # Check response
             if response.status_code == 200:
@@ -436,7 +734,7 @@ class GoogleDriveIntegration:
                 error_msg = f"HTTP Error: {response.status_code}, Response: {response.text}"
                 self.logger.error(error_msg)
                 return {'error': error_msg}
-                
+        
         except Exception as e:
             error_msg = f"Exception in getting file stream URL: {str(e)}"
             self.logger.error(error_msg)
@@ -6,6 +6,7 @@ from keycloak import KeycloakAdmin
 from flask import current_app
 import requests
 from app.utils.logging_config import get_security_logger, get_audit_logger
+from app.utils.job_service import job_handler
 
 class KeycloakAdminClient:
     """Keycloak Admin API client for user management"""
@@ -489,3 +490,26 @@ class KeycloakAdminClient:
 
 # Create global instance
 keycloak_admin = KeycloakAdminClient()
+
+@job_handler('sincronizar_usuarios_keycloak')
+def _sincronizar_usuarios_job(contexto):
+    """Sincroniza en segundo plano los usuarios laboratoristas desde Keycloak"""
+    if not keycloak_admin.admin_client:
+        raise Exception('Keycloak admin client no está inicializado. Verifique la configuración.')
+    
+    contexto.progress(None, 'Sincronizando usuarios desde Keycloak...')
+    sync_stats = keycloak_admin.sync_users_to_local_db()
+    
+    partes = []
+    if sync_stats['created'] > 0:
+        partes.append(f"{sync_stats['created']} usuarios creados")
+    if sync_stats['updated'] > 0:
+        partes.append(f"{sync_stats['updated']} usuarios actualizados")
+    if sync_stats['skipped'] > 0:
+        partes.append(f"{sync_stats['skipped']} usuarios omitidos")
+    if sync_stats['errors'] > 0:
+        partes.append(f"{sync_stats['errors']} errores")
+    
+    resultado = dict(sync_stats)
+    resultado['mensaje'] = f"Sincronización completada: {', '.join(partes) or 'sin cambios'}"
+    return resultado
@@ -128,6 +128,8 @@ class Movimiento(db.Model):
     tipoMovimiento = db.Column(db.String(20), nullable=False)  # 'ingreso', 'compra', 'uso', 'transferencia'
     cantidad = db.Column(db.Float, nullable=False)
     unidadMedida = db.Column(db.String(10), nullable=False)
+    # Efecto con signo sobre el stock del laboratorio (lo calcula stock_service al guardar)
+    delta = db.Column(db.Float, nullable=False, default=0.0, server_default='0')
       # New fields for the specialized movement types
     tipoDocumento = db.Column(db.String(20), nullable=True)  # 'factura' or 'remito' for 'compra' type
     numeroDocumento = db.Column(db.String(50), nullable=True)  # Number of the invoice or receipt
@@ -145,6 +147,8 @@ class Movimiento(db.Model):
         db.Index('idx_movimiento_lab_timestamp', 'idLaboratorio', 'timestamp'),
         db.Index('idx_movimiento_producto_timestamp', 'idProducto', 'timestamp'),
         db.Index('idx_movimiento_tipo_timestamp', 'tipoMovimiento', 'timestamp'),
+        # Índice cubriente para SUM(delta) por (laboratorio, producto)
+        db.Index('idx_movimiento_lab_producto_delta', 'idLaboratorio', 'idProducto', 'delta'),
     )
 
 class Stock(db.Model):
@@ -162,4 +166,85 @@ class Stock(db.Model):
         db.Index('idx_stock_lab_producto', 'idLaboratorio', 'idProducto'),
         # Unique constraint to prevent duplicate stock entries
         db.UniqueConstraint('idProducto', 'idLaboratorio', name='unique_producto_laboratorio'),
-    )
\ No newline at end of file
+    )
+
+class StockCheckpoint(db.Model):
+    __tablename__ = 'stock_checkpoint'
+    idCheckpoint = db.Column(db.Integer, primary_key=True)
+    idProducto = db.Column(db.String(10), db.ForeignKey('producto.idProducto'), nullable=False)
+    idLaboratorio = db.Column(db.String(10), db.ForeignKey('laboratorio.idLaboratorio'), nullable=False)
+    # Saldo acumulado de todos los movimientos con timestamp < fechaCorte
+    fechaCorte = db.Column(db.DateTime, nullable=False)
+    cantidad = db.Column(db.Float, nullable=False, default=0)
+    # Se marca cuando se agrega o elimina un movimiento anterior al corte
+    desactualizado = db.Column(db.Boolean, nullable=False, default=False)
+    
+    __table_args__ = (
+        db.UniqueConstraint('idLaboratorio', 'idProducto', name='unique_checkpoint_laboratorio_producto'),
+    )
+
+class ContadorFilas(db.Model):
+    __tablename__ = 'contador_filas'
+    # 'tabla' para el total, o 'tabla|columna=valor' para un filtro mantenido
+    clave = db.Column(db.String(150), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+class Secuencia(db.Model):
+    __tablename__ = 'secuencia'
+    # Último número entregado de cada secuencia (ej. 'movimiento'); ver id_service
+    nombre = db.Column(db.String(50), primary_key=True)
+    valor = db.Column(db.BigInteger, nullable=False)
+
+class Trabajo(db.Model):
+    __tablename__ = 'trabajo'
+    idTrabajo = db.Column(db.String(32), primary_key=True)
+    # Nombre del manejador registrado en job_service (ej. 'importar_productos')
+    tipo = db.Column(db.String(50), nullable=False)
+    # pendiente, en_proceso, completado, error
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    parametros = db.Column(db.Text, nullable=True)    # JSON
+    progreso = db.Column(db.Integer, nullable=True)   # 0-100, o NULL si no se puede estimar
+    mensaje = db.Column(db.String(255), nullable=True)
+    resultado = db.Column(db.Text, nullable=True)     # JSON
+    archivoResultado = db.Column(db.String(255), nullable=True)
+    idUsuario = db.Column(db.String(10), db.ForeignKey('usuario.idUsuario'), nullable=True)
+    fechaCreacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    fechaInicio = db.Column(db.DateTime, nullable=True)
+    fechaFin = db.Column(db.DateTime, nullable=True)
+    # Última señal de vida del worker que lo ejecuta (se renueva mientras está en proceso)
+    ultimoLatido = db.Column(db.DateTime, nullable=True)
+    # Reintentos: intentos fallidos hasta ahora y momento desde el que se puede volver a tomar
+    intentos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    disponibleDesde = db.Column(db.DateTime, nullable=True)
+    # Entidad a la que pertenece el trabajo (ej. 'movimiento:MOV1000042'), para mostrar su estado
+    referencia = db.Column(db.String(50), nullable=True, index=True)
+    
+    __table_args__ = (
+        db.Index('idx_trabajo_estado_creacion', 'estado', 'fechaCreacion'),
+    )
+
+class CorreoSaliente(db.Model):
+    """Correo en cola para el envío en segundo plano (en lotes, a través del Apps Script)"""
+    __tablename__ = 'correo_saliente'
+    idCorreo = db.Column(db.Integer, primary_key=True)
+    destinatario = db.Column(db.String(120), nullable=False)
+    asunto = db.Column(db.String(255), nullable=False)
+    cuerpoHtml = db.Column(db.Text, nullable=False)
+    nombreRemitente = db.Column(db.String(100), nullable=True)
+    responderA = db.Column(db.String(120), nullable=True)
+    # SHA-256 de destinatario, asunto, cuerpo y remitente, para descartar duplicados
+    huella = db.Column(db.String(64), nullable=False, index=True)
+    # pendiente, enviando, enviado, error
+    estado = db.Column(db.String(20), nullable=False, default='pendiente')
+    intentos = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    disponibleDesde = db.Column(db.DateTime, nullable=True)
+    # Lote del worker que tomó el correo (evita que dos workers envíen el mismo)
+    lote = db.Column(db.String(32), nullable=True)
+    ultimoError = db.Column(db.String(255), nullable=True)
+    fechaCreacion = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    fechaIntento = db.Column(db.DateTime, nullable=True)
+    fechaEnvio = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        db.Index('idx_correo_estado_disponible', 'estado', 'disponibleDesde'),
+    )
@@ -8,7 +8,18 @@ from wtforms.validators import DataRequired, Email, Length, ValidationError, URL
 from app.integrations.google_drive import drive_integration
 from app.integrations.keycloak_admin_client import keycloak_admin
 from app.utils.email_service import EmailService
-from app.utils.stock_service import get_stock_map_for_laboratory, get_global_stock_for_products
+from app.utils.stock_service import get_stock_map_for_laboratory, get_global_stock_for_products, get_stock_by_lab_map
+from app.utils.report_service import build_movements_report
+from app.utils.pagination import paginate_keyset
+from app.utils.count_service import get_count, paginate_counted
+from app.utils.datatables import parse_datatables_args, datatables_response
+from app.utils.search_service import apply_product_search
+from app.utils.product_index import product_index
+from app.utils.id_service import movement_ids
+from app.utils.catalog_cache import catalog_cache, laboratorio_choices, proveedor_choices
+from app.utils.job_service import enqueue, new_job_id, job_directory
+from app.utils.upload_outbox import (spool_upload, queue_movement_document, queue_safety_sheet, upload_states,
+                                    movement_reference, product_reference)
 from app.utils.logging_decorators import (
     log_admin_action, 
     log_data_modification, 
@@ -17,8 +28,7 @@ from app.utils.logging_decorators import (
     log_business_operation
 )
 from app.utils.logging_config import get_business_logger, get_audit_logger, get_performance_logger
-import pandas as pd
-import io
+import os
 import logging
 
 admin = Blueprint('admin', __name__)
@@ -76,7 +86,7 @@ class UsuarioForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(UsuarioForm, self).__init__(*args, **kwargs)
         # Populate labs choices
-        self.labs_asignados.choices = [(lab.idLaboratorio, lab.nombre) for lab in Laboratorio.query.all()]
+        self.labs_asignados.choices = laboratorio_choices()
 
 class LaboratorioForm(FlaskForm):
     idLaboratorio = StringField('ID Laboratorio', validators=[DataRequired(), Length(min=4, max=10)])
@@ -131,16 +141,15 @@ class MovimientoForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(MovimientoForm, self).__init__(*args, **kwargs)
         # Populate choices
-        self.idLaboratorio.choices = [(lab.idLaboratorio, lab.nombre) for lab in Laboratorio.query.all()]
-        self.idProducto.choices = [(p.idProducto, p.nombre) for p in Producto.query.all()]
-        self.laboratorioDestino.choices = [(lab.idLaboratorio, lab.nombre) for lab in Laboratorio.query.all()]
-        
-        # Populate provider choices
-        proveedores = Proveedor.query.order_by(Proveedor.nombre).all()
-        self.idProveedor.choices = [(0, 'Nuevo proveedor...')] + [(p.idProveedor, f"{p.nombre} ({p.cuit})") for p in proveedores]
-    
-    def validate(self):
-        if not super().validate():
+        # Catálogos cacheados: construir el formulario no consulta la base
+        self.idLaboratorio.choices = laboratorio_choices()
+        # El producto se elige con búsqueda asíncrona: solo se envía el seleccionado
+        self.idProducto.choices = product_index.choices_for(self.idProducto.data)
+        self.laboratorioDestino.choices = list(self.idLaboratorio.choices)
+        self.idProveedor.choices = proveedor_choices()
+    
+    def validate(self, **kwargs):
+        if not super().validate(**kwargs):
             return False
             
         if self.tipoMovimiento.data == 'compra':
@@ -177,17 +186,17 @@ class ReporteForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(ReporteForm, self).__init__(*args, **kwargs)
         # Populate lab choices
-        laboratorios = Laboratorio.query.all()
-        self.laboratorio.choices = [('', 'Todos')] + [(lab.idLaboratorio, lab.nombre) for lab in laboratorios]
+        self.laboratorio.choices = [('', 'Todos')] + laboratorio_choices()
 
 # Dashboard
 @admin.route('/')
 @admin_required
 def dashboard():
-    usuarios_count = Usuario.query.count()
-    laboratorios_count = Laboratorio.query.count()
-    productos_count = Producto.query.count()
-    movimientos_count = Movimiento.query.count()
+    # Contadores mantenidos por eventos (sin COUNT(*) por request)
+    usuarios_count = get_count(Usuario)
+    laboratorios_count = get_count(Laboratorio)
+    productos_count = get_count(Producto)
+    movimientos_count = get_count(Movimiento)
     
     return render_template('admin/dashboard.html', 
                            title='Panel de Administración',
@@ -207,11 +216,9 @@ def list_usuarios():
     # Crear la query base
     query = Usuario.query
     
-    # Obtener conteo total antes de paginar
-    total_usuarios = query.count()
-    
-    # Aplicar paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Aplicar paginación (el total sale del contador mantenido)
+    pagination = paginate_counted(Usuario, query, page, per_page)
+    total_usuarios = pagination.total
     usuarios = pagination.items
     
     return render_template('admin/usuarios/list.html', 
@@ -313,35 +320,16 @@ def sync_users_from_keycloak():
             flash('Error: Keycloak admin client no está inicializado. Verifique la configuración.', 'danger')
             return redirect(url_for('admin.list_usuarios'))
         
-        current_app.logger.info("Starting Keycloak user synchronization")
-        
-        # Perform the synchronization
-        sync_stats = keycloak_admin.sync_users_to_local_db()
-        
-        current_app.logger.info(f"Keycloak synchronization completed: {sync_stats}")
-        
-        # Create a summary message
-        messages = []
-        if sync_stats['created'] > 0:
-            messages.append(f"{sync_stats['created']} usuarios creados")
-        if sync_stats['updated'] > 0:
-            messages.append(f"{sync_stats['updated']} usuarios actualizados")
-        if sync_stats['skipped'] > 0:
-            messages.append(f"{sync_stats['skipped']} usuarios omitidos")
-        if sync_stats['errors'] > 0:
-            messages.append(f"{sync_stats['errors']} errores")
-        
-        if sync_stats['created'] > 0 or sync_stats['updated'] > 0:
-            flash(f'Sincronización completada: {", ".join(messages)}', 'success')
-        elif sync_stats['skipped'] > 0 and sync_stats['errors'] == 0:
-            flash(f'Sincronización completada: {", ".join(messages)} (no hay cambios nuevos)', 'info')
-        else:
-            flash(f'Sincronización completada con problemas: {", ".join(messages)}', 'warning')
+        # La sincronización puede superar el timeout del servidor: se ejecuta en segundo plano
+        trabajo = enqueue('sincronizar_usuarios_keycloak', usuario_id=current_user.idUsuario)
+        current_app.logger.info(f"Keycloak user synchronization queued as job {trabajo.idTrabajo}")
+        flash('La sincronización con Keycloak se está ejecutando en segundo plano', 'info')
+        return redirect(url_for('main.ver_trabajo', id_trabajo=trabajo.idTrabajo))
             
     except Exception as e:
         error_msg = f"Error during Keycloak user synchronization: {str(e)}"
         current_app.logger.error(error_msg, exc_info=True)
-        flash(f'Error durante la sincronización con Keycloak: {str(e)}', 'danger')
+        flash(f'Error al iniciar la sincronización con Keycloak: {str(e)}', 'danger')
     
     return redirect(url_for('admin.list_usuarios'))
 
@@ -356,11 +344,9 @@ def list_laboratorios():
     # Crear la query base
     query = Laboratorio.query
     
-    # Obtener conteo total antes de paginar
-    total_laboratorios = query.count()
-    
-    # Aplicar paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Aplicar paginación (el total sale del contador mantenido)
+    pagination = paginate_counted(Laboratorio, query, page, per_page)
+    total_laboratorios = pagination.total
     laboratorios = pagination.items
     
     return render_template('admin/laboratorios/list.html', 
@@ -489,7 +475,7 @@ def list_productos():
     per_page = request.args.get('per_page', 20, type=int)
     
     # Obtener todos los laboratorios para el menú desplegable
-    laboratorios = Laboratorio.query.all()
+    laboratorios = catalog_cache.get('laboratorios')
     
     # Definir los tipos de productos para el menú desplegable
     tipos_productos = [
@@ -509,14 +495,12 @@ def list_productos():
     
     # Aplicar filtro de búsqueda si se especifica
     if search_term:
-        productos_query = productos_query.filter(
-            Producto.nombre.ilike(f'%{search_term}%')
-        )
+        productos_query = apply_product_search(productos_query, search_term)
     
-    # Obtener conteo total antes de paginar
-    total_productos = productos_query.count()
-      # Aplicar paginación
-    productos_paginados = productos_query.paginate(page=page, per_page=per_page, error_out=False)
+    # Aplicar paginación (un único conteo: contador mantenido o COUNT(*) si hay búsqueda)
+    productos_paginados = paginate_counted(Producto, productos_query, page, per_page,
+                                           filtros={'tipoProducto': tipo_producto, 'nombre': search_term})
+    total_productos = productos_paginados.total
     
     # Optimizar consultas de stock
     product_ids = [p.idProducto for p in productos_paginados.items]
@@ -551,7 +535,22 @@ def list_productos():
                          selected_tipo=tipo_producto,
                          search_term=search_term,
                          pagination=productos_paginados,
-                         total_productos=total_productos)
+                         total_productos=total_productos,
+                         subidas=upload_states([product_reference(item['producto'].idProducto)
+                                                for item in productos_con_stock]))
+
+def _encolar_ficha(producto_id, archivo, extension):
+    """Encola la subida de la ficha de seguridad (confirma el producto junto con el trabajo)"""
+    try:
+        guardado = spool_upload(archivo)
+    except Exception as e:
+        current_app.logger.error(f"Error saving ficha de seguridad upload: {str(e)}")
+        flash(f'Error al procesar la ficha de seguridad: {str(e)}', 'warning')
+        return
+    # Fuera del try: si la confirmación falla, la sesión queda inutilizable y el error
+    # debe propagarse
+    queue_safety_sheet(producto_id, guardado, extension, usuario_id=current_user.idUsuario)
+    flash('La ficha de seguridad se está subiendo a Google Drive', 'info')
 
 @admin.route('/productos/new', methods=['GET', 'POST'])
 @admin_required
@@ -566,44 +565,21 @@ def new_producto():
             flash('El ID de producto ya existe', 'danger')
             return render_template('admin/productos/form.html', title='Nuevo Producto', form=form)
         
-        # Handle file upload for ficha de seguridad
+        # Handle file upload for ficha de seguridad (validated here, uploaded in the background)
         url_ficha = form.urlFichaSeguridad.data
+        file_extension = None
         if form.fichaSeguridad.data:
-            try:
-                import base64
-                # Read and encode the file
-                file_data = form.fichaSeguridad.data.read()
-                file_b64 = base64.b64encode(file_data).decode('utf-8')
-                filename = form.fichaSeguridad.data.filename
-                
-                # Validate file extension
-                if not filename or '.' not in filename:
-                    flash('Error: Archivo inválido', 'warning')
-                    return render_template('admin/productos/form.html', title='Nuevo Producto', form=form)
-                
-                file_extension = filename.rsplit('.', 1)[1].lower()
-                if file_extension not in ['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx']:
-                    flash('Error: Tipo de archivo no permitido. Use PDF, JPG, PNG, DOC o DOCX.', 'warning')
-                    return render_template('admin/productos/form.html', title='Nuevo Producto', form=form)
-                
-                # Upload file to Google Drive
-                result = drive_integration.upload_ficha_seguridad(
-                    form.idProducto.data,
-                    file_b64,
-                    file_extension
-                )
-                
-                if result and 'file_id' in result:
-                    url_ficha = result['file_id']
-                    flash('Ficha de seguridad subida correctamente a Google Drive', 'success')
-                elif result and 'error' in result:
-                    flash(f'Error al subir la ficha de seguridad: {result["error"]}', 'warning')
-                else:
-                    flash('Error desconocido al subir la ficha de seguridad', 'warning')
-                    
-            except Exception as e:
-                current_app.logger.error(f"Error uploading ficha de seguridad: {str(e)}")
-                flash(f'Error al procesar la ficha de seguridad: {str(e)}', 'warning')
+            filename = form.fichaSeguridad.data.filename
+            
+            # Validate file extension
+            if not filename or '.' not in filename:
+                flash('Error: Archivo inválido', 'warning')
+                return render_template('admin/productos/form.html', title='Nuevo Producto', form=form)
+            
+            file_extension = filename.rsplit('.', 1)[1].lower()
+            if file_extension not in ['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx']:
+                flash('Error: Tipo de archivo no permitido. Use PDF, JPG, PNG, DOC o DOCX.', 'warning')
+                return render_template('admin/productos/form.html', title='Nuevo Producto', form=form)
         
         producto = Producto(
             idProducto=form.idProducto.data,
@@ -618,6 +594,8 @@ def new_producto():
         )
         
         db.session.add(producto)
+        if file_extension:
+            _encolar_ficha(producto.idProducto, form.fichaSeguridad.data, file_extension)
         db.session.commit()
         flash('Producto creado correctamente', 'success')
         return redirect(url_for('admin.list_productos'))
@@ -633,44 +611,21 @@ def edit_producto(id):
     form = ProductoForm(obj=producto)
     
     if form.validate_on_submit():
-        # Handle file upload for ficha de seguridad
+        # Handle file upload for ficha de seguridad (validated here, uploaded in the background)
         url_ficha = form.urlFichaSeguridad.data
+        file_extension = None
         if form.fichaSeguridad.data:
-            try:
-                import base64
-                # Read and encode the file
-                file_data = form.fichaSeguridad.data.read()
-                file_b64 = base64.b64encode(file_data).decode('utf-8')
-                filename = form.fichaSeguridad.data.filename
-                
-                # Validate file extension
-                if not filename or '.' not in filename:
-                    flash('Error: Archivo inválido', 'warning')
-                    return render_template('admin/productos/form.html', title='Editar Producto', form=form, producto=producto)
-                
-                file_extension = filename.rsplit('.', 1)[1].lower()
-                if file_extension not in ['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx']:
-                    flash('Error: Tipo de archivo no permitido. Use PDF, JPG, PNG, DOC o DOCX.', 'warning')
-                    return render_template('admin/productos/form.html', title='Editar Producto', form=form, producto=producto)
-                
-                # Upload file to Google Drive
-                result = drive_integration.upload_ficha_seguridad(
-                    producto.idProducto,
-                    file_b64,
-                    file_extension
-                )
-                
-                if result and 'file_id' in result:
-                    url_ficha = result['file_id']
-                    flash('Ficha de seguridad actualizada correctamente en Google Drive', 'success')
-                elif result and 'error' in result:
-                    flash(f'Error al subir la nueva ficha de seguridad: {result["error"]}', 'warning')
-                else:
-                    flash('Error desconocido al subir la nueva ficha de seguridad', 'warning')
-                    
-            except Exception as e:
-                current_app.logger.error(f"Error uploading ficha de seguridad: {str(e)}")
-                flash(f'Error al procesar la nueva ficha de seguridad: {str(e)}', 'warning')
+            filename = form.fichaSeguridad.data.filename
+            
+            # Validate file extension
+            if not filename or '.' not in filename:
+                flash('Error: Archivo inválido', 'warning')
+                return render_template('admin/productos/form.html', title='Editar Producto', form=form, producto=producto)
+            
+            file_extension = filename.rsplit('.', 1)[1].lower()
+            if file_extension not in ['pdf', 'jpg', 'jpeg', 'png', 'doc', 'docx']:
+                flash('Error: Tipo de archivo no permitido. Use PDF, JPG, PNG, DOC o DOCX.', 'warning')
+                return render_template('admin/productos/form.html', title='Editar Producto', form=form, producto=producto)
         
         producto.nombre = form.nombre.data
         producto.descripcion = form.descripcion.data
@@ -681,6 +636,8 @@ def edit_producto(id):
         producto.controlSedronar = form.controlSedronar.data
         producto.urlFichaSeguridad = url_ficha
         
+        if file_extension:
+            _encolar_ficha(producto.idProducto, form.fichaSeguridad.data, file_extension)
         db.session.commit()
         flash('Producto actualizado correctamente', 'success')
         return redirect(url_for('admin.list_productos'))
@@ -709,9 +666,6 @@ def delete_producto(id):
 @log_admin_action("importar productos desde Excel")
 @monitor_performance(threshold_ms=5000)
 def importar_productos():
-    import pandas as pd
-    import io
-    
     logger = get_business_logger()
     form = ExcelUploadForm()
     
@@ -727,260 +681,61 @@ def importar_productos():
         
         # Validar extensión del archivo
         filename = form.archivo.data.filename
-        if not filename.lower().endswith(('.xlsx', '.xls')):
-            flash('El archivo debe ser un Excel (.xlsx o .xls)', 'danger')
-            return redirect(url_for('admin.importar_productos'))
-        
-        try:
-            # Leer el archivo Excel
-            file_content = form.archivo.data.read()
-            
-            # Reset file pointer for potential re-read
-            form.archivo.data.seek(0)
-            
-            if len(file_content) == 0:
-                flash('El archivo está vacío', 'danger')
-                return redirect(url_for('admin.importar_productos'))
-            
-            data_frame = pd.read_excel(io.BytesIO(file_content))
-            
-        except pd.errors.EmptyDataError:
-            flash('El archivo Excel está vacío o no contiene datos válidos', 'danger')
-            logger.error(f"Empty Excel file uploaded by user {current_user.idUsuario}")
-            return redirect(url_for('admin.importar_productos'))
-        
-        except pd.errors.ParserError as e:
-            flash('Error al leer el archivo Excel. Verifique que el formato sea correcto.', 'danger')
-            logger.error(f"Excel parsing error for user {current_user.idUsuario}: {str(e)}")
+        if not filename.lower().endswith(('.xlsx', '.xls', '.csv')):
+            flash('El archivo debe ser un Excel (.xlsx o .xls) o un CSV', 'danger')
             return redirect(url_for('admin.importar_productos'))
         
-        except Exception as e:
-            flash('Error al procesar el archivo. Verifique que sea un archivo Excel válido.', 'danger')
-            logger.error(f"Unexpected error reading Excel file for user {current_user.idUsuario}: {str(e)}")
+        trabajo = _encolar_importacion('importar_productos', form.archivo.data)
+        if trabajo is None:
+            flash('El archivo está vacío', 'danger')
             return redirect(url_for('admin.importar_productos'))
         
-        try:
-            # Validar que el DataFrame no esté vacío
-            if data_frame.empty:
-                flash('El archivo no contiene datos para procesar', 'warning')
-                return redirect(url_for('admin.importar_productos'))
-              # Validar las columnas del archivo
-            required_columns = ['ID Producto', 'Nombre', 'Tipo de Producto', 
-                               'Estado Físico', 'URL Ficha de Seguridad', 'Descripción', 'Control Sedronar']
-            
-            # Verificar si todas las columnas requeridas están presentes
-            missing_columns = [col for col in required_columns if col not in data_frame.columns]
-            if missing_columns:
-                flash(f'El archivo no contiene todas las columnas requeridas. Faltan: {", ".join(missing_columns)}', 'danger')
-                logger.warning(f"Missing columns in Excel upload by user {current_user.idUsuario}: {missing_columns}")
-                return redirect(url_for('admin.importar_productos'))
-            
-            # Mapeo de valores de campos a valores de la BD
-            tipo_producto_map = {
-                'Botiquín': 'botiquin',
-                'Droguero': 'droguero',
-                'Materiales de vidrio': 'vidrio',
-                'Elementos de seguridad': 'seguridad',
-                'Residuos peligrosos': 'residuos'
-            }
-            
-            estado_fisico_map = {
-                'Sólido': 'solido',
-                'Líquido': 'liquido',
-                'Gaseoso': 'gaseoso'
-            }
-            
-            # Contadores para la información de proceso
-            productos_creados = 0
-            productos_actualizados = 0
-            productos_saltados = 0
-            errores = []
-              # Procesar cada fila del Excel
-            for index, row in data_frame.iterrows():
-                try:
-                    # Validar que ID Producto no esté vacío
-                    if pd.isna(row['ID Producto']) or str(row['ID Producto']).strip() == '':
-                        errores.append(f"Fila {index+2}: ID Producto está vacío")
-                        productos_saltados += 1
-                        continue
-                    
-                    # Validar que Nombre no esté vacío
-                    if pd.isna(row['Nombre']) or str(row['Nombre']).strip() == '':
-                        errores.append(f"Fila {index+2}: Nombre del producto está vacío")
-                        productos_saltados += 1
-                        continue
-                    
-                    id_producto = str(row['ID Producto']).strip()
-                    
-                    # Validar longitud del ID Producto
-                    if len(id_producto) < 4 or len(id_producto) > 10:
-                        errores.append(f"Fila {index+2}: ID Producto '{id_producto}' debe tener entre 4 y 10 caracteres")
-                        productos_saltados += 1
-                        continue
-                    
-                    # Mapear tipo de producto
-                    if pd.isna(row['Tipo de Producto']):
-                        errores.append(f"Fila {index+2}: Tipo de producto está vacío")
-                        productos_saltados += 1
-                        continue
-                    
-                    tipo_producto_excel = str(row['Tipo de Producto']).strip()
-                    tipo_producto = tipo_producto_map.get(tipo_producto_excel, None)
-                    if not tipo_producto:
-                        if tipo_producto_excel.lower() in tipo_producto_map.values():
-                            # Si es una clave válida directamente
-                            tipo_producto = tipo_producto_excel.lower()
-                        else:
-                            errores.append(f"Fila {index+2}: Tipo de producto '{tipo_producto_excel}' no válido. Valores permitidos: {', '.join(tipo_producto_map.keys())}")
-                            productos_saltados += 1
-                            continue
-                    
-                    # Mapear estado físico
-                    if pd.isna(row['Estado Físico']):
-                        errores.append(f"Fila {index+2}: Estado físico está vacío")
-                        productos_saltados += 1
-                        continue
-                    
-                    estado_fisico_excel = str(row['Estado Físico']).strip()
-                    estado_fisico = estado_fisico_map.get(estado_fisico_excel, None)
-                    if not estado_fisico:
-                        if estado_fisico_excel.lower() in estado_fisico_map.values():
-                            # Si es una clave válida directamente
-                            estado_fisico = estado_fisico_excel.lower()
-                        else:
-                            errores.append(f"Fila {index+2}: Estado físico '{estado_fisico_excel}' no válido. Valores permitidos: {', '.join(estado_fisico_map.keys())}")
-                            productos_saltados += 1
-                            continue
-                    
-                    # Manejar Control Sedronar como booleano
-                    control_sedronar = False
-                    if not pd.isna(row['Control Sedronar']):
-                        control_value = str(row['Control Sedronar']).strip().lower()
-                        control_sedronar = control_value in ['true', 'verdadero', 'sí', 'si', '1', 'yes', 'y', 'true']
-                      # Validar URL si se proporciona
-                    url_ficha = None
-                    if not pd.isna(row['URL Ficha de Seguridad']):
-                        url_ficha = str(row['URL Ficha de Seguridad']).strip()
-                        # Validación básica de URL
-                        if url_ficha and not (url_ficha.startswith('http://') or url_ficha.startswith('https://')):
-                            errores.append(f"Fila {index+2}: URL de ficha de seguridad no válida (debe comenzar con http:// o https://)")
-                            productos_saltados += 1
-                            continue
-                    
-                    # Descripción (opcional)
-                    descripcion = None
-                    if not pd.isna(row['Descripción']):
-                        descripcion = str(row['Descripción']).strip()
-                        if len(descripcion) > 500:  # Asumiendo límite de 500 caracteres
-                            errores.append(f"Fila {index+2}: Descripción es demasiado larga (máximo 500 caracteres)")
-                            productos_saltados += 1
-                            continue
-                    
-                    # Verificar si el producto ya existe
-                    producto_existente = Producto.query.filter_by(idProducto=id_producto).first()
-                    
-                    if producto_existente:
-                        # Actualizar producto existente
-                        producto_existente.nombre = str(row['Nombre']).strip()
-                        producto_existente.descripcion = descripcion
-                        producto_existente.tipoProducto = tipo_producto
-                        producto_existente.estadoFisico = estado_fisico
-                        producto_existente.controlSedronar = control_sedronar
-                        producto_existente.urlFichaSeguridad = url_ficha
-                        productos_actualizados += 1
-                        logger.info(f"Updated product {id_producto} by user {current_user.idUsuario}")
-                    else:
-                        # Crear nuevo producto (ahora son globales, sin asignación a laboratorio)
-                        nuevo_producto = Producto(
-                            idProducto=id_producto,
-                            nombre=str(row['Nombre']).strip(),
-                            descripcion=descripcion,
-                            tipoProducto=tipo_producto,
-                            estadoFisico=estado_fisico,
-                            controlSedronar=control_sedronar,
-                            urlFichaSeguridad=url_ficha
-                        )
-                        
-                        db.session.add(nuevo_producto)
-                        productos_creados += 1
-                        logger.info(f"Created new product {id_producto} by user {current_user.idUsuario}")
-                        
-                except ValueError as e:
-                    error_msg = f"Fila {index+2}: Error de formato en los datos: {str(e)}"
-                    errores.append(error_msg)
-                    logger.warning(f"Data format error in row {index+2}: {str(e)}")
-                    productos_saltados += 1
-                
-                except KeyError as e:
-                    error_msg = f"Fila {index+2}: Columna faltante: {str(e)}"
-                    errores.append(error_msg)
-                    logger.error(f"Missing column in row {index+2}: {str(e)}")
-                    productos_saltados += 1
-                
-                except Exception as e:
-                    error_msg = f"Fila {index+2}: Error inesperado procesando producto: {str(e)}"
-                    errores.append(error_msg)
-                    logger.error(f"Unexpected error processing row {index+2}: {str(e)}")
-                    productos_saltados += 1
-              # Guardar cambios en la base de datos
-            try:
-                db.session.commit()
-                logger.info(f"Products import completed by user {current_user.idUsuario}: {productos_creados} created, {productos_actualizados} updated, {productos_saltados} skipped")
-            except Exception as e:
-                db.session.rollback()
-                flash(f'Error al guardar los productos en la base de datos: {str(e)}', 'danger')
-                logger.error(f"Database error during products import by user {current_user.idUsuario}: {str(e)}")
-                return redirect(url_for('admin.importar_productos'))
-            
-            # Mostrar resumen del proceso
-            if productos_creados > 0 or productos_actualizados > 0:
-                flash(f'Importación completada: {productos_creados} productos creados, {productos_actualizados} actualizados, {productos_saltados} saltados', 'success')
-            elif productos_saltados > 0:
-                flash(f'No se pudo procesar ningún producto. {productos_saltados} filas con errores', 'warning')
-            else:
-                flash('No se encontraron productos válidos para procesar', 'info')
-            
-            # Mostrar errores si ocurrieron
-            if errores:
-                error_message = "<br>".join(errores[:10])
-                if len(errores) > 10:
-                    error_message += f"<br>... y {len(errores) - 10} errores más."
-                flash(f'Se encontraron los siguientes errores:<br>{error_message}', 'warning')
-            
-            return redirect(url_for('admin.list_productos'))
-            
-        except Exception as e:
-            # Rollback en caso de error durante el procesamiento
-            db.session.rollback()
-            flash('Error inesperado durante el procesamiento del archivo. Contacte al administrador del sistema.', 'danger')
-            logger.error(f"Unexpected error during Excel processing by user {current_user.idUsuario}: {str(e)}")
-            return redirect(url_for('admin.importar_productos'))
+        logger.info(f"Products import queued by user {current_user.idUsuario} as job {trabajo.idTrabajo}")
+        flash('El archivo se está importando en segundo plano', 'info')
+        return redirect(url_for('main.ver_trabajo', id_trabajo=trabajo.idTrabajo))
     
     return render_template('admin/productos/importar.html', title='Importar Productos', form=form)
 
+def _encolar_importacion(tipo, archivo):
+    """
+    Guarda la subida junto a un trabajo nuevo y lo encola; la importación corre en segundo plano.
+    
+    Returns:
+        Trabajo: Trabajo encolado, o None si el archivo está vacío
+    """
+    id_trabajo = new_job_id()
+    extension = os.path.splitext(archivo.filename)[1].lower()
+    ruta = os.path.join(job_directory(current_app, id_trabajo), f'entrada{extension}')
+    archivo.save(ruta)
+    if os.path.getsize(ruta) == 0:
+        os.remove(ruta)
+        os.rmdir(os.path.dirname(ruta))
+        return None
+    
+    return enqueue(tipo, {
+        'archivo': ruta,
+        'nombre_archivo': archivo.filename,
+        'tamano_lote': current_app.config.get('IMPORT_CHUNK_SIZE', 500),
+    }, usuario_id=current_user.idUsuario, id_trabajo=id_trabajo)
+
 # CRUD for Movimientos
 @admin.route('/movimientos')
 @admin_required
 def list_movimientos():
-    # Parámetros de paginación
-    page = request.args.get('page', 1, type=int)
+    # Parámetros de paginación por cursor (más recientes primero)
     per_page = request.args.get('per_page', 20, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     
-    # Crear la query base ordenada por fecha (más recientes primero)
-    query = Movimiento.query.order_by(Movimiento.timestamp.desc())
-    
-    # Obtener conteo total antes de paginar
-    total_movimientos = query.count()
-    
-    # Aplicar paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    pagination = paginate_keyset(Movimiento.query, Movimiento.timestamp, Movimiento.idMovimiento,
+                                 per_page, after=after, before=before)
     movimientos = pagination.items
     
     return render_template('admin/movimientos/list.html', 
                          title='Gestión de Movimientos', 
                          movimientos=movimientos,
                          pagination=pagination,
-                         total_movimientos=total_movimientos)
+                         subidas=upload_states([movement_reference(m.idMovimiento) for m in movimientos]))
 
 @admin.route('/movimientos/new', methods=['GET', 'POST'])
 @admin_required
@@ -991,10 +746,8 @@ def new_movimiento():
     form = MovimientoForm()
     
     if form.validate_on_submit():
-        # Generate a unique movement ID
-        import random
-        import string
-        movement_id = 'MOV' + ''.join(random.choices(string.digits, k=6))
+        # Próximo ID de la secuencia de movimientos
+        movement_id = movement_ids.next_id()
         
         # Verificar que el producto existe
         producto = Producto.query.get(form.idProducto.data)
@@ -1004,7 +757,6 @@ def new_movimiento():
         
         # Variables for movement
         tipo_movimiento = form.tipoMovimiento.data
-        url_documento = None
         lab_destino = None
         tipo_documento = None
         fecha_factura = None
@@ -1021,33 +773,6 @@ def new_movimiento():
                 except ValueError:
                     flash('El formato de la fecha de factura no es válido. Utilice el formato YYYY-MM-DD.', 'warning')
             
-            # Process document upload if provided
-            if form.documento.data:
-                try:
-                    import base64
-                    from app.integrations.google_drive import drive_integration
-                    
-                    # Read file and encode as base64
-                    file_data = base64.b64encode(form.documento.data.read()).decode('utf-8')
-                    file_name = form.documento.data.filename
-                    file_type = "application/pdf"  # Assuming PDFs only
-                    
-                    # Upload document to Google Drive
-                    result = drive_integration.upload_movimiento_documento(
-                        lab_id=form.idLaboratorio.data,
-                        movimiento_id=movement_id,
-                        file_data=file_data,
-                        file_name=file_name,
-                        file_type=file_type
-                    )
-                    
-                    if result:
-                        url_documento = result.get('file_url')
-                    else:
-                        flash('Error al subir el documento. El movimiento se registrará sin documento adjunto.', 'warning')
-                except Exception as e:
-                    flash(f'Error al procesar el documento: {str(e)}', 'danger')
-        
         elif tipo_movimiento == 'transferencia':
             lab_destino = form.laboratorioDestino.data
             if not lab_destino:
@@ -1073,7 +798,6 @@ def new_movimiento():
             idLaboratorio=form.idLaboratorio.data,
             tipoDocumento=tipo_documento,
             numeroDocumento=form.numeroDocumento.data if tipo_movimiento == 'compra' else None,
-            urlDocumento=url_documento,
             fechaFactura=fecha_factura,
             idProveedor=form.idProveedor.data if tipo_movimiento == 'compra' and form.idProveedor.data != 0 else None,
             laboratorioDestino=lab_destino        )
@@ -1082,7 +806,7 @@ def new_movimiento():
         
         # If it's a transfer, create an ingress movement for the destination laboratory
         if tipo_movimiento == 'transferencia' and lab_destino:
-            movement_id_dest = 'MOV' + ''.join(random.choices(string.digits, k=6))
+            movement_id_dest = movement_ids.next_id()
             
             movimiento_dest = Movimiento(
                 idMovimiento=movement_id_dest,
@@ -1097,23 +821,104 @@ def new_movimiento():
             )
             db.session.add(movimiento_dest)
         
+        # El documento se sube a Drive en segundo plano; el movimiento se confirma
+        # junto con el trabajo de subida
+        if tipo_movimiento == 'compra' and form.documento.data:
+            try:
+                guardado = spool_upload(form.documento.data)
+            except Exception as e:
+                current_app.logger.error(f"Error saving movement document upload: {str(e)}")
+                flash('Error al procesar el documento. El movimiento se registrará sin documento adjunto.', 'warning')
+            else:
+                queue_movement_document(movement_id, form.idLaboratorio.data, guardado,
+                                        usuario_id=current_user.idUsuario)
+                flash('El documento se está subiendo a Google Drive', 'info')
+        
         db.session.commit()
         flash('Movimiento registrado correctamente', 'success')
         return redirect(url_for('admin.list_movimientos'))
     
     return render_template('admin/movimientos/form.html', title='Nuevo Movimiento', form=form)
 
-@admin.route('/api/get_products_by_lab/<string:lab_id>')
+@admin.route('/movimientos/importar', methods=['GET', 'POST'])
 @admin_required
-def get_products_by_lab(lab_id):
-    productos = Producto.query.filter_by(idLaboratorio=lab_id).all()
-    return {'products': [{'id': p.idProducto, 'nombre': p.nombre} for p in productos]}
+@log_admin_action("importar movimientos desde Excel")
+@monitor_performance(threshold_ms=5000)
+def importar_movimientos():
+    logger = get_business_logger()
+    form = ExcelUploadForm()
+    
+    if form.validate_on_submit():
+        filename = form.archivo.data.filename
+        if not filename.lower().endswith(('.xlsx', '.xls', '.csv')):
+            flash('El archivo debe ser un Excel (.xlsx o .xls) o un CSV', 'danger')
+            return redirect(url_for('admin.importar_movimientos'))
+        
+        trabajo = _encolar_importacion('importar_movimientos', form.archivo.data)
+        if trabajo is None:
+            flash('El archivo está vacío', 'danger')
+            return redirect(url_for('admin.importar_movimientos'))
+        
+        logger.info(f"Movements import queued by user {current_user.idUsuario} as job {trabajo.idTrabajo}")
+        flash('El archivo se está importando en segundo plano', 'info')
+        return redirect(url_for('main.ver_trabajo', id_trabajo=trabajo.idTrabajo))
+    
+    return render_template('admin/movimientos/importar.html', title='Importar Movimientos', form=form)
+
+@admin.route('/api/stock_cache')
+@admin_required
+def stock_cache_stats():
+    from app.utils.stock_cache import stock_cache
+    return stock_cache.stats()
+
+@admin.route('/api/drive_stats')
+@admin_required
+def drive_stats():
+    from app.integrations.google_drive import apps_script_session
+    from app.utils.drive_file_cache import drive_file_cache
+    return {'acciones': apps_script_session.stats(), 'cache_archivos': drive_file_cache.stats()}
 
 @admin.route('/api/get_products')
 @admin_required
 def get_products():
-    productos = Producto.query.all()
-    return {'products': [{'id': p.idProducto, 'nombre': p.nombre} for p in productos]}
+    # Búsqueda acotada sobre el índice en memoria; ya no se devuelve el catálogo completo
+    termino = request.args.get('q', '')
+    limite = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    productos = product_index.search(termino, limit=limite)
+    return {'products': [{'id': id_producto, 'nombre': nombre} for id_producto, nombre in productos]}
+
+# Endpoint para DataTables en modo servidor (búsqueda, orden y paginación en SQL)
+@admin.route('/api/datatables/proveedores')
+@admin_required
+def datatables_proveedores():
+    dt_request = parse_datatables_args(request.args)
+    return datatables_response(
+        dt_request, Proveedor.query,
+        serializar=lambda p: {
+            'idProveedor': p.idProveedor,
+            'nombre': p.nombre,
+            'cuit': p.cuit,
+            'telefono': p.telefono or '-',
+            'email': p.email or '-',
+            'acciones': [
+                {'url': url_for('admin.edit_proveedor', id=p.idProveedor), 'icono': 'fa-edit',
+                 'clase': 'btn-warning', 'titulo': 'Editar'},
+                {'url': url_for('admin.delete_proveedor', id=p.idProveedor), 'icono': 'fa-trash',
+                 'clase': 'btn-delete', 'titulo': 'Eliminar', 'metodo': 'POST',
+                 'confirmar': f'el proveedor {p.nombre}'}
+            ]
+        },
+        columnas_orden={
+            'idProveedor': Proveedor.idProveedor,
+            'nombre': Proveedor.nombre,
+            'cuit': Proveedor.cuit,
+            'telefono': Proveedor.telefono,
+            'email': Proveedor.email
+        },
+        columnas_busqueda=[Proveedor.nombre, Proveedor.cuit, Proveedor.email],
+        orden_defecto=[Proveedor.nombre, Proveedor.idProveedor],
+        total=get_count(Proveedor)
+    )
 
 @admin.route('/movimientos/delete/<string:id>', methods=['POST'])
 @admin_required
@@ -1121,6 +926,8 @@ def get_products():
 @log_business_operation("movement_deletion")
 def delete_movimiento(id):
     movimiento = Movimiento.query.get_or_404(id)
+    # Los eventos de Movimiento revierten el saldo en el ledger y marcan como
+    # desactualizado el checkpoint si el movimiento era anterior a su corte
     db.session.delete(movimiento)
     db.session.commit()
     flash('Movimiento eliminado correctamente', 'success')
@@ -1130,25 +937,9 @@ def delete_movimiento(id):
 @admin.route('/proveedores')
 @admin_required
 def list_proveedores():
-    # Parámetros de paginación
-    page = request.args.get('page', 1, type=int)
-    per_page = request.args.get('per_page', 20, type=int)
-    
-    # Crear la query base ordenada por nombre
-    query = Proveedor.query.order_by(Proveedor.nombre)
-    
-    # Obtener conteo total antes de paginar
-    total_proveedores = query.count()
-    
-    # Aplicar paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-    proveedores = pagination.items
-    
+    # La tabla se completa desde datatables_proveedores (paginación en el servidor)
     return render_template('admin/proveedores/list.html', 
-                           title='Gestión de Proveedores', 
-                           proveedores=proveedores,
-                           pagination=pagination,
-                           total_proveedores=total_proveedores)
+                           title='Gestión de Proveedores')
 
 @admin.route('/proveedores/new', methods=['GET', 'POST'])
 @admin_required
@@ -1226,7 +1017,6 @@ def delete_proveedor(id):
 @admin_required
 def reporte_movimientos():
     from datetime import datetime
-    from sqlalchemy import and_, or_
     from app.utils.pagination import ManualPagination
     
     # Obtener página actual desde parámetros GET
@@ -1242,103 +1032,29 @@ def reporte_movimientos():
             # Convertir fechas
             fecha_inicial = datetime.strptime(form.fecha_inicial.data, '%Y-%m-%d')
             fecha_final = datetime.strptime(form.fecha_final.data, '%Y-%m-%d').replace(hour=23, minute=59, second=59)
-              # Filtrar por tipo de producto si se selecciona uno
-            productos_query = Producto.query
-            if form.tipo_producto.data:
-                productos_query = productos_query.filter_by(tipoProducto=form.tipo_producto.data)
             
-            # Filtrar por control Sedronar si se selecciona
-            if form.control_sedronar.data:
-                if form.control_sedronar.data == 'true':
-                    productos_query = productos_query.filter_by(controlSedronar=True)
-                elif form.control_sedronar.data == 'false':
-                    productos_query = productos_query.filter_by(controlSedronar=False)
+            control_sedronar = None
+            if form.control_sedronar.data == 'true':
+                control_sedronar = True
+            elif form.control_sedronar.data == 'false':
+                control_sedronar = False
             
-            productos = productos_query.all()
-            
-            # Construir consulta base para movimientos
-            movimientos_query = Movimiento.query.filter(
-                and_(
-                    Movimiento.timestamp >= fecha_inicial,
-                    Movimiento.timestamp <= fecha_final
-                )
+            # Reporte completo (stock antes/después por movimiento) en una sola consulta
+            reporte_data = build_movements_report(
+                fecha_inicial,
+                fecha_final,
+                lab_id=form.laboratorio.data or None,
+                tipo_producto=form.tipo_producto.data or None,
+                control_sedronar=control_sedronar
             )
-            
-            # Filtrar por laboratorio si se selecciona uno
-            if form.laboratorio.data:
-                movimientos_query = movimientos_query.filter_by(idLaboratorio=form.laboratorio.data)
-            
-            # Para cada producto, obtener sus movimientos y calcular stocks
-            for producto in productos:
-                # Obtener el stock inicial (justo antes de fecha_inicial)
-                ingresos_antes = db.session.query(db.func.sum(Movimiento.cantidad)).filter(
-                    and_(
-                        Movimiento.idProducto == producto.idProducto,
-                        Movimiento.tipoMovimiento.in_(['ingreso', 'compra']),
-                        Movimiento.timestamp < fecha_inicial
-                    )
-                ).scalar() or 0
-                
-                egresos_antes = db.session.query(db.func.sum(Movimiento.cantidad)).filter(
-                    and_(
-                        Movimiento.idProducto == producto.idProducto,
-                        Movimiento.tipoMovimiento.in_(['uso', 'transferencia']),
-                        Movimiento.timestamp < fecha_inicial
-                    )
-                ).scalar() or 0
-                
-                stock_inicial = ingresos_antes - egresos_antes
-                
-                # Filtrar movimientos de este producto en el período seleccionado
-                movimientos_producto = movimientos_query.filter_by(idProducto=producto.idProducto).order_by(Movimiento.timestamp).all()
-                
-                # Si no hay movimientos para este producto en el período, no lo incluimos en el reporte
-                if not movimientos_producto:
-                    continue
-                
-                # Para cada movimiento del producto, calcular stock antes y después
-                stock_actual = stock_inicial
-                for movimiento in movimientos_producto:
-                    # Determinar efecto en stock
-                    if movimiento.tipoMovimiento in ['ingreso', 'compra']:
-                        stock_despues = stock_actual + movimiento.cantidad
-                    else:  # uso o transferencia
-                        stock_despues = stock_actual - movimiento.cantidad
-                      # Obtener CUIT del proveedor si es un movimiento de compra
-                    cuit_proveedor = None
-                    if movimiento.tipoMovimiento == 'compra' and movimiento.idProveedor:
-                        proveedor = Proveedor.query.get(movimiento.idProveedor)
-                        if proveedor:
-                            cuit_proveedor = proveedor.cuit
-                    
-                    # Agregar a los datos del reporte
-                    reporte_data.append({
-                        'fecha': movimiento.timestamp,
-                        'producto_id': producto.idProducto,
-                        'producto_nombre': producto.nombre,
-                        'stock_inicial_cantidad': stock_actual,
-                        'stock_inicial_unidad': movimiento.unidadMedida,
-                        'tipo_movimiento': movimiento.tipoMovimiento,
-                        'cantidad': movimiento.cantidad,
-                        'unidad_medida': movimiento.unidadMedida,
-                        'stock_final_cantidad': stock_despues,
-                        'stock_final_unidad': movimiento.unidadMedida,
-                        'tipo_documento': movimiento.tipoDocumento,
-                        'numero_documento': movimiento.numeroDocumento,
-                        'cuit_proveedor': cuit_proveedor
-                    })
-                    
-                    # Actualizar stock para el siguiente movimiento
-                    stock_actual = stock_despues
-            
-            # Ordenar por fecha
-            reporte_data.sort(key=lambda x: x['fecha'])
-              # Guardar todos los datos en sesión para exportar a Excel
-            session['reporte_data_completo'] = [
-                {k: (v.strftime('%d/%m/%Y %H:%M:%S') if k == 'fecha' else v) 
-                 for k, v in item.items()}
-                for item in reporte_data
-            ]
+            # Guardar solo los filtros en sesión: el Excel se genera en segundo plano
+            session['reporte_filtros'] = {
+                'fecha_inicial': form.fecha_inicial.data,
+                'fecha_final': form.fecha_final.data,
+                'lab_id': form.laboratorio.data or None,
+                'tipo_producto': form.tipo_producto.data or None,
+                'control_sedronar': control_sedronar,
+            }
             
             # Implementar paginación manual
             total_items = len(reporte_data)
@@ -1374,119 +1090,29 @@ def reporte_movimientos():
 @admin.route('/reportes/movimientos/excel')
 @admin_required
 def exportar_reporte_excel():
-    import pandas as pd
-    from datetime import datetime
-    from io import BytesIO
-    from flask import send_file
-      # Recuperar datos completos de la sesión
-    reporte_data = session.get('reporte_data_completo', [])
+    # Filtros del último reporte generado
+    filtros = session.get('reporte_filtros')
     
-    if not reporte_data:
+    if not filtros:
         flash('No hay datos para exportar', 'warning')
         return redirect(url_for('admin.reporte_movimientos'))
     
-    # Crear DataFrame con pandas
-    df = pd.DataFrame(reporte_data)
-      # Reordenar columnas según el formato solicitado
-    columnas_ordenadas = [
-        'fecha',
-        'producto_nombre',
-        'stock_inicial_cantidad',
-        'stock_inicial_unidad',
-        'tipo_movimiento',
-        'cantidad',
-        'unidad_medida',
-        'stock_final_cantidad',
-        'stock_final_unidad',
-        'tipo_documento',
-        'numero_documento',
-        'cuit_proveedor'
-    ]
-    
-    # Verificar que todas las columnas existan en el DataFrame
-    columnas_existentes = [col for col in columnas_ordenadas if col in df.columns]
-    df = df[columnas_existentes]
-      # Renombrar las columnas para el archivo Excel
-    columnas_excel = {
-        'fecha': 'Fecha',
-        'producto_nombre': 'Producto',
-        'stock_inicial_cantidad': 'Stock Inicial - Cantidad',
-        'stock_inicial_unidad': 'Stock Inicial - Unidad de medida',
-        'tipo_movimiento': 'Movimiento - Tipo',
-        'cantidad': 'Movimiento - Cantidad',
-        'unidad_medida': 'Movimiento - Unidad de Medida',
-        'stock_final_cantidad': 'Stock Final - Cantidad',
-        'stock_final_unidad': 'Stock Final - Unidad de medida',
-        'tipo_documento': 'Documento para operación - Tipo',
-        'numero_documento': 'Documento para operación - Número',
-        'cuit_proveedor': 'CUIT Proveedor'
-    }
-    df = df.rename(columns=columnas_excel)
-    
-    # Crear un archivo Excel en memoria
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Reporte de Movimientos', index=False)
-        
-        # Formatear la hoja para que sea más legible
-        workbook = writer.book
-        worksheet = writer.sheets['Reporte de Movimientos']
-        
-        # Formato para los encabezados
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'top',
-            'fg_color': '#D7E4BC',
-            'border': 1
-        })
-        
-        # Aplicar formato a los encabezados
-        for col_num, value in enumerate(df.columns.values):
-            worksheet.write(0, col_num, value, header_format)
-            # Ajustar ancho de columna basado en el contenido
-            max_len = max(
-                df[value].astype(str).map(len).max(),
-                len(str(value))
-            ) + 2
-            worksheet.set_column(col_num, col_num, max_len)
-    
-    # Preparar el archivo para descarga
-    output.seek(0)
-    
-    # Generar nombre de archivo con fecha y hora
-    fecha_actual = datetime.now().strftime('%Y%m%d_%H%M%S')
-    filename = f"reporte_movimientos_{fecha_actual}.xlsx"
-    
-    # Enviar archivo al cliente
-    return send_file(
-        output,
-        as_attachment=True,
-        download_name=filename,
-        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
+    # El Excel se arma en segundo plano y se descarga desde la página del trabajo
+    trabajo = enqueue('exportar_reporte_movimientos', filtros, usuario_id=current_user.idUsuario)
+    flash('El reporte se está generando en segundo plano', 'info')
+    return redirect(url_for('main.ver_trabajo', id_trabajo=trabajo.idTrabajo))
 
 @admin.route('/productos/view/<string:id>')
 @admin_required
 def view_producto(id):
-    from sqlalchemy import func
-    
     producto = Producto.query.get_or_404(id)
     
-    # Obtener stock por laboratorio
-    stock_por_laboratorio = db.session.query(
-        Laboratorio,
-        func.coalesce(func.sum(
-            db.case(
-                (Movimiento.tipoMovimiento.in_(['ingreso', 'compra', 'transferencia']), Movimiento.cantidad),
-                else_=-Movimiento.cantidad
-            )
-        ), 0).label('stock')
-    ).outerjoin(
-        Movimiento, 
-        (Movimiento.idLaboratorio == Laboratorio.idLaboratorio) & 
-        (Movimiento.idProducto == producto.idProducto)
-    ).group_by(Laboratorio.idLaboratorio).all()
+    # Obtener stock por laboratorio desde el ledger (misma regla de signos que el resto del sistema)
+    stock_por_lab = get_stock_by_lab_map([producto.idProducto]).get(producto.idProducto, {})
+    stock_por_laboratorio = [
+        (lab, stock_por_lab.get(lab.idLaboratorio, 0))
+        for lab in catalog_cache.get('laboratorios')
+    ]
     
     # Calcular stock total
     stock_total = sum([lab_info[1] for lab_info in stock_por_laboratorio])
@@ -1507,4 +1133,6 @@ def view_producto(id):
                          producto=producto,
                          stock_total=stock_total,
                          stock_por_laboratorio=stock_info,
-                         movimientos_recientes=movimientos_recientes)
\ No newline at end of file
+                         movimientos_recientes=movimientos_recientes,
+                         subida=upload_states([product_reference(producto.idProducto)]).get(
+                             product_reference(producto.idProducto)))
\ No newline at end of file
@@ -1,9 +1,14 @@
-from flask import Blueprint, render_template, redirect, url_for, Response, request, abort
+from flask import Blueprint, render_template, redirect, url_for, Response, request, abort, jsonify, current_app, send_file, flash
 from flask_login import current_user, login_required
 from datetime import datetime
-import base64
 import io
+from werkzeug.exceptions import HTTPException
 from app.integrations.google_drive import drive_integration
+from app.utils.drive_file_cache import drive_file_cache
+from app.utils.product_index import product_index
+from app.utils.job_service import job_status, job_directory, retry_job
+from app.models.models import Trabajo
+import os
 
 main = Blueprint('main', __name__)
 
@@ -20,6 +25,72 @@ def index():
 def about():
     return render_template('about.html', title='Acerca de', now=datetime.now())
 
+@main.route('/api/productos/buscar')
+@login_required
+def buscar_productos():
+    """
+    Búsqueda typeahead de productos por prefijo de ID o de palabras del nombre.
+    Se resuelve con el índice en memoria del proceso, sin consultar la base.
+    """
+    termino = request.args.get('q', '').strip()
+    limite = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    resultados = product_index.search(termino, limit=limite)
+    return jsonify({'results': [{'id': id_producto, 'text': nombre} for id_producto, nombre in resultados]})
+
+# Página a la que vuelve el usuario al terminar cada tipo de trabajo
+_VOLVER_TRABAJO = {
+    'importar_productos': ('admin.list_productos', 'Volver a Productos'),
+    'importar_movimientos': ('admin.list_movimientos', 'Volver a Movimientos'),
+    'exportar_reporte_movimientos': ('admin.reporte_movimientos', 'Volver al Reporte'),
+    'sincronizar_usuarios_keycloak': ('admin.list_usuarios', 'Volver a Usuarios'),
+}
+
+def _trabajo_visible(id_trabajo):
+    """Trabajo del usuario actual (o cualquiera, para administradores); 404 si no"""
+    trabajo = Trabajo.query.get_or_404(id_trabajo)
+    if current_user.rol != 'admin' and trabajo.idUsuario != current_user.idUsuario:
+        abort(404)
+    return trabajo
+
+@main.route('/trabajos/<string:id_trabajo>')
+@login_required
+def ver_trabajo(id_trabajo):
+    """Página de seguimiento de un trabajo en segundo plano"""
+    trabajo = _trabajo_visible(id_trabajo)
+    endpoint, etiqueta = _VOLVER_TRABAJO.get(trabajo.tipo, ('main.index', 'Volver al inicio'))
+    return render_template('trabajos/estado.html', title='Trabajo en segundo plano',
+                           trabajo=job_status(trabajo), volver_url=url_for(endpoint),
+                           volver_etiqueta=etiqueta)
+
+@main.route('/api/trabajos/<string:id_trabajo>')
+@login_required
+def estado_trabajo(id_trabajo):
+    """Estado y progreso de un trabajo (JSON, consultado periódicamente por la página)"""
+    return jsonify(job_status(_trabajo_visible(id_trabajo)))
+
+@main.route('/trabajos/<string:id_trabajo>/reintentar', methods=['POST'])
+@login_required
+def reintentar_trabajo(id_trabajo):
+    """Vuelve a encolar un trabajo que terminó con error (por ejemplo, una subida a Drive)"""
+    trabajo = _trabajo_visible(id_trabajo)
+    if retry_job(trabajo.idTrabajo):
+        flash('El trabajo se volvió a encolar', 'info')
+    else:
+        flash('El trabajo no está en estado de error', 'warning')
+    return redirect(request.referrer or url_for('main.ver_trabajo', id_trabajo=trabajo.idTrabajo))
+
+@main.route('/trabajos/<string:id_trabajo>/descargar')
+@login_required
+def descargar_resultado_trabajo(id_trabajo):
+    """Descarga el archivo generado por un trabajo terminado"""
+    trabajo = _trabajo_visible(id_trabajo)
+    if not trabajo.archivoResultado:
+        abort(404)
+    ruta = os.path.join(job_directory(current_app, trabajo.idTrabajo, crear=False), trabajo.archivoResultado)
+    if not os.path.exists(ruta):
+        abort(404, description="El archivo del trabajo ya no está disponible")
+    return send_file(ruta, as_attachment=True, download_name=trabajo.archivoResultado)
+
 @main.route('/descargar_archivo_drive/<file_id>')
 @login_required
 def descargar_archivo_drive(file_id):
@@ -32,23 +103,18 @@ def descargar_archivo_drive(file_id):
         if not file_id or not file_id.replace('-', '').replace('_', '').isalnum():
             abort(400, description="ID de archivo no válido")
         
-        # Intentar obtener el archivo desde Google Drive
-        file_result = drive_integration.download_file(file_id)
-        
-        if not file_result or 'error' in file_result:
-            error_msg = file_result.get('error') if file_result else 'Archivo no encontrado'
-            abort(404, description=f"No se pudo obtener el archivo: {error_msg}")
+        # Obtener el archivo desde el cache local o, si no está, desde Google Drive
+        # (en bloques, sin cargarlo completo en memoria)
+        limite = current_app.config.get('DRIVE_DOWNLOAD_MAX_MB', 50) * 1024 * 1024
+        archivo = drive_file_cache.get(
+            file_id, lambda archivo_id: drive_integration.open_file_stream(archivo_id, max_bytes=limite)
+        )
         
-        # Decodificar los datos del archivo
-        try:
-            file_data = base64.b64decode(file_result['file_data'])
-        except Exception as e:
-            abort(500, description="Error al decodificar el archivo")
+        if 'error' in archivo:
+            abort(archivo.get('status', 404), description=f"No se pudo obtener el archivo: {archivo['error']}")
         
-        # Obtener información del archivo
-        file_name = file_result.get('file_name', f'archivo_{file_id}')
-        mime_type = file_result.get('mime_type', 'application/octet-stream')
-        file_size = file_result.get('file_size', len(file_data))
+        file_name = archivo['file_name']
+        mime_type = archivo.get('mime_type')
         
         # Determinar el tipo MIME apropiado para archivos comunes
         if not mime_type or mime_type == 'application/octet-stream':
@@ -62,31 +128,36 @@ def descargar_archivo_drive(file_id):
                 mime_type = 'image/gif'
             elif file_name.lower().endswith(('.doc', '.docx')):
                 mime_type = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+            else:
+                mime_type = 'application/octet-stream'
         
-        # Crear el objeto de respuesta
-        response = Response(
-            file_data,
-            mimetype=mime_type,
-            headers={
-                'Content-Disposition': f'inline; filename="{file_name}"',
-                'Content-Length': str(file_size),
-                'Cache-Control': 'public, max-age=3600',  # Cache por 1 hora
-                'X-Content-Type-Options': 'nosniff',
-                # Headers adicionales para PDFs
-                'X-Frame-Options': 'SAMEORIGIN',  # Permitir embebido en iframe del mismo origen
-                'Content-Security-Policy': "frame-ancestors 'self'"
-            }
-        )
-        
-        # Para PDFs, agregar headers adicionales para mejor compatibilidad
-        if mime_type == 'application/pdf':
-            response.headers['Accept-Ranges'] = 'bytes'
-        
+        if 'ruta' in archivo:
+            # send_file responde 304 a If-None-Match y 206 a los pedidos Range
+            response = send_file(
+                archivo['ruta'],
+                mimetype=mime_type,
+                download_name=file_name,
+                etag=archivo['etag'],
+                conditional=True,
+                max_age=3600  # Cache por 1 hora; luego el navegador revalida con el ETag
+            )
+        else:
+            # Archivo que no entra en el cache: se retransmite bloque a bloque
+            response = Response(archivo['chunks'], mimetype=mime_type)
+            response.headers['Content-Disposition'] = f'inline; filename="{file_name}"'
+            if archivo.get('file_size') is not None:
+                response.headers['Content-Length'] = str(archivo['file_size'])
+            response.headers['Cache-Control'] = 'public, max-age=3600'
+        response.headers['X-Content-Type-Options'] = 'nosniff'
+        # Permitir embebido en iframe del mismo origen
+        response.headers['X-Frame-Options'] = 'SAMEORIGIN'
+        response.headers['Content-Security-Policy'] = "frame-ancestors 'self'"
         return response
         
+    except HTTPException:
+        raise
     except Exception as e:
         # Log del error para debugging
-        from flask import current_app
         current_app.logger.error(f"Error al servir archivo {file_id}: {str(e)}")
         abort(500, description="Error interno del servidor")
 
@@ -6,11 +6,18 @@ from flask_wtf import FlaskForm
 from wtforms import SelectField, FloatField, StringField, TextAreaField, BooleanField, FileField, SubmitField
 from wtforms.validators import DataRequired, Length, URL, Optional, Email, Regexp, ValidationError
 from flask_wtf.file import FileAllowed
-import base64
 import os
 from werkzeug.utils import secure_filename
 from app.integrations.google_drive import drive_integration
-from app.utils.pagination import ManualPagination
+from app.utils.pagination import paginate_keyset
+from app.utils.count_service import paginate_counted
+from app.utils.search_service import apply_product_search
+from app.utils.product_index import product_index
+from app.utils.id_service import movement_ids
+from app.utils.upload_outbox import (spool_upload, queue_movement_document, queue_safety_sheet, upload_states,
+                                    movement_reference, product_reference)
+from app.utils.catalog_cache import laboratorio_choices, proveedor_choices
+from app.utils.stock_queries import local_stock_page, global_stock_page, labs_with_stock
 from app.utils.logging_decorators import (
     log_business_operation, 
     audit_user_action,
@@ -24,10 +31,7 @@ from app.utils.stock_service import (
     get_real_time_global_stock_map,
     get_real_time_stock_by_lab_map,
     # Funciones legacy para compatibilidad
-    get_stock_map_for_laboratory, 
-    get_stock_for_product_in_laboratory, 
-    get_stock_map_for_all_laboratories, 
-    get_global_stock_for_products
+    get_stock_for_product_in_laboratory
 )
 
 tecnicos = Blueprint('tecnicos', __name__)
@@ -106,25 +110,20 @@ class MovimientoTecnicoForm(FlaskForm):
     laboratorioDestino = SelectField('Laboratorio Destino', validators=[Optional()], coerce=str)
     
     def __init__(self, *args, **kwargs):
-        self.laboratorios = kwargs.pop('laboratorios', [])
+        # Laboratorio de origen, excluido de los destinos de transferencia
+        self.lab_origen = kwargs.pop('lab_origen', None)
         super(MovimientoTecnicoForm, self).__init__(*args, **kwargs)
         
-        # Populate product choices with all products
-        productos = Producto.query.all()
-        if productos:
-            self.idProducto.choices = [(p.idProducto, p.nombre) for p in productos]
-        else:
-            self.idProducto.choices = [('', 'No hay productos disponibles')]
+        # El producto se elige con búsqueda asíncrona: solo se envía el seleccionado
+        self.idProducto.choices = product_index.choices_for(self.idProducto.data)
             
-        # Populate laboratory destination choices
-        if self.laboratorios:
-            self.laboratorioDestino.choices = [(lab.idLaboratorio, lab.nombre) for lab in self.laboratorios]
+        # Catálogos cacheados: construir el formulario no consulta la base
+        laboratorios = laboratorio_choices(excluir=self.lab_origen)
+        if laboratorios:
+            self.laboratorioDestino.choices = laboratorios
         else:
             self.laboratorioDestino.choices = [('', 'No hay laboratorios disponibles')]
-            
-        # Populate provider choices
-        proveedores = Proveedor.query.order_by(Proveedor.nombre).all()
-        self.idProveedor.choices = [(0, 'Nuevo proveedor...')] + [(p.idProveedor, f"{p.nombre} ({p.cuit})") for p in proveedores]
+        self.idProveedor.choices = proveedor_choices()
     def validate(self, **kwargs):
         if not super().validate(**kwargs):
             return False
@@ -178,23 +177,12 @@ def dashboard():
 def panel_laboratorio(lab_id):
     laboratorio = Laboratorio.query.get_or_404(lab_id)
     
-    # Obtener todos los productos
-    productos = Producto.query.all()
-    
-    # Calcular stock en tiempo real para todos los productos en este laboratorio
-    product_ids = [p.idProducto for p in productos]
-    productos_stock_map = get_real_time_stock_map_for_lab(lab_id, product_ids)
-    
-    # Para cada producto, usar el stock calculado en tiempo real
-    productos_con_stock = []
-    for producto in productos:
-        stock_en_lab = productos_stock_map.get(producto.idProducto, 0)
-        # Solo mostramos productos que tienen stock en este laboratorio
-        if stock_en_lab > 0:
-            productos_con_stock.append({
-                'producto': producto,
-                'stock': stock_en_lab
-            })
+    # El panel muestra solo los primeros productos con stock en este laboratorio
+    pagina = local_stock_page(lab_id, page=1, per_page=5, stock_filtro='inStock')
+    productos_con_stock = [
+        {'producto': producto, 'stock': stock_en_lab}
+        for producto, stock_en_lab in pagina.items
+    ]
     
     return render_template('tecnicos/panel_laboratorio.html',
                            title=f'Panel - {laboratorio.nombre}',
@@ -238,33 +226,18 @@ def list_productos(lab_id):
     
     # Aplicar filtro de búsqueda si se especifica
     if search_term:
-        productos_query = productos_query.filter(
-            Producto.nombre.ilike(f'%{search_term}%')
-        )# Si queremos sólo productos con stock, necesitamos obtenerlos todos para filtrar
+        productos_query = apply_product_search(productos_query, search_term)
+    
+    # Sólo productos con stock: filtrado y paginación en la base
     if solo_con_stock:
-        todos_productos = productos_query.all()
-        
-        # Calcular stock en tiempo real para todos los productos
-        product_ids = [p.idProducto for p in todos_productos]
-        productos_stock_map = get_real_time_stock_map_for_lab(lab_id, product_ids)
-        
-        # Filtrar manualmente los que tienen stock en este laboratorio
-        productos_con_stock_positivo = []
-        for producto in todos_productos:
-            stock_en_lab = productos_stock_map.get(producto.idProducto, 0)
-            if stock_en_lab > 0:
-                productos_con_stock_positivo.append({
-                    'producto': producto,
-                    'stock': stock_en_lab
-                })
-          # Paginación manual para productos filtrados
-        total_productos = len(productos_con_stock_positivo)
-        inicio = (page - 1) * per_page
-        fin = min(inicio + per_page, total_productos)
-        productos_paginados = productos_con_stock_positivo[inicio:fin]
-        
-        # Crear un objeto de paginación manual
-        pagination = ManualPagination(productos_paginados, page, per_page, total_productos)
+        pagination = local_stock_page(lab_id, page=page, per_page=per_page,
+                                      tipo_producto=tipo_producto, search_term=search_term,
+                                      stock_filtro='inStock')
+        productos_paginados = [
+            {'producto': producto, 'stock': stock_en_lab}
+            for producto, stock_en_lab in pagination.items
+        ]
+        total_productos = pagination.total
         
         return render_template('tecnicos/productos/list.html',
                               title=f'Productos - {laboratorio.nombre}',
@@ -274,12 +247,14 @@ def list_productos(lab_id):
                               selected_tipo=tipo_producto,
                               search_term=search_term,
                               pagination=pagination,
-                              total_productos=total_productos)
-    else:        # Obtener conteo total antes de paginar
-        total_productos = productos_query.count()
-        
-        # Aplicar paginación a la consulta original
-        productos_paginados = productos_query.paginate(page=page, per_page=per_page, error_out=False)
+                              total_productos=total_productos,
+                              subidas=upload_states([product_reference(item['producto'].idProducto)
+                                                     for item in productos_paginados]))
+    else:
+        # Aplicar paginación a la consulta original (un único conteo)
+        productos_paginados = paginate_counted(Producto, productos_query, page, per_page,
+                                               filtros={'tipoProducto': tipo_producto, 'nombre': search_term})
+        total_productos = productos_paginados.total
         
         # Calcular stock en tiempo real para todos los productos en la página actual
         product_ids = [p.idProducto for p in productos_paginados.items]
@@ -302,7 +277,9 @@ def list_productos(lab_id):
                               selected_tipo=tipo_producto,
                               search_term=search_term,
                               pagination=productos_paginados,
-                              total_productos=total_productos)
+                              total_productos=total_productos,
+                              subidas=upload_states([product_reference(item['producto'].idProducto)
+                                                     for item in productos_con_stock]))
 
 @tecnicos.route('/panel/<string:lab_id>/productos/new', methods=['GET', 'POST'])
 @login_required
@@ -328,8 +305,8 @@ def new_producto(lab_id):
                                   title='Nuevo Producto', 
                                   form=form,
                                   laboratorio=laboratorio)
-          # Manejar la subida de la ficha de seguridad
-        ficha_seguridad_id = None
+          # Validar la ficha de seguridad (se sube a Drive en segundo plano)
+        ficha_extension = None
         if form.fichaSeguridad.data:
             try:
                 # Verificar configuración de Google Drive
@@ -340,17 +317,18 @@ def new_producto(lab_id):
                                           form=form,
                                           laboratorio=laboratorio)
                 
-                # Leer el archivo y convertirlo a base64
-                file_data = form.fichaSeguridad.data.read()
-                if len(file_data) == 0:
+                # Verificar que el archivo no esté vacío
+                archivo_ficha = form.fichaSeguridad.data
+                archivo_ficha.stream.seek(0, os.SEEK_END)
+                vacio = archivo_ficha.stream.tell() == 0
+                archivo_ficha.stream.seek(0)
+                if vacio:
                     flash('Error: El archivo está vacío', 'warning')
                     return render_template('tecnicos/productos/form.html', 
                                           title='Nuevo Producto', 
                                           form=form,
                                           laboratorio=laboratorio)
                 
-                file_b64 = base64.b64encode(file_data).decode('utf-8')
-                
                 # Obtener la extensión del archivo
                 filename = secure_filename(form.fichaSeguridad.data.filename)
                 if not filename:
@@ -367,22 +345,8 @@ def new_producto(lab_id):
                                           title='Nuevo Producto', 
                                           form=form,
                                           laboratorio=laboratorio)
-                  # Subir el archivo a Google Drive
-                result = drive_integration.upload_ficha_seguridad(
-                    form.idProducto.data,
-                    file_b64,
-                    file_extension
-                )
                 
-                if result and 'file_id' in result:
-                    ficha_seguridad_id = result['file_id']
-                    flash('Ficha de seguridad subida correctamente', 'success')
-                elif result and 'error' in result:
-                    flash(f'Error al subir la ficha de seguridad: {result["error"]}', 'warning')
-                    # Continuar creando el producto sin la ficha
-                else:
-                    flash('Error desconocido al subir la ficha de seguridad', 'warning')
-                    # Continuar creando el producto sin la ficha
+                ficha_extension = file_extension
                     
             except Exception as e:
                 flash(f'Error al procesar la ficha de seguridad: {str(e)}', 'warning')
@@ -395,18 +359,25 @@ def new_producto(lab_id):
             tipoProducto=form.tipoProducto.data,
             estadoFisico=form.estadoFisico.data,
             controlSedronar=form.controlSedronar.data,
-            urlFichaSeguridad=ficha_seguridad_id,  # Guardar el ID del archivo en lugar de URL
             stockMinimo=form.stockMinimo.data or 0,
             marca=form.marca.data
         )
         
         db.session.add(producto)
+        if ficha_extension:
+            # El trabajo de subida guarda el ID del archivo en urlFichaSeguridad al terminar
+            try:
+                guardado = spool_upload(form.fichaSeguridad.data)
+            except Exception as e:
+                flash(f'Error al procesar la ficha de seguridad: {str(e)}', 'warning')
+            else:
+                queue_safety_sheet(producto.idProducto, guardado, ficha_extension,
+                                   usuario_id=current_user.idUsuario)
+                flash('La ficha de seguridad se está subiendo a Google Drive', 'info')
         db.session.commit()
         
         # Crear un movimiento de ingreso inicial para este laboratorio
-        import random
-        import string
-        movement_id = 'MOV' + ''.join(random.choices(string.digits, k=6))
+        movement_id = movement_ids.next_id()
         
         movimiento = Movimiento(
             idMovimiento=movement_id,
@@ -445,18 +416,15 @@ def edit_producto(lab_id, id):
 def list_movimientos(lab_id):
     laboratorio = Laboratorio.query.get_or_404(lab_id)
     
-    # Parámetros de paginación
-    page = request.args.get('page', 1, type=int)
+    # Parámetros de paginación por cursor (más recientes primero)
     per_page = request.args.get('per_page', 20, type=int)
+    after = request.args.get('after')
+    before = request.args.get('before')
     
-    # Crear la query base ordenada por fecha (más recientes primero)
-    query = Movimiento.query.filter_by(idLaboratorio=lab_id).order_by(Movimiento.timestamp.desc())
-    
-    # Obtener conteo total antes de paginar
-    total_movimientos = query.count()
-    
-    # Aplicar paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Usa idx_movimiento_lab_timestamp: cada página cuesta lo mismo sin importar su profundidad
+    query = Movimiento.query.filter_by(idLaboratorio=lab_id)
+    pagination = paginate_keyset(query, Movimiento.timestamp, Movimiento.idMovimiento,
+                                 per_page, after=after, before=before)
     movimientos = pagination.items
     
     return render_template('tecnicos/movimientos/list.html',
@@ -464,7 +432,7 @@ def list_movimientos(lab_id):
                            laboratorio=laboratorio,
                            movimientos=movimientos,
                            pagination=pagination,
-                           total_movimientos=total_movimientos)
+                           subidas=upload_states([movement_reference(m.idMovimiento) for m in movimientos]))
 
 @tecnicos.route('/panel/<string:lab_id>/movimientos/new', methods=['GET', 'POST'])
 @login_required
@@ -476,24 +444,17 @@ def list_movimientos(lab_id):
 def new_movimiento(lab_id):
     laboratorio = Laboratorio.query.get_or_404(lab_id)
     
-    # Get all laboratories except the current one for transfers
-    all_laboratorios = Laboratorio.query.filter(Laboratorio.idLaboratorio != lab_id).all()
-    # Initialize form with all available laboratories
-    form = MovimientoTecnicoForm(laboratorios=all_laboratorios)
-    
-    # Obtener todos los proveedores y agregarlos al formulario
-    proveedores = Proveedor.query.order_by(Proveedor.nombre).all()
-    form.idProveedor.choices = [(0, 'Nuevo proveedor...')] + [(p.idProveedor, f"{p.nombre} ({p.cuit})") for p in proveedores]
+    # Los destinos de transferencia son todos los laboratorios salvo el actual
+    form = MovimientoTecnicoForm(lab_origen=lab_id)
     
     # Pre-select product if provided in query param
     if request.args.get('producto'):
         form.idProducto.data = request.args.get('producto')
+        form.idProducto.choices = product_index.choices_for(form.idProducto.data)
     
     if form.validate_on_submit():
-        # Generate a unique movement ID
-        import random
-        import string
-        movement_id = 'MOV' + ''.join(random.choices(string.digits, k=6))
+        # Próximo ID de la secuencia de movimientos
+        movement_id = movement_ids.next_id()
         
         # Verificar que el producto existe
         producto = Producto.query.get(form.idProducto.data)
@@ -503,7 +464,6 @@ def new_movimiento(lab_id):
         
         # Variables for movement
         tipo_movimiento = form.tipoMovimiento.data
-        url_documento = None
         lab_destino = None
         tipo_documento = None
           # Process based on movement type        if tipo_movimiento == 'compra':
@@ -526,33 +486,6 @@ def new_movimiento(lab_id):
                 # Redirect to new provider form with return URL
                 return redirect(url_for('tecnicos.new_proveedor', 
                     return_to=url_for('tecnicos.new_movimiento', lab_id=lab_id)))
-            
-            # Check if document was uploaded
-            if form.documento.data:
-                try:
-                    import base64
-                    from app.integrations.google_drive import drive_integration
-                    
-                    # Read file and encode as base64
-                    file_data = base64.b64encode(form.documento.data.read()).decode('utf-8')
-                    file_name = form.documento.data.filename
-                    file_type = "application/pdf"  # Assuming PDFs only
-                    
-                    # Upload document to Google Drive
-                    result = drive_integration.upload_movimiento_documento(
-                        lab_id=lab_id,
-                        movimiento_id=movement_id,
-                        file_data=file_data,
-                        file_name=file_name,
-                        file_type=file_type
-                    )
-                    
-                    if result:
-                        url_documento = result.get('file_url')
-                    else:
-                        flash('Error al subir el documento. El movimiento se registrará sin documento adjunto.', 'warning')
-                except Exception as e:
-                    flash(f'Error al procesar el documento: {str(e)}', 'danger')
         
         elif tipo_movimiento == 'transferencia':
             # For transfer movements, set destination laboratory
@@ -583,7 +516,6 @@ def new_movimiento(lab_id):
             idProducto=form.idProducto.data,
             idLaboratorio=lab_id,
             tipoDocumento=tipo_documento,
-            urlDocumento=url_documento,
             laboratorioDestino=lab_destino,
             fechaFactura=fecha_factura if tipo_movimiento == 'compra' else None,
             idProveedor=form.idProveedor.data if tipo_movimiento == 'compra' and form.idProveedor.data != 0 else None,            numeroDocumento=form.numeroDocumento.data if tipo_movimiento == 'compra' else None
@@ -592,7 +524,7 @@ def new_movimiento(lab_id):
         
         # If it's a transfer, create an ingress movement for the destination laboratory
         if tipo_movimiento == 'transferencia' and lab_destino:
-            movement_id_dest = 'MOV' + ''.join(random.choices(string.digits, k=6))
+            movement_id_dest = movement_ids.next_id()
             
             movimiento_dest = Movimiento(
                 idMovimiento=movement_id_dest,
@@ -607,18 +539,20 @@ def new_movimiento(lab_id):
             )
             db.session.add(movimiento_dest)
         
-        # Commit para guardar los movimientos
-        db.session.commit()
-        
-        # Actualizar stock
-        from app.utils.stock_service import actualizar_stock_por_movimiento
-        actualizar_stock_por_movimiento(movimiento)
-        
-        # Para transferencias, actualizar el stock en el destino con el movimiento creado
-        if tipo_movimiento == 'transferencia' and lab_destino and 'movimiento_dest' in locals():
-            actualizar_stock_por_movimiento(movimiento_dest)
+        # El documento se sube a Drive en segundo plano; el movimiento se confirma
+        # junto con el trabajo de subida
+        if tipo_movimiento == 'compra' and form.documento.data:
+            try:
+                guardado = spool_upload(form.documento.data)
+            except Exception as e:
+                flash(f'Error al procesar el documento: {str(e)}', 'warning')
+            else:
+                queue_movement_document(movement_id, lab_id, guardado,
+                                        usuario_id=current_user.idUsuario)
+                flash('El documento se está subiendo a Google Drive', 'info')
         
-        # Guardar los cambios en el stock
+        # Commit para guardar los movimientos (el ledger de stock se actualiza
+        # en la misma transacción mediante los eventos de Movimiento)
         db.session.commit()
         
         flash('Movimiento registrado correctamente', 'success')
@@ -669,53 +603,17 @@ def visualizar_stock_global(lab_id):
     tipo_filtro = request.args.get('tipo', '')
     stock_filtro = request.args.get('stock', 'all')
     
-    # Get all laboratories
-    todos_laboratorios = Laboratorio.query.all()
+    # Una página de productos con su stock global y local, filtrada y ordenada en la base
+    pagination = global_stock_page(lab_id, page=page, per_page=per_page,
+                                   tipo_producto=tipo_filtro, search_term=search_query,
+                                   stock_filtro=stock_filtro)
     
-    # Crear la query base
-    productos_query = Producto.query
+    # Laboratorios con stock, solo para los productos de esta página
+    labs_map = labs_with_stock([producto.idProducto for producto, _, _ in pagination.items])
     
-    # Aplicar filtro por tipo de producto
-    if tipo_filtro:
-        productos_query = productos_query.filter_by(tipoProducto=tipo_filtro)
-    
-    # Aplicar filtro por búsqueda de nombre
-    if search_query:
-        productos_query = productos_query.filter(Producto.nombre.ilike(f'%{search_query}%'))
-      # Obtenemos todos los productos para el filtro de stock
-    todos_productos = productos_query.all()
-    
-    # Obtener stock de todos los productos en todos los laboratorios de una vez
-    product_ids = [p.idProducto for p in todos_productos]
-    stock_map_all_labs = get_stock_map_for_all_laboratories(product_ids)
-    stock_global_map = get_global_stock_for_products(product_ids)
-    
-    # Preparamos la lista de productos con stock
-    productos_con_stock = []
-    for producto in todos_productos:
-        # Para cada producto, usar los mapas optimizados
-        stock_global = stock_global_map.get(producto.idProducto, 0)
-        stock_en_lab = stock_map_all_labs.get(producto.idProducto, {}).get(lab_id, 0)
-        
-        # Aplicar filtro por stock
-        if stock_filtro == 'inStock' and stock_global <= 0:
-            continue
-        elif stock_filtro == 'outOfStock' and stock_global > 0:
-            continue
-        
-        # Obtener laboratorios donde hay stock de este producto
-        laboratorios_con_stock = []
-        producto_stock_en_labs = stock_map_all_labs.get(producto.idProducto, {})
-        for lab in todos_laboratorios:
-            stock_en_este_lab = producto_stock_en_labs.get(lab.idLaboratorio, 0)
-            if stock_en_este_lab > 0:
-                laboratorios_con_stock.append({
-                    'nombre': lab.nombre,
-                    'id': lab.idLaboratorio,
-                    'stock': stock_en_este_lab
-                })
-        
-        productos_con_stock.append({
+    productos_paginados = []
+    for producto, stock_global, stock_en_lab in pagination.items:
+        productos_paginados.append({
             'id': producto.idProducto,
             'nombre': producto.nombre,
             'descripcion': producto.descripcion,
@@ -724,16 +622,9 @@ def visualizar_stock_global(lab_id):
             'stock_global': stock_global,
             'stock_local': stock_en_lab,
             'control_sedronar': producto.controlSedronar,
-            'laboratorios_con_stock': laboratorios_con_stock
+            'laboratorios_con_stock': labs_map.get(producto.idProducto, [])
         })
-      # Paginación manual para productos filtrados
-    total_productos = len(productos_con_stock)
-    inicio = (page - 1) * per_page
-    fin = min(inicio + per_page, total_productos)
-    productos_paginados = productos_con_stock[inicio:fin]
-    
-    # Crear un objeto de paginación manual
-    pagination = ManualPagination(productos_paginados, page, per_page, total_productos)
+    total_productos = pagination.total
     
     return render_template('tecnicos/stock/visualizar.html',
                           title='Stock Global',
@@ -760,34 +651,14 @@ def visualizar_stock(lab_id):
     tipo_filtro = request.args.get('tipo', '')
     stock_filtro = request.args.get('stock', 'all')
     
-    # Crear la query base
-    productos_query = Producto.query
-    
-    # Aplicar filtro por tipo de producto
-    if tipo_filtro:
-        productos_query = productos_query.filter_by(tipoProducto=tipo_filtro)
+    # Una página de productos con su stock local, filtrada y ordenada en la base
+    pagination = local_stock_page(lab_id, page=page, per_page=per_page,
+                                  tipo_producto=tipo_filtro, search_term=search_query,
+                                  stock_filtro=stock_filtro)
     
-    # Aplicar filtro por búsqueda de nombre
-    if search_query:
-        productos_query = productos_query.filter(Producto.nombre.ilike(f'%{search_query}%'))    # Obtenemos todos los productos
-    todos_productos = productos_query.all()
-    
-    # Obtenemos el stock de todos los productos en el laboratorio de una sola vez
-    product_ids = [p.idProducto for p in todos_productos]
-    productos_stock_map = get_stock_map_for_laboratory(lab_id, product_ids)
-    
-    # Preparamos la lista de productos con stock
-    productos_con_stock = []
-    for producto in todos_productos:
-        stock_en_lab = productos_stock_map.get(producto.idProducto, 0)
-        
-        # Aplicar filtro por stock
-        if stock_filtro == 'inStock' and stock_en_lab <= 0:
-            continue
-        elif stock_filtro == 'outOfStock' and stock_en_lab > 0:
-            continue
-        
-        productos_con_stock.append({
+    productos_paginados = []
+    for producto, stock_en_lab in pagination.items:
+        productos_paginados.append({
             'id': producto.idProducto,
             'nombre': producto.nombre,
             'descripcion': producto.descripcion,
@@ -796,14 +667,7 @@ def visualizar_stock(lab_id):
             'stock': stock_en_lab,
             'control_sedronar': producto.controlSedronar
         })
-      # Paginación manual para productos filtrados
-    total_productos = len(productos_con_stock)
-    inicio = (page - 1) * per_page
-    fin = min(inicio + per_page, total_productos)
-    productos_paginados = productos_con_stock[inicio:fin]
-    
-    # Crear un objeto de paginación manual
-    pagination = ManualPagination(productos_paginados, page, per_page, total_productos)
+    total_productos = pagination.total
     
     return render_template('tecnicos/stock/visualizar.html',
                           title=f'Stock - {laboratorio.nombre}',
@@ -825,11 +689,9 @@ def list_proveedores():
     # Crear la query base ordenada por nombre
     query = Proveedor.query.order_by(Proveedor.nombre)
     
-    # Obtener conteo total antes de paginar
-    total_proveedores = query.count()
-    
-    # Aplicar paginación
-    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    # Aplicar paginación (el total sale del contador mantenido)
+    pagination = paginate_counted(Proveedor, query, page, per_page)
+    total_proveedores = pagination.total
     proveedores = pagination.items
     
     return render_template('tecnicos/proveedores/list.html', 
@@ -936,4 +798,4 @@ def api_nuevo_proveedor():
         )
     except Exception as e:
         db.session.rollback()
-        return jsonify(success=False, error=f"Error al guardar: {str(e)}")
\ No newline at end of file
+        return jsonify(success=False, error=f"Error al guardar: {str(e)}")
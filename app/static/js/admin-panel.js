@@ -2,14 +2,18 @@
 
 // Inicializar DataTables para todas las tablas de administración
 $(document).ready(function() {
-    // Configuración para tablas de administración
-    $('.admin-table').DataTable({
+    // Tablas con endpoint JSON: búsqueda, orden y paginación en el servidor
+    $('.admin-table[data-ajax-url]').each(function() {
+        inicializarTablaServidor(this);
+    });
+    
+    // Tablas chicas renderizadas en el servidor (sin opción "Todos")
+    $('.admin-table:not([data-ajax-url])').DataTable({
         language: {
             url: '/static/js/Spanish.json'
         },
         responsive: true,
-        stateSave: true,
-        lengthMenu: [[10, 25, 50, -1], [10, 25, 50, "Todos"]],
+        lengthMenu: [10, 25, 50, 100],
         columnDefs: [
             { 
                 targets: -1, // Última columna (acciones)
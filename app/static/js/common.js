@@ -34,6 +34,93 @@ function confirmarEliminar(url, nombre) {
     return confirmarEliminacion(nombre, url);
 }
 
+/**
+ * Escapa un valor para insertarlo como HTML
+ * @param {*} valor - Valor a escapar
+ * @returns {string} - Texto seguro para HTML
+ */
+function escaparHtml(valor) {
+    return $('<div>').text(valor === null || valor === undefined ? '' : String(valor)).html();
+}
+
+/**
+ * Renderiza la columna de acciones de una tabla en modo servidor.
+ * Cada acción es {url, icono, clase, titulo, metodo?, confirmar?}; las acciones POST
+ * se envían con un formulario que incluye el token CSRF de la tabla.
+ */
+function renderAccionesTabla(acciones, type, row, meta) {
+    if (type !== 'display' || !acciones) {
+        return '';
+    }
+    const csrfToken = $(meta.settings.nTable).data('csrf-token') || '';
+    const botones = acciones.map(function(accion) {
+        const icono = `<i class="fas ${escaparHtml(accion.icono)}"></i>`;
+        const clase = `btn btn-sm ${escaparHtml(accion.clase)}`;
+        if (accion.metodo === 'POST') {
+            return `<form action="${escaparHtml(accion.url)}" method="POST" class="d-inline form-accion-tabla" data-confirmar="${escaparHtml(accion.confirmar || '')}">` +
+                `<input type="hidden" name="csrf_token" value="${escaparHtml(csrfToken)}">` +
+                `<button type="submit" class="${clase}" title="${escaparHtml(accion.titulo)}">${icono}</button></form>`;
+        }
+        return `<a href="${escaparHtml(accion.url)}" class="${clase}" title="${escaparHtml(accion.titulo)}">${icono}</a>`;
+    });
+    return `<div class="btn-group" role="group">${botones.join('')}</div>`;
+}
+
+/**
+ * Inicializa una DataTable en modo servidor (serverSide: true).
+ * La URL se toma de data-ajax-url en la tabla, la traducción de data-language-url
+ * (generada con url_for, respeta el prefijo de la aplicación) y cada columna de
+ * data-data en su <th>; la columna de acciones se marca con la clase "col-acciones".
+ * @param {string|Element} tabla - Selector o elemento de la tabla
+ * @param {Object} opciones - Opciones adicionales de DataTables
+ * @returns {DataTable} - Instancia creada
+ */
+function inicializarTablaServidor(tabla, opciones = {}) {
+    const $tabla = $(tabla);
+    return $tabla.DataTable(Object.assign({
+        language: {
+            url: $tabla.data('language-url')
+        },
+        responsive: true,
+        serverSide: true,
+        processing: true,
+        searchDelay: 400,
+        pageLength: 25,
+        lengthMenu: [10, 25, 50, 100],
+        ajax: {
+            url: $tabla.data('ajax-url')
+        },
+        columnDefs: [
+            {
+                targets: 'col-acciones',
+                orderable: false,
+                searchable: false,
+                render: renderAccionesTabla
+            },
+            {
+                targets: '_all',
+                render: function(data, type) {
+                    if (type !== 'display') {
+                        return data;
+                    }
+                    if (data === true || data === false) {
+                        return data ? 'Sí' : 'No';
+                    }
+                    return escaparHtml(data);
+                }
+            }
+        ]
+    }, opciones));
+}
+
+// Confirmación de las acciones POST generadas por las tablas en modo servidor
+$(document).on('submit', '.form-accion-tabla', function(e) {
+    const mensaje = $(this).data('confirmar');
+    if (mensaje && !confirmarEliminacion(`¿Estás seguro que deseas eliminar ${mensaje}?`)) {
+        e.preventDefault();
+    }
+});
+
 /**
  * Inicializar funcionalidades comunes cuando se carga el DOM
  */
@@ -105,3 +192,47 @@ function validarFormulario(form) {
     
     return esValido;
 }
+
+/**
+ * Convierte un <select> de productos en un selector con búsqueda asíncrona (Tom Select).
+ * Las opciones se piden al endpoint de búsqueda a medida que se escribe, en lugar de
+ * enviar el catálogo completo con la página.
+ * @param {HTMLSelectElement|string} select - Elemento o selector CSS
+ * @param {string} url - Endpoint de búsqueda (recibe ?q= y devuelve {results: [{id, text}]})
+ * @returns {TomSelect|null} - Instancia creada o null si la librería no está cargada
+ */
+function inicializarSelectorProductos(select, url) {
+    const elemento = typeof select === 'string' ? document.querySelector(select) : select;
+    if (!elemento || typeof TomSelect === 'undefined') {
+        return null;
+    }
+    
+    return new TomSelect(elemento, {
+        valueField: 'id',
+        labelField: 'text',
+        searchField: ['text', 'id'],
+        maxOptions: 20,
+        loadThrottle: 250,
+        placeholder: 'Buscar producto por nombre o ID...',
+        shouldLoad: function(query) {
+            return query.length >= 2;
+        },
+        load: function(query, callback) {
+            fetch(url + '?q=' + encodeURIComponent(query), {credentials: 'same-origin'})
+                .then(response => response.json())
+                .then(data => callback(data.results))
+                .catch(() => callback());
+        },
+        render: {
+            option: function(item, escape) {
+                return `<div><strong>${escape(item.id)}</strong> - ${escape(item.text)}</div>`;
+            },
+            item: function(item, escape) {
+                return `<div>${escape(item.text)} (${escape(item.id)})</div>`;
+            },
+            no_results: function() {
+                return '<div class="no-results">Sin productos que coincidan</div>';
+            }
+        }
+    });
+}
@@ -6,12 +6,13 @@ $(document).ready(function() {
     const tooltipList = [...tooltipTriggerList].map(tooltipTriggerEl => new bootstrap.Tooltip(tooltipTriggerEl));
     
     // Inicializar tablas de datos
-    if ($('.tecnico-table').length) {        $('.tecnico-table').DataTable({
+    if ($('.tecnico-table').length) {
+        $('.tecnico-table').DataTable({
             language: {
                 url: '/static/js/Spanish.json'
             },
             responsive: true,
-            lengthMenu: [[10, 25, 50, -1], [10, 25, 50, "Todos"]],
+            lengthMenu: [10, 25, 50, 100],
             columnDefs: [
                 { 
                     targets: -1, // Última columna (acciones)
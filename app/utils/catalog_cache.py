@@ -0,0 +1,172 @@
+"""
+Cache de catálogos para los formularios (laboratorios, productos y proveedores)
+Cada catálogo se guarda como una tupla de namedtuples compactas, versionada con un
+contador en el cache compartido. Las altas, ediciones y bajas confirmadas descartan la
+copia local y avanzan la versión, de modo que los demás workers recargan en su
+próxima lectura; mientras tanto, construir un formulario no consulta la base.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.models.models import db, Laboratorio, Producto, Proveedor
+from app.utils.shared_cache import shared_cache
+
+LaboratorioItem = namedtuple('LaboratorioItem', ['idLaboratorio', 'nombre'])
+ProductoItem = namedtuple('ProductoItem', ['idProducto', 'nombre'])
+ProveedorItem = namedtuple('ProveedorItem', ['idProveedor', 'nombre', 'cuit'])
+
+# Catálogo -> (modelo, tipo de fila, columnas, orden)
+CATALOGOS = {
+    'laboratorios': (Laboratorio, LaboratorioItem,
+                     (Laboratorio.idLaboratorio, Laboratorio.nombre), (Laboratorio.idLaboratorio,)),
+    'productos': (Producto, ProductoItem,
+                  (Producto.idProducto, Producto.nombre), (Producto.nombre, Producto.idProducto)),
+    'proveedores': (Proveedor, ProveedorItem,
+                    (Proveedor.idProveedor, Proveedor.nombre, Proveedor.cuit), (Proveedor.nombre, Proveedor.idProveedor)),
+}
+_CATALOGO_POR_MODELO = {modelo: nombre for nombre, (modelo, _, _, _) in CATALOGOS.items()}
+
+def _clave_generacion(nombre):
+    return f'generacion:catalogo:{nombre}'
+
+class CatalogCache:
+    """Copias locales de los catálogos, validadas contra la versión compartida"""
+    
+    def __init__(self, ttl=300, enabled=True):
+        self._lock = threading.Lock()
+        self._entradas = {}    # nombre -> (generación, expira, filas)
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+    
+    def configure(self, ttl=None, enabled=None):
+        """Ajusta los parámetros del cache (se llama desde create_app)"""
+        with self._lock:
+            if ttl is not None:
+                self.ttl = ttl
+            if enabled is not None:
+                self.enabled = enabled
+            self._entradas.clear()
+    
+    def _cargar(self, nombre):
+        _, tipo, columnas, orden = CATALOGOS[nombre]
+        filas = db.session.query(*columnas).order_by(*orden).all()
+        return tuple(tipo(*fila) for fila in filas)
+    
+    def get(self, nombre):
+        """
+        Devuelve un catálogo completo.
+        
+        Args:
+            nombre: 'laboratorios', 'productos' o 'proveedores'
+        
+        Returns:
+            tuple: Filas del catálogo (namedtuples con los nombres de columna del modelo)
+        """
+        if not self.enabled:
+            return self._cargar(nombre)
+        
+        generacion = shared_cache.get_counter(_clave_generacion(nombre))
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(nombre)
+            if entrada and entrada[0] == generacion and entrada[1] > ahora:
+                self.hits += 1
+                return entrada[2]
+            self.misses += 1
+        
+        # Otro worker pudo haber cargado ya esta versión
+        tipo = CATALOGOS[nombre][1]
+        clave = f'catalogo:{nombre}:{generacion}' if generacion is not None else None
+        guardado = shared_cache.get_json(clave) if clave else None
+        if guardado is not None:
+            filas = tuple(tipo(*fila) for fila in guardado)
+        else:
+            filas = self._cargar(nombre)
+            if clave:
+                shared_cache.set_json(clave, [list(fila) for fila in filas], ttl=self.ttl)
+        
+        with self._lock:
+            self._entradas[nombre] = (generacion, ahora + self.ttl, filas)
+        return filas
+    
+    def invalidate(self, *nombres):
+        """
+        Descarta catálogos en este proceso y avanza su versión compartida.
+        
+        Args:
+            nombres: Catálogos a invalidar (todos si no se indica ninguno)
+        """
+        nombres = nombres or tuple(CATALOGOS)
+        with self._lock:
+            for nombre in nombres:
+                self._entradas.pop(nombre, None)
+        for nombre in nombres:
+            shared_cache.incr(_clave_generacion(nombre))
+    
+    def stats(self):
+        """Métricas del cache para diagnóstico"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'catalogos': {nombre: len(entrada[2]) for nombre, entrada in self._entradas.items()},
+            }
+
+# Instancia compartida por el proceso (configurada en create_app)
+catalog_cache = CatalogCache()
+
+# CHOICES PARA FORMULARIOS
+
+def laboratorio_choices(excluir=None):
+    """
+    Opciones (id, nombre) de laboratorios para un SelectField.
+    
+    Args:
+        excluir: ID de laboratorio a omitir (por ejemplo, el origen de una transferencia)
+    """
+    return [(lab.idLaboratorio, lab.nombre) for lab in catalog_cache.get('laboratorios')
+            if lab.idLaboratorio != excluir]
+
+def proveedor_choices():
+    """Opciones de proveedores con la opción para cargar uno nuevo al inicio"""
+    return [(0, 'Nuevo proveedor...')] + [
+        (p.idProveedor, f"{p.nombre} ({p.cuit})") for p in catalog_cache.get('proveedores')
+    ]
+
+# INVALIDACIÓN POR EVENTOS
+
+def register_changes(session, *nombres):
+    """
+    Marca catálogos para invalidarlos cuando la sesión confirme.
+    Las cargas masivas que no disparan los eventos del ORM deben llamarlo.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        nombres: Catálogos modificados ('laboratorios', 'productos', 'proveedores')
+    """
+    session.info.setdefault('catalogos_modificados', set()).update(nombres)
+
+def _registrar_cambio(mapper, connection, target):
+    session = object_session(target)
+    if session is not None:
+        register_changes(session, _CATALOGO_POR_MODELO[mapper.class_])
+
+for _modelo in _CATALOGO_POR_MODELO:
+    for _evento in ('after_insert', 'after_update', 'after_delete'):
+        event.listen(_modelo, _evento, _registrar_cambio)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_al_confirmar(session):
+    nombres = session.info.pop('catalogos_modificados', None)
+    if nombres:
+        catalog_cache.invalidate(*nombres)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_cambios(session, previous_transaction):
+    session.info.pop('catalogos_modificados', None)
@@ -0,0 +1,272 @@
+"""
+Servicio de conteo de filas para los listados
+Mantiene contadores por tabla y por filtro frecuente en la tabla contador_filas,
+actualizados en la misma transacción por los eventos de alta, baja y modificación.
+Para tablas muy grandes sin contador sembrado devuelve una estimación del motor
+(MAX(rowid) en SQLite, reltuples en PostgreSQL) en lugar de un COUNT(*) completo.
+"""
+import logging
+
+from flask import current_app
+from sqlalchemy import event, func, inspect, literal, select, text
+from sqlalchemy.exc import IntegrityError
+
+from app.models.models import db, ContadorFilas, Usuario, Laboratorio, Producto, Movimiento, Proveedor
+
+logger = logging.getLogger(__name__)
+
+# Columnas por las que se filtran los listados y cuyos conteos se mantienen
+FILTROS_MANTENIDOS = {
+    Usuario: (),
+    Laboratorio: (),
+    Producto: ('tipoProducto',),
+    Movimiento: ('idLaboratorio',),
+    Proveedor: (),
+}
+
+def _clave(model, columna=None, valor=None):
+    """Clave del contador: 'tabla' o 'tabla|columna=valor'"""
+    tabla = model.__tablename__
+    if columna is None:
+        return tabla
+    return f'{tabla}|{columna}={valor}'
+
+def _claves_de_instancia(target, valores=None):
+    """Claves afectadas por una fila (total de la tabla más cada filtro mantenido)"""
+    model = type(target)
+    claves = [_clave(model)]
+    for columna in FILTROS_MANTENIDOS.get(model, ()):
+        valor = (valores or {}).get(columna, getattr(target, columna))
+        if valor is not None:
+            claves.append(_clave(model, columna, valor))
+    return claves
+
+def _ajustar(connection, claves, delta):
+    """Suma `delta` a los contadores ya sembrados (los demás se calculan al primer uso)"""
+    if not claves:
+        return
+    tabla = ContadorFilas.__table__
+    connection.execute(
+        tabla.update()
+        .where(tabla.c.clave.in_(claves))
+        .values(cantidad=tabla.c.cantidad + delta)
+    )
+
+def _after_insert(mapper, connection, target):
+    _ajustar(connection, _claves_de_instancia(target), 1)
+
+def _after_delete(mapper, connection, target):
+    _ajustar(connection, _claves_de_instancia(target), -1)
+
+def _after_update(mapper, connection, target):
+    state = inspect(target)
+    for columna in FILTROS_MANTENIDOS.get(type(target), ()):
+        history = state.attrs[columna].history
+        if not history.has_changes():
+            continue
+        anterior = history.deleted[0] if history.deleted else None
+        nuevo = getattr(target, columna)
+        if anterior is not None:
+            _ajustar(connection, [_clave(type(target), columna, anterior)], -1)
+        if nuevo is not None:
+            _ajustar(connection, [_clave(type(target), columna, nuevo)], 1)
+
+def _registrar_eventos():
+    for model, columnas in FILTROS_MANTENIDOS.items():
+        event.listen(model, 'after_insert', _after_insert)
+        event.listen(model, 'after_delete', _after_delete)
+        if columnas:
+            event.listen(model, 'after_update', _after_update)
+            # Cargar el valor previo aunque la instancia esté expirada
+            for columna in columnas:
+                event.listen(getattr(model, columna), 'set',
+                             lambda target, value, oldvalue, initiator: value,
+                             active_history=True, retval=True)
+
+_registrar_eventos()
+
+def estimate_rows(model):
+    """
+    Estimación barata de la cantidad de filas de una tabla.
+    
+    Args:
+        model: Modelo de SQLAlchemy
+    
+    Returns:
+        int: Filas estimadas, o None si el motor no ofrece una estimación
+    """
+    tabla = model.__tablename__
+    dialecto = db.engine.dialect.name
+    try:
+        if dialecto == 'sqlite':
+            # Sin borrados masivos, el rowid máximo aproxima la cantidad de filas
+            return db.session.execute(text(f'SELECT MAX(rowid) FROM "{tabla}"')).scalar() or 0
+        if dialecto == 'postgresql':
+            valor = db.session.execute(
+                text('SELECT reltuples::bigint FROM pg_class WHERE relname = :tabla'),
+                {'tabla': tabla}
+            ).scalar()
+            return int(valor) if valor is not None and valor >= 0 else None
+    except Exception as e:
+        logger.warning(f"No se pudo estimar el tamaño de {tabla}: {str(e)}")
+    return None
+
+def _sembrar(model, clave, columna=None, valor=None):
+    """
+    Calcula y guarda un contador nuevo con un INSERT ... SELECT COUNT(*) en una
+    transacción propia: contar y sembrar es una sola sentencia, así que no queda una
+    alta confirmada entre el conteo y la siembra sin contar (los eventos solo ajustan
+    contadores ya sembrados).
+    
+    Returns:
+        int: Cantidad guardada en el contador (la de otro proceso si lo sembró primero)
+    """
+    tabla = ContadorFilas.__table__
+    conteo = select(literal(clave), func.count()).select_from(model.__table__)
+    if columna is not None:
+        conteo = conteo.where(model.__table__.c[columna] == valor)
+    leer = select(tabla.c.cantidad).where(tabla.c.clave == clave)
+    try:
+        with db.engine.begin() as connection:
+            connection.execute(tabla.insert().from_select(['clave', 'cantidad'], conteo))
+            return connection.execute(leer).scalar()
+    except IntegrityError:
+        # Otro proceso lo sembró primero
+        with db.engine.connect() as connection:
+            return connection.execute(leer).scalar()
+
+def get_count(model, columna=None, valor=None):
+    """
+    Obtiene la cantidad de filas de una tabla, total o filtrada por una columna mantenida.
+    
+    Args:
+        model: Modelo de SQLAlchemy (uno de FILTROS_MANTENIDOS)
+        columna: Columna de filtro (opcional, debe estar en FILTROS_MANTENIDOS)
+        valor: Valor del filtro
+    
+    Returns:
+        int: Cantidad de filas (estimada si la tabla supera COUNT_APPROX_THRESHOLD y
+             todavía no tiene contador)
+    """
+    if columna is not None and columna not in FILTROS_MANTENIDOS.get(model, ()):
+        raise ValueError(f'El filtro {columna} no se mantiene para {model.__tablename__}')
+    
+    clave = _clave(model, columna, valor)
+    cantidad = db.session.execute(
+        select(ContadorFilas.cantidad).where(ContadorFilas.clave == clave)
+    ).scalar()
+    if cantidad is not None:
+        return cantidad
+    
+    if columna is None:
+        umbral = current_app.config.get('COUNT_APPROX_THRESHOLD', 200000)
+        estimado = estimate_rows(model)
+        if estimado is not None and estimado > umbral:
+            return estimado
+    
+    return _sembrar(model, clave, columna, valor)
+
+def count_query(model, query, filtros=None):
+    """
+    Cuenta las filas de un listado: usa el contador mantenido si la consulta no tiene
+    más filtros que uno mantenido, o un único COUNT(*) en caso contrario.
+    
+    Args:
+        model: Modelo listado
+        query: Consulta filtrada del listado
+        filtros: dict {columna: valor} con los filtros aplicados a la consulta
+    
+    Returns:
+        int: Cantidad de filas del listado
+    """
+    filtros = {columna: valor for columna, valor in (filtros or {}).items() if valor}
+    if not filtros:
+        return get_count(model)
+    if len(filtros) == 1:
+        columna, valor = next(iter(filtros.items()))
+        if columna in FILTROS_MANTENIDOS.get(model, ()):
+            return get_count(model, columna, valor)
+    return query.order_by(None).count()
+
+def paginate_counted(model, query, page, per_page, filtros=None):
+    """
+    Pagina una consulta sin el COUNT(*) de paginate(), usando count_query para el total.
+    
+    Args:
+        model: Modelo listado
+        query: Consulta filtrada (y ordenada) del listado
+        page: Número de página
+        per_page: Elementos por página
+        filtros: dict {columna: valor} con los filtros aplicados (ver count_query)
+    
+    Returns:
+        Pagination: Página de Flask-SQLAlchemy con el total asignado
+    """
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagination.total = count_query(model, query, filtros)
+    return pagination
+
+def adjust_counts(model, filas, signo=1):
+    """
+    Ajusta los contadores ya sembrados después de altas (o bajas) masivas que no
+    disparan los eventos del ORM, sin recalcular la tabla completa. No hace commit.
+    
+    Args:
+        model: Modelo afectado (uno de FILTROS_MANTENIDOS)
+        filas: dicts con los valores de las columnas mantenidas de cada fila
+        signo: 1 para altas, -1 para bajas
+    """
+    conteos = {}
+    for fila in filas:
+        for clave in [_clave(model)] + [
+            _clave(model, columna, fila.get(columna))
+            for columna in FILTROS_MANTENIDOS.get(model, ()) if fila.get(columna) is not None
+        ]:
+            conteos[clave] = conteos.get(clave, 0) + 1
+    
+    # Un UPDATE por cada cantidad distinta (normalmente unas pocas)
+    por_cantidad = {}
+    for clave, cantidad in conteos.items():
+        por_cantidad.setdefault(cantidad, []).append(clave)
+    connection = db.session.connection()
+    for cantidad, claves in por_cantidad.items():
+        _ajustar(connection, claves, signo * cantidad)
+
+def rebuild_counts(models=None):
+    """
+    Recalcula los contadores de forma exacta (después de cargas masivas que no
+    disparan eventos del ORM, o para reemplazar estimaciones).
+    
+    Args:
+        models: Modelos a recalcular (todos los mantenidos si es None)
+    
+    Returns:
+        int: Cantidad de contadores guardados
+    """
+    modelos = models or list(FILTROS_MANTENIDOS)
+    contadores = {}
+    for model in modelos:
+        columnas = FILTROS_MANTENIDOS[model]
+        contadores[_clave(model)] = db.session.query(func.count()).select_from(model).scalar()
+        for columna in columnas:
+            columna_attr = getattr(model, columna)
+            rows = db.session.query(columna_attr, func.count()).filter(
+                columna_attr.isnot(None)
+            ).group_by(columna_attr).all()
+            for valor, cantidad in rows:
+                contadores[_clave(model, columna, valor)] = cantidad
+    
+    tabla = ContadorFilas.__table__
+    if models is None:
+        db.session.execute(tabla.delete())
+    else:
+        for model in modelos:
+            db.session.execute(tabla.delete().where(
+                (tabla.c.clave == model.__tablename__) | tabla.c.clave.like(f'{model.__tablename__}|%')
+            ))
+    if contadores:
+        db.session.execute(
+            tabla.insert(),
+            [{'clave': clave, 'cantidad': cantidad} for clave, cantidad in contadores.items()]
+        )
+    return len(contadores)
@@ -0,0 +1,104 @@
+"""
+Soporte para DataTables en modo servidor (serverSide: true)
+Interpreta los parámetros draw/start/length/order/search que envía DataTables y
+resuelve el filtrado, el orden y la paginación en SQL, devolviendo solo la página visible.
+"""
+from sqlalchemy import or_
+
+# Tamaño máximo de página: no se admite "Todos" (-1)
+MAX_LENGTH = 100
+
+class DataTablesRequest:
+    """Parámetros de una solicitud de DataTables"""
+    
+    def __init__(self, draw, start, length, search, order):
+        self.draw = draw
+        self.start = start
+        self.length = length
+        self.search = search
+        self.order = order  # Lista de (nombre_de_columna, 'asc' | 'desc')
+
+def parse_datatables_args(args, default_length=25):
+    """
+    Lee los parámetros de DataTables de la query string.
+    
+    Args:
+        args: request.args
+        default_length: Tamaño de página si no se indica uno válido
+    
+    Returns:
+        DataTablesRequest: Parámetros normalizados (length acotado a MAX_LENGTH)
+    """
+    length = args.get('length', default_length, type=int)
+    if not length:
+        length = default_length
+    elif length < 0 or length > MAX_LENGTH:
+        length = MAX_LENGTH
+    
+    order = []
+    indice = 0
+    while f'order[{indice}][column]' in args:
+        columna = args.get(f'order[{indice}][column]', type=int)
+        direccion = 'desc' if args.get(f'order[{indice}][dir]') == 'desc' else 'asc'
+        nombre = args.get(f'columns[{columna}][data]') if columna is not None else None
+        if nombre:
+            order.append((nombre, direccion))
+        indice += 1
+    
+    return DataTablesRequest(
+        draw=args.get('draw', 0, type=int) or 0,
+        start=max(args.get('start', 0, type=int) or 0, 0),
+        length=length,
+        search=(args.get('search[value]') or '').strip(),
+        order=order
+    )
+
+def datatables_response(dt_request, query, serializar, columnas_orden=None, columnas_busqueda=None,
+                        filtro_busqueda=None, orden_defecto=None, total=None):
+    """
+    Aplica búsqueda, orden y paginación a una consulta y arma la respuesta de DataTables.
+    
+    Args:
+        dt_request: DataTablesRequest de parse_datatables_args
+        query: Consulta base (con los filtros fijos de la vista, sin ORDER BY)
+        serializar: Función fila -> dict para la respuesta JSON
+        columnas_orden: dict {nombre_de_columna: expresión SQL} con las columnas ordenables
+        columnas_busqueda: Expresiones SQL sobre las que se aplica la búsqueda global (ILIKE)
+        filtro_busqueda: Función (query, término) -> query que reemplaza a columnas_busqueda
+                         (por ejemplo, el índice de búsqueda de productos)
+        orden_defecto: Lista de expresiones ORDER BY de desempate (y orden sin parámetros)
+        total: Total sin búsqueda ya conocido (por ejemplo, de count_service)
+    
+    Returns:
+        dict: {'draw', 'recordsTotal', 'recordsFiltered', 'data'}
+    """
+    columnas_orden = columnas_orden or {}
+    if total is None:
+        total = query.order_by(None).count()
+    
+    filtrada = query
+    filtrados = total
+    if dt_request.search and filtro_busqueda is not None:
+        filtrada = filtro_busqueda(query, dt_request.search)
+        filtrados = filtrada.order_by(None).count()
+    elif dt_request.search and columnas_busqueda:
+        patron = f'%{dt_request.search}%'
+        filtrada = query.filter(or_(*[columna.ilike(patron) for columna in columnas_busqueda]))
+        filtrados = filtrada.order_by(None).count()
+    
+    orden = []
+    for nombre, direccion in dt_request.order:
+        expresion = columnas_orden.get(nombre)
+        if expresion is not None:
+            orden.append(expresion.desc() if direccion == 'desc' else expresion.asc())
+    orden.extend(orden_defecto or [])
+    if orden:
+        filtrada = filtrada.order_by(*orden)
+    
+    filas = filtrada.limit(dt_request.length).offset(dt_request.start).all()
+    return {
+        'draw': dt_request.draw,
+        'recordsTotal': total,
+        'recordsFiltered': filtrados,
+        'data': [serializar(fila) for fila in filas]
+    }
@@ -0,0 +1,215 @@
+"""
+Cache en disco de los archivos descargados de Google Drive (fichas de seguridad)
+Cada archivo se guarda una sola vez por ID de Drive, junto con sus metadatos, en un
+directorio compartido por todos los workers. Las vistas siguientes se sirven desde el
+disco con send_file (ETag, If-None-Match y Range) sin volver a llamar al Apps Script.
+La descarga llega en bloques y se escribe directamente al disco, por lo que la memoria
+por pedido queda acotada al tamaño de un bloque.
+
+El tamaño total está acotado: al superar el máximo se eliminan los archivos usados
+hace más tiempo (la fecha de modificación marca el último uso). Los archivos de Drive
+no cambian de contenido (una ficha reemplazada se sube con un ID nuevo), por lo que la
+vigencia solo sirve para dejar de servir archivos borrados en Drive.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from app.integrations.google_drive import DownloadTooLargeError
+
+logger = logging.getLogger(__name__)
+
+class DriveFileCache:
+    """Cache LRU en disco de archivos de Drive, acotado por tamaño total"""
+    
+    def __init__(self, directorio=None, max_bytes=500 * 1024 * 1024, ttl=7 * 24 * 3600, enabled=True):
+        self._lock = threading.Lock()
+        self._descargas = {}     # file_id -> Lock (una sola descarga por archivo y proceso)
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evicciones = 0
+    
+    def configure(self, directorio=None, max_bytes=None, ttl=None, enabled=None):
+        """Ajusta los parámetros del cache (se llama desde create_app)"""
+        with self._lock:
+            if directorio is not None:
+                self.directorio = directorio
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            if ttl is not None:
+                self.ttl = ttl
+            if enabled is not None:
+                self.enabled = enabled
+    
+    def _rutas(self, file_id):
+        # El ID forma parte del nombre del archivo: no debe poder salir del directorio
+        if not file_id or not file_id.replace('-', '').replace('_', '').isalnum():
+            raise ValueError(f'ID de archivo no válido: {file_id!r}')
+        base = os.path.join(self.directorio, file_id)
+        return base + '.bin', base + '.json'
+    
+    def _leer(self, file_id):
+        """Entrada vigente del cache, o None"""
+        ruta, ruta_meta = self._rutas(file_id)
+        try:
+            with open(ruta_meta, encoding='utf-8') as archivo:
+                meta = json.load(archivo)
+            modificado = os.path.getmtime(ruta)
+        except (OSError, ValueError):
+            return None
+        if time.time() - meta.get('guardado', 0) > self.ttl:
+            return None
+        # Marcar como usado recientemente (orden LRU entre procesos)
+        if time.time() - modificado > 60:
+            try:
+                os.utime(ruta)
+            except OSError:
+                pass
+        return dict(meta, ruta=ruta)
+    
+    def _escribir(self, file_id, chunks, meta):
+        """
+        Guarda el archivo a medida que llegan los bloques (con su hash como ETag) y
+        después sus metadatos, con reemplazos atómicos.
+        """
+        os.makedirs(self.directorio, exist_ok=True)
+        ruta, ruta_meta = self._rutas(file_id)
+        resumen = hashlib.sha256()
+        tamano = 0
+        descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as archivo:
+                for bloque in chunks:
+                    archivo.write(bloque)
+                    resumen.update(bloque)
+                    tamano += len(bloque)
+            meta = dict(meta, file_size=tamano, etag=resumen.hexdigest()[:32])
+            os.replace(temporal, ruta)
+            descriptor, temporal = tempfile.mkstemp(dir=self.directorio, suffix='.tmp')
+            with os.fdopen(descriptor, 'wb') as archivo:
+                archivo.write(json.dumps(meta).encode('utf-8'))
+            os.replace(temporal, ruta_meta)
+        except BaseException:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+            raise
+        return dict(meta, ruta=ruta)
+    
+    def _recortar(self, conservar=None):
+        """
+        Elimina los archivos usados hace más tiempo hasta quedar bajo el máximo
+        (salvo `conservar`, el archivo que se está por servir).
+        """
+        archivos, total = [], 0
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.bin'):
+                    estado = entrada.stat()
+                    total += estado.st_size
+                    if entrada.path != conservar:
+                        archivos.append((estado.st_mtime, estado.st_size, entrada.path))
+        archivos.sort()
+        for _, tamano, ruta in archivos:
+            if total <= self.max_bytes:
+                break
+            for eliminar in (ruta, ruta[:-len('.bin')] + '.json'):
+                try:
+                    os.remove(eliminar)
+                except OSError:
+                    pass
+            total -= tamano
+            self.evicciones += 1
+    
+    def get(self, file_id, opener):
+        """
+        Obtiene un archivo desde el cache o lo descarga con `opener`.
+        
+        Args:
+            file_id: ID del archivo en Drive (ya validado como alfanumérico)
+            opener: Función opener(file_id) con el formato de
+                GoogleDriveIntegration.open_file_stream
+        
+        Returns:
+            dict: {'file_name', 'mime_type', 'file_size'} más 'ruta' y 'etag' si el
+                  archivo quedó en el cache o 'chunks' (iterador de bytes) si se debe
+                  transmitir directamente; o {'error', 'status'} si no se pudo obtener
+        """
+        if self.enabled and self.directorio:
+            entrada = self._leer(file_id)
+            if entrada is not None:
+                self.hits += 1
+                return entrada
+            with self._lock:
+                candado = self._descargas.setdefault(file_id, threading.Lock())
+            with candado:
+                # Otro hilo pudo haberlo descargado mientras esperábamos
+                entrada = self._leer(file_id)
+                if entrada is not None:
+                    self.hits += 1
+                    return entrada
+                try:
+                    return self._descargar(file_id, opener)
+                finally:
+                    with self._lock:
+                        self._descargas.pop(file_id, None)
+        return self._descargar(file_id, opener)
+    
+    def _descargar(self, file_id, opener):
+        self.misses += 1
+        archivo = opener(file_id)
+        if not archivo or 'error' in archivo:
+            return archivo or {'error': 'Archivo no encontrado', 'status': 404}
+        
+        meta = {
+            'file_name': archivo.get('file_name') or f'archivo_{file_id}',
+            'mime_type': archivo.get('mime_type'),
+            'file_size': archivo.get('file_size'),
+            'guardado': time.time(),
+        }
+        tamano = archivo.get('file_size')
+        if not (self.enabled and self.directorio) or (tamano is not None and int(tamano) > self.max_bytes):
+            # Sin cache (o más grande que el cache completo): se transmite sin guardar
+            return dict(meta, chunks=archivo['chunks'])
+        try:
+            entrada = self._escribir(file_id, archivo['chunks'], meta)
+        except DownloadTooLargeError as e:
+            return {'error': str(e), 'status': 413}
+        except OSError as e:
+            # Sin disco disponible se transmite directamente con una descarga nueva
+            logger.warning(f"Could not cache Drive file {file_id}: {str(e)}")
+            archivo = opener(file_id)
+            return archivo if 'error' in archivo else dict(meta, chunks=archivo['chunks'])
+        self._recortar(conservar=entrada['ruta'])
+        return entrada
+    
+    def stats(self):
+        """Estadísticas del cache para diagnóstico"""
+        archivos, total = 0, 0
+        if self.directorio and os.path.isdir(self.directorio):
+            with os.scandir(self.directorio) as entradas:
+                for entrada in entradas:
+                    if entrada.name.endswith('.bin'):
+                        archivos += 1
+                        total += entrada.stat().st_size
+        consultas = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'archivos': archivos,
+            'bytes': total,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evicciones': self.evicciones,
+            'hit_ratio': round(self.hits / consultas, 3) if consultas else None,
+        }
+
+# Instancia compartida por el proceso
+drive_file_cache = DriveFileCache()
@@ -0,0 +1,293 @@
+"""
+Bandeja de salida de correos (restablecimiento de contraseña, altas de usuarios)
+Las rutas guardan el correo en la tabla `correo_saliente` y responden sin esperar al
+Apps Script. Un único trabajo en segundo plano toma los correos pendientes en lotes y
+envía cada lote en una sola llamada (acción sendEmails); los correos que fallan se
+reintentan con espera exponencial y, agotados los intentos, quedan en estado error.
+
+Un correo idéntico (mismo destinatario, asunto, cuerpo y remitente) a otro que todavía
+está en cola, o que se envió hace poco, no se vuelve a encolar: evita duplicados por
+formularios enviados dos veces.
+
+Con la cuota diaria de MailApp agotada no se toman más lotes: los correos pendientes se
+postergan (sin contar un intento) hasta la próxima prueba, EMAIL_QUOTA_RETRY_SECONDS
+después.
+
+Los envíos no son idempotentes: si Gmail envió un lote pero la respuesta se perdió, el
+reintento puede repetir esos correos (nunca perderlos).
+"""
+import hashlib
+import logging
+import uuid
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import select, update, delete, func, or_
+
+from app.models.models import db, CorreoSaliente, Trabajo
+from app.integrations.google_drive import drive_integration
+from app.utils.job_service import job_handler, enqueue, job_runner, RetryJob, ESTADO_PENDIENTE
+
+logger = logging.getLogger(__name__)
+
+TIPO_ENVIO_CORREOS = 'enviar_correos'
+
+CORREO_PENDIENTE = 'pendiente'
+CORREO_ENVIANDO = 'enviando'
+CORREO_ENVIADO = 'enviado'
+CORREO_ERROR = 'error'
+
+# Un lote tomado hace más de este tiempo sin resultado pertenece a un worker interrumpido
+ENVIO_ABANDONADO_SEGUNDOS = 600
+
+def email_fingerprint(destinatario, asunto, cuerpo_html, nombre_remitente=None, responder_a=None):
+    """Huella del contenido de un correo, para descartar duplicados"""
+    partes = [destinatario.strip().lower(), asunto, cuerpo_html, nombre_remitente or '', responder_a or '']
+    return hashlib.sha256('\x1f'.join(partes).encode('utf-8')).hexdigest()
+
+def queue_email(destinatario, asunto, cuerpo_html, nombre_remitente=None, responder_a=None):
+    """
+    Encola un correo y programa su envío. Confirma la sesión actual.
+    
+    Args:
+        destinatario: Dirección de correo del destinatario
+        asunto: Asunto del correo
+        cuerpo_html: Contenido HTML
+        nombre_remitente: Nombre mostrado como remitente
+        responder_a: Dirección de respuesta
+    
+    Returns:
+        CorreoSaliente: Correo encolado, o el correo idéntico ya encolado o enviado
+            recientemente
+    """
+    huella = email_fingerprint(destinatario, asunto, cuerpo_html, nombre_remitente, responder_a)
+    ventana = datetime.utcnow() - timedelta(seconds=current_app.config.get('EMAIL_DEDUP_SECONDS', 600))
+    duplicado = CorreoSaliente.query.filter(
+        CorreoSaliente.huella == huella,
+        or_(CorreoSaliente.estado.in_([CORREO_PENDIENTE, CORREO_ENVIANDO]),
+            (CorreoSaliente.estado == CORREO_ENVIADO) & (CorreoSaliente.fechaEnvio >= ventana))
+    ).first()
+    if duplicado is not None:
+        logger.info(f"Duplicate email to {destinatario} discarded (already queued as {duplicado.idCorreo})")
+        return duplicado
+    
+    correo = CorreoSaliente(
+        destinatario=destinatario,
+        asunto=asunto,
+        cuerpoHtml=cuerpo_html,
+        nombreRemitente=nombre_remitente,
+        responderA=responder_a,
+        huella=huella,
+        estado=CORREO_PENDIENTE,
+    )
+    db.session.add(correo)
+    db.session.commit()
+    _programar_envio()
+    return correo
+
+def _programar_envio():
+    """
+    Asegura que haya un trabajo de envío en cola y disponible ya. Si el trabajo en cola
+    está esperando el reintento de otros correos, se adelanta.
+    """
+    tabla = Trabajo.__table__
+    with db.engine.begin() as connection:
+        adelantados = connection.execute(
+            update(tabla)
+            .where(tabla.c.tipo == TIPO_ENVIO_CORREOS, tabla.c.estado == ESTADO_PENDIENTE)
+            .values(disponibleDesde=None, mensaje='En cola')
+        ).rowcount
+    if adelantados:
+        job_runner.notify()
+    else:
+        enqueue(TIPO_ENVIO_CORREOS)
+
+def _liberar_abandonados():
+    """Devuelve a la cola los correos tomados por un worker que se interrumpió"""
+    tabla = CorreoSaliente.__table__
+    limite = datetime.utcnow() - timedelta(seconds=ENVIO_ABANDONADO_SEGUNDOS)
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(tabla)
+            .where(tabla.c.estado == CORREO_ENVIANDO, tabla.c.fechaIntento < limite)
+            .values(estado=CORREO_PENDIENTE, lote=None)
+        ).rowcount
+
+def _tomar_lote(tamano):
+    """
+    Toma hasta `tamano` correos disponibles marcándolos con un lote propio (la
+    actualización condicional evita que dos workers tomen el mismo correo).
+    
+    Returns:
+        list: Filas de los correos tomados
+    """
+    tabla = CorreoSaliente.__table__
+    lote = uuid.uuid4().hex
+    ahora = datetime.utcnow()
+    with db.engine.begin() as connection:
+        candidatos = connection.execute(
+            select(tabla.c.idCorreo)
+            .where(tabla.c.estado == CORREO_PENDIENTE,
+                   or_(tabla.c.disponibleDesde.is_(None), tabla.c.disponibleDesde <= ahora))
+            .order_by(tabla.c.idCorreo)
+            .limit(tamano)
+        ).scalars().all()
+        if not candidatos:
+            return []
+        connection.execute(
+            update(tabla)
+            .where(tabla.c.idCorreo.in_(candidatos), tabla.c.estado == CORREO_PENDIENTE)
+            .values(estado=CORREO_ENVIANDO, lote=lote, fechaIntento=ahora)
+        )
+    with db.engine.connect() as connection:
+        return connection.execute(
+            select(tabla).where(tabla.c.lote == lote).order_by(tabla.c.idCorreo)
+        ).all()
+
+def _enviar(filas):
+    """
+    Envía un lote en una sola llamada al Apps Script (o de a uno si el script
+    desplegado no tiene la acción sendEmails).
+    
+    Returns:
+        tuple: ({idCorreo: mensaje de error, o None si se envió}, conjunto de los
+            idCorreo que no se enviaron por tener la cuota diaria agotada)
+    """
+    mensajes = [{
+        'id': fila.idCorreo,
+        'to': fila.destinatario,
+        'subject': fila.asunto,
+        'htmlBody': fila.cuerpoHtml,
+        'senderName': fila.nombreRemitente,
+        'replyTo': fila.responderA,
+    } for fila in filas]
+    respuesta = drive_integration.send_emails(mensajes)
+    
+    if respuesta.get('error') == 'Unknown action':
+        logger.warning("Apps Script does not support sendEmails yet, sending one by one")
+        return {
+            fila.idCorreo: None if drive_integration.send_email(
+                to=fila.destinatario, subject=fila.asunto, html_body=fila.cuerpoHtml,
+                sender_name=fila.nombreRemitente, reply_to=fila.responderA
+            ) else 'No se pudo enviar el correo'
+            for fila in filas
+        }, set()
+    if 'error' in respuesta:
+        return {fila.idCorreo: respuesta['error'] for fila in filas}, set()
+    resultados = respuesta['results']
+    return ({fila.idCorreo: resultados.get(fila.idCorreo, 'Sin respuesta del Apps Script') for fila in filas},
+            set(respuesta.get('quota_exceeded', ())))
+
+def _registrar_resultados(filas, resultados, max_intentos, espera_base, sin_cuota=(), fin_espera_cuota=None):
+    """
+    Marca los correos enviados y reprograma (o da por fallidos) los demás. Los correos
+    de `sin_cuota` vuelven a la cola hasta `fin_espera_cuota` sin contar el intento.
+    
+    Returns:
+        tuple: (enviados, fallidos)
+    """
+    tabla = CorreoSaliente.__table__
+    ahora = datetime.utcnow()
+    enviados = [fila.idCorreo for fila in filas if resultados[fila.idCorreo] is None]
+    fallidos = 0
+    with db.engine.begin() as connection:
+        if enviados:
+            connection.execute(
+                update(tabla).where(tabla.c.idCorreo.in_(enviados))
+                .values(estado=CORREO_ENVIADO, fechaEnvio=ahora, lote=None, ultimoError=None)
+            )
+        for fila in filas:
+            error = resultados[fila.idCorreo]
+            if error is None:
+                continue
+            if fila.idCorreo in sin_cuota:
+                connection.execute(
+                    update(tabla).where(tabla.c.idCorreo == fila.idCorreo)
+                    .values(estado=CORREO_PENDIENTE, lote=None, ultimoError=str(error)[:255],
+                            disponibleDesde=fin_espera_cuota)
+                )
+                continue
+            intentos = fila.intentos + 1
+            valores = {'intentos': intentos, 'lote': None, 'ultimoError': str(error)[:255]}
+            if intentos >= max_intentos:
+                fallidos += 1
+                logger.error(f"Email {fila.idCorreo} to {fila.destinatario} failed after {intentos} attempts: {error}")
+                valores.update(estado=CORREO_ERROR)
+            else:
+                valores.update(estado=CORREO_PENDIENTE,
+                               disponibleDesde=ahora + timedelta(seconds=espera_base * (2 ** fila.intentos)))
+            connection.execute(update(tabla).where(tabla.c.idCorreo == fila.idCorreo).values(**valores))
+    return len(enviados), fallidos
+
+def _postergar_pendientes(hasta):
+    """Posterga hasta `hasta` los correos pendientes disponibles antes (cuota agotada)"""
+    tabla = CorreoSaliente.__table__
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(tabla)
+            .where(tabla.c.estado == CORREO_PENDIENTE,
+                   or_(tabla.c.disponibleDesde.is_(None), tabla.c.disponibleDesde < hasta))
+            .values(disponibleDesde=hasta)
+        ).rowcount
+
+def _proximo_reintento():
+    """Momento del próximo correo pendiente en espera, o None si no quedan pendientes"""
+    return db.session.query(func.min(CorreoSaliente.disponibleDesde)).filter(
+        CorreoSaliente.estado == CORREO_PENDIENTE
+    ).scalar()
+
+@job_handler(TIPO_ENVIO_CORREOS)
+def _enviar_correos(contexto):
+    """Envía los correos pendientes en lotes hasta vaciar la cola"""
+    config = contexto.app.config
+    tamano = max(1, config.get('EMAIL_BATCH_SIZE', 20))
+    max_intentos = config.get('EMAIL_MAX_ATTEMPTS', 5)
+    espera_base = config.get('EMAIL_RETRY_SECONDS', 60)
+    espera_cuota = config.get('EMAIL_QUOTA_RETRY_SECONDS', 3600)
+    
+    _liberar_abandonados()
+    enviados = fallidos = 0
+    while True:
+        filas = _tomar_lote(tamano)
+        if not filas:
+            break
+        resultados, sin_cuota = _enviar(filas)
+        fin_espera_cuota = datetime.utcnow() + timedelta(seconds=espera_cuota)
+        resultado = _registrar_resultados(filas, resultados, max_intentos, espera_base,
+                                          sin_cuota, fin_espera_cuota)
+        enviados += resultado[0]
+        fallidos += resultado[1]
+        contexto.progress(mensaje=f'{enviados} correos enviados')
+        if sin_cuota:
+            # Seguir enviando sólo gastaría intentos: se prueba de nuevo más tarde
+            postergados = _postergar_pendientes(fin_espera_cuota)
+            logger.warning(f"Daily email quota exhausted: {len(sin_cuota) + postergados} emails "
+                           f"postponed for {espera_cuota}s")
+            break
+    
+    # Los correos que esperan un reintento los envía este mismo trabajo más tarde (salvo
+    # que ya se haya encolado otro mientras este se ejecutaba)
+    proximo = _proximo_reintento()
+    otro_en_cola = db.session.query(Trabajo.idTrabajo).filter(
+        Trabajo.tipo == TIPO_ENVIO_CORREOS, Trabajo.estado == ESTADO_PENDIENTE
+    ).first() is not None
+    db.session.rollback()
+    if proximo is not None and not otro_en_cola:
+        retraso = max(1, int((proximo - datetime.utcnow()).total_seconds()) + 1)
+        raise RetryJob(f'{enviados} correos enviados; quedan correos en espera de reintento', retraso=retraso)
+    return {'enviados': enviados, 'fallidos': fallidos, 'mensaje': f'{enviados} correos enviados'}
+
+def purge_sent_emails(dias):
+    """
+    Elimina los correos enviados o fallidos hace más de `dias` días.
+    
+    Returns:
+        int: Cantidad de correos eliminados
+    """
+    tabla = CorreoSaliente.__table__
+    limite = datetime.utcnow() - timedelta(days=dias)
+    with db.engine.begin() as connection:
+        return connection.execute(
+            delete(tabla).where(tabla.c.estado.in_([CORREO_ENVIADO, CORREO_ERROR]),
+                                func.coalesce(tabla.c.fechaEnvio, tabla.c.fechaIntento) < limite)
+        ).rowcount
@@ -1,6 +1,7 @@
 import os
 from flask import current_app, url_for
-from app.integrations.google_drive import drive_integration
+from app.models.models import db
+from app.utils.email_outbox import queue_email
 
 class EmailService:
     """Service for sending emails"""
@@ -8,7 +9,8 @@ class EmailService:
     @staticmethod
     def send_email(to, subject, html_content):
         """
-        Send an email using Google Apps Script integration
+        Queue an email for background delivery through the Google Apps Script
+        integration (see app.utils.email_outbox)
         
         Args:
             to (str): Recipient email address
@@ -16,31 +18,28 @@ class EmailService:
             html_content (str): HTML content of the email
             
         Returns:
-            bool: True if email was sent successfully, False otherwise
+            bool: True if email was queued successfully, False otherwise
         """
         try:
             # Get email configuration from environment or config
             sender_name = os.environ.get('MAIL_SENDER_NAME') or current_app.config.get('MAIL_SENDER_NAME', 'Sistema de Gestión de Laboratorios CRUB')
             reply_to = os.environ.get('MAIL_REPLY_TO') or current_app.config.get('MAIL_REPLY_TO', 'no-reply@crub.edu.ar')
             
-            # Use Google Drive integration to send email
-            success = drive_integration.send_email(
-                to=to,
-                subject=subject,
-                html_body=html_content,
-                sender_name=sender_name,
-                reply_to=reply_to
+            # Queue the email; the outbox job sends it in batches and retries on failure
+            correo = queue_email(
+                destinatario=to,
+                asunto=subject,
+                cuerpo_html=html_content,
+                nombre_remitente=sender_name,
+                responder_a=reply_to
             )
             
-            if success:
-                current_app.logger.info(f"Email sent to {to} with subject '{subject}'")
-            else:
-                current_app.logger.error(f"Failed to send email to {to}")
-                
-            return success
+            current_app.logger.info(f"Email to {to} with subject '{subject}' queued as {correo.idCorreo}")
+            return True
             
         except Exception as e:
-            current_app.logger.error(f"Failed to send email: {str(e)}")
+            db.session.rollback()
+            current_app.logger.error(f"Failed to queue email: {str(e)}")
             return False
     
     @staticmethod
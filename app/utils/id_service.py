@@ -0,0 +1,143 @@
+"""
+Generación de IDs secuenciales para las tablas con clave de texto
+Cada secuencia guarda en la tabla `secuencia` el último número entregado. Los procesos
+reservan bloques de números con una actualización atómica en una transacción propia y
+los entregan desde memoria, de modo que un alta normal no consulta la base. Los IDs
+nuevos tienen ancho fijo ('MOV' + 7 dígitos), así que son secuenciales entre sí también
+como texto. No quedan al final del índice si hay IDs anteriores de 6 dígitos: como texto,
+'MOV1000042' se ordena entre 'MOV100004' y 'MOV100005'.
+
+Los números de un bloque que no se llegan a usar (reinicio del proceso, transacción
+revertida) se pierden: la secuencia puede tener huecos, nunca repetidos.
+"""
+import os
+import threading
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.models.models import db, Secuencia, Movimiento
+
+class IdAllocator:
+    """Entrega IDs con prefijo y ancho fijo a partir de una secuencia de la base"""
+    
+    def __init__(self, nombre, columna, prefijo, digitos, inicio, bloque=20):
+        """
+        Args:
+            nombre: Nombre de la secuencia en la tabla `secuencia`
+            columna: Columna de la clave (para sembrar la secuencia sobre los IDs existentes)
+            prefijo: Prefijo de los IDs
+            digitos: Cantidad de dígitos del número (ancho fijo)
+            inicio: Primer número de la secuencia
+            bloque: Números reservados por cada viaje a la base
+        """
+        self.nombre = nombre
+        self.columna = columna
+        self.prefijo = prefijo
+        self.digitos = digitos
+        self.inicio = inicio
+        self.bloque = bloque
+        self._lock = threading.Lock()
+        self._siguiente = 0
+        self._fin = 0          # el bloque actual llega hasta _fin - 1
+        self._pid = None
+    
+    def configure(self, bloque=None):
+        """Ajusta el tamaño de bloque (se llama desde create_app)"""
+        with self._lock:
+            if bloque is not None:
+                self.bloque = max(1, bloque)
+            self._siguiente = self._fin = 0
+    
+    def reset(self):
+        """Descarta el bloque en memoria (por ejemplo, al cambiar de base en las pruebas)"""
+        with self._lock:
+            self._siguiente = self._fin = 0
+    
+    def _formatear(self, numero):
+        if numero >= 10 ** self.digitos:
+            raise RuntimeError(f'La secuencia {self.nombre} superó el máximo de {self.digitos} dígitos')
+        return f'{self.prefijo}{numero:0{self.digitos}d}'
+    
+    def _valor_inicial(self, connection):
+        """Último número ya usado con este formato (o el anterior al inicio)"""
+        maximo = connection.execute(
+            select(func.max(self.columna)).where(
+                self.columna.like(f'{self.prefijo}%'),
+                func.length(self.columna) == len(self.prefijo) + self.digitos
+            )
+        ).scalar()
+        numero = self.inicio - 1
+        if maximo and maximo[len(self.prefijo):].isdigit():
+            numero = max(numero, int(maximo[len(self.prefijo):]))
+        return numero
+    
+    def _reservar(self, cantidad):
+        """
+        Avanza la secuencia en `cantidad` en una transacción propia (confirmada aunque
+        la transacción del llamador se revierta).
+        
+        Returns:
+            int: Primer número del rango reservado
+        """
+        tabla = Secuencia.__table__
+        for _ in range(2):
+            with db.engine.begin() as connection:
+                actualizadas = connection.execute(
+                    update(tabla).where(tabla.c.nombre == self.nombre)
+                    .values(valor=tabla.c.valor + cantidad)
+                ).rowcount
+                if actualizadas:
+                    valor = connection.execute(
+                        select(tabla.c.valor).where(tabla.c.nombre == self.nombre)
+                    ).scalar()
+                    return valor - cantidad + 1
+            # Primer uso: sembrar por encima de los IDs existentes
+            try:
+                with db.engine.begin() as connection:
+                    connection.execute(tabla.insert().values(
+                        nombre=self.nombre, valor=self._valor_inicial(connection)
+                    ))
+            except IntegrityError:
+                # Otro proceso la sembró primero
+                pass
+        raise RuntimeError(f'No se pudo inicializar la secuencia {self.nombre}')
+    
+    def next_id(self):
+        """
+        Devuelve el próximo ID, reservando un bloque nuevo cuando se agota el actual.
+        
+        Returns:
+            str: ID con prefijo y ancho fijo (ej. 'MOV1000042')
+        """
+        with self._lock:
+            # Un proceso hijo (fork) no puede reutilizar el bloque del padre
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._siguiente = self._fin = 0
+            if self._siguiente >= self._fin:
+                self._siguiente = self._reservar(self.bloque)
+                self._fin = self._siguiente + self.bloque
+            numero = self._siguiente
+            self._siguiente += 1
+        return self._formatear(numero)
+    
+    def reserve(self, cantidad):
+        """
+        Reserva un rango contiguo de IDs para una inserción masiva.
+        
+        Args:
+            cantidad: Cantidad de IDs
+        
+        Returns:
+            list: IDs consecutivos, en orden
+        """
+        if cantidad <= 0:
+            return []
+        primero = self._reservar(cantidad)
+        return [self._formatear(numero) for numero in range(primero, primero + cantidad)]
+
+# Los IDs aleatorios anteriores tienen 6 dígitos; los secuenciales empiezan en 7 dígitos
+# para no chocar con ellos (aunque como texto se intercalan entre ellos) y caben en
+# Movimiento.idMovimiento (String(10))
+movement_ids = IdAllocator('movimiento', Movimiento.idMovimiento, 'MOV', 7, inicio=1000000)
@@ -0,0 +1,136 @@
+"""
+Lectura de planillas para las importaciones masivas (productos y movimientos)
+Los archivos se leen en streaming (openpyxl en modo read_only o csv) y se entregan en
+lotes de DataFrames con las columnas pedidas, indexados por la posición de la fila.
+"""
+import csv
+import io
+from itertools import islice
+
+import pandas as pd
+
+class ArchivoImportacionError(ValueError):
+    """El archivo no se puede importar (formato, encabezados o contenido vacío)"""
+
+def text_column(serie):
+    """Columna como texto sin espacios en los extremos; vacíos y NaN quedan como <NA>"""
+    texto = serie.astype('string').str.strip()
+    return texto.mask(texto == '')
+
+def map_labels(texto, mapa):
+    """Aplica un mapa de etiquetas, aceptando también el valor de BD en minúsculas"""
+    directo = texto.map(mapa)
+    minusculas = texto.str.lower()
+    return directo.fillna(minusculas.where(minusculas.isin(list(mapa.values()))))
+
+def first_errors(validaciones, indice):
+    """
+    Primer error de cada fila.
+    
+    Args:
+        validaciones: Lista de (condición, mensaje) en el orden en que se reportan; el
+            mensaje es un texto fijo o una Series con un texto por fila
+        indice: Índice de las filas validadas
+    
+    Returns:
+        Series: Mensaje de error por fila (<NA> en las filas válidas)
+    """
+    error = pd.Series(pd.NA, index=indice, dtype='string')
+    for condicion, mensaje in validaciones:
+        nuevos = condicion.fillna(False).astype(bool) & error.isna()
+        if nuevos.any():
+            error[nuevos] = mensaje[nuevos] if isinstance(mensaje, pd.Series) else mensaje
+    return error
+
+def _columnas(encabezado, requeridas, opcionales):
+    """Posición de cada columna en la fila de encabezado (None para opcionales ausentes)"""
+    nombres = [str(valor).strip() if valor is not None else '' for valor in encabezado]
+    faltantes = [columna for columna in requeridas if columna not in nombres]
+    if faltantes:
+        raise ArchivoImportacionError(
+            f'El archivo no contiene todas las columnas requeridas. Faltan: {", ".join(faltantes)}'
+        )
+    return [nombres.index(columna) if columna in nombres else None
+            for columna in list(requeridas) + list(opcionales)]
+
+def _filas_xlsx(stream):
+    """Filas de la primera hoja de un .xlsx sin cargar el libro completo"""
+    from openpyxl import load_workbook
+    
+    libro = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from libro.worksheets[0].iter_rows(values_only=True)
+    finally:
+        libro.close()
+
+def _filas_csv(stream):
+    """Filas de un CSV en UTF-8 (con o sin BOM), separado por coma o punto y coma"""
+    texto = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    muestra = texto.read(4096)
+    texto.seek(0)
+    try:
+        dialecto = csv.Sniffer().sniff(muestra, delimiters=',;')
+    except csv.Error:
+        dialecto = csv.excel
+    try:
+        yield from csv.reader(texto, dialecto)
+    finally:
+        texto.detach()
+
+def _filas_xls(stream):
+    """Filas de un .xls (formato binario antiguo, sin lectura en streaming)"""
+    data_frame = pd.read_excel(stream, header=None, dtype=object)
+    for fila in data_frame.itertuples(index=False):
+        yield tuple(None if pd.isna(valor) else valor for valor in fila)
+
+def iter_file_chunks(stream, nombre_archivo, columnas, tamano_lote, opcionales=()):
+    """
+    Lee una planilla en lotes de DataFrames.
+    
+    Args:
+        stream: Archivo binario posicionable (por ejemplo, el stream de la subida)
+        nombre_archivo: Nombre original, para elegir el lector por extensión
+        columnas: Encabezados requeridos
+        tamano_lote: Filas por lote
+        opcionales: Encabezados que pueden faltar (la columna queda vacía)
+    
+    Yields:
+        DataFrame: Lote con las columnas pedidas, indexado por la posición de la fila
+            (0 = primera fila después del encabezado)
+    
+    Raises:
+        ArchivoImportacionError: Extensión no soportada o encabezados faltantes
+    """
+    extension = nombre_archivo.rsplit('.', 1)[-1].lower() if '.' in nombre_archivo else ''
+    lectores = {'xlsx': _filas_xlsx, 'csv': _filas_csv, 'xls': _filas_xls}
+    if extension not in lectores:
+        raise ArchivoImportacionError('El archivo debe ser un Excel (.xlsx o .xls) o un CSV')
+    
+    nombres = list(columnas) + list(opcionales)
+    filas = lectores[extension](stream)
+    try:
+        encabezado = next(filas, None)
+        if encabezado is None:
+            raise ArchivoImportacionError('El archivo no contiene datos para procesar')
+        posiciones = _columnas(encabezado, columnas, opcionales)
+        ancho = max(posicion for posicion in posiciones if posicion is not None) + 1
+        
+        inicio = 0
+        while True:
+            lote = list(islice(filas, tamano_lote))
+            if not lote:
+                break
+            valores, indices = [], []
+            for desplazamiento, fila in enumerate(lote):
+                fila = tuple(fila) + (None,) * (ancho - len(fila))
+                seleccion = [fila[posicion] if posicion is not None else None for posicion in posiciones]
+                # Las filas totalmente vacías (frecuentes al final de las hojas) se ignoran
+                if any(valor is not None and str(valor).strip() != '' for valor in seleccion):
+                    valores.append(seleccion)
+                    indices.append(inicio + desplazamiento)
+            if valores:
+                yield pd.DataFrame(valores, columns=nombres, index=indices, dtype=object)
+            inicio += len(lote)
+    finally:
+        # Cerrar el lector (y el libro) mientras el stream sigue abierto
+        filas.close()
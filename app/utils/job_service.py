@@ -0,0 +1,424 @@
+"""
+Trabajos en segundo plano (importaciones, reportes, sincronizaciones)
+Las rutas encolan un trabajo en la tabla `trabajo` y responden de inmediato; un pool de
+hilos (iniciado con la aplicación web o con `flask jobs worker`) los toma de a uno,
+con una actualización condicional que evita que dos workers ejecuten el mismo trabajo.
+El estado y el progreso se guardan en conexiones propias para no mezclarse con las
+transacciones del manejador.
+
+Un manejador puede pedir que se reintente más tarde lanzando RetryJob (por ejemplo, ante
+una falla transitoria de un servicio externo); el trabajo vuelve a la cola y no se toma
+antes del momento indicado.
+
+Mientras un trabajo está en proceso, el worker renueva su latido (`ultimoLatido`) cada
+JOBS_HEARTBEAT_SECONDS y con cada avance informado. Un trabajo sin latido por más de
+JOBS_STALE_SECONDS se considera abandonado, aunque otros procesos sigan vivos.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import uuid
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, or_, func, literal
+
+from app.models.models import db, Trabajo
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PENDIENTE = 'pendiente'
+ESTADO_EN_PROCESO = 'en_proceso'
+ESTADO_COMPLETADO = 'completado'
+ESTADO_ERROR = 'error'
+
+class RetryJob(Exception):
+    """Lanzada por un manejador para reencolar el trabajo dentro de `retraso` segundos"""
+    
+    def __init__(self, mensaje, retraso):
+        super().__init__(mensaje)
+        self.retraso = retraso
+
+# tipo -> función(contexto) que devuelve un dict serializable con el resultado
+_MANEJADORES = {}
+# Tipos que no se pueden repetir desde el principio tras una interrupción
+_NO_REANUDABLES = set()
+# Trabajos que se ejecutan en este proceso (el runner renueva su latido)
+_EN_EJECUCION = set()
+_en_ejecucion_lock = threading.Lock()
+
+def job_handler(tipo, reanudable=True):
+    """
+    Registra la función que ejecuta los trabajos de un tipo.
+    
+    Args:
+        tipo: Nombre del tipo de trabajo
+        reanudable: False si repetir el trabajo después de una interrupción puede
+            duplicar datos ya confirmados (por ejemplo, una importación que confirma por
+            lotes); esos trabajos abandonados quedan en error en lugar de volver a la cola
+    """
+    def decorador(funcion):
+        _MANEJADORES[tipo] = funcion
+        if reanudable:
+            _NO_REANUDABLES.discard(tipo)
+        else:
+            _NO_REANUDABLES.add(tipo)
+        return funcion
+    return decorador
+
+def _jobs_dir(app):
+    return app.config.get('JOBS_DIR') or os.path.join(app.instance_path, 'jobs')
+
+def job_directory(app, id_trabajo, crear=True):
+    """Directorio de archivos (entrada y resultado) de un trabajo"""
+    ruta = os.path.join(_jobs_dir(app), id_trabajo)
+    if crear:
+        os.makedirs(ruta, exist_ok=True)
+    return ruta
+
+def _actualizar(id_trabajo, **valores):
+    """Actualiza el trabajo en una transacción propia, independiente de db.session"""
+    tabla = Trabajo.__table__
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(tabla).where(tabla.c.idTrabajo == id_trabajo).values(**valores)
+        ).rowcount
+
+# ENCOLADO Y CONSULTA
+
+def new_job_id():
+    """ID para un trabajo nuevo (permite guardar archivos de entrada antes de encolar)"""
+    return uuid.uuid4().hex
+
+def enqueue(tipo, parametros=None, usuario_id=None, id_trabajo=None, referencia=None):
+    """
+    Encola un trabajo.
+    
+    Args:
+        tipo: Tipo registrado con @job_handler
+        parametros: dict serializable a JSON
+        usuario_id: Usuario que lo solicitó (solo él y los administradores lo ven)
+        id_trabajo: ID obtenido con new_job_id(), si ya se guardaron archivos
+        referencia: Entidad a la que pertenece el trabajo (ej. 'movimiento:MOV1000042')
+    
+    Returns:
+        Trabajo: Trabajo creado en estado pendiente
+    """
+    if tipo not in _MANEJADORES:
+        raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+    trabajo = Trabajo(
+        idTrabajo=id_trabajo or new_job_id(),
+        tipo=tipo,
+        estado=ESTADO_PENDIENTE,
+        parametros=json.dumps(parametros or {}),
+        idUsuario=usuario_id,
+        mensaje='En cola',
+        referencia=referencia,
+    )
+    db.session.add(trabajo)
+    db.session.commit()
+    job_runner.notify()
+    return trabajo
+
+def retry_job(id_trabajo):
+    """
+    Vuelve a encolar un trabajo terminado con error (reintento manual).
+    
+    Returns:
+        bool: True si el trabajo estaba en error y se reencoló
+    """
+    tabla = Trabajo.__table__
+    with db.engine.begin() as connection:
+        reencolado = connection.execute(
+            update(tabla)
+            .where(tabla.c.idTrabajo == id_trabajo, tabla.c.estado == ESTADO_ERROR)
+            .values(estado=ESTADO_PENDIENTE, disponibleDesde=None, fechaFin=None,
+                    progreso=None, mensaje='En cola (reintento manual)')
+        ).rowcount
+    if reencolado:
+        job_runner.notify()
+    return bool(reencolado)
+
+def jobs_by_reference(referencias):
+    """
+    Último trabajo de cada referencia.
+    
+    Args:
+        referencias: Lista de referencias (ej. ['movimiento:MOV1000042', ...])
+    
+    Returns:
+        dict: {referencia: Trabajo} solo para las referencias con trabajos
+    """
+    resultado = {}
+    referencias = list(set(referencias))
+    for inicio in range(0, len(referencias), 900):
+        trabajos = Trabajo.query.filter(
+            Trabajo.referencia.in_(referencias[inicio:inicio + 900])
+        ).order_by(Trabajo.fechaCreacion).all()
+        for trabajo in trabajos:
+            resultado[trabajo.referencia] = trabajo
+    return resultado
+
+def job_status(trabajo):
+    """Representación JSON del estado de un trabajo"""
+    return {
+        'id': trabajo.idTrabajo,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'resultado': json.loads(trabajo.resultado) if trabajo.resultado else None,
+        'tiene_archivo': bool(trabajo.archivoResultado),
+        'fecha_creacion': trabajo.fechaCreacion.isoformat() if trabajo.fechaCreacion else None,
+        'fecha_inicio': trabajo.fechaInicio.isoformat() if trabajo.fechaInicio else None,
+        'fecha_fin': trabajo.fechaFin.isoformat() if trabajo.fechaFin else None,
+        'intentos': trabajo.intentos or 0,
+        'terminado': trabajo.estado in (ESTADO_COMPLETADO, ESTADO_ERROR),
+    }
+
+# EJECUCIÓN
+
+class JobContext:
+    """Lo que recibe un manejador: parámetros, directorio de archivos y reporte de progreso"""
+    
+    def __init__(self, app, trabajo):
+        self.app = app
+        self.id = trabajo.idTrabajo
+        self.params = json.loads(trabajo.parametros) if trabajo.parametros else {}
+        self.usuario_id = trabajo.idUsuario
+        self.intentos = trabajo.intentos or 0   # intentos fallidos anteriores
+        self.directorio = job_directory(app, trabajo.idTrabajo)
+        self.archivo_resultado = None
+    
+    def progress(self, progreso=None, mensaje=None):
+        """Guarda el avance (0-100, o None si no se puede estimar) y un mensaje breve"""
+        valores = {'progreso': progreso, 'ultimoLatido': datetime.utcnow()}
+        if mensaje is not None:
+            valores['mensaje'] = mensaje[:255]
+        _actualizar(self.id, **valores)
+    
+    def output_path(self, nombre):
+        """Ruta del archivo descargable del trabajo (uno por trabajo)"""
+        self.archivo_resultado = nombre
+        return os.path.join(self.directorio, nombre)
+
+def claim_next():
+    """
+    Toma el trabajo pendiente más antiguo.
+    
+    Returns:
+        str: ID del trabajo tomado, o None si no hay pendientes
+    """
+    for _ in range(5):
+        candidato = db.session.query(Trabajo.idTrabajo).filter(
+            Trabajo.estado == ESTADO_PENDIENTE,
+            or_(Trabajo.disponibleDesde.is_(None), Trabajo.disponibleDesde <= datetime.utcnow())
+        ).order_by(Trabajo.fechaCreacion).limit(1).scalar()
+        db.session.rollback()
+        if candidato is None:
+            return None
+        tabla = Trabajo.__table__
+        ahora = datetime.utcnow()
+        with db.engine.begin() as connection:
+            tomado = connection.execute(
+                update(tabla)
+                .where(tabla.c.idTrabajo == candidato, tabla.c.estado == ESTADO_PENDIENTE)
+                .values(estado=ESTADO_EN_PROCESO, fechaInicio=ahora, ultimoLatido=ahora, mensaje='Procesando...')
+            ).rowcount
+        if tomado:
+            return candidato
+    return None
+
+def run_job(app, id_trabajo):
+    """
+    Ejecuta un trabajo ya tomado y guarda su resultado o su error.
+    Debe llamarse dentro de un contexto de aplicación.
+    """
+    trabajo = db.session.get(Trabajo, id_trabajo)
+    tipo = trabajo.tipo
+    contexto = JobContext(app, trabajo)
+    db.session.rollback()
+    
+    with _en_ejecucion_lock:
+        _EN_EJECUCION.add(id_trabajo)
+    try:
+        manejador = _MANEJADORES.get(tipo)
+        if manejador is None:
+            raise ValueError(f'Tipo de trabajo desconocido: {tipo}')
+        resultado = manejador(contexto) or {}
+    except RetryJob as e:
+        db.session.rollback()
+        logger.warning(f"Background job {id_trabajo} ({tipo}) will be retried in {e.retraso}s: {str(e)}")
+        _actualizar(id_trabajo, estado=ESTADO_PENDIENTE, intentos=contexto.intentos + 1,
+                    disponibleDesde=datetime.utcnow() + timedelta(seconds=e.retraso),
+                    mensaje=f'Reintento pendiente: {str(e)}'[:255])
+        return False
+    except Exception as e:
+        db.session.rollback()
+        logger.exception(f"Background job {id_trabajo} ({tipo}) failed")
+        _actualizar(id_trabajo, estado=ESTADO_ERROR, fechaFin=datetime.utcnow(),
+                    intentos=contexto.intentos + 1, mensaje=f'Error: {str(e)}'[:255])
+        return False
+    finally:
+        with _en_ejecucion_lock:
+            _EN_EJECUCION.discard(id_trabajo)
+    
+    mensaje = resultado.pop('mensaje', None) if isinstance(resultado, dict) else None
+    _actualizar(
+        id_trabajo,
+        estado=ESTADO_COMPLETADO,
+        progreso=100,
+        fechaFin=datetime.utcnow(),
+        mensaje=(mensaje or 'Completado')[:255],
+        resultado=json.dumps(resultado, default=str),
+        archivoResultado=contexto.archivo_resultado,
+    )
+    return True
+
+def heartbeat():
+    """
+    Renueva el latido de los trabajos que se ejecutan en este proceso.
+    
+    Returns:
+        int: Cantidad de trabajos actualizados
+    """
+    with _en_ejecucion_lock:
+        ids = list(_EN_EJECUCION)
+    if not ids:
+        return 0
+    tabla = Trabajo.__table__
+    with db.engine.begin() as connection:
+        return connection.execute(
+            update(tabla)
+            .where(tabla.c.idTrabajo.in_(ids), tabla.c.estado == ESTADO_EN_PROCESO)
+            .values(ultimoLatido=datetime.utcnow())
+        ).rowcount
+
+def requeue_stale(timeout_segundos):
+    """
+    Devuelve a la cola los trabajos en proceso abandonados: los que no renovaron su
+    latido en `timeout_segundos` (por ejemplo, por un reinicio del servidor a mitad de
+    la ejecución). Los de tipos no reanudables quedan en error, con el último progreso
+    informado, para revisarlos antes de reintentarlos.
+    
+    Returns:
+        int: Cantidad de trabajos reencolados
+    """
+    limite = datetime.utcnow() - timedelta(seconds=timeout_segundos)
+    tabla = Trabajo.__table__
+    abandonado = ((tabla.c.estado == ESTADO_EN_PROCESO)
+                  & (func.coalesce(tabla.c.ultimoLatido, tabla.c.fechaInicio) < limite))
+    no_reanudables = sorted(_NO_REANUDABLES)
+    with db.engine.begin() as connection:
+        fallidos = connection.execute(
+            update(tabla)
+            .where(abandonado, tabla.c.tipo.in_(no_reanudables))
+            .values(estado=ESTADO_ERROR, fechaFin=datetime.utcnow(),
+                    mensaje=func.substr(
+                        literal('Error: interrumpido; puede haber guardado datos parcialmente (')
+                        + func.coalesce(tabla.c.mensaje, '') + literal(')'), 1, 255))
+        ).rowcount
+        reencolados = connection.execute(
+            update(tabla)
+            .where(abandonado, tabla.c.tipo.not_in(no_reanudables))
+            .values(estado=ESTADO_PENDIENTE, mensaje='Reencolado tras una interrupción')
+        ).rowcount
+    if fallidos:
+        logger.warning(f"{fallidos} interrupted background jobs cannot be repeated safely and were marked as failed")
+    return reencolados
+
+def purge_jobs(app, dias):
+    """
+    Elimina los trabajos terminados hace más de `dias` días junto con sus archivos.
+    
+    Returns:
+        int: Cantidad de trabajos eliminados
+    """
+    limite = datetime.utcnow() - timedelta(days=dias)
+    viejos = Trabajo.query.filter(
+        Trabajo.estado.in_([ESTADO_COMPLETADO, ESTADO_ERROR]),
+        Trabajo.fechaFin < limite
+    ).all()
+    for trabajo in viejos:
+        shutil.rmtree(job_directory(app, trabajo.idTrabajo, crear=False), ignore_errors=True)
+        db.session.delete(trabajo)
+    db.session.commit()
+    return len(viejos)
+
+# POOL DE HILOS
+
+class JobRunner:
+    """Pool de hilos que ejecuta los trabajos pendientes"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._despertar = threading.Event()
+        self._detener = threading.Event()
+        self._hilos = []
+    
+    @property
+    def running(self):
+        return any(hilo.is_alive() for hilo in self._hilos)
+    
+    def start(self, app, hilos=2, intervalo=5.0, latido=60.0):
+        """
+        Inicia los hilos (una sola vez por proceso).
+        
+        Args:
+            app: Aplicación Flask
+            hilos: Cantidad de trabajos en paralelo
+            intervalo: Segundos entre consultas a la cola cuando no hay avisos
+            latido: Segundos entre renovaciones del latido de los trabajos en proceso
+        """
+        with self._lock:
+            if self.running:
+                return
+            self._detener.clear()
+            with app.app_context():
+                reencolados = requeue_stale(app.config.get('JOBS_STALE_SECONDS', 3600))
+            if reencolados:
+                logger.warning(f"Requeued {reencolados} interrupted background jobs")
+            self._hilos = [
+                threading.Thread(target=self._bucle, args=(app, intervalo),
+                                 name=f'job-worker-{i + 1}', daemon=True)
+                for i in range(hilos)
+            ]
+            self._hilos.append(threading.Thread(target=self._latir, args=(app, latido),
+                                                name='job-heartbeat', daemon=True))
+            for hilo in self._hilos:
+                hilo.start()
+    
+    def stop(self, timeout=None):
+        self._detener.set()
+        self._despertar.set()
+        for hilo in self._hilos:
+            hilo.join(timeout)
+    
+    def notify(self):
+        """Avisa a los hilos de este proceso que hay un trabajo nuevo"""
+        self._despertar.set()
+    
+    def _bucle(self, app, intervalo):
+        while not self._detener.is_set():
+            try:
+                with app.app_context():
+                    id_trabajo = claim_next()
+                    if id_trabajo:
+                        run_job(app, id_trabajo)
+                        continue
+            except Exception:
+                logger.exception("Background job worker loop failed")
+            self._despertar.wait(intervalo)
+            self._despertar.clear()
+    
+    def _latir(self, app, latido):
+        while not self._detener.wait(latido):
+            try:
+                with app.app_context():
+                    heartbeat()
+            except Exception:
+                logger.exception("Background job heartbeat failed")
+
+# Instancia compartida por el proceso
+job_runner = JobRunner()
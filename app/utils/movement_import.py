@@ -0,0 +1,391 @@
+"""
+Importación masiva de movimientos históricos desde Excel o CSV
+Pensada para cargar saldos de apertura y consumos pasados: los productos, laboratorios y
+proveedores se validan contra los catálogos cacheados y el stock resultante se verifica
+con una suma acumulada vectorizada por (laboratorio, producto) en orden cronológico,
+intercalando los movimientos que ya están en la base.
+
+Las filas válidas se insertan en bloque, en orden cronológico, con un commit por lote.
+Como las inserciones masivas no disparan los eventos del ORM, cada lote actualiza
+explícitamente el ledger de stock, los checkpoints, el cache de stock y los contadores.
+"""
+import logging
+import os
+import re
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+
+from app.models.models import db, Movimiento
+from app.utils.catalog_cache import catalog_cache
+from app.utils.count_service import adjust_counts
+from app.utils.id_service import movement_ids
+from app.utils.import_reader import iter_file_chunks, text_column, map_labels, first_errors
+from app.utils.job_service import job_handler
+from app.utils.product_import import LOTE_CONSULTA, LOTE_IMPORTACION, MAX_ERRORES_REPORTADOS
+from app.utils.stock_service import (TIPOS_INGRESO, compute_stock_from_movements,
+                                     apply_bulk_movements)
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_REQUERIDAS = ['Fecha', 'Tipo de Movimiento', 'ID Producto', 'ID Laboratorio',
+                       'Cantidad', 'Unidad de Medida']
+COLUMNAS_OPCIONALES = ['Laboratorio Destino', 'Tipo de Documento', 'Número de Documento',
+                       'CUIT Proveedor', 'Fecha Factura']
+
+TIPO_MOVIMIENTO_MAP = {
+    'Ingreso': 'ingreso',
+    'Compra': 'compra',
+    'Uso': 'uso',
+    'Transferencia': 'transferencia'
+}
+
+TIPO_DOCUMENTO_MAP = {
+    'Factura': 'factura',
+    'Remito': 'remito'
+}
+
+# Formatos aceptados en las columnas de fecha (las celdas de fecha de Excel llegan como
+# datetime y se leen con el primero)
+FORMATOS_FECHA = ['%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+                  '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y']
+
+# Margen para los errores de redondeo de las cantidades decimales
+TOLERANCIA_STOCK = 1e-9
+
+def _fechas(serie):
+    """Convierte una columna a fechas probando los FORMATOS_FECHA; lo inválido queda NaT"""
+    texto = text_column(serie)
+    fechas = pd.Series(pd.NaT, index=serie.index, dtype='datetime64[us]')
+    for formato in FORMATOS_FECHA:
+        faltan = fechas.isna() & texto.notna()
+        if not faltan.any():
+            break
+        fechas[faltan] = pd.to_datetime(texto[faltan], format=formato, errors='coerce')
+    return fechas
+
+def _solo_digitos(texto):
+    digitos = texto.str.replace(r'\D', '', regex=True)
+    return digitos.mask(digitos == '')
+
+def validate_movements_frame(data_frame):
+    """
+    Valida y mapea el contenido de un archivo de movimientos contra los catálogos.
+    
+    Args:
+        data_frame: DataFrame con las COLUMNAS_REQUERIDAS y COLUMNAS_OPCIONALES; el índice
+            es la posición de la fila de datos en el archivo
+    
+    Returns:
+        tuple: (DataFrame de movimientos válidos con columnas del modelo más 'fila',
+                DataFrame de errores con columnas 'fila' y 'error')
+    """
+    fecha_texto = text_column(data_frame['Fecha'])
+    fecha = _fechas(data_frame['Fecha'])
+    tipo_texto = text_column(data_frame['Tipo de Movimiento'])
+    tipo = map_labels(tipo_texto, TIPO_MOVIMIENTO_MAP)
+    id_producto = text_column(data_frame['ID Producto'])
+    id_laboratorio = text_column(data_frame['ID Laboratorio'])
+    cantidad_texto = text_column(data_frame['Cantidad'])
+    cantidad = pd.to_numeric(cantidad_texto.str.replace(',', '.', regex=False), errors='coerce')
+    unidad = text_column(data_frame['Unidad de Medida'])
+    destino = text_column(data_frame['Laboratorio Destino'])
+    tipo_documento_texto = text_column(data_frame['Tipo de Documento'])
+    tipo_documento = map_labels(tipo_documento_texto, TIPO_DOCUMENTO_MAP)
+    numero_documento = text_column(data_frame['Número de Documento'])
+    cuit_texto = text_column(data_frame['CUIT Proveedor'])
+    cuit = _solo_digitos(cuit_texto)
+    fecha_factura_texto = text_column(data_frame['Fecha Factura'])
+    fecha_factura = _fechas(data_frame['Fecha Factura'])
+    
+    productos = {producto.idProducto for producto in catalog_cache.get('productos')}
+    laboratorios = {lab.idLaboratorio for lab in catalog_cache.get('laboratorios')}
+    proveedores = {re.sub(r'\D', '', proveedor.cuit): proveedor.idProveedor
+                   for proveedor in catalog_cache.get('proveedores') if proveedor.cuit}
+    id_proveedor = cuit.map(proveedores)
+    
+    es_compra = (tipo == 'compra').fillna(False).astype(bool)
+    es_transferencia = (tipo == 'transferencia').fillna(False).astype(bool)
+    
+    # (condición de error, mensaje) en el orden en que se reportan
+    tipos_permitidos = ', '.join(TIPO_MOVIMIENTO_MAP)
+    documentos_permitidos = ', '.join(TIPO_DOCUMENTO_MAP)
+    validaciones = [
+        (fecha_texto.isna(), 'Fecha está vacía'),
+        (fecha.isna(), "Fecha '" + fecha_texto + "' no válida (use AAAA-MM-DD o DD/MM/AAAA)"),
+        (fecha > datetime.now(), 'La fecha no puede ser posterior a hoy'),
+        (tipo_texto.isna(), 'Tipo de movimiento está vacío'),
+        (tipo.isna(),
+         "Tipo de movimiento '" + tipo_texto + f"' no válido. Valores permitidos: {tipos_permitidos}"),
+        (id_producto.isna(), 'ID Producto está vacío'),
+        (~id_producto.isin(productos), "Producto '" + id_producto + "' no existe"),
+        (id_laboratorio.isna(), 'ID Laboratorio está vacío'),
+        (~id_laboratorio.isin(laboratorios), "Laboratorio '" + id_laboratorio + "' no existe"),
+        (cantidad_texto.isna(), 'Cantidad está vacía'),
+        (cantidad.isna(), "Cantidad '" + cantidad_texto + "' no es un número"),
+        (cantidad <= 0, 'La cantidad debe ser mayor a cero'),
+        (unidad.isna(), 'Unidad de medida está vacía'),
+        (unidad.str.len() > 10, 'Unidad de medida es demasiado larga (máximo 10 caracteres)'),
+        (es_transferencia & destino.isna(), 'Una transferencia requiere Laboratorio Destino'),
+        (es_transferencia & ~destino.isin(laboratorios),
+         "Laboratorio destino '" + destino + "' no existe"),
+        (es_transferencia & (destino == id_laboratorio),
+         'El laboratorio destino debe ser distinto del laboratorio de origen'),
+        (es_compra & tipo_documento_texto.notna() & tipo_documento.isna(),
+         "Tipo de documento '" + tipo_documento_texto + f"' no válido. Valores permitidos: {documentos_permitidos}"),
+        (es_compra & (numero_documento.str.len() > 50),
+         'Número de documento es demasiado largo (máximo 50 caracteres)'),
+        (es_compra & cuit.notna() & id_proveedor.isna(),
+         "CUIT '" + cuit_texto + "' no corresponde a ningún proveedor"),
+        (es_compra & fecha_factura_texto.notna() & fecha_factura.isna(),
+         "Fecha de factura '" + fecha_factura_texto + "' no válida (use AAAA-MM-DD o DD/MM/AAAA)"),
+    ]
+    error = first_errors(validaciones, data_frame.index)
+    
+    filas = pd.Series(data_frame.index + 2, index=data_frame.index)  # fila 1 = encabezado
+    con_error = error.notna()
+    errores = pd.DataFrame({'fila': filas[con_error], 'error': error[con_error]})
+    
+    validos = pd.DataFrame({
+        'fila': filas,
+        'timestamp': fecha,
+        'tipoMovimiento': tipo,
+        'cantidad': cantidad.astype(float),
+        'unidadMedida': unidad,
+        'idProducto': id_producto,
+        'idLaboratorio': id_laboratorio,
+        'laboratorioDestino': destino.where(es_transferencia),
+        'tipoDocumento': tipo_documento.where(es_compra),
+        'numeroDocumento': numero_documento.where(es_compra),
+        'idProveedor': id_proveedor.where(es_compra),
+        'fechaFactura': fecha_factura.where(es_compra),
+    })[~con_error]
+    validos['delta'] = np.where(validos['tipoMovimiento'].isin(TIPOS_INGRESO),
+                                validos['cantidad'], -validos['cantidad'])
+    return validos, errores
+
+# VALIDACIÓN DE SALDOS
+
+def _efectos_en_stock(validos):
+    """
+    Efecto de cada fila sobre el stock: el movimiento propio más, en las
+    transferencias, el ingreso en el laboratorio destino.
+    """
+    columnas = ['fila', 'idLaboratorio', 'idProducto', 'timestamp', 'delta']
+    transferencias = validos[validos['tipoMovimiento'] == 'transferencia']
+    destino = pd.DataFrame({
+        'fila': transferencias['fila'],
+        'idLaboratorio': transferencias['laboratorioDestino'],
+        'idProducto': transferencias['idProducto'],
+        'timestamp': transferencias['timestamp'],
+        'delta': transferencias['cantidad'],
+    })
+    return pd.concat([validos[columnas], destino], ignore_index=True)
+
+def _movimientos_existentes(productos, desde):
+    """Movimientos de la base desde `desde` para los productos indicados"""
+    filas = []
+    for inicio in range(0, len(productos), LOTE_CONSULTA):
+        lote = productos[inicio:inicio + LOTE_CONSULTA]
+        filas.extend(db.session.execute(
+            select(Movimiento.idLaboratorio, Movimiento.idProducto, Movimiento.timestamp, Movimiento.delta)
+            .where(Movimiento.timestamp >= desde, Movimiento.idProducto.in_(lote))
+        ).all())
+    return pd.DataFrame(filas, columns=['idLaboratorio', 'idProducto', 'timestamp', 'delta'])
+
+def find_negative_balances(efectos):
+    """
+    Detecta las filas que dejarían un saldo negativo en algún momento del historial.
+    
+    Los movimientos del archivo se intercalan con los de la base por fecha (a igual fecha,
+    primero los ingresos) y se calcula el saldo con una suma acumulada por
+    (laboratorio, producto) partiendo del saldo previo a la primera fecha del archivo.
+    Para cada clave que queda en negativo se descarta el último egreso del archivo
+    anterior a ese punto y se recalcula, hasta que ningún saldo quede por debajo del
+    que ya tenía la base (un historial existente negativo no bloquea la importación).
+    
+    Args:
+        efectos: DataFrame con 'fila', 'idLaboratorio', 'idProducto', 'timestamp' y
+            'delta'; las transferencias aportan dos efectos con la misma fila
+    
+    Returns:
+        dict: {fila: (idLaboratorio, idProducto)} de las filas rechazadas
+    """
+    if efectos.empty:
+        return {}
+    desde = efectos['timestamp'].min()
+    productos = sorted(efectos['idProducto'].unique())
+    saldos = compute_stock_from_movements(
+        product_ids=productos if len(productos) <= LOTE_CONSULTA else None,
+        antes_de=desde
+    )
+    existentes = _movimientos_existentes(productos, desde).assign(fila=-1)
+    
+    movimientos = pd.concat([existentes, efectos], ignore_index=True)
+    movimientos['timestamp'] = pd.to_datetime(movimientos['timestamp'])
+    movimientos = movimientos.sort_values(
+        ['idLaboratorio', 'idProducto', 'timestamp', 'delta'],
+        ascending=[True, True, True, False], kind='stable'
+    ).reset_index(drop=True)
+    
+    claves = pd.MultiIndex.from_frame(movimientos[['idLaboratorio', 'idProducto']])
+    inicial = pd.Series(saldos, dtype=float).reindex(claves).fillna(0.0).to_numpy() if saldos \
+        else np.zeros(len(movimientos))
+    grupo = movimientos.groupby(['idLaboratorio', 'idProducto'], sort=False).ngroup().to_numpy()
+    fila = movimientos['fila'].to_numpy()
+    delta = movimientos['delta'].to_numpy(dtype=float)
+    es_nuevo = fila >= 0
+    posicion = np.arange(len(movimientos))
+    
+    def _saldo(efectivo):
+        return inicial + pd.Series(efectivo).groupby(grupo).cumsum().to_numpy()
+    
+    # Saldo que ya tenía la base en cada punto: el piso que no se puede mejorar
+    piso = np.minimum(_saldo(np.where(es_nuevo, 0.0, delta)), 0.0) - TOLERANCIA_STOCK
+    
+    activo = np.ones(len(movimientos), dtype=bool)
+    rechazadas = {}
+    while True:
+        faltante = _saldo(np.where(activo, delta, 0.0)) < piso
+        if not faltante.any():
+            break
+        primera_falta = pd.Series(posicion[faltante]).groupby(grupo[faltante]).first().to_numpy()
+        ultimo_egreso = pd.Series(
+            np.where(es_nuevo & activo & (delta < 0), posicion, np.nan)
+        ).groupby(grupo).ffill().to_numpy()
+        culpables = ultimo_egreso[primera_falta]
+        culpables = culpables[~np.isnan(culpables)].astype(int)
+        if not len(culpables):
+            break
+        for indice in culpables:
+            rechazadas[int(fila[indice])] = (movimientos.at[indice, 'idLaboratorio'],
+                                             movimientos.at[indice, 'idProducto'])
+        # Descartar la fila completa (en una transferencia, también el ingreso en destino)
+        activo &= ~np.isin(fila, list(rechazadas))
+    return rechazadas
+
+# INSERCIÓN POR LOTES
+
+def _registros(lote):
+    """Filas de Movimiento a insertar para un lote (con el ingreso de cada transferencia)"""
+    limpio = lote.drop(columns=['fila']).astype(object).where(lote.notna(), None)
+    registros = []
+    for movimiento in limpio.to_dict('records'):
+        movimiento['timestamp'] = pd.Timestamp(movimiento['timestamp']).to_pydatetime()
+        if movimiento['fechaFactura'] is not None:
+            movimiento['fechaFactura'] = pd.Timestamp(movimiento['fechaFactura']).date()
+        if movimiento['idProveedor'] is not None:
+            movimiento['idProveedor'] = int(movimiento['idProveedor'])
+        registros.append(movimiento)
+        if movimiento['tipoMovimiento'] == 'transferencia':
+            # Igual que el alta manual: ingreso en destino que referencia al origen
+            registros.append(dict(
+                movimiento,
+                tipoMovimiento='ingreso',
+                delta=movimiento['cantidad'],
+                idLaboratorio=movimiento['laboratorioDestino'],
+                tipoDocumento='transferencia',
+                laboratorioDestino=movimiento['idLaboratorio'],
+            ))
+    # Rango contiguo de la secuencia: los IDs del lote quedan juntos en el índice de la clave
+    for registro, id_movimiento in zip(registros, movement_ids.reserve(len(registros))):
+        registro['idMovimiento'] = id_movimiento
+    return registros
+
+def import_movements_stream(stream, nombre_archivo, tamano_lote=LOTE_IMPORTACION, al_procesar_lote=None):
+    """
+    Importa un archivo de movimientos: valida todo el archivo (catálogos y saldos) y
+    luego inserta las filas válidas en orden cronológico, con un commit por lote.
+    
+    Si un lote falla al guardarse se revierte y la importación se detiene: los lotes
+    siguientes se validaron contando con él y podrían dejar saldos negativos.
+    
+    Args:
+        stream: Archivo binario posicionable
+        nombre_archivo: Nombre original del archivo (.xlsx, .xls o .csv)
+        tamano_lote: Filas del archivo por lote
+        al_procesar_lote: Función opcional que recibe el resultado acumulado tras cada lote
+    
+    Returns:
+        dict: {'creados', 'movimientos', 'saltados', 'errores', 'total_errores', 'lotes',
+               'lotes_fallidos'}; 'creados' cuenta filas del archivo y 'movimientos' los
+               registros insertados (una transferencia genera dos)
+    
+    Raises:
+        ArchivoImportacionError: El archivo no se puede leer como archivo de movimientos
+    """
+    resultado = {'creados': 0, 'movimientos': 0, 'saltados': 0, 'errores': [],
+                 'total_errores': 0, 'lotes': 0, 'lotes_fallidos': 0}
+    
+    lotes = list(iter_file_chunks(stream, nombre_archivo, COLUMNAS_REQUERIDAS, tamano_lote,
+                                  opcionales=COLUMNAS_OPCIONALES))
+    if not lotes:
+        return resultado
+    
+    validos, errores = validate_movements_frame(pd.concat(lotes))
+    sin_stock = find_negative_balances(_efectos_en_stock(validos))
+    mensajes = {fila: error for fila, error in zip(errores['fila'], errores['error'])}
+    for fila, (lab_id, product_id) in sin_stock.items():
+        mensajes[fila] = f'Stock insuficiente: el saldo de {product_id} en {lab_id} quedaría negativo'
+    
+    validos = validos[~validos['fila'].isin(list(sin_stock))].sort_values(['timestamp', 'fila'])
+    resultado['saltados'] = len(mensajes)
+    
+    for inicio in range(0, len(validos), tamano_lote):
+        lote = validos.iloc[inicio:inicio + tamano_lote]
+        resultado['lotes'] += 1
+        try:
+            registros = _registros(lote)
+            db.session.bulk_insert_mappings(Movimiento, registros)
+            apply_bulk_movements(registros)
+            adjust_counts(Movimiento, registros)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error saving movements import batch {resultado['lotes']}: {str(e)}")
+            resultado['lotes_fallidos'] += 1
+            pendientes = validos['fila'].iloc[inicio:]
+            resultado['saltados'] += len(pendientes)
+            mensajes[int(lote['fila'].iloc[0])] = (
+                f'no se pudo guardar el lote que comienza en esta fila ({str(e)}); '
+                f'la importación se detuvo y {len(pendientes)} filas quedaron sin guardar'
+            )
+            break
+        else:
+            resultado['creados'] += len(lote)
+            resultado['movimientos'] += len(registros)
+        
+        if al_procesar_lote:
+            al_procesar_lote(resultado)
+    
+    resultado['total_errores'] = len(mensajes)
+    resultado['errores'] = [f'Fila {fila}: {mensajes[fila]}'
+                            for fila in sorted(mensajes)[:MAX_ERRORES_REPORTADOS]]
+    return resultado
+
+# No reanudable: los lotes ya confirmados se volverían a insertar con IDs nuevos
+@job_handler('importar_movimientos', reanudable=False)
+def _importar_movimientos_job(contexto):
+    """Importa en segundo plano el archivo de movimientos guardado al encolar el trabajo"""
+    ruta = contexto.params['archivo']
+    
+    def _informar(resultado):
+        contexto.progress(None, f"{resultado['creados']} filas guardadas")
+    
+    try:
+        contexto.progress(None, 'Validando el archivo...')
+        with open(ruta, 'rb') as stream:
+            resultado = import_movements_stream(
+                stream, contexto.params['nombre_archivo'],
+                tamano_lote=contexto.params.get('tamano_lote', LOTE_IMPORTACION),
+                al_procesar_lote=_informar
+            )
+    finally:
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    
+    resultado['mensaje'] = (f"Importación completada: {resultado['creados']} filas importadas "
+                            f"({resultado['movimientos']} movimientos), {resultado['saltados']} saltadas")
+    return resultado
@@ -1,7 +1,12 @@
 """
 Utilidades de paginación para el manejo de resultados filtrados que requieren
-paginación manual en lugar de utilizar la paginación de SQLAlchemy.
+paginación manual en lugar de utilizar la paginación de SQLAlchemy, y
+paginación por cursor (keyset) para listados históricos extensos.
 """
+import base64
+from datetime import datetime
+
+from sqlalchemy import and_, or_
 
 class ManualPagination:
     """
@@ -74,3 +79,125 @@ class ManualPagination:
                     yield None
                 yield num
                 last = num
+
+
+class KeysetPagination:
+    """
+    Paginación por cursor (keyset) para listados ordenados de forma descendente por
+    una clave compuesta, típicamente (timestamp, id).
+    
+    En lugar de OFFSET, cada página se obtiene buscando las filas anteriores o
+    posteriores a la clave del último/primer elemento visto, de modo que el costo
+    de una página no depende de su posición en el historial.
+    """
+    
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        """
+        Inicializa una página obtenida por cursor.
+        
+        Args:
+            items: Elementos de la página actual
+            per_page: Número de elementos por página
+            next_cursor: Cursor para la página siguiente (más antigua) o None
+            prev_cursor: Cursor para la página anterior (más reciente) o None
+        """
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+    
+    @property
+    def has_next(self):
+        """Indica si hay una página siguiente disponible."""
+        return self.next_cursor is not None
+    
+    @property
+    def has_prev(self):
+        """Indica si hay una página anterior disponible."""
+        return self.prev_cursor is not None
+
+
+def encode_cursor(timestamp, identificador):
+    """
+    Codifica la clave (timestamp, id) de una fila como cursor opaco para la URL.
+    
+    Args:
+        timestamp: Fecha y hora de la fila
+        identificador: ID de la fila (desempate entre timestamps iguales)
+    
+    Returns:
+        str: Cursor en base64 apto para URL
+    """
+    valor = f'{timestamp.isoformat()}|{identificador}'
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decodifica un cursor generado por encode_cursor.
+    
+    Args:
+        cursor: Cursor recibido en la URL
+    
+    Returns:
+        tuple: (timestamp, id), o None si el cursor es inválido
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valor = base64.urlsafe_b64decode(cursor + relleno).decode('utf-8')
+        timestamp, identificador = valor.split('|', 1)
+        return datetime.fromisoformat(timestamp), identificador
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def paginate_keyset(query, timestamp_column, id_column, per_page, after=None, before=None):
+    """
+    Pagina una consulta en orden (timestamp DESC, id DESC) usando cursores.
+    
+    Args:
+        query: Consulta base (con los filtros ya aplicados, sin ORDER BY)
+        timestamp_column: Columna de fecha de la clave
+        id_column: Columna de desempate de la clave
+        per_page: Número de elementos por página
+        after: Cursor de la página siguiente (filas más antiguas que el cursor)
+        before: Cursor de la página anterior (filas más recientes que el cursor)
+    
+    Returns:
+        KeysetPagination: Página con los cursores de navegación
+    """
+    clave_after = decode_cursor(after)
+    clave_before = decode_cursor(before) if clave_after is None else None
+    
+    if clave_before is not None:
+        # Página anterior: se recorre en orden ascendente desde el cursor y se invierte
+        ts, identificador = clave_before
+        filas = query.filter(or_(
+            timestamp_column > ts,
+            and_(timestamp_column == ts, id_column > identificador)
+        )).order_by(timestamp_column.asc(), id_column.asc()).limit(per_page + 1).all()
+        hay_mas = len(filas) > per_page
+        items = list(reversed(filas[:per_page]))
+        hay_anterior, hay_siguiente = hay_mas, True
+    else:
+        if clave_after is not None:
+            ts, identificador = clave_after
+            query = query.filter(or_(
+                timestamp_column < ts,
+                and_(timestamp_column == ts, id_column < identificador)
+            ))
+        filas = query.order_by(timestamp_column.desc(), id_column.desc()).limit(per_page + 1).all()
+        items = filas[:per_page]
+        hay_anterior, hay_siguiente = clave_after is not None, len(filas) > per_page
+    
+    def _cursor(item):
+        return encode_cursor(getattr(item, timestamp_column.key), getattr(item, id_column.key))
+    
+    return KeysetPagination(
+        items,
+        per_page,
+        next_cursor=_cursor(items[-1]) if hay_siguiente and items else None,
+        prev_cursor=_cursor(items[0]) if hay_anterior and items else None
+    )
@@ -0,0 +1,277 @@
+"""
+Importación masiva de productos desde Excel o CSV
+La validación y el mapeo se hacen con operaciones vectorizadas de pandas, generando un
+error por fila (el primero que falle, en el mismo orden que la validación original).
+Los productos existentes se obtienen con consultas IN por lotes y las altas y
+modificaciones se aplican con inserciones y actualizaciones masivas.
+
+Los archivos se leen en streaming (openpyxl en modo read_only o csv) y se procesan en
+lotes de tamaño fijo con un commit por lote, de modo que la memoria queda acotada y un
+lote fallido no revierte los anteriores.
+"""
+import logging
+import os
+
+import pandas as pd
+
+from app.models.models import db, Producto
+from app.utils.count_service import rebuild_counts
+from app.utils.search_service import reindex_products
+from app.utils import product_index, catalog_cache
+from app.utils.job_service import job_handler
+from app.utils.import_reader import iter_file_chunks, text_column, map_labels, first_errors
+
+logger = logging.getLogger(__name__)
+
+COLUMNAS_REQUERIDAS = ['ID Producto', 'Nombre', 'Tipo de Producto', 'Estado Físico',
+                       'URL Ficha de Seguridad', 'Descripción', 'Control Sedronar']
+
+# Mapeo de valores del Excel a valores de la BD
+TIPO_PRODUCTO_MAP = {
+    'Botiquín': 'botiquin',
+    'Droguero': 'droguero',
+    'Materiales de vidrio': 'vidrio',
+    'Elementos de seguridad': 'seguridad',
+    'Residuos peligrosos': 'residuos'
+}
+
+ESTADO_FISICO_MAP = {
+    'Sólido': 'solido',
+    'Líquido': 'liquido',
+    'Gaseoso': 'gaseoso'
+}
+
+VALORES_SEDRONAR = ['true', 'verdadero', 'sí', 'si', '1', 'yes', 'y']
+
+MAX_DESCRIPCION = 500
+
+# Tamaño de lote para las consultas IN (por debajo del límite de parámetros de SQLite)
+LOTE_CONSULTA = 900
+
+# Filas por lote en la importación en streaming
+LOTE_IMPORTACION = 500
+
+# Mensajes de error conservados en el resultado (el resto solo se cuenta)
+MAX_ERRORES_REPORTADOS = 100
+
+# Columnas que actualiza la importación en productos existentes
+COLUMNAS_ACTUALIZADAS = ['nombre', 'descripcion', 'tipoProducto', 'estadoFisico',
+                         'controlSedronar', 'urlFichaSeguridad']
+
+def validate_products_frame(data_frame):
+    """
+    Valida y mapea el contenido de un Excel de productos.
+    
+    Args:
+        data_frame: DataFrame con las COLUMNAS_REQUERIDAS; el índice es la posición de
+            la fila de datos en el archivo (0 = primera fila después del encabezado)
+    
+    Returns:
+        tuple: (DataFrame de productos válidos con columnas del modelo,
+                DataFrame de errores con columnas 'fila' y 'error')
+    """
+    id_producto = text_column(data_frame['ID Producto'])
+    nombre = text_column(data_frame['Nombre'])
+    tipo_excel = text_column(data_frame['Tipo de Producto'])
+    estado_excel = text_column(data_frame['Estado Físico'])
+    url_ficha = text_column(data_frame['URL Ficha de Seguridad'])
+    descripcion = text_column(data_frame['Descripción'])
+    sedronar = text_column(data_frame['Control Sedronar'])
+    
+    tipo_producto = map_labels(tipo_excel, TIPO_PRODUCTO_MAP)
+    estado_fisico = map_labels(estado_excel, ESTADO_FISICO_MAP)
+    largo_id = id_producto.str.len()
+    
+    # (condición de error, mensaje) en el orden en que se reportan
+    tipos_permitidos = ', '.join(TIPO_PRODUCTO_MAP)
+    estados_permitidos = ', '.join(ESTADO_FISICO_MAP)
+    validaciones = [
+        (id_producto.isna(), 'ID Producto está vacío'),
+        (nombre.isna(), 'Nombre del producto está vacío'),
+        ((largo_id < 4) | (largo_id > 10),
+         "ID Producto '" + id_producto + "' debe tener entre 4 y 10 caracteres"),
+        (tipo_excel.isna(), 'Tipo de producto está vacío'),
+        (tipo_producto.isna(),
+         "Tipo de producto '" + tipo_excel + f"' no válido. Valores permitidos: {tipos_permitidos}"),
+        (estado_excel.isna(), 'Estado físico está vacío'),
+        (estado_fisico.isna(),
+         "Estado físico '" + estado_excel + f"' no válido. Valores permitidos: {estados_permitidos}"),
+        (url_ficha.notna() & ~url_ficha.str.startswith(('http://', 'https://')),
+         'URL de ficha de seguridad no válida (debe comenzar con http:// o https://)'),
+        (descripcion.str.len() > MAX_DESCRIPCION,
+         f'Descripción es demasiado larga (máximo {MAX_DESCRIPCION} caracteres)'),
+    ]
+    
+    error = first_errors(validaciones, data_frame.index)
+    
+    filas = pd.Series(data_frame.index + 2, index=data_frame.index)  # fila 1 = encabezado
+    con_error = error.notna()
+    errores = pd.DataFrame({'fila': filas[con_error], 'error': error[con_error]})
+    
+    validos = pd.DataFrame({
+        'idProducto': id_producto,
+        'nombre': nombre,
+        'descripcion': descripcion,
+        'tipoProducto': tipo_producto,
+        'estadoFisico': estado_fisico,
+        'controlSedronar': sedronar.str.lower().isin(VALORES_SEDRONAR).fillna(False).astype(bool),
+        'urlFichaSeguridad': url_ficha,
+    })[~con_error]
+    # Un mismo ID repetido en el archivo: prevalece la última fila
+    validos = validos.drop_duplicates('idProducto', keep='last')
+    return validos, errores
+
+def _ids_existentes(ids):
+    """IDs que ya están en la base, consultados por lotes"""
+    existentes = set()
+    for inicio in range(0, len(ids), LOTE_CONSULTA):
+        lote = ids[inicio:inicio + LOTE_CONSULTA]
+        existentes.update(
+            fila[0] for fila in db.session.query(Producto.idProducto).filter(Producto.idProducto.in_(lote))
+        )
+    return existentes
+
+def _registros(frame):
+    """Filas del DataFrame como dicts, con None en lugar de <NA>"""
+    limpio = frame.astype(object).where(frame.notna(), None)
+    return limpio.to_dict('records')
+
+def import_products(data_frame):
+    """
+    Valida un DataFrame de productos y aplica las altas y modificaciones en la sesión
+    actual (el commit queda a cargo de quien llama).
+    
+    Como las operaciones masivas no disparan los eventos del ORM, se actualizan
+    explícitamente los contadores, el índice de búsqueda, el índice typeahead y el
+    cache de catálogos.
+    
+    Args:
+        data_frame: DataFrame leído del Excel (con las COLUMNAS_REQUERIDAS)
+    
+    Returns:
+        dict: {'creados', 'actualizados', 'saltados', 'errores'} donde 'errores' es una
+              lista de mensajes "Fila N: ..."
+    """
+    validos, errores = validate_products_frame(data_frame)
+    
+    ids = validos['idProducto'].tolist()
+    existentes = _ids_existentes(ids)
+    es_existente = validos['idProducto'].isin(existentes)
+    
+    nuevos = _registros(validos[~es_existente])
+    actualizados = _registros(validos.loc[es_existente, ['idProducto'] + COLUMNAS_ACTUALIZADAS])
+    
+    if nuevos:
+        db.session.bulk_insert_mappings(Producto, nuevos)
+    if actualizados:
+        db.session.bulk_update_mappings(Producto, actualizados)
+    
+    if ids:
+        rebuild_counts(models=[Producto])
+        # Con muchos IDs conviene reconstruir el índice completo antes que un IN enorme
+        reindex_products(ids if len(ids) <= LOTE_CONSULTA else None)
+        product_index.register_changes(db.session, dict(zip(ids, validos['nombre'])))
+        catalog_cache.register_changes(db.session, 'productos')
+    
+    return {
+        'creados': len(nuevos),
+        'actualizados': len(actualizados),
+        'saltados': len(errores),
+        'errores': [f"Fila {fila}: {error}" for fila, error in zip(errores['fila'], errores['error'])],
+    }
+
+# LECTURA EN STREAMING
+
+def iter_product_chunks(stream, nombre_archivo, tamano_lote=LOTE_IMPORTACION):
+    """
+    Lee un archivo de productos en lotes de DataFrames.
+    
+    Args:
+        stream: Archivo binario posicionable (por ejemplo, el stream de la subida)
+        nombre_archivo: Nombre original, para elegir el lector por extensión
+        tamano_lote: Filas por lote
+    
+    Yields:
+        DataFrame: Lote con las COLUMNAS_REQUERIDAS, indexado por la posición de la fila
+    
+    Raises:
+        ArchivoImportacionError: Extensión no soportada o encabezados faltantes
+    """
+    return iter_file_chunks(stream, nombre_archivo, COLUMNAS_REQUERIDAS, tamano_lote)
+
+def import_products_stream(stream, nombre_archivo, tamano_lote=LOTE_IMPORTACION, al_procesar_lote=None):
+    """
+    Importa un archivo de productos por lotes, con un commit por lote.
+    
+    Un lote que falla al guardarse se revierte y se informa, sin afectar a los lotes
+    ya confirmados ni impedir los siguientes.
+    
+    Args:
+        stream: Archivo binario posicionable
+        nombre_archivo: Nombre original del archivo (.xlsx, .xls o .csv)
+        tamano_lote: Filas por lote
+        al_procesar_lote: Función opcional que recibe el resultado acumulado tras cada lote
+    
+    Returns:
+        dict: {'creados', 'actualizados', 'saltados', 'errores', 'total_errores', 'lotes',
+               'lotes_fallidos'} donde 'errores' conserva hasta MAX_ERRORES_REPORTADOS mensajes
+    
+    Raises:
+        ArchivoImportacionError: El archivo no se puede leer como archivo de productos
+    """
+    resultado = {'creados': 0, 'actualizados': 0, 'saltados': 0, 'errores': [],
+                 'total_errores': 0, 'lotes': 0, 'lotes_fallidos': 0}
+    
+    def _agregar_errores(mensajes):
+        resultado['total_errores'] += len(mensajes)
+        libres = MAX_ERRORES_REPORTADOS - len(resultado['errores'])
+        if libres > 0:
+            resultado['errores'].extend(mensajes[:libres])
+    
+    for lote in iter_product_chunks(stream, nombre_archivo, tamano_lote):
+        resultado['lotes'] += 1
+        try:
+            parcial = import_products(lote)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            primera, ultima = lote.index[0] + 2, lote.index[-1] + 2
+            logger.error(f"Error saving import batch (rows {primera}-{ultima}): {str(e)}")
+            resultado['lotes_fallidos'] += 1
+            resultado['saltados'] += len(lote)
+            _agregar_errores([f"Filas {primera}-{ultima}: no se pudieron guardar ({str(e)})"])
+        else:
+            resultado['creados'] += parcial['creados']
+            resultado['actualizados'] += parcial['actualizados']
+            resultado['saltados'] += parcial['saltados']
+            _agregar_errores(parcial['errores'])
+        
+        if al_procesar_lote:
+            al_procesar_lote(resultado)
+    
+    return resultado
+
+@job_handler('importar_productos')
+def _importar_productos_job(contexto):
+    """Importa en segundo plano el archivo guardado al encolar el trabajo"""
+    ruta = contexto.params['archivo']
+    
+    def _informar(resultado):
+        procesadas = resultado['creados'] + resultado['actualizados'] + resultado['saltados']
+        contexto.progress(None, f'{procesadas} filas procesadas')
+    
+    try:
+        with open(ruta, 'rb') as stream:
+            resultado = import_products_stream(
+                stream, contexto.params['nombre_archivo'],
+                tamano_lote=contexto.params.get('tamano_lote', LOTE_IMPORTACION),
+                al_procesar_lote=_informar
+            )
+    finally:
+        # El archivo subido ya no se necesita (el resultado queda en el trabajo)
+        if os.path.exists(ruta):
+            os.remove(ruta)
+    
+    resultado['mensaje'] = (f"Importación completada: {resultado['creados']} productos creados, "
+                            f"{resultado['actualizados']} actualizados, {resultado['saltados']} saltados")
+    return resultado
@@ -0,0 +1,206 @@
+"""
+Índice de prefijos de productos en memoria (por proceso) para búsquedas typeahead
+Arreglo ordenado de claves normalizadas (ID, nombre completo y cada palabra del nombre)
+consultado con bisect. Se actualiza de forma incremental al confirmar cambios en
+Producto, y se reconstruye si otro worker modificó productos (generación compartida).
+"""
+import threading
+from bisect import bisect_left, insort
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+
+from app.models.models import db, Producto
+from app.utils.search_service import normalize_text, search_tokens
+from app.utils.shared_cache import shared_cache
+
+# Contador compartido de cambios en el catálogo de productos
+GENERACION_PRODUCTOS = 'generacion:productos'
+
+def _claves_producto(id_producto, nombre):
+    """Claves normalizadas por las que se encuentra un producto"""
+    id_normalizado = normalize_text(id_producto)
+    nombre_normalizado = normalize_text(nombre)
+    claves = {id_normalizado, nombre_normalizado}
+    palabras = nombre_normalizado.split()
+    for i in range(1, len(palabras)):
+        # Sufijos desde cada palabra: "clorh" encuentra "acido clorhidrico"
+        claves.add(' '.join(palabras[i:]))
+    claves.discard('')
+    return claves
+
+class ProductPrefixIndex:
+    """Índice ordenado (clave, id_producto) con búsqueda por prefijo"""
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._claves = []       # [(clave, id_producto)] ordenado
+        self._productos = {}    # id_producto -> (nombre, texto normalizado)
+        self._cargado = False
+        self._generacion = None
+    
+    def _agregar(self, id_producto, nombre):
+        self._productos[id_producto] = (nombre, normalize_text(f'{id_producto} {nombre}'))
+        for clave in _claves_producto(id_producto, nombre):
+            insort(self._claves, (clave, id_producto))
+    
+    def _quitar(self, id_producto):
+        anterior = self._productos.pop(id_producto, None)
+        if anterior is None:
+            return
+        for clave in _claves_producto(id_producto, anterior[0]):
+            posicion = bisect_left(self._claves, (clave, id_producto))
+            if posicion < len(self._claves) and self._claves[posicion] == (clave, id_producto):
+                del self._claves[posicion]
+    
+    def rebuild(self):
+        """Reconstruye el índice completo desde la base"""
+        filas = db.session.query(Producto.idProducto, Producto.nombre).all()
+        claves = []
+        productos = {}
+        for id_producto, nombre in filas:
+            productos[id_producto] = (nombre, normalize_text(f'{id_producto} {nombre}'))
+            claves.extend((clave, id_producto) for clave in _claves_producto(id_producto, nombre))
+        claves.sort()
+        with self._lock:
+            self._claves = claves
+            self._productos = productos
+            self._cargado = True
+    
+    def apply_changes(self, cambios):
+        """
+        Aplica cambios confirmados en este proceso.
+        
+        Args:
+            cambios: dict {id_producto: nombre, o None si se eliminó}
+        """
+        with self._lock:
+            if not self._cargado:
+                return
+            for id_producto, nombre in cambios.items():
+                self._quitar(id_producto)
+                if nombre is not None:
+                    self._agregar(id_producto, nombre)
+        generacion = shared_cache.incr(GENERACION_PRODUCTOS)
+        with self._lock:
+            if generacion is None:
+                return
+            if self._generacion is not None and generacion != self._generacion + 1:
+                # Otro worker también modificó productos: reconstruir en la próxima búsqueda
+                self._cargado = False
+            self._generacion = generacion
+    
+    def reset(self):
+        """Descarta el índice; se reconstruye completo en la próxima búsqueda"""
+        with self._lock:
+            self._cargado = False
+    
+    def _asegurar_vigente(self):
+        """Carga el índice si hace falta o si otro worker avanzó la generación"""
+        generacion = shared_cache.get_counter(GENERACION_PRODUCTOS)
+        with self._lock:
+            vigente = self._cargado and (generacion is None or generacion == self._generacion)
+        if not vigente:
+            self.rebuild()
+            with self._lock:
+                self._generacion = generacion
+    
+    def choices_for(self, id_producto):
+        """
+        Opciones para un SelectField de producto con búsqueda asíncrona: solo el
+        producto seleccionado, si existe. Así el formulario valida la elección sin
+        cargar el catálogo.
+        
+        Args:
+            id_producto: ID del producto seleccionado (puede ser None)
+        
+        Returns:
+            list: [(id_producto, nombre)] o lista vacía
+        """
+        if not id_producto:
+            return []
+        self._asegurar_vigente()
+        with self._lock:
+            producto = self._productos.get(id_producto)
+        return [(id_producto, producto[0])] if producto else []
+    
+    def search(self, termino, limit=20):
+        """
+        Busca productos cuyo ID o alguna palabra del nombre empiece con el término.
+        
+        Args:
+            termino: Texto ingresado (se normaliza: sin tildes ni mayúsculas)
+            limit: Cantidad máxima de resultados
+        
+        Returns:
+            list: [(id_producto, nombre)] con las coincidencias exactas de ID primero
+        """
+        tokens = search_tokens(termino)
+        if not tokens:
+            return []
+        self._asegurar_vigente()
+        
+        # Recorrer el índice por la palabra más larga y verificar el resto en el texto
+        principal = max(tokens, key=len)
+        otros = [token for token in tokens if token is not principal]
+        consulta = normalize_text(termino)
+        encontrados = {}
+        with self._lock:
+            posicion = bisect_left(self._claves, (principal, ''))
+            while posicion < len(self._claves) and len(encontrados) < limit * 5:
+                clave, id_producto = self._claves[posicion]
+                if not clave.startswith(principal):
+                    break
+                posicion += 1
+                if id_producto in encontrados:
+                    continue
+                nombre, texto = self._productos[id_producto]
+                palabras = texto.split()
+                if all(any(p.startswith(token) for p in palabras) for token in otros):
+                    encontrados[id_producto] = nombre
+        
+        resultados = sorted(
+            encontrados.items(),
+            key=lambda item: (normalize_text(item[0]) != consulta, normalize_text(item[1]), item[0])
+        )
+        return resultados[:limit]
+
+# Instancia compartida por el proceso
+product_index = ProductPrefixIndex()
+
+# SINCRONIZACIÓN CON LOS EVENTOS DE PRODUCTO
+
+def register_changes(session, cambios):
+    """
+    Registra cambios de productos para aplicarlos al índice cuando la sesión confirme.
+    Las cargas masivas que no disparan los eventos del ORM deben llamarlo.
+    
+    Args:
+        session: Sesión de SQLAlchemy
+        cambios: dict {id_producto: nombre, o None si se eliminó}
+    """
+    session.info.setdefault('productos_modificados', {}).update(cambios)
+
+def _registrar_cambio(target, nombre):
+    session = object_session(target)
+    if session is not None:
+        register_changes(session, {target.idProducto: nombre})
+
+@event.listens_for(Producto, 'after_insert')
+@event.listens_for(Producto, 'after_update')
+def _producto_guardado(mapper, connection, target):
+    _registrar_cambio(target, target.nombre)
+
+@event.listens_for(Producto, 'after_delete')
+def _producto_eliminado(mapper, connection, target):
+    _registrar_cambio(target, None)
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_cambios_confirmados(session):
+    cambios = session.info.pop('productos_modificados', None)
+    if cambios:
+        product_index.apply_changes(cambios)
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_cambios(session, previous_transaction):
+    session.info.pop('productos_modificados', None)
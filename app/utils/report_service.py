@@ -0,0 +1,179 @@
+"""
+Servicio de reportes de movimientos
+Genera el reporte de movimientos con stock antes/después en una única sentencia SQL,
+usando funciones de ventana (SQLite 3.25+ y PostgreSQL).
+"""
+from datetime import datetime
+
+from app.models.models import db, Movimiento, Producto, Proveedor
+from app.utils.stock_service import movement_delta_expression, checkpoint_balance_rows
+from app.utils.job_service import job_handler
+from sqlalchemy import func, select, and_
+
+# Columnas del Excel del reporte: (clave en las filas, encabezado)
+COLUMNAS_EXCEL = [
+    ('fecha', 'Fecha'),
+    ('producto_nombre', 'Producto'),
+    ('stock_inicial_cantidad', 'Stock Inicial - Cantidad'),
+    ('stock_inicial_unidad', 'Stock Inicial - Unidad de medida'),
+    ('tipo_movimiento', 'Movimiento - Tipo'),
+    ('cantidad', 'Movimiento - Cantidad'),
+    ('unidad_medida', 'Movimiento - Unidad de Medida'),
+    ('stock_final_cantidad', 'Stock Final - Cantidad'),
+    ('stock_final_unidad', 'Stock Final - Unidad de medida'),
+    ('tipo_documento', 'Documento para operación - Tipo'),
+    ('numero_documento', 'Documento para operación - Número'),
+    ('cuit_proveedor', 'CUIT Proveedor'),
+]
+
+def build_movements_report(fecha_inicial, fecha_final, lab_id=None, tipo_producto=None, control_sedronar=None):
+    """
+    Construye las filas del reporte de movimientos del período.
+    
+    El stock de apertura de cada producto sale de una CTE (checkpoint + movimientos
+    anteriores a fecha_inicial) y el saldo de cada fila se obtiene con
+    SUM(delta) OVER (PARTITION BY idProducto ORDER BY timestamp).
+    
+    Args:
+        fecha_inicial: Inicio del período (inclusive)
+        fecha_final: Fin del período (inclusive)
+        lab_id: Limitar a un laboratorio (opcional; si es None el saldo es global)
+        tipo_producto: Limitar a un tipo de producto (opcional)
+        control_sedronar: True/False para filtrar por control Sedronar (opcional)
+    
+    Returns:
+        list: Filas del reporte ordenadas por fecha
+    """
+    filtros = [
+        Movimiento.timestamp >= fecha_inicial,
+        Movimiento.timestamp <= fecha_final
+    ]
+    if lab_id:
+        filtros.append(Movimiento.idLaboratorio == lab_id)
+    if tipo_producto:
+        filtros.append(Producto.tipoProducto == tipo_producto)
+    if control_sedronar is not None:
+        filtros.append(Producto.controlSedronar == control_sedronar)
+    
+    # Productos con movimientos en el período: acotan el cálculo del stock de apertura
+    productos_periodo = select(Movimiento.idProducto).join(
+        Producto, Movimiento.idProducto == Producto.idProducto
+    ).where(and_(*filtros)).distinct()
+    
+    saldos = checkpoint_balance_rows(antes_de=fecha_inicial, lab_id=lab_id, product_ids=productos_periodo)
+    apertura = select(
+        saldos.c.idProducto,
+        func.sum(saldos.c.cantidad).label('stock_apertura')
+    ).group_by(saldos.c.idProducto).cte('apertura')
+    
+    delta = movement_delta_expression()
+    stock_final = func.coalesce(apertura.c.stock_apertura, 0) + func.sum(delta).over(
+        partition_by=Movimiento.idProducto,
+        order_by=(Movimiento.timestamp, Movimiento.idMovimiento),
+        rows=(None, 0)
+    )
+    
+    query = select(
+        Movimiento.timestamp,
+        Movimiento.idProducto,
+        Producto.nombre,
+        Movimiento.tipoMovimiento,
+        Movimiento.cantidad,
+        Movimiento.unidadMedida,
+        Movimiento.tipoDocumento,
+        Movimiento.numeroDocumento,
+        Proveedor.cuit,
+        (stock_final - delta).label('stock_inicial'),
+        stock_final.label('stock_final')
+    ).join(
+        Producto, Movimiento.idProducto == Producto.idProducto
+    ).outerjoin(
+        Proveedor, Movimiento.idProveedor == Proveedor.idProveedor
+    ).outerjoin(
+        apertura, apertura.c.idProducto == Movimiento.idProducto
+    ).where(
+        and_(*filtros)
+    ).order_by(
+        Movimiento.timestamp, Movimiento.idProducto, Movimiento.idMovimiento
+    )
+    
+    reporte_data = []
+    for row in db.session.execute(query):
+        reporte_data.append({
+            'fecha': row.timestamp,
+            'producto_id': row.idProducto,
+            'producto_nombre': row.nombre,
+            'stock_inicial_cantidad': float(row.stock_inicial or 0),
+            'stock_inicial_unidad': row.unidadMedida,
+            'tipo_movimiento': row.tipoMovimiento,
+            'cantidad': row.cantidad,
+            'unidad_medida': row.unidadMedida,
+            'stock_final_cantidad': float(row.stock_final or 0),
+            'stock_final_unidad': row.unidadMedida,
+            'tipo_documento': row.tipoDocumento,
+            'numero_documento': row.numeroDocumento,
+            # CUIT del proveedor solo para movimientos de compra
+            'cuit_proveedor': row.cuit if row.tipoMovimiento == 'compra' else None
+        })
+    
+    return reporte_data
+
+def write_movements_report_excel(reporte_data, destino):
+    """
+    Escribe el reporte en un .xlsx (openpyxl en modo write_only, fila por fila).
+    
+    Args:
+        reporte_data: Filas devueltas por build_movements_report
+        destino: Ruta o archivo binario de salida
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+    from openpyxl.utils import get_column_letter
+    
+    filas = [
+        [item['fecha'].strftime('%d/%m/%Y %H:%M:%S') if isinstance(item['fecha'], datetime) else item['fecha']]
+        + [item.get(clave) for clave, _ in COLUMNAS_EXCEL[1:]]
+        for item in reporte_data
+    ]
+    
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Reporte de Movimientos')
+    
+    # Ancho de columna según el contenido más largo
+    for indice, (_, encabezado) in enumerate(COLUMNAS_EXCEL):
+        largo = max([len(encabezado)] + [len(str(fila[indice])) for fila in filas if fila[indice] is not None])
+        hoja.column_dimensions[get_column_letter(indice + 1)].width = largo + 2
+    
+    borde = Side(style='thin')
+    encabezados = []
+    for _, encabezado in COLUMNAS_EXCEL:
+        celda = WriteOnlyCell(hoja, value=encabezado)
+        celda.font = Font(bold=True)
+        celda.alignment = Alignment(wrap_text=True, vertical='top')
+        celda.fill = PatternFill('solid', fgColor='D7E4BC')
+        celda.border = Border(left=borde, right=borde, top=borde, bottom=borde)
+        encabezados.append(celda)
+    hoja.append(encabezados)
+    
+    for fila in filas:
+        hoja.append(fila)
+    libro.save(destino)
+
+@job_handler('exportar_reporte_movimientos')
+def _exportar_reporte_job(contexto):
+    """Genera el Excel del reporte de movimientos en segundo plano"""
+    params = contexto.params
+    contexto.progress(None, 'Calculando el reporte...')
+    reporte_data = build_movements_report(
+        datetime.strptime(params['fecha_inicial'], '%Y-%m-%d'),
+        datetime.strptime(params['fecha_final'], '%Y-%m-%d').replace(hour=23, minute=59, second=59),
+        lab_id=params.get('lab_id'),
+        tipo_producto=params.get('tipo_producto'),
+        control_sedronar=params.get('control_sedronar')
+    )
+    
+    contexto.progress(50, f'Escribiendo {len(reporte_data)} filas en Excel...')
+    nombre = f"reporte_movimientos_{datetime.now():%Y%m%d_%H%M%S}.xlsx"
+    write_movements_report_excel(reporte_data, contexto.output_path(nombre))
+    return {'mensaje': f'Reporte generado: {len(reporte_data)} movimientos', 'filas': len(reporte_data)}
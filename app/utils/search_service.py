@@ -0,0 +1,234 @@
+"""
+Índice de búsqueda de productos
+Mantiene una tabla auxiliar `producto_busqueda` con el texto normalizado (sin tildes,
+en minúsculas) de ID, nombre, marca y descripción de cada producto:
+- SQLite: tabla virtual FTS5 (tokenizer unicode61 con remove_diacritics)
+- PostgreSQL: tabla con índice GIN sobre to_tsvector('simple', texto)
+Se sincroniza con los eventos de Producto; las cargas masivas que no pasan por el
+ORM deben llamar a reindex_products().
+"""
+import logging
+import re
+import unicodedata
+
+from flask import current_app, has_app_context
+from sqlalchemy import bindparam, column, event, text, or_
+
+from app.models.models import db, Producto
+
+logger = logging.getLogger(__name__)
+
+TABLA_BUSQUEDA = 'producto_busqueda'
+_CLAVE_EXTENSION = 'producto_busqueda'
+_LOTE_BORRADO = 500
+
+def normalize_text(texto):
+    """
+    Normaliza un texto para la búsqueda: minúsculas, sin tildes ni diéresis y con
+    espacios simples ("Ácido Clorhídrico" -> "acido clorhidrico").
+    
+    Args:
+        texto: Texto a normalizar (puede ser None)
+    
+    Returns:
+        str: Texto normalizado
+    """
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto))
+    sin_marcas = ''.join(c for c in descompuesto if not unicodedata.combining(c))
+    return ' '.join(sin_marcas.lower().split())
+
+def search_tokens(termino):
+    """Palabras normalizadas de un término de búsqueda"""
+    return re.findall(r'\w+', normalize_text(termino))
+
+def _texto_producto(producto):
+    """Texto indexado de un producto"""
+    partes = (producto.idProducto, producto.nombre, producto.marca, producto.descripcion)
+    return normalize_text(' '.join(p for p in partes if p))
+
+def _backend_activo():
+    """Motor de índice disponible ('fts5', 'postgresql') o None si se usa ILIKE"""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get(_CLAVE_EXTENSION)
+
+# CREACIÓN Y REINDEXADO
+
+def create_search_index(connection):
+    """
+    Crea la estructura del índice si no existe.
+    
+    Args:
+        connection: Conexión de SQLAlchemy
+    
+    Returns:
+        str: 'fts5', 'postgresql' o None si el motor no está soportado
+    """
+    dialecto = connection.dialect.name
+    if dialecto == 'sqlite':
+        connection.execute(text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_BUSQUEDA} USING fts5('
+            '"idProducto" UNINDEXED, texto, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        ))
+        return 'fts5'
+    if dialecto == 'postgresql':
+        connection.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {TABLA_BUSQUEDA} ('
+            '"idProducto" VARCHAR(10) PRIMARY KEY '
+            'REFERENCES producto("idProducto") ON DELETE CASCADE, '
+            'texto TEXT NOT NULL)'
+        ))
+        connection.execute(text(
+            f'CREATE INDEX IF NOT EXISTS idx_producto_busqueda_texto ON {TABLA_BUSQUEDA} '
+            "USING GIN (to_tsvector('simple', texto))"
+        ))
+        return 'postgresql'
+    return None
+
+def _eliminar(connection, product_ids):
+    """
+    Quita entradas del índice. En FTS5 la columna idProducto no está indexada, así que
+    se borra con un IN por lote (un recorrido por lote, no uno por producto).
+    """
+    sentencia = text(f'DELETE FROM {TABLA_BUSQUEDA} WHERE "idProducto" IN :ids').bindparams(
+        bindparam('ids', expanding=True)
+    )
+    product_ids = list(product_ids)
+    for inicio in range(0, len(product_ids), _LOTE_BORRADO):
+        connection.execute(sentencia, {'ids': product_ids[inicio:inicio + _LOTE_BORRADO]})
+
+def _reemplazar(connection, filas):
+    """Reemplaza las entradas del índice para los productos indicados"""
+    if not filas:
+        return
+    _eliminar(connection, [fila['id'] for fila in filas])
+    connection.execute(
+        text(f'INSERT INTO {TABLA_BUSQUEDA} ("idProducto", texto) VALUES (:id, :texto)'),
+        filas
+    )
+
+def reindex_products(product_ids=None):
+    """
+    Reconstruye el índice de búsqueda (todo, o solo los productos indicados).
+    Se usa después de cargas masivas que no disparan los eventos del ORM.
+    
+    Args:
+        product_ids: Lista opcional de IDs de productos
+    
+    Returns:
+        int: Cantidad de productos indexados
+    """
+    if _backend_activo() is None:
+        return 0
+    
+    query = Producto.query
+    if product_ids is not None:
+        if not product_ids:
+            return 0
+        query = query.filter(Producto.idProducto.in_(product_ids))
+    else:
+        db.session.execute(text(f'DELETE FROM {TABLA_BUSQUEDA}'))
+    
+    filas = [{'id': p.idProducto, 'texto': _texto_producto(p)} for p in query.all()]
+    if product_ids is not None:
+        # Quitar también los productos que ya no existen
+        _eliminar(db.session.connection(), product_ids)
+    if filas:
+        db.session.execute(
+            text(f'INSERT INTO {TABLA_BUSQUEDA} ("idProducto", texto) VALUES (:id, :texto)'),
+            filas
+        )
+    return len(filas)
+
+def ensure_search_index():
+    """
+    Crea el índice si falta y lo puebla si está vacío pero hay productos
+    (se llama al iniciar la aplicación).
+    
+    Returns:
+        bool: True si se reconstruyó el índice
+    """
+    try:
+        backend = create_search_index(db.session.connection())
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Índice de búsqueda no disponible, se usará ILIKE: {str(e)}")
+        backend = None
+    current_app.extensions[_CLAVE_EXTENSION] = backend
+    if backend is None:
+        db.session.commit()
+        return False
+    
+    vacio = db.session.execute(text(f'SELECT 1 FROM {TABLA_BUSQUEDA} LIMIT 1')).first() is None
+    hay_productos = db.session.query(Producto.idProducto).first() is not None
+    if vacio and hay_productos:
+        reindex_products()
+        db.session.commit()
+        return True
+    db.session.commit()
+    return False
+
+# SINCRONIZACIÓN CON LOS EVENTOS DE PRODUCTO
+
+@event.listens_for(Producto, 'after_insert')
+@event.listens_for(Producto, 'after_update')
+def _indexar_producto(mapper, connection, target):
+    if _backend_activo() is None:
+        return
+    _reemplazar(connection, [{'id': target.idProducto, 'texto': _texto_producto(target)}])
+
+@event.listens_for(Producto, 'after_delete')
+def _desindexar_producto(mapper, connection, target):
+    if _backend_activo() is None:
+        return
+    connection.execute(
+        text(f'DELETE FROM {TABLA_BUSQUEDA} WHERE "idProducto" = :id'),
+        {'id': target.idProducto}
+    )
+
+# CONSULTA
+
+def _subconsulta_coincidencias(tokens, backend):
+    """SELECT idProducto de los productos que contienen todas las palabras (como prefijo)"""
+    if backend == 'fts5':
+        consulta = ' '.join(f'"{token}"*' for token in tokens)
+        return text(
+            f'SELECT "idProducto" FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH :consulta'
+        ).bindparams(consulta=consulta)
+    consulta = ' & '.join(f'{token}:*' for token in tokens)
+    return text(
+        f'SELECT "idProducto" FROM {TABLA_BUSQUEDA} '
+        "WHERE to_tsvector('simple', texto) @@ to_tsquery('simple', :consulta)"
+    ).bindparams(consulta=consulta)
+
+def apply_product_search(query, termino):
+    """
+    Filtra una consulta de productos por un término de búsqueda usando el índice.
+    Cada palabra del término debe aparecer como inicio de palabra en el ID, nombre,
+    marca o descripción, sin distinguir tildes ni mayúsculas.
+    
+    Args:
+        query: Consulta que incluye la entidad Producto
+        termino: Texto ingresado por el usuario
+    
+    Returns:
+        Query: Consulta filtrada (sin cambios si el término está vacío)
+    """
+    tokens = search_tokens(termino)
+    if not tokens:
+        return query
+    
+    backend = _backend_activo()
+    if backend is None:
+        # Sin índice disponible: búsqueda por subcadena en nombre y marca
+        condiciones = [
+            or_(Producto.nombre.ilike(f'%{token}%'), Producto.marca.ilike(f'%{token}%'))
+            for token in tokens
+        ]
+        return query.filter(*condiciones)
+    
+    coincidencias = _subconsulta_coincidencias(tokens, backend).columns(column('idProducto'))
+    return query.filter(Producto.idProducto.in_(coincidencias))
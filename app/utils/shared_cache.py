@@ -0,0 +1,258 @@
+"""
+Cache compartido entre procesos (workers de mod_wsgi/gunicorn)
+Backends intercambiables con la misma interfaz que Redis (get/set/delete/incr):
+SQLite local (por defecto, sin servicios externos), Redis o deshabilitado.
+"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Contador monótono de cambios en movimientos: los workers lo comparan antes de
+# confiar en sus valores cacheados
+GENERACION_MOVIMIENTOS = 'generacion:movimientos'
+
+class CacheBackend:
+    """Interfaz mínima compatible con Redis"""
+    
+    def get(self, key):
+        raise NotImplementedError
+    
+    def set(self, key, value, ttl=None):
+        raise NotImplementedError
+    
+    def delete(self, key):
+        raise NotImplementedError
+    
+    def incr(self, key, amount=1):
+        raise NotImplementedError
+
+class NullCacheBackend(CacheBackend):
+    """Backend deshabilitado: no guarda valores; los contadores son locales al proceso"""
+    
+    def __init__(self):
+        self._contadores = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            valor = self._contadores.get(key)
+        return str(valor) if valor is not None else None
+    
+    def set(self, key, value, ttl=None):
+        pass
+    
+    def delete(self, key):
+        with self._lock:
+            self._contadores.pop(key, None)
+    
+    def incr(self, key, amount=1):
+        with self._lock:
+            self._contadores[key] = self._contadores.get(key, 0) + amount
+            return self._contadores[key]
+
+class SQLiteCacheBackend(CacheBackend):
+    """
+    Backend sobre un archivo SQLite local compartido por todos los workers del host.
+    Usa una conexión por hilo en modo autocommit y WAL para lecturas concurrentes.
+    Las conexiones se abren al primer uso y se vuelven a abrir en un proceso hijo:
+    una conexión SQLite no se puede usar después de un fork (gunicorn --preload).
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Conexiones heredadas del proceso padre: se conservan sin usarlas, porque
+        # cerrarlas desde el hijo también actuaría sobre el archivo del padre
+        self._heredadas = []
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+    
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid != os.getpid():
+            self._heredadas.append(conn)
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS cache ('
+                'clave TEXT PRIMARY KEY, valor TEXT NOT NULL, expira REAL)'
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+    
+    def get(self, key):
+        row = self._conexion().execute(
+            'SELECT valor, expira FROM cache WHERE clave = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        valor, expira = row
+        if expira is not None and expira <= time.time():
+            self.delete(key)
+            return None
+        return valor
+    
+    def set(self, key, value, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        self._conexion().execute(
+            'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+            (key, value, expira)
+        )
+    
+    def delete(self, key):
+        self._conexion().execute('DELETE FROM cache WHERE clave = ?', (key,))
+    
+    def incr(self, key, amount=1):
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT OR IGNORE INTO cache (clave, valor, expira) VALUES (?, ?, NULL)',
+                (key, '0')
+            )
+            conn.execute(
+                'UPDATE cache SET valor = CAST(valor AS INTEGER) + ? WHERE clave = ?',
+                (amount, key)
+            )
+            valor = conn.execute('SELECT valor FROM cache WHERE clave = ?', (key,)).fetchone()[0]
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return int(valor)
+    
+    def purge_expired(self):
+        """Elimina las entradas vencidas"""
+        self._conexion().execute(
+            'DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?', (time.time(),)
+        )
+
+class RedisCacheBackend(CacheBackend):
+    """Backend Redis (requiere el paquete `redis`)"""
+    
+    def __init__(self, url):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError('CACHE_BACKEND=redis requiere el paquete "redis" instalado') from e
+        self._client = redis.Redis.from_url(url, decode_responses=True)
+    
+    def get(self, key):
+        return self._client.get(key)
+    
+    def set(self, key, value, ttl=None):
+        self._client.set(key, value, ex=int(ttl) if ttl else None)
+    
+    def delete(self, key):
+        self._client.delete(key)
+    
+    def incr(self, key, amount=1):
+        return int(self._client.incr(key, amount))
+
+class SharedCache:
+    """
+    Fachada sobre el backend configurado. Un fallo del backend nunca rompe la
+    request: se registra y se comporta como un cache vacío. Las claves llevan el
+    prefijo del espacio de nombres, para que dos instalaciones que comparten el
+    backend (staging y producción en el mismo host o el mismo Redis) no se mezclen.
+    """
+    
+    def __init__(self, backend=None, default_ttl=300, namespace=''):
+        self.backend = backend or NullCacheBackend()
+        self.default_ttl = default_ttl
+        self.namespace = namespace
+    
+    def configure(self, backend, default_ttl=None, namespace=None):
+        self.backend = backend
+        if default_ttl is not None:
+            self.default_ttl = default_ttl
+        if namespace is not None:
+            self.namespace = namespace
+    
+    def _clave(self, key):
+        return f'{self.namespace}:{key}' if self.namespace else key
+    
+    def get_json(self, key):
+        try:
+            valor = self.backend.get(self._clave(key))
+        except Exception as e:
+            logger.warning(f"Error leyendo el cache compartido ({key}): {str(e)}")
+            return None
+        return json.loads(valor) if valor is not None else None
+    
+    def set_json(self, key, value, ttl=None):
+        try:
+            self.backend.set(self._clave(key), json.dumps(value), ttl or self.default_ttl)
+        except Exception as e:
+            logger.warning(f"Error escribiendo el cache compartido ({key}): {str(e)}")
+    
+    def delete(self, key):
+        try:
+            self.backend.delete(self._clave(key))
+        except Exception as e:
+            logger.warning(f"Error eliminando del cache compartido ({key}): {str(e)}")
+    
+    def get_counter(self, key):
+        """
+        Valor actual de un contador: 0 si no existe, None si el backend falla (quien
+        llama debe entonces ignorar la copia compartida, que no se puede validar)
+        """
+        try:
+            valor = self.backend.get(self._clave(key))
+        except Exception as e:
+            logger.warning(f"Error leyendo el contador {key}: {str(e)}")
+            return None
+        return int(valor) if valor is not None else 0
+    
+    def incr(self, key, amount=1):
+        try:
+            return self.backend.incr(self._clave(key), amount)
+        except Exception as e:
+            logger.warning(f"Error incrementando el contador {key}: {str(e)}")
+            return None
+
+def create_backend(config, instance_path=None):
+    """
+    Crea el backend indicado por la configuración.
+    
+    Args:
+        config: Configuración de Flask (CACHE_BACKEND, CACHE_SQLITE_PATH, CACHE_REDIS_URL)
+        instance_path: Directorio de instancia (ubicación por defecto del archivo SQLite)
+    
+    Returns:
+        CacheBackend: Backend listo para usar
+    """
+    tipo = (config.get('CACHE_BACKEND') or 'sqlite').lower()
+    if tipo == 'redis':
+        return RedisCacheBackend(config.get('CACHE_REDIS_URL') or 'redis://localhost:6379/0')
+    if tipo == 'sqlite':
+        path = config.get('CACHE_SQLITE_PATH') or os.path.join(
+            instance_path or tempfile.gettempdir(), 'shared_cache.sqlite3'
+        )
+        return SQLiteCacheBackend(path)
+    return NullCacheBackend()
+
+def cache_namespace(config):
+    """
+    Espacio de nombres de las claves: CACHE_NAMESPACE o, por defecto, un hash de la
+    URI de la base (cada instalación con su propia base tiene sus propias claves).
+    """
+    if config.get('CACHE_NAMESPACE'):
+        return config['CACHE_NAMESPACE']
+    uri = str(config.get('SQLALCHEMY_DATABASE_URI') or '')
+    return hashlib.sha256(uri.encode('utf-8')).hexdigest()[:12]
+
+# Instancia compartida por el proceso (configurada en create_app)
+shared_cache = SharedCache()
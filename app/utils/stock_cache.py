@@ -0,0 +1,247 @@
+"""
+Cache en proceso para los mapas de stock
+Cache LRU/TTL acotado por espacio (un espacio por laboratorio, más los mapas globales),
+con invalidación precisa por (laboratorio, producto) desde los eventos de Movimiento.
+
+Con un cache compartido configurado (ver shared_cache), cada worker compara la
+generación de movimientos antes de confiar en sus valores: si otro proceso registró
+movimientos, el cache local se descarta. Los mapas completos se guardan además en el
+cache compartido bajo una clave que incluye la generación.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from app.utils.shared_cache import GENERACION_MOVIMIENTOS
+
+# Espacios para los mapas que no pertenecen a un único laboratorio
+ESPACIO_GLOBAL = '__global__'
+ESPACIO_POR_LABORATORIO = '__por_laboratorio__'
+
+# Marca de producto consultado sin fila en el ledger
+_AUSENTE = object()
+
+class _Entrada:
+    """Valores cacheados de un espacio (laboratorio o mapa global)"""
+    __slots__ = ('valores', 'completa', 'faltantes', 'expira', 'version')
+    
+    def __init__(self, expira):
+        self.valores = {}
+        self.completa = False    # True si `valores` contiene todos los productos del espacio
+        self.faltantes = set()   # Productos invalidados de una entrada completa
+        self.expira = expira
+        self.version = 0
+
+class StockCache:
+    """
+    Cache de mapas {product_id: valor} por espacio.
+    
+    Las lecturas completan solo los productos que faltan llamando al `loader`,
+    y las invalidaciones eliminan únicamente el producto afectado.
+    """
+    
+    def __init__(self, max_espacios=64, ttl=300, enabled=True):
+        self._lock = threading.RLock()
+        self._entradas = OrderedDict()
+        self.max_espacios = max_espacios
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.invalidaciones = 0
+        self.evicciones = 0
+        self.hits_compartidos = 0
+        self.invalidaciones_remotas = 0
+        self.shared = None
+        self._generacion = None
+    
+    def configure(self, max_espacios=None, ttl=None, enabled=None, shared=None):
+        """Ajusta los parámetros del cache (se llama desde create_app)"""
+        with self._lock:
+            if shared is not None:
+                self.shared = shared
+                self._generacion = None
+            if max_espacios is not None:
+                self.max_espacios = max_espacios
+            if ttl is not None:
+                self.ttl = ttl
+            if enabled is not None:
+                self.enabled = enabled
+            self._entradas.clear()
+    
+    def _obtener_entrada(self, espacio, crear=False):
+        """Devuelve la entrada vigente del espacio (marcándola como usada recientemente)"""
+        entrada = self._entradas.get(espacio)
+        ahora = time.monotonic()
+        if entrada is not None and entrada.expira <= ahora:
+            del self._entradas[espacio]
+            entrada = None
+        if entrada is None and crear:
+            entrada = _Entrada(ahora + self.ttl)
+            self._entradas[espacio] = entrada
+            while len(self._entradas) > self.max_espacios:
+                self._entradas.popitem(last=False)
+                self.evicciones += 1
+        if entrada is not None:
+            self._entradas.move_to_end(espacio)
+        return entrada
+    
+    @staticmethod
+    def _conocido(entrada, product_id):
+        if product_id in entrada.faltantes:
+            return False
+        return product_id in entrada.valores or entrada.completa
+    
+    @staticmethod
+    def _resultado(entrada_valores, product_ids):
+        if product_ids is None:
+            claves = entrada_valores.keys()
+        else:
+            claves = product_ids
+        resultado = {}
+        for product_id in claves:
+            valor = entrada_valores.get(product_id, _AUSENTE)
+            if valor is not _AUSENTE:
+                resultado[product_id] = valor
+        return resultado
+    
+    def get_map(self, espacio, product_ids, loader):
+        """
+        Obtiene el mapa de un espacio, consultando la base solo por lo que falta.
+        
+        Args:
+            espacio: ID de laboratorio o uno de los espacios globales
+            product_ids: Lista de productos, o None para el mapa completo
+            loader: Función loader(product_ids_o_None) -> dict que consulta la base
+        
+        Returns:
+            dict: {product_id: valor} (sin entradas para productos sin datos)
+        """
+        if not self.enabled:
+            return loader(list(product_ids) if product_ids is not None else None)
+        
+        generacion = self._sincronizar_generacion()
+        
+        with self._lock:
+            entrada = self._obtener_entrada(espacio, crear=True)
+            if product_ids is None:
+                pendientes = list(entrada.faltantes) if entrada.completa else None
+            else:
+                pendientes = [pid for pid in product_ids if not self._conocido(entrada, pid)]
+            
+            if pendientes is not None and not pendientes:
+                self.hits += 1
+                return self._resultado(entrada.valores, product_ids)
+            
+            self.misses += 1
+            version = entrada.version
+        
+        # Consultar la base fuera del lock (los mapas completos, primero en el cache compartido)
+        if pendientes is None and generacion is not None:
+            clave = f'stock:{espacio}:{generacion}'
+            datos = self.shared.get_json(clave)
+            if datos is None:
+                datos = loader(None)
+                self.shared.set_json(clave, datos, self.ttl)
+            else:
+                with self._lock:
+                    self.hits_compartidos += 1
+        else:
+            datos = loader(pendientes)
+        
+        with self._lock:
+            if self._entradas.get(espacio) is entrada and entrada.version == version:
+                if pendientes is None:
+                    entrada.valores = dict(datos)
+                    entrada.completa = True
+                    entrada.faltantes.clear()
+                else:
+                    for product_id in pendientes:
+                        entrada.valores[product_id] = datos.get(product_id, _AUSENTE)
+                        entrada.faltantes.discard(product_id)
+                valores = entrada.valores
+            else:
+                # Hubo una invalidación (o expiró la entrada) durante la consulta: no se guarda
+                valores = dict(entrada.valores)
+                valores.update(datos)
+            
+            return self._resultado(valores, product_ids)
+    
+    def _sincronizar_generacion(self):
+        """
+        Lee la generación de movimientos compartida y descarta el cache local si
+        otro worker registró cambios desde la última lectura.
+        
+        Returns:
+            int: Generación vigente, o None si no hay cache compartido disponible
+        """
+        if self.shared is None:
+            return None
+        generacion = self.shared.get_counter(GENERACION_MOVIMIENTOS)
+        if generacion is None:
+            return None
+        with self._lock:
+            if self._generacion != generacion:
+                if self._generacion is not None and self._entradas:
+                    self._entradas.clear()
+                    self.invalidaciones_remotas += 1
+                self._generacion = generacion
+        return generacion
+    
+    def notify_write(self):
+        """
+        Avanza la generación compartida tras confirmar movimientos en este proceso.
+        Las claves propias ya se invalidaron con precisión, así que el cache local
+        solo se descarta si otro worker avanzó la generación en el medio.
+        """
+        if self.shared is None:
+            return
+        generacion = self.shared.incr(GENERACION_MOVIMIENTOS)
+        with self._lock:
+            if generacion is None:
+                self._generacion = None
+                return
+            if self._generacion is not None and generacion != self._generacion + 1:
+                self._entradas.clear()
+                self.invalidaciones_remotas += 1
+            self._generacion = generacion
+    
+    def invalidate(self, lab_id, product_id):
+        """Invalida un (laboratorio, producto) en su espacio y en los mapas globales"""
+        with self._lock:
+            for espacio in (lab_id, ESPACIO_GLOBAL, ESPACIO_POR_LABORATORIO):
+                entrada = self._entradas.get(espacio)
+                if entrada is None:
+                    continue
+                entrada.valores.pop(product_id, None)
+                if entrada.completa:
+                    entrada.faltantes.add(product_id)
+                entrada.version += 1
+            self.invalidaciones += 1
+    
+    def clear(self):
+        """Vacía el cache (reconstrucciones del ledger, cargas masivas)"""
+        with self._lock:
+            self._entradas.clear()
+    
+    def stats(self):
+        """Contadores de uso del cache"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'enabled': self.enabled,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+                'invalidaciones': self.invalidaciones,
+                'evicciones': self.evicciones,
+                'hits_compartidos': self.hits_compartidos,
+                'invalidaciones_remotas': self.invalidaciones_remotas,
+                'generacion': self._generacion,
+                'espacios': len(self._entradas),
+                'max_espacios': self.max_espacios,
+                'ttl': self.ttl
+            }
+
+# Instancia compartida por el proceso
+stock_cache = StockCache()
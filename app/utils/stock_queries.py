@@ -0,0 +1,148 @@
+"""
+Consultas paginadas de productos con su stock
+El filtrado por stock, el orden y la paginación se resuelven en la base uniendo
+los productos con el ledger (tabla Stock), de modo que el costo de cada página no
+depende del tamaño del catálogo.
+"""
+from app.models.models import db, Producto, Stock, Laboratorio
+from app.utils.pagination import ManualPagination
+from app.utils.search_service import apply_product_search
+from sqlalchemy import func, and_
+
+def _aplicar_filtros_producto(query, tipo_producto=None, search_term=None):
+    """Filtros comunes del catálogo (tipo de producto y búsqueda en el índice de productos)"""
+    if tipo_producto:
+        query = query.filter(Producto.tipoProducto == tipo_producto)
+    if search_term:
+        query = apply_product_search(query, search_term)
+    return query
+
+def _filtrar_por_stock(query, stock, stock_filtro):
+    """Aplica el filtro 'inStock' / 'outOfStock' sobre una expresión de stock"""
+    if stock_filtro == 'inStock':
+        query = query.filter(stock > 0)
+    elif stock_filtro == 'outOfStock':
+        query = query.filter(stock <= 0)
+    return query
+
+def _paginar(query, page, per_page):
+    """Cuenta el total y trae solo la página pedida (LIMIT/OFFSET)"""
+    page = max(page, 1)
+    total = query.order_by(None).count()
+    items = query.limit(per_page).offset((page - 1) * per_page).all()
+    return ManualPagination(items, page, per_page, total)
+
+def local_stock_query(lab_id, tipo_producto=None, search_term=None, stock_filtro='all'):
+    """
+    Consulta (Producto, stock_en_lab) de todo el catálogo para un laboratorio, sin ordenar
+    ni paginar (base de local_stock_page y del endpoint de DataTables).
+    
+    Args:
+        lab_id: ID del laboratorio
+        tipo_producto: Filtrar por tipo de producto (opcional)
+        search_term: Texto a buscar en el nombre (opcional)
+        stock_filtro: 'all', 'inStock' (stock > 0) u 'outOfStock' (stock <= 0)
+    
+    Returns:
+        Query: Consulta con las columnas Producto y 'stock'
+    """
+    stock_local = func.coalesce(Stock.cantidad, 0)
+    query = db.session.query(Producto, stock_local.label('stock')).outerjoin(
+        Stock,
+        and_(Stock.idProducto == Producto.idProducto, Stock.idLaboratorio == lab_id)
+    )
+    query = _aplicar_filtros_producto(query, tipo_producto, search_term)
+    return _filtrar_por_stock(query, stock_local, stock_filtro)
+
+def local_stock_page(lab_id, page=1, per_page=20, tipo_producto=None, search_term=None,
+                     stock_filtro='all'):
+    """
+    Obtiene una página de productos con su stock en un laboratorio.
+    
+    Args:
+        lab_id: ID del laboratorio
+        page: Número de página (basado en 1)
+        per_page: Productos por página
+        tipo_producto: Filtrar por tipo de producto (opcional)
+        search_term: Texto a buscar en el nombre (opcional)
+        stock_filtro: 'all', 'inStock' (stock > 0) u 'outOfStock' (stock <= 0)
+    
+    Returns:
+        ManualPagination: Página cuyos items son tuplas (Producto, stock_en_lab)
+    """
+    query = local_stock_query(lab_id, tipo_producto, search_term, stock_filtro)
+    query = query.order_by(Producto.nombre, Producto.idProducto)
+    return _paginar(query, page, per_page)
+
+def global_stock_page(lab_id, page=1, per_page=20, tipo_producto=None, search_term=None,
+                      stock_filtro='all'):
+    """
+    Obtiene una página de productos con su stock global y el del laboratorio actual.
+    
+    Args:
+        lab_id: ID del laboratorio del técnico (para el stock local)
+        page: Número de página (basado en 1)
+        per_page: Productos por página
+        tipo_producto: Filtrar por tipo de producto (opcional)
+        search_term: Texto a buscar en el nombre (opcional)
+        stock_filtro: 'all', 'inStock' (stock global > 0) u 'outOfStock' (stock global <= 0)
+    
+    Returns:
+        ManualPagination: Página cuyos items son tuplas (Producto, stock_global, stock_local)
+    """
+    totales = db.session.query(
+        Stock.idProducto.label('idProducto'),
+        func.sum(Stock.cantidad).label('cantidad')
+    ).group_by(Stock.idProducto).subquery()
+    stock_global = func.coalesce(totales.c.cantidad, 0)
+    stock_local = func.coalesce(Stock.cantidad, 0)
+    
+    query = db.session.query(
+        Producto,
+        stock_global.label('stock_global'),
+        stock_local.label('stock_local')
+    ).outerjoin(
+        totales, totales.c.idProducto == Producto.idProducto
+    ).outerjoin(
+        Stock,
+        and_(Stock.idProducto == Producto.idProducto, Stock.idLaboratorio == lab_id)
+    )
+    query = _aplicar_filtros_producto(query, tipo_producto, search_term)
+    query = _filtrar_por_stock(query, stock_global, stock_filtro)
+    query = query.order_by(Producto.nombre, Producto.idProducto)
+    return _paginar(query, page, per_page)
+
+def labs_with_stock(product_ids):
+    """
+    Obtiene los laboratorios con stock positivo de un conjunto acotado de productos
+    (típicamente los de una página).
+    
+    Args:
+        product_ids: Lista de IDs de productos
+    
+    Returns:
+        dict: {product_id: [{'id', 'nombre', 'stock'}, ...]} ordenado por laboratorio
+    """
+    resultado = {}
+    if not product_ids:
+        return resultado
+    
+    rows = db.session.query(
+        Stock.idProducto,
+        Laboratorio.idLaboratorio,
+        Laboratorio.nombre,
+        Stock.cantidad
+    ).join(
+        Laboratorio, Laboratorio.idLaboratorio == Stock.idLaboratorio
+    ).filter(
+        Stock.idProducto.in_(product_ids),
+        Stock.cantidad > 0
+    ).order_by(Stock.idProducto, Laboratorio.idLaboratorio).all()
+    
+    for product_id, lab_id, nombre, cantidad in rows:
+        resultado.setdefault(product_id, []).append({
+            'nombre': nombre,
+            'id': lab_id,
+            'stock': cantidad
+        })
+    return resultado
@@ -1,84 +1,293 @@
 """
 Servicio para gestionar las operaciones de stock
-Cálculos de stock en tiempo real sin cache - Solución simplificada
+El stock vigente se lee del ledger materializado (tabla Stock), que se mantiene
+en la misma transacción que cada alta, baja o modificación de Movimiento.
+Las lecturas pasan por un cache en proceso invalidado por (laboratorio, producto).
 """
-from app.models.models import db, Stock, Movimiento, Producto
-from sqlalchemy import func, case
+from app.models.models import db, Stock, StockCheckpoint, Movimiento, Producto
+from app.utils.stock_cache import stock_cache, ESPACIO_GLOBAL, ESPACIO_POR_LABORATORIO
+from sqlalchemy import func, event, and_, or_, inspect, select, union_all
+from sqlalchemy.orm import Session, object_session
 
-# FUNCIONES PRINCIPALES PARA CÁLCULO DE STOCK EN TIEMPO REAL (SIN CACHE)
+# Tipos de movimiento según su efecto sobre el stock del laboratorio
+TIPOS_INGRESO = ('ingreso', 'compra')
+TIPOS_EGRESO = ('egreso', 'uso', 'salida', 'transferencia')
 
-def get_stock_for_product_in_lab(product_id, lab_id):
+def calcular_delta_movimiento(tipo_movimiento, cantidad):
     """
-    Calcula el stock actual de un producto en un laboratorio específico
-    basándose directamente en los movimientos. FUNCIÓN PRINCIPAL.
+    Devuelve el efecto con signo de un movimiento sobre el stock de su laboratorio.
     
     Args:
-        product_id: ID del producto
-        lab_id: ID del laboratorio
+        tipo_movimiento: Tipo de movimiento ('ingreso', 'compra', 'uso', 'transferencia', ...)
+        cantidad: Cantidad del movimiento
     
     Returns:
-        float: Stock actual calculado en tiempo real
-    """
-    result = db.session.query(
-        func.coalesce(
-            func.sum(
-                case(
-                    (Movimiento.tipoMovimiento.in_(['ingreso', 'compra']), Movimiento.cantidad),
-                    (Movimiento.tipoMovimiento.in_(['egreso', 'uso', 'salida', 'transferencia']), -Movimiento.cantidad),
-                    else_=0
-                )
-            ), 
-            0
-        ).label('stock_actual')
-    ).filter(
-        Movimiento.idProducto == product_id,
-        Movimiento.idLaboratorio == lab_id
-    ).scalar()
+        float: Cantidad positiva para ingresos, negativa para egresos, 0 para tipos desconocidos
+    """
+    if cantidad is None:
+        return 0.0
+    if tipo_movimiento in TIPOS_INGRESO:
+        return float(cantidad)
+    if tipo_movimiento in TIPOS_EGRESO:
+        return -float(cantidad)
+    return 0.0
+
+def movement_delta_expression():
+    """Expresión SQL con el efecto con signo de cada movimiento (columna persistida)"""
+    return Movimiento.delta
+
+# LEDGER DE STOCK: ACTUALIZACIÓN TRANSACCIONAL DESDE LOS EVENTOS DE MOVIMIENTO
+
+def _aplicar_delta(connection, lab_id, product_id, delta):
+    """
+    Suma `delta` al saldo (lab_id, product_id) del ledger usando la conexión del flush,
+    de modo que el ajuste queda en la misma transacción que el movimiento.
+    """
+    stock_table = Stock.__table__
+    result = connection.execute(
+        stock_table.update()
+        .where(and_(stock_table.c.idLaboratorio == lab_id,
+                    stock_table.c.idProducto == product_id))
+        .values(cantidad=stock_table.c.cantidad + delta)
+    )
+    if result.rowcount == 0:
+        connection.execute(
+            stock_table.insert().values(
+                idLaboratorio=lab_id,
+                idProducto=product_id,
+                cantidad=delta
+            )
+        )
+
+def _invalidar_cache(target, lab_id, product_id):
+    """
+    Invalida la clave en el cache de inmediato y la registra en la sesión para
+    volver a invalidarla al confirmar o revertir la transacción.
+    """
+    stock_cache.invalidate(lab_id, product_id)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault('stock_claves_modificadas', set()).add((lab_id, product_id))
+
+def _invalidar_cache_al_finalizar(session):
+    """
+    Repite las invalidaciones registradas en la sesión.
     
-    return float(result or 0)
+    Returns:
+        bool: True si la transacción había modificado stock
+    """
+    limpiar = session.info.pop('stock_cache_limpiar', False)
+    if limpiar:
+        stock_cache.clear()
+    claves = session.info.pop('stock_claves_modificadas', None)
+    if claves:
+        for lab_id, product_id in claves:
+            stock_cache.invalidate(lab_id, product_id)
+    return bool(limpiar or claves)
 
-def get_stock_map_for_lab(lab_id, product_ids=None):
+@event.listens_for(Session, 'after_commit')
+def _invalidar_cache_al_confirmar(session):
+    if _invalidar_cache_al_finalizar(session):
+        # Avisar al resto de los workers que hay movimientos nuevos
+        stock_cache.notify_write()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _invalidar_cache_al_revertir(session, previous_transaction):
+    _invalidar_cache_al_finalizar(session)
+
+def _marcar_checkpoint_desactualizado(connection, lab_id, product_id, timestamp):
     """
-    Obtiene un mapa de stock en tiempo real para productos en un laboratorio específico.
-    FUNCIÓN PRINCIPAL OPTIMIZADA.
+    Invalida el checkpoint (lab_id, product_id) si el movimiento es anterior a su
+    fecha de corte: el saldo guardado ya no refleja el historial.
+    """
+    if timestamp is None:
+        return
+    checkpoint_table = StockCheckpoint.__table__
+    connection.execute(
+        checkpoint_table.update()
+        .where(and_(checkpoint_table.c.idLaboratorio == lab_id,
+                    checkpoint_table.c.idProducto == product_id,
+                    checkpoint_table.c.fechaCorte > timestamp))
+        .values(desactualizado=True)
+    )
+
+def _valor_anterior(state, atributo):
+    """Obtiene el valor previo de un atributo modificado (o el actual si no cambió)"""
+    history = state.attrs[atributo].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, atributo)
+
+@event.listens_for(Movimiento, 'before_insert')
+@event.listens_for(Movimiento, 'before_update')
+def _calcular_delta(mapper, connection, target):
+    """Persiste el efecto con signo del movimiento: única fuente de la regla de signos"""
+    delta = calcular_delta_movimiento(target.tipoMovimiento, target.cantidad)
+    if target.delta != delta:
+        target.delta = delta
+
+@event.listens_for(Movimiento, 'after_insert')
+def _ledger_after_insert(mapper, connection, target):
+    _aplicar_delta(connection, target.idLaboratorio, target.idProducto, target.delta)
+    _invalidar_cache(target, target.idLaboratorio, target.idProducto)
+    _marcar_checkpoint_desactualizado(connection, target.idLaboratorio, target.idProducto, target.timestamp)
+
+@event.listens_for(Movimiento, 'after_delete')
+def _ledger_after_delete(mapper, connection, target):
+    if target.delta:
+        _aplicar_delta(connection, target.idLaboratorio, target.idProducto, -target.delta)
+    _invalidar_cache(target, target.idLaboratorio, target.idProducto)
+    _marcar_checkpoint_desactualizado(connection, target.idLaboratorio, target.idProducto, target.timestamp)
+
+def _registrar_historial_activo():
+    """
+    Fuerza a SQLAlchemy a cargar el valor previo de los campos que afectan el saldo
+    cuando se modifican sobre una instancia expirada; sin esto el historial no
+    tendría el valor anterior en `after_update`.
+    """
+    for campo in (Movimiento.tipoMovimiento, Movimiento.cantidad, Movimiento.idLaboratorio,
+                  Movimiento.idProducto, Movimiento.timestamp):
+        event.listen(campo, 'set', lambda target, value, oldvalue, initiator: value,
+                     active_history=True, retval=True)
+
+_registrar_historial_activo()
+
+@event.listens_for(Movimiento, 'after_update')
+def _ledger_after_update(mapper, connection, target):
+    state = inspect(target)
+    campos = ('tipoMovimiento', 'cantidad', 'idLaboratorio', 'idProducto', 'timestamp')
+    if not any(state.attrs[campo].history.has_changes() for campo in campos):
+        return
+    
+    lab_anterior = _valor_anterior(state, 'idLaboratorio')
+    producto_anterior = _valor_anterior(state, 'idProducto')
+    delta_anterior = calcular_delta_movimiento(
+        _valor_anterior(state, 'tipoMovimiento'),
+        _valor_anterior(state, 'cantidad')
+    )
+    if delta_anterior:
+        _aplicar_delta(connection, lab_anterior, producto_anterior, -delta_anterior)
+    _invalidar_cache(target, lab_anterior, producto_anterior)
+    _marcar_checkpoint_desactualizado(connection, lab_anterior, producto_anterior,
+                                      _valor_anterior(state, 'timestamp'))
+    
+    _aplicar_delta(connection, target.idLaboratorio, target.idProducto, target.delta)
+    _invalidar_cache(target, target.idLaboratorio, target.idProducto)
+    _marcar_checkpoint_desactualizado(connection, target.idLaboratorio, target.idProducto, target.timestamp)
+
+def apply_bulk_movements(filas):
+    """
+    Aplica al ledger y a los checkpoints el efecto de movimientos insertados en bloque
+    (las inserciones masivas no disparan los eventos de Movimiento). Usa la conexión
+    de la sesión, de modo que todo queda en la misma transacción. No hace commit.
     
     Args:
-        lab_id: ID del laboratorio
-        product_ids: Lista opcional de IDs de productos
+        filas: dicts con idLaboratorio, idProducto, delta y timestamp de cada movimiento
     
     Returns:
-        dict: {product_id: stock_actual}
+        int: Cantidad de saldos (laboratorio, producto) ajustados
     """
+    deltas = {}
+    primeros = {}
+    for fila in filas:
+        clave = (fila['idLaboratorio'], fila['idProducto'])
+        deltas[clave] = deltas.get(clave, 0.0) + fila['delta']
+        if clave not in primeros or fila['timestamp'] < primeros[clave]:
+            primeros[clave] = fila['timestamp']
+    
+    connection = db.session.connection()
+    for (lab_id, product_id), delta in deltas.items():
+        if delta:
+            _aplicar_delta(connection, lab_id, product_id, delta)
+        _marcar_checkpoint_desactualizado(connection, lab_id, product_id, primeros[(lab_id, product_id)])
+        stock_cache.invalidate(lab_id, product_id)
+    db.session.info.setdefault('stock_claves_modificadas', set()).update(deltas)
+    return len(deltas)
+
+# CONSULTAS AL LEDGER (LOADERS DEL CACHE DE STOCK)
+
+def _load_lab_map(lab_id, product_ids):
     query = db.session.query(
-        Movimiento.idProducto,
-        func.coalesce(
-            func.sum(
-                case(
-                    (Movimiento.tipoMovimiento.in_(['ingreso', 'compra']), Movimiento.cantidad),
-                    (Movimiento.tipoMovimiento.in_(['egreso', 'uso', 'salida', 'transferencia']), -Movimiento.cantidad),
-                    else_=0
-                )
-            ), 
-            0
-        ).label('stock_actual')
+        Stock.idProducto,
+        Stock.cantidad
     ).filter(
-        Movimiento.idLaboratorio == lab_id
+        Stock.idLaboratorio == lab_id
+    )
+    
+    if product_ids is not None:
+        query = query.filter(Stock.idProducto.in_(product_ids))
+    
+    return {row.idProducto: float(row.cantidad or 0) for row in query}
+
+def _load_global_map(product_ids):
+    query = db.session.query(
+        Stock.idProducto,
+        func.coalesce(func.sum(Stock.cantidad), 0).label('stock_global')
     )
     
-    if product_ids:
-        query = query.filter(Movimiento.idProducto.in_(product_ids))
+    if product_ids is not None:
+        query = query.filter(Stock.idProducto.in_(product_ids))
+    
+    query = query.group_by(Stock.idProducto)
+    
+    return {row.idProducto: float(row.stock_global or 0) for row in query}
+
+def _load_by_lab_map(product_ids):
+    query = db.session.query(
+        Stock.idProducto,
+        Stock.idLaboratorio,
+        Stock.cantidad
+    )
     
-    query = query.group_by(Movimiento.idProducto)
+    if product_ids is not None:
+        query = query.filter(Stock.idProducto.in_(product_ids))
     
     result = {}
     for row in query:
-        result[row.idProducto] = float(row.stock_actual or 0)
+        if row.idProducto not in result:
+            result[row.idProducto] = {}
+        result[row.idProducto][row.idLaboratorio] = float(row.cantidad or 0)
     
     return result
 
+# FUNCIONES PRINCIPALES PARA LECTURA DE STOCK (LEDGER + CACHE EN PROCESO)
+
+def get_stock_for_product_in_lab(product_id, lab_id):
+    """
+    Obtiene el stock actual de un producto en un laboratorio específico
+    desde el ledger materializado. FUNCIÓN PRINCIPAL.
+    
+    Args:
+        product_id: ID del producto
+        lab_id: ID del laboratorio
+    
+    Returns:
+        float: Stock actual
+    """
+    stock_map = get_stock_map_for_lab(lab_id, [product_id])
+    return stock_map.get(product_id, 0.0)
+
+def get_stock_map_for_lab(lab_id, product_ids=None):
+    """
+    Obtiene un mapa de stock para productos en un laboratorio específico.
+    FUNCIÓN PRINCIPAL OPTIMIZADA.
+    
+    Args:
+        lab_id: ID del laboratorio
+        product_ids: Lista opcional de IDs de productos
+    
+    Returns:
+        dict: {product_id: stock_actual}
+    """
+    return stock_cache.get_map(
+        lab_id,
+        product_ids or None,
+        lambda ids: _load_lab_map(lab_id, ids)
+    )
+
 def get_global_stock_map(product_ids=None):
     """
-    Obtiene un mapa de stock global (todos los laboratorios) en tiempo real.
+    Obtiene un mapa de stock global (todos los laboratorios).
     FUNCIÓN PRINCIPAL PARA STOCK GLOBAL.
     
     Args:
@@ -87,87 +296,173 @@ def get_global_stock_map(product_ids=None):
     Returns:
         dict: {product_id: stock_total_global}
     """
-    query = db.session.query(
+    return stock_cache.get_map(ESPACIO_GLOBAL, product_ids or None, _load_global_map)
+
+def get_stock_by_lab_map(product_ids=None):
+    """
+    Obtiene un mapa completo de stock por laboratorio.
+    FUNCIÓN PRINCIPAL PARA DISTRIBUCIÓN POR LABORATORIO.
+    
+    Args:
+        product_ids: Lista opcional de IDs de productos
+    
+    Returns:
+        dict: {product_id: {lab_id: stock_en_lab}}
+    """
+    stock_map = stock_cache.get_map(ESPACIO_POR_LABORATORIO, product_ids or None, _load_by_lab_map)
+    # Copia para que el llamador no modifique los diccionarios cacheados
+    return {product_id: dict(por_lab) for product_id, por_lab in stock_map.items()}
+
+# CHECKPOINTS DE STOCK: SALDO AL CORTE + MOVIMIENTOS POSTERIORES
+
+def checkpoint_balance_rows(antes_de=None, lab_id=None, product_ids=None):
+    """
+    Construye una subconsulta (idLaboratorio, idProducto, cantidad) cuya suma por clave
+    es el saldo calculado desde el historial: el checkpoint vigente de cada
+    (laboratorio, producto) más los movimientos posteriores a su fecha de corte.
+    Las claves sin checkpoint válido se calculan desde todo el historial.
+    
+    Args:
+        antes_de: Considerar solo movimientos con timestamp < antes_de (opcional)
+        lab_id: Limitar a un laboratorio (opcional)
+        product_ids: Limitar a una lista (o subconsulta) de productos (opcional)
+    
+    Returns:
+        Subquery: Filas a agrupar y sumar por el llamador
+    """
+    checkpoint = StockCheckpoint.__table__
+    condiciones_checkpoint = [checkpoint.c.desactualizado.is_(False)]
+    if antes_de is not None:
+        condiciones_checkpoint.append(checkpoint.c.fechaCorte <= antes_de)
+    
+    parte_checkpoints = select(
+        checkpoint.c.idLaboratorio,
+        checkpoint.c.idProducto,
+        checkpoint.c.cantidad.label('cantidad')
+    ).where(*condiciones_checkpoint)
+    
+    parte_movimientos = select(
+        Movimiento.idLaboratorio,
         Movimiento.idProducto,
-        func.coalesce(
-            func.sum(
-                case(
-                    (Movimiento.tipoMovimiento.in_(['ingreso', 'compra']), Movimiento.cantidad),
-                    (Movimiento.tipoMovimiento.in_(['egreso', 'uso', 'salida', 'transferencia']), -Movimiento.cantidad),
-                    else_=0
-                )
-            ), 
-            0
-        ).label('stock_global')
+        movement_delta_expression().label('cantidad')
+    ).select_from(
+        Movimiento.__table__.outerjoin(
+            checkpoint,
+            and_(checkpoint.c.idLaboratorio == Movimiento.idLaboratorio,
+                 checkpoint.c.idProducto == Movimiento.idProducto,
+                 *condiciones_checkpoint)
+        )
+    ).where(
+        or_(checkpoint.c.idCheckpoint.is_(None),
+            Movimiento.timestamp >= checkpoint.c.fechaCorte)
     )
     
-    if product_ids:
-        query = query.filter(Movimiento.idProducto.in_(product_ids))
+    if antes_de is not None:
+        parte_movimientos = parte_movimientos.where(Movimiento.timestamp < antes_de)
+    if lab_id:
+        parte_checkpoints = parte_checkpoints.where(checkpoint.c.idLaboratorio == lab_id)
+        parte_movimientos = parte_movimientos.where(Movimiento.idLaboratorio == lab_id)
+    if product_ids is not None:
+        parte_checkpoints = parte_checkpoints.where(checkpoint.c.idProducto.in_(product_ids))
+        parte_movimientos = parte_movimientos.where(Movimiento.idProducto.in_(product_ids))
     
-    query = query.group_by(Movimiento.idProducto)
+    return union_all(parte_checkpoints, parte_movimientos).subquery('saldos')
+
+def compute_stock_from_movements(lab_id=None, product_ids=None, antes_de=None):
+    """
+    Calcula los saldos desde el historial usando checkpoints, de modo que el costo
+    depende de la actividad reciente y no del historial completo.
     
-    result = {}
-    for row in query:
-        result[row.idProducto] = float(row.stock_global or 0)
+    Args:
+        lab_id: Limitar a un laboratorio (opcional)
+        product_ids: Lista opcional de IDs de productos
+        antes_de: Saldo considerando solo movimientos anteriores a esta fecha (opcional)
     
-    return result
+    Returns:
+        dict: {(lab_id, product_id): cantidad}
+    """
+    saldos = checkpoint_balance_rows(antes_de=antes_de, lab_id=lab_id, product_ids=product_ids)
+    query = select(
+        saldos.c.idLaboratorio,
+        saldos.c.idProducto,
+        func.coalesce(func.sum(saldos.c.cantidad), 0).label('cantidad')
+    ).group_by(saldos.c.idLaboratorio, saldos.c.idProducto)
+    
+    return {
+        (row.idLaboratorio, row.idProducto): float(row.cantidad or 0)
+        for row in db.session.execute(query)
+    }
 
-def get_stock_by_lab_map(product_ids=None):
+def get_stock_as_of(timestamp, lab_id=None, product_ids=None):
     """
-    Obtiene un mapa completo de stock por laboratorio en tiempo real.
-    FUNCIÓN PRINCIPAL PARA DISTRIBUCIÓN POR LABORATORIO.
+    Obtiene el saldo de apertura (justo antes de `timestamp`) de varios productos
+    en una sola consulta agrupada, apoyada en los checkpoints vigentes.
     
     Args:
+        timestamp: Instante de referencia (se suman movimientos con timestamp < timestamp)
+        lab_id: ID del laboratorio; si es None se suma el stock de todos los laboratorios
         product_ids: Lista opcional de IDs de productos
     
     Returns:
-        dict: {product_id: {lab_id: stock_en_lab}}
+        dict: {product_id: stock_al_instante}
     """
-    query = db.session.query(
-        Movimiento.idProducto,
-        Movimiento.idLaboratorio,
-        func.coalesce(
-            func.sum(
-                case(
-                    (Movimiento.tipoMovimiento.in_(['ingreso', 'compra']), Movimiento.cantidad),
-                    (Movimiento.tipoMovimiento.in_(['egreso', 'uso', 'salida', 'transferencia']), -Movimiento.cantidad),
-                    else_=0
-                )
-            ), 
-            0
-        ).label('stock_actual')
-    )
+    saldos = checkpoint_balance_rows(antes_de=timestamp, lab_id=lab_id, product_ids=product_ids)
+    query = select(
+        saldos.c.idProducto,
+        func.coalesce(func.sum(saldos.c.cantidad), 0).label('cantidad')
+    ).group_by(saldos.c.idProducto)
     
-    if product_ids:
-        query = query.filter(Movimiento.idProducto.in_(product_ids))
+    return {row.idProducto: float(row.cantidad or 0) for row in db.session.execute(query)}
+
+def roll_forward_checkpoints(fecha_corte):
+    """
+    Avanza todos los checkpoints hasta `fecha_corte`. Cada saldo nuevo se calcula
+    desde el checkpoint vigente anterior (o desde el historial completo si estaba
+    desactualizado). No hace commit.
     
-    query = query.group_by(Movimiento.idProducto, Movimiento.idLaboratorio)
+    Args:
+        fecha_corte: Nueva fecha de corte (se incluyen movimientos con timestamp < fecha_corte)
     
-    result = {}
-    for row in query:
-        if row.idProducto not in result:
-            result[row.idProducto] = {}
-        result[row.idProducto][row.idLaboratorio] = float(row.stock_actual or 0)
+    Returns:
+        int: Cantidad de checkpoints escritos
+    """
+    saldos = compute_stock_from_movements(antes_de=fecha_corte)
     
-    return result
+    StockCheckpoint.query.delete(synchronize_session=False)
+    if saldos:
+        db.session.execute(
+            StockCheckpoint.__table__.insert(),
+            [
+                {
+                    'idLaboratorio': lab_id,
+                    'idProducto': product_id,
+                    'fechaCorte': fecha_corte,
+                    'cantidad': cantidad,
+                    'desactualizado': False
+                }
+                for (lab_id, product_id), cantidad in saldos.items()
+            ]
+        )
+    
+    return len(saldos)
 
 # FUNCIONES DE COMPATIBILIDAD (REDIRIGEN A LAS FUNCIONES PRINCIPALES)
 # Mantenemos los nombres antiguos para no romper el código existente
 
 def get_stock_map_for_laboratory(lab_id, product_ids=None):
-    """Función de compatibilidad - usa cálculo en tiempo real"""
+    """Función de compatibilidad - usa el ledger de stock"""
     return get_stock_map_for_lab(lab_id, product_ids)
 
 def get_stock_for_product_in_laboratory(product_id, lab_id):
-    """Función de compatibilidad - usa cálculo en tiempo real"""
+    """Función de compatibilidad - usa el ledger de stock"""
     return get_stock_for_product_in_lab(product_id, lab_id)
 
 def get_global_stock_for_products(product_ids=None):
-    """Función de compatibilidad - usa cálculo en tiempo real"""
+    """Función de compatibilidad - usa el ledger de stock"""
     return get_global_stock_map(product_ids)
 
 def get_stock_map_for_all_laboratories(product_ids=None):
-    """Función de compatibilidad - usa cálculo en tiempo real"""
+    """Función de compatibilidad - usa el ledger de stock"""
     return get_stock_by_lab_map(product_ids)
 
 # FUNCIONES ANTIGUAS CONSERVADAS PARA REFERENCIAS
@@ -189,14 +484,64 @@ def get_real_time_stock_by_lab_map(product_ids=None):
     """Función legacy - usa la función principal"""
     return get_stock_by_lab_map(product_ids)
 
-# FUNCIONES UTILITARIAS (OPCIONALES - PARA MIGRACIÓN O CORRECCIÓN)
+# FUNCIONES UTILITARIAS (MIGRACIÓN O CORRECCIÓN DEL LEDGER)
 
 def recalculate_stock_from_movements(product_id=None, lab_id=None):
     """
-    DEPRECADA: Ya no es necesaria porque calculamos en tiempo real.
-    Se mantiene para compatibilidad pero no hace nada útil en el nuevo sistema.
+    Reconstruye el ledger de stock a partir de los checkpoints y los movimientos
+    posteriores a cada corte. Se usa para poblar la tabla Stock en bases
+    existentes o para corregir desvíos. No hace commit: el llamador decide
+    cuándo confirmar.
+    
+    Args:
+        product_id: Limitar la reconstrucción a un producto (opcional)
+        lab_id: Limitar la reconstrucción a un laboratorio (opcional)
+    
+    Returns:
+        int: Cantidad de saldos (laboratorio, producto) reconstruidos
+    """
+    saldos = compute_stock_from_movements(
+        lab_id=lab_id,
+        product_ids=[product_id] if product_id else None
+    )
+    
+    borrar_query = Stock.query
+    if product_id:
+        borrar_query = borrar_query.filter(Stock.idProducto == product_id)
+    if lab_id:
+        borrar_query = borrar_query.filter(Stock.idLaboratorio == lab_id)
+    
+    borrar_query.delete(synchronize_session=False)
+    if saldos:
+        db.session.execute(
+            Stock.__table__.insert(),
+            [
+                {
+                    'idLaboratorio': saldo_lab_id,
+                    'idProducto': saldo_product_id,
+                    'cantidad': cantidad
+                }
+                for (saldo_lab_id, saldo_product_id), cantidad in saldos.items()
+            ]
+        )
+    
+    stock_cache.clear()
+    db.session.info['stock_cache_limpiar'] = True
+    return len(saldos)
+
+def ensure_stock_ledger():
     """
-    print("⚠️  ADVERTENCIA: recalculate_stock_from_movements está deprecada.")
-    print("   El nuevo sistema calcula stock en tiempo real, no necesita recálculo.")
+    Puebla el ledger si está vacío pero ya existen movimientos
+    (bases creadas antes de que la tabla Stock fuera autoritativa).
+    
+    Returns:
+        bool: True si se reconstruyó el ledger
+    """
+    if db.session.query(Stock.idStock).first() is not None:
+        return False
+    if db.session.query(Movimiento.idMovimiento).first() is None:
+        return False
+    
+    recalculate_stock_from_movements()
+    db.session.commit()
     return True
-    
\ No newline at end of file
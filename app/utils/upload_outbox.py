@@ -0,0 +1,189 @@
+"""
+Bandeja de salida de archivos hacia Google Drive (documentos de movimientos y fichas
+de seguridad)
+Las rutas guardan el archivo subido en el directorio de un trabajo (spool_upload) y
+confirman el movimiento o producto junto con el trabajo, sin esperar a Drive. Un trabajo en segundo plano sube el archivo,
+reintenta con espera exponencial ante fallas y completa `urlDocumento` o
+`urlFichaSeguridad` al terminar. El estado de cada subida se consulta por la referencia
+del trabajo ('movimiento:<id>' o 'producto:<id>').
+
+Las subidas no son idempotentes: si Drive recibió el archivo pero la respuesta se
+perdió, el reintento puede dejar una copia de más en la carpeta (nunca un registro sin
+archivo).
+"""
+import base64
+import logging
+import os
+import shutil
+
+from flask import current_app
+from werkzeug.utils import secure_filename
+
+from app.models.models import db, Movimiento, Producto
+from app.integrations.google_drive import drive_integration
+from app.utils.job_service import (job_handler, enqueue, new_job_id, job_directory, jobs_by_reference,
+                                   RetryJob, ESTADO_PENDIENTE, ESTADO_EN_PROCESO, ESTADO_ERROR)
+
+logger = logging.getLogger(__name__)
+
+TIPO_DOCUMENTO_MOVIMIENTO = 'subir_documento_movimiento'
+TIPO_FICHA_SEGURIDAD = 'subir_ficha_seguridad'
+
+def movement_reference(movimiento_id):
+    return f'movimiento:{movimiento_id}'
+
+def product_reference(producto_id):
+    return f'producto:{producto_id}'
+
+def spool_upload(archivo):
+    """
+    Guarda el archivo subido en el directorio de un trabajo nuevo, todavía sin encolar.
+    Es el único paso que las rutas pueden dejar fallar y seguir: no toca la sesión.
+    
+    Args:
+        archivo: FileStorage subido en el formulario
+    
+    Returns:
+        dict: {'id_trabajo', 'ruta', 'nombre_archivo'} para queue_movement_document o
+              queue_safety_sheet
+    """
+    id_trabajo = new_job_id()
+    nombre = secure_filename(archivo.filename) or 'archivo'
+    ruta = os.path.join(job_directory(current_app, id_trabajo), nombre)
+    archivo.save(ruta)
+    return {'id_trabajo': id_trabajo, 'ruta': ruta, 'nombre_archivo': archivo.filename}
+
+def _encolar(tipo, referencia, guardado, parametros, usuario_id):
+    """Encola el trabajo de un archivo guardado con spool_upload"""
+    try:
+        return enqueue(tipo, dict(parametros, archivo=guardado['ruta'], nombre_archivo=guardado['nombre_archivo']),
+                       usuario_id=usuario_id, id_trabajo=guardado['id_trabajo'], referencia=referencia)
+    except Exception:
+        # Sin trabajo confirmado, el archivo guardado no tiene quién lo suba
+        shutil.rmtree(os.path.dirname(guardado['ruta']), ignore_errors=True)
+        raise
+
+def queue_movement_document(movimiento_id, lab_id, guardado, usuario_id=None):
+    """
+    Encola la subida del documento de un movimiento. Confirma la sesión actual junto
+    con el trabajo, por lo que el movimiento debe estar agregado a la sesión; si la
+    confirmación falla, la excepción se propaga.
+    
+    Args:
+        movimiento_id: ID del movimiento
+        lab_id: Laboratorio del movimiento (carpeta de Drive)
+        guardado: Archivo devuelto por spool_upload
+        usuario_id: Usuario que registró el movimiento
+    
+    Returns:
+        Trabajo: Trabajo de subida creado
+    """
+    return _encolar(TIPO_DOCUMENTO_MOVIMIENTO, movement_reference(movimiento_id), guardado, {
+        'movimiento_id': movimiento_id,
+        'lab_id': lab_id,
+        'tipo_archivo': 'application/pdf',  # Solo se aceptan PDFs
+    }, usuario_id)
+
+def queue_safety_sheet(producto_id, guardado, extension, usuario_id=None):
+    """
+    Encola la subida de la ficha de seguridad de un producto. Confirma la sesión actual
+    junto con el trabajo, por lo que el producto debe estar agregado a la sesión; si la
+    confirmación falla, la excepción se propaga.
+    
+    Args:
+        producto_id: ID del producto
+        guardado: Archivo devuelto por spool_upload
+        extension: Extensión ya validada (pdf, jpg, png, ...)
+        usuario_id: Usuario que cargó la ficha
+    
+    Returns:
+        Trabajo: Trabajo de subida creado
+    """
+    return _encolar(TIPO_FICHA_SEGURIDAD, product_reference(producto_id), guardado, {
+        'producto_id': producto_id,
+        'extension': extension,
+    }, usuario_id)
+
+def upload_states(referencias):
+    """
+    Estado de las subidas que todavía no terminaron bien, para mostrar en los listados.
+    
+    Args:
+        referencias: Referencias de las filas mostradas
+    
+    Returns:
+        dict: {referencia: {'id', 'estado', 'mensaje'}} donde estado es 'pendiente'
+              (en cola o subiendo) o 'error'; las subidas completadas no se incluyen
+    """
+    estados = {}
+    for referencia, trabajo in jobs_by_reference(referencias).items():
+        if trabajo.estado in (ESTADO_PENDIENTE, ESTADO_EN_PROCESO):
+            estados[referencia] = {'id': trabajo.idTrabajo, 'estado': 'pendiente', 'mensaje': trabajo.mensaje}
+        elif trabajo.estado == ESTADO_ERROR:
+            estados[referencia] = {'id': trabajo.idTrabajo, 'estado': 'error', 'mensaje': trabajo.mensaje}
+    return estados
+
+def _leer_base64(ruta):
+    with open(ruta, 'rb') as archivo:
+        return base64.b64encode(archivo.read()).decode('utf-8')
+
+def _reintentar(contexto, mensaje):
+    """Reencola con espera exponencial o, agotados los intentos, falla definitivamente"""
+    max_intentos = contexto.app.config.get('DRIVE_UPLOAD_MAX_ATTEMPTS', 5)
+    if contexto.intentos + 1 >= max_intentos:
+        raise RuntimeError(f'{mensaje} (después de {max_intentos} intentos)')
+    base = contexto.app.config.get('DRIVE_UPLOAD_RETRY_SECONDS', 60)
+    raise RetryJob(mensaje, retraso=base * (2 ** contexto.intentos))
+
+def _terminar(contexto):
+    """Elimina el archivo en cola una vez subido"""
+    ruta = contexto.params['archivo']
+    if os.path.exists(ruta):
+        os.remove(ruta)
+
+@job_handler(TIPO_DOCUMENTO_MOVIMIENTO)
+def _subir_documento_movimiento(contexto):
+    """Sube el documento de un movimiento y guarda su URL"""
+    params = contexto.params
+    resultado = drive_integration.upload_movimiento_documento(
+        lab_id=params['lab_id'],
+        movimiento_id=params['movimiento_id'],
+        file_data=_leer_base64(params['archivo']),
+        file_name=params['nombre_archivo'],
+        file_type=params['tipo_archivo']
+    )
+    if not resultado:
+        _reintentar(contexto, 'No se pudo subir el documento a Google Drive')
+    
+    movimiento = db.session.get(Movimiento, params['movimiento_id'])
+    if movimiento is None:
+        logger.warning(f"Movement {params['movimiento_id']} was deleted before its document was uploaded")
+    else:
+        movimiento.urlDocumento = resultado.get('file_url')
+        db.session.commit()
+    _terminar(contexto)
+    return {'file_id': resultado.get('file_id'), 'file_url': resultado.get('file_url'),
+            'mensaje': 'Documento subido a Google Drive'}
+
+@job_handler(TIPO_FICHA_SEGURIDAD)
+def _subir_ficha_seguridad(contexto):
+    """Sube la ficha de seguridad de un producto y guarda el ID del archivo"""
+    params = contexto.params
+    resultado = drive_integration.upload_ficha_seguridad(
+        params['producto_id'],
+        _leer_base64(params['archivo']),
+        params['extension']
+    )
+    if not resultado or 'file_id' not in resultado:
+        error = resultado.get('error') if resultado else 'error desconocido'
+        _reintentar(contexto, f'No se pudo subir la ficha de seguridad: {error}')
+    
+    producto = db.session.get(Producto, params['producto_id'])
+    if producto is None:
+        logger.warning(f"Product {params['producto_id']} was deleted before its safety sheet was uploaded")
+    else:
+        # Se guarda el ID del archivo (igual que la carga directa)
+        producto.urlFichaSeguridad = resultado['file_id']
+        db.session.commit()
+    _terminar(contexto)
+    return {'file_id': resultado['file_id'], 'mensaje': 'Ficha de seguridad subida a Google Drive'}
@@ -28,6 +28,66 @@ class Config:
     LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
     LOG_DIR = os.environ.get('LOG_DIR', 'logs')
     
+    # Cache en proceso de stock (por laboratorio, LRU + TTL)
+    STOCK_CACHE_ENABLED = os.environ.get('STOCK_CACHE_ENABLED', 'true').lower() == 'true'
+    STOCK_CACHE_TTL = int(os.environ.get('STOCK_CACHE_TTL', 300))
+    STOCK_CACHE_MAX_LABS = int(os.environ.get('STOCK_CACHE_MAX_LABS', 64))
+    
+    # Cache de catálogos para formularios (laboratorios, productos, proveedores)
+    CATALOG_CACHE_ENABLED = os.environ.get('CATALOG_CACHE_ENABLED', 'true').lower() == 'true'
+    CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 600))
+    
+    # Importación de productos: filas por lote (un commit por lote)
+    IMPORT_CHUNK_SIZE = int(os.environ.get('IMPORT_CHUNK_SIZE', 500))
+    
+    # Cliente HTTP del Apps Script de Google Drive (conexiones reutilizadas y reintentos)
+    GOOGLE_SCRIPT_POOL_SIZE = int(os.environ.get('GOOGLE_SCRIPT_POOL_SIZE', 10))
+    GOOGLE_SCRIPT_MAX_RETRIES = int(os.environ.get('GOOGLE_SCRIPT_MAX_RETRIES', 3))
+    GOOGLE_SCRIPT_RETRY_BACKOFF = float(os.environ.get('GOOGLE_SCRIPT_RETRY_BACKOFF', 0.5))
+    
+    # Cache en disco de archivos descargados de Drive (fichas de seguridad)
+    DRIVE_CACHE_ENABLED = os.environ.get('DRIVE_CACHE_ENABLED', 'true').lower() == 'true'
+    DRIVE_CACHE_DIR = os.environ.get('DRIVE_CACHE_DIR')  # por defecto, instance/drive_cache
+    DRIVE_CACHE_MAX_MB = int(os.environ.get('DRIVE_CACHE_MAX_MB', 500))
+    DRIVE_CACHE_TTL = int(os.environ.get('DRIVE_CACHE_TTL', 7 * 24 * 3600))
+    # Subidas a Drive en segundo plano: intentos y espera base (se duplica en cada reintento)
+    DRIVE_UPLOAD_MAX_ATTEMPTS = int(os.environ.get('DRIVE_UPLOAD_MAX_ATTEMPTS', 5))
+    DRIVE_UPLOAD_RETRY_SECONDS = int(os.environ.get('DRIVE_UPLOAD_RETRY_SECONDS', 60))
+    # Tamaño máximo de un archivo servido desde Drive (la descarga se corta al superarlo)
+    DRIVE_DOWNLOAD_MAX_MB = int(os.environ.get('DRIVE_DOWNLOAD_MAX_MB', 50))
+    # Correos en segundo plano: mensajes por llamada al Apps Script, intentos, espera base
+    # (se duplica en cada reintento), espera con la cuota diaria de MailApp agotada (no
+    # cuenta como intento) y ventana para descartar correos idénticos
+    EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', 20))
+    EMAIL_MAX_ATTEMPTS = int(os.environ.get('EMAIL_MAX_ATTEMPTS', 5))
+    EMAIL_RETRY_SECONDS = int(os.environ.get('EMAIL_RETRY_SECONDS', 60))
+    EMAIL_QUOTA_RETRY_SECONDS = int(os.environ.get('EMAIL_QUOTA_RETRY_SECONDS', 3600))
+    EMAIL_DEDUP_SECONDS = int(os.environ.get('EMAIL_DEDUP_SECONDS', 600))
+    
+    # IDs de movimiento: números reservados por cada viaje a la tabla de secuencias
+    ID_BLOCK_SIZE = int(os.environ.get('ID_BLOCK_SIZE', 20))
+    
+    # Trabajos en segundo plano (importaciones, exportaciones, sincronizaciones)
+    JOBS_DIR = os.environ.get('JOBS_DIR')  # por defecto, instance/jobs
+    JOBS_RUN_IN_APP = os.environ.get('JOBS_RUN_IN_APP', 'true').lower() == 'true'
+    JOBS_WORKER_THREADS = int(os.environ.get('JOBS_WORKER_THREADS', 2))
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 5))
+    # Un trabajo en proceso renueva su latido cada JOBS_HEARTBEAT_SECONDS; sin latido por
+    # más de JOBS_STALE_SECONDS se considera abandonado
+    JOBS_HEARTBEAT_SECONDS = float(os.environ.get('JOBS_HEARTBEAT_SECONDS', 60))
+    JOBS_STALE_SECONDS = int(os.environ.get('JOBS_STALE_SECONDS', 600))
+    
+    # Cache compartido entre workers (stock y catálogos): 'sqlite', 'redis' o 'none'
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'sqlite')
+    CACHE_SQLITE_PATH = os.environ.get('CACHE_SQLITE_PATH')  # por defecto, instance/shared_cache.sqlite3
+    # Prefijo de las claves (por defecto, un hash de la URI de la base de datos)
+    CACHE_NAMESPACE = os.environ.get('CACHE_NAMESPACE')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    
+    # Tablas sin contador sembrado que superen este tamaño muestran un total estimado
+    COUNT_APPROX_THRESHOLD = int(os.environ.get('COUNT_APPROX_THRESHOLD', 200000))
+    
     # Keycloak Configuration - Updated for v26
     # Note: Keycloak v26 changed URL structure from /auth to /keycloak
     KEYCLOAK_SERVER_URL = os.environ.get('KEYCLOAK_SERVER_URL', 'https://huayca.crub.uncoma.edu.ar/keycloak/')
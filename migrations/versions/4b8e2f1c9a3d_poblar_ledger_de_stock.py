@@ -0,0 +1,37 @@
+"""Poblar el ledger de stock desde los movimientos
+
+Revision ID: 4b8e2f1c9a3d
+Revises: dc2584637bea
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b8e2f1c9a3d'
+down_revision = 'dc2584637bea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # La tabla stock pasa a ser el saldo autoritativo: se recalcula desde el historial
+    op.execute("DELETE FROM stock")
+    op.execute("""
+        INSERT INTO stock ("idLaboratorio", "idProducto", cantidad)
+        SELECT "idLaboratorio", "idProducto",
+               COALESCE(SUM(CASE
+                   WHEN "tipoMovimiento" IN ('ingreso', 'compra') THEN cantidad
+                   WHEN "tipoMovimiento" IN ('egreso', 'uso', 'salida', 'transferencia') THEN -cantidad
+                   ELSE 0
+               END), 0)
+        FROM movimiento
+        GROUP BY "idLaboratorio", "idProducto"
+    """)
+
+
+def downgrade():
+    # El ledger se puede volver a generar en cualquier momento con `flask stock rebuild`
+    op.execute("DELETE FROM stock")
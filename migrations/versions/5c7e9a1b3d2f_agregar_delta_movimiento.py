@@ -0,0 +1,49 @@
+"""Agregar columna delta a movimiento con índice cubriente
+
+Revision ID: 5c7e9a1b3d2f
+Revises: 8f3a6d2e5c1b
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c7e9a1b3d2f'
+down_revision = '8f3a6d2e5c1b'
+branch_labels = None
+depends_on = None
+
+# Mismas reglas que stock_service.TIPOS_INGRESO / TIPOS_EGRESO al momento de la migración
+TIPOS_INGRESO = ('ingreso', 'compra')
+TIPOS_EGRESO = ('egreso', 'uso', 'salida', 'transferencia')
+
+
+def upgrade():
+    with op.batch_alter_table('movimiento', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('delta', sa.Float(), nullable=False, server_default='0'))
+
+    # Completar el delta de los movimientos existentes
+    movimiento = sa.table(
+        'movimiento',
+        sa.column('tipoMovimiento', sa.String),
+        sa.column('cantidad', sa.Float),
+        sa.column('delta', sa.Float)
+    )
+    op.execute(
+        movimiento.update().values(delta=sa.case(
+            (movimiento.c.tipoMovimiento.in_(TIPOS_INGRESO), movimiento.c.cantidad),
+            (movimiento.c.tipoMovimiento.in_(TIPOS_EGRESO), -movimiento.c.cantidad),
+            else_=0
+        ))
+    )
+
+    op.create_index('idx_movimiento_lab_producto_delta', 'movimiento',
+                    ['idLaboratorio', 'idProducto', 'delta'], unique=False)
+
+
+def downgrade():
+    op.drop_index('idx_movimiento_lab_producto_delta', table_name='movimiento')
+    with op.batch_alter_table('movimiento', schema=None) as batch_op:
+        batch_op.drop_column('delta')
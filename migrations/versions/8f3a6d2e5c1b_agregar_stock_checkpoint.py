@@ -0,0 +1,35 @@
+"""Agregar tabla stock_checkpoint
+
+Revision ID: 8f3a6d2e5c1b
+Revises: 4b8e2f1c9a3d
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f3a6d2e5c1b'
+down_revision = '4b8e2f1c9a3d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('stock_checkpoint',
+        sa.Column('idCheckpoint', sa.Integer(), nullable=False),
+        sa.Column('idProducto', sa.String(length=10), nullable=False),
+        sa.Column('idLaboratorio', sa.String(length=10), nullable=False),
+        sa.Column('fechaCorte', sa.DateTime(), nullable=False),
+        sa.Column('cantidad', sa.Float(), nullable=False),
+        sa.Column('desactualizado', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['idLaboratorio'], ['laboratorio.idLaboratorio'], ),
+        sa.ForeignKeyConstraint(['idProducto'], ['producto.idProducto'], ),
+        sa.PrimaryKeyConstraint('idCheckpoint'),
+        sa.UniqueConstraint('idLaboratorio', 'idProducto', name='unique_checkpoint_laboratorio_producto')
+    )
+
+
+def downgrade():
+    op.drop_table('stock_checkpoint')
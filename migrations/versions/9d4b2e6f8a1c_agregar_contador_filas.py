@@ -0,0 +1,29 @@
+"""Agregar tabla contador_filas
+
+Revision ID: 9d4b2e6f8a1c
+Revises: 5c7e9a1b3d2f
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9d4b2e6f8a1c'
+down_revision = '5c7e9a1b3d2f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los contadores se siembran al primer uso (o con `flask counts rebuild`)
+    op.create_table('contador_filas',
+        sa.Column('clave', sa.String(length=150), nullable=False),
+        sa.Column('cantidad', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('clave')
+    )
+
+
+def downgrade():
+    op.drop_table('contador_filas')
@@ -0,0 +1,42 @@
+"""Agregar índice de búsqueda de productos
+
+Revision ID: a3f1c7d9e2b4
+Revises: 9d4b2e6f8a1c
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f1c7d9e2b4'
+down_revision = '9d4b2e6f8a1c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # El contenido normalizado se carga al iniciar la aplicación (ensure_search_index)
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'sqlite':
+        op.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS producto_busqueda USING fts5('
+            '"idProducto" UNINDEXED, texto, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+    elif dialecto == 'postgresql':
+        op.execute(
+            'CREATE TABLE IF NOT EXISTS producto_busqueda ('
+            '"idProducto" VARCHAR(10) PRIMARY KEY '
+            'REFERENCES producto("idProducto") ON DELETE CASCADE, '
+            'texto TEXT NOT NULL)'
+        )
+        op.execute(
+            'CREATE INDEX IF NOT EXISTS idx_producto_busqueda_texto ON producto_busqueda '
+            "USING GIN (to_tsvector('simple', texto))"
+        )
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS producto_busqueda')
@@ -0,0 +1,44 @@
+"""Agregar tabla trabajo (tareas en segundo plano)
+
+Revision ID: b7e2d4f6a8c1
+Revises: a3f1c7d9e2b4
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e2d4f6a8c1'
+down_revision = 'a3f1c7d9e2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('trabajo',
+        sa.Column('idTrabajo', sa.String(length=32), nullable=False),
+        sa.Column('tipo', sa.String(length=50), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('parametros', sa.Text(), nullable=True),
+        sa.Column('progreso', sa.Integer(), nullable=True),
+        sa.Column('mensaje', sa.String(length=255), nullable=True),
+        sa.Column('resultado', sa.Text(), nullable=True),
+        sa.Column('archivoResultado', sa.String(length=255), nullable=True),
+        sa.Column('idUsuario', sa.String(length=10), nullable=True),
+        sa.Column('fechaCreacion', sa.DateTime(), nullable=False),
+        sa.Column('fechaInicio', sa.DateTime(), nullable=True),
+        sa.Column('fechaFin', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['idUsuario'], ['usuario.idUsuario'], ),
+        sa.PrimaryKeyConstraint('idTrabajo')
+    )
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.create_index('idx_trabajo_estado_creacion', ['estado', 'fechaCreacion'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.drop_index('idx_trabajo_estado_creacion')
+
+    op.drop_table('trabajo')
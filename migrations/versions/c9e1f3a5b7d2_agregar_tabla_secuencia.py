@@ -0,0 +1,29 @@
+"""Agregar tabla secuencia
+
+Revision ID: c9e1f3a5b7d2
+Revises: b7e2d4f6a8c1
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c9e1f3a5b7d2'
+down_revision = 'b7e2d4f6a8c1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las secuencias se siembran al primer uso, por encima de los IDs existentes
+    op.create_table('secuencia',
+        sa.Column('nombre', sa.String(length=50), nullable=False),
+        sa.Column('valor', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('nombre')
+    )
+
+
+def downgrade():
+    op.drop_table('secuencia')
@@ -0,0 +1,32 @@
+"""Agregar reintentos y referencia a trabajo
+
+Revision ID: d4a6c8e0f2b3
+Revises: c9e1f3a5b7d2
+Create Date: 2026-10-18 20:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd4a6c8e0f2b3'
+down_revision = 'c9e1f3a5b7d2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('disponibleDesde', sa.DateTime(), nullable=True))
+        batch_op.add_column(sa.Column('referencia', sa.String(length=50), nullable=True))
+        batch_op.create_index(batch_op.f('ix_trabajo_referencia'), ['referencia'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_trabajo_referencia'))
+        batch_op.drop_column('referencia')
+        batch_op.drop_column('disponibleDesde')
+        batch_op.drop_column('intentos')
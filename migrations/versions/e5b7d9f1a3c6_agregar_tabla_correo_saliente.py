@@ -0,0 +1,47 @@
+"""Agregar tabla correo_saliente
+
+Revision ID: e5b7d9f1a3c6
+Revises: d4a6c8e0f2b3
+Create Date: 2026-10-18 22:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b7d9f1a3c6'
+down_revision = 'd4a6c8e0f2b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('correo_saliente',
+        sa.Column('idCorreo', sa.Integer(), nullable=False),
+        sa.Column('destinatario', sa.String(length=120), nullable=False),
+        sa.Column('asunto', sa.String(length=255), nullable=False),
+        sa.Column('cuerpoHtml', sa.Text(), nullable=False),
+        sa.Column('nombreRemitente', sa.String(length=100), nullable=True),
+        sa.Column('responderA', sa.String(length=120), nullable=True),
+        sa.Column('huella', sa.String(length=64), nullable=False),
+        sa.Column('estado', sa.String(length=20), nullable=False),
+        sa.Column('intentos', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('disponibleDesde', sa.DateTime(), nullable=True),
+        sa.Column('lote', sa.String(length=32), nullable=True),
+        sa.Column('ultimoError', sa.String(length=255), nullable=True),
+        sa.Column('fechaCreacion', sa.DateTime(), nullable=False),
+        sa.Column('fechaIntento', sa.DateTime(), nullable=True),
+        sa.Column('fechaEnvio', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('idCorreo')
+    )
+    with op.batch_alter_table('correo_saliente', schema=None) as batch_op:
+        batch_op.create_index('idx_correo_estado_disponible', ['estado', 'disponibleDesde'], unique=False)
+        batch_op.create_index(batch_op.f('ix_correo_saliente_huella'), ['huella'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('correo_saliente', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_correo_saliente_huella'))
+        batch_op.drop_index('idx_correo_estado_disponible')
+    op.drop_table('correo_saliente')
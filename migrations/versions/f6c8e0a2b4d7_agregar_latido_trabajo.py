@@ -0,0 +1,26 @@
+"""Agregar latido a trabajo
+
+Revision ID: f6c8e0a2b4d7
+Revises: e5b7d9f1a3c6
+Create Date: 2026-10-18 23:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f6c8e0a2b4d7'
+down_revision = 'e5b7d9f1a3c6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('ultimoLatido', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('trabajo', schema=None) as batch_op:
+        batch_op.drop_column('ultimoLatido')
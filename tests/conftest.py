@@ -0,0 +1,53 @@
+"""
+Fixtures compartidas para las pruebas que necesitan una base de datos.
+Se usa una aplicación Flask mínima (sin Keycloak ni blueprints) sobre SQLite en memoria.
+"""
+import os
+import sys
+
+import pytest
+from flask import Flask
+
+# Agregar el directorio del proyecto al path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.models.models import db, Laboratorio, Producto
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(
+        TESTING=True,
+        SECRET_KEY='test',
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(app)
+    
+    # Registrar los eventos de SQLAlchemy igual que create_app
+    from app.utils import stock_service, count_service, search_service  # noqa: F401
+    from app.utils.stock_cache import stock_cache
+    from app.utils.product_index import product_index
+    from app.utils.catalog_cache import catalog_cache
+    from app.utils.id_service import movement_ids
+    product_index.reset()
+    movement_ids.configure(bloque=20)
+    catalog_cache.configure(ttl=300, enabled=True)
+    stock_cache.configure(max_espacios=64, ttl=300, enabled=True)
+    
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Laboratorio(idLaboratorio='L001', nombre='Química', direccion='Aula 1'),
+            Laboratorio(idLaboratorio='L002', nombre='Biología', direccion='Aula 2'),
+            Producto(idProducto='P001', nombre='Ácido clorhídrico', tipoProducto='droguero',
+                     estadoFisico='liquido', controlSedronar=True),
+            Producto(idProducto='P002', nombre='Guantes de nitrilo', tipoProducto='seguridad',
+                     estadoFisico='solido'),
+        ])
+        db.session.commit()
+        search_service.ensure_search_index()
+        yield app
+        db.session.remove()
+        db.drop_all()
@@ -0,0 +1,55 @@
+"""
+Pruebas del cache de catálogos para formularios
+"""
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from app.models.models import db, Laboratorio, Proveedor
+from app.utils.catalog_cache import catalog_cache, laboratorio_choices, proveedor_choices
+
+
+@contextmanager
+def _contar_consultas():
+    consultas = []
+    
+    def _registrar(conn, cursor, statement, parameters, context, executemany):
+        consultas.append(statement)
+    
+    event.listen(db.engine, 'before_cursor_execute', _registrar)
+    try:
+        yield consultas
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', _registrar)
+
+
+def test_lecturas_repetidas_no_consultan_la_base(app):
+    assert laboratorio_choices() == [('L001', 'Química'), ('L002', 'Biología')]
+    assert laboratorio_choices(excluir='L001') == [('L002', 'Biología')]
+    
+    with _contar_consultas() as consultas:
+        laboratorio_choices()
+        catalog_cache.get('laboratorios')
+    assert consultas == []
+    assert catalog_cache.get('laboratorios')[0].nombre == 'Química'
+
+
+def test_escrituras_confirmadas_invalidan_el_catalogo(app):
+    assert proveedor_choices() == [(0, 'Nuevo proveedor...')]
+    
+    db.session.add(Proveedor(nombre='Droguería Sur', cuit='20123456789'))
+    db.session.commit()
+    proveedor = Proveedor.query.one()
+    assert proveedor_choices() == [(0, 'Nuevo proveedor...'), (proveedor.idProveedor, 'Droguería Sur (20123456789)')]
+    
+    db.session.get(Laboratorio, 'L002').nombre = 'Microbiología'
+    db.session.commit()
+    assert ('L002', 'Microbiología') in laboratorio_choices()
+    
+    # Un cambio revertido no invalida ni modifica el catálogo
+    db.session.add(Laboratorio(idLaboratorio='L003', nombre='Física', direccion='Aula 3'))
+    db.session.flush()
+    db.session.rollback()
+    with _contar_consultas() as consultas:
+        assert [lab for lab, _ in laboratorio_choices()] == ['L001', 'L002']
+    assert consultas == []
@@ -0,0 +1,50 @@
+"""
+Pruebas del servicio de conteo de filas
+"""
+from app.models.models import db, ContadorFilas, Producto, Proveedor
+from app.utils.count_service import get_count, count_query, rebuild_counts, _sembrar
+
+
+def test_contadores_se_siembran_y_siguen_a_los_eventos(app):
+    assert get_count(Producto) == 2
+    assert get_count(Producto, 'tipoProducto', 'vidrio') == 0
+    assert db.session.get(ContadorFilas, 'producto').cantidad == 2
+    
+    db.session.add(Producto(idProducto='P003', nombre='Pipeta', tipoProducto='vidrio',
+                            estadoFisico='solido'))
+    db.session.commit()
+    assert get_count(Producto) == 3
+    assert get_count(Producto, 'tipoProducto', 'vidrio') == 1
+    
+    producto = db.session.get(Producto, 'P003')
+    producto.tipoProducto = 'seguridad'
+    db.session.commit()
+    assert get_count(Producto, 'tipoProducto', 'vidrio') == 0
+    
+    db.session.delete(db.session.get(Producto, 'P003'))
+    db.session.commit()
+    assert get_count(Producto) == 2
+    assert rebuild_counts() >= 1
+    assert get_count(Producto, 'tipoProducto', 'droguero') == 1
+
+
+def test_conteo_con_filtros_no_mantenidos_usa_la_consulta(app):
+    query = Producto.query.filter(Producto.nombre.ilike('%guantes%'))
+    assert count_query(Producto, query, {'nombre': 'guantes'}) == 1
+    assert db.session.get(ContadorFilas, 'producto|nombre=guantes') is None
+
+
+def test_tablas_grandes_sin_contador_usan_estimacion(app):
+    app.config['COUNT_APPROX_THRESHOLD'] = 1
+    db.session.add_all([Proveedor(nombre=f'Proveedor {i}', cuit=f'2012345678{i}') for i in range(3)])
+    db.session.commit()
+    assert get_count(Proveedor) == 3
+    assert db.session.get(ContadorFilas, 'proveedor') is None
+
+
+def test_siembra_cuenta_en_la_misma_sentencia_y_respeta_la_de_otro_proceso(app):
+    assert _sembrar(Producto, 'producto|tipoProducto=droguero', 'tipoProducto', 'droguero') == 1
+    # Si otro proceso lo sembró primero (y ya lo ajustaron los eventos), se usa su valor
+    db.session.add(ContadorFilas(clave='producto', cantidad=7))
+    db.session.commit()
+    assert _sembrar(Producto, 'producto') == 7
@@ -0,0 +1,48 @@
+"""
+Pruebas del soporte de DataTables en modo servidor
+"""
+from werkzeug.datastructures import MultiDict
+
+from app.models.models import Producto
+from app.utils.datatables import parse_datatables_args, datatables_response, MAX_LENGTH
+
+
+def _args(**extra):
+    args = {
+        'draw': '3', 'start': '0', 'length': '-1', 'search[value]': ' guan ',
+        'columns[0][data]': 'idProducto', 'columns[1][data]': 'nombre',
+        'order[0][column]': '1', 'order[0][dir]': 'desc',
+    }
+    args.update(extra)
+    return MultiDict(args)
+
+
+def test_parametros_normalizados():
+    dt_request = parse_datatables_args(_args())
+    assert dt_request.draw == 3
+    assert dt_request.length == MAX_LENGTH  # "Todos" no está permitido
+    assert dt_request.search == 'guan'
+    assert dt_request.order == [('nombre', 'desc')]
+
+
+def test_respuesta_filtra_ordena_y_pagina_en_sql(app):
+    columnas = {'idProducto': Producto.idProducto, 'nombre': Producto.nombre}
+    
+    def serializar(p):
+        return {'idProducto': p.idProducto}
+    
+    respuesta = datatables_response(
+        parse_datatables_args(_args(**{'search[value]': ''})), Producto.query, serializar,
+        columnas_orden=columnas, columnas_busqueda=[Producto.nombre]
+    )
+    assert respuesta['recordsTotal'] == respuesta['recordsFiltered'] == 2
+    assert [fila['idProducto'] for fila in respuesta['data']] == ['P001', 'P002']  # 'Á' > 'G'
+    
+    respuesta = datatables_response(
+        parse_datatables_args(_args(length='1')), Producto.query, serializar,
+        columnas_orden=columnas, columnas_busqueda=[Producto.nombre]
+    )
+    assert respuesta['draw'] == 3
+    assert respuesta['recordsTotal'] == 2
+    assert respuesta['recordsFiltered'] == 1
+    assert respuesta['data'] == [{'idProducto': 'P002'}]
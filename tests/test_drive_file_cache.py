@@ -0,0 +1,103 @@
+"""
+Pruebas del cache en disco de archivos de Drive
+"""
+import os
+
+from flask import Flask, send_file
+
+from app.integrations.google_drive import DownloadTooLargeError
+from app.utils.drive_file_cache import DriveFileCache
+
+
+def _loader(contenidos, llamadas, limite=None):
+    def abrir(file_id):
+        llamadas.append(file_id)
+        if file_id not in contenidos:
+            return {'error': 'File not found', 'status': 404}
+        datos = contenidos[file_id]
+        
+        def bloques():
+            for inicio in range(0, len(datos), 4):
+                if limite is not None and inicio + 4 > limite:
+                    raise DownloadTooLargeError(f'{file_id} supera {limite} bytes')
+                yield datos[inicio:inicio + 4]
+        return {'chunks': bloques(), 'file_name': f'{file_id}.pdf', 'mime_type': 'application/pdf',
+                'file_size': None}
+    return abrir
+
+
+def test_segunda_vista_sin_descarga(tmp_path):
+    cache = DriveFileCache(directorio=str(tmp_path))
+    llamadas = []
+    loader = _loader({'abc': b'%PDF-1.4 ficha'}, llamadas)
+    
+    primera = cache.get('abc', loader)
+    segunda = cache.get('abc', loader)
+    
+    assert llamadas == ['abc']
+    assert primera['ruta'] == segunda['ruta'] and primera['etag'] == segunda['etag']
+    with open(segunda['ruta'], 'rb') as archivo:
+        assert archivo.read() == b'%PDF-1.4 ficha'
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 1)
+    
+    # Otra instancia (otro worker) ve el mismo archivo
+    assert DriveFileCache(directorio=str(tmp_path)).get('abc', loader)['etag'] == primera['etag']
+    assert llamadas == ['abc']
+
+
+def test_errores_no_se_guardan(tmp_path):
+    cache = DriveFileCache(directorio=str(tmp_path))
+    llamadas = []
+    loader = _loader({}, llamadas)
+    
+    assert cache.get('nope', loader)['error'] == 'File not found'
+    assert cache.get('nope', loader)['error'] == 'File not found'
+    assert llamadas == ['nope', 'nope']
+    assert os.listdir(tmp_path) == []
+
+
+def test_desalojo_lru_por_tamano(tmp_path):
+    cache = DriveFileCache(directorio=str(tmp_path), max_bytes=250)
+    contenidos = {'a1': b'a' * 100, 'b2': b'b' * 100, 'c3': b'c' * 100}
+    llamadas = []
+    loader = _loader(contenidos, llamadas)
+    
+    cache.get('a1', loader)
+    cache.get('b2', loader)
+    os.utime(os.path.join(tmp_path, 'a1.bin'), (1, 1))
+    os.utime(os.path.join(tmp_path, 'b2.bin'), (2, 2))
+    cache.get('a1', loader)   # uso reciente: 'a1' pasa a ser el más nuevo
+    cache.get('c3', loader)   # supera el máximo: se desaloja 'b2'
+    
+    assert sorted(nombre for nombre in os.listdir(tmp_path) if nombre.endswith('.bin')) == ['a1.bin', 'c3.bin']
+    assert cache.stats()['evicciones'] == 1
+    assert llamadas == ['a1', 'b2', 'c3']
+
+
+def test_limite_y_transmision_directa(tmp_path):
+    cache = DriveFileCache(directorio=str(tmp_path))
+    resultado = cache.get('grande', _loader({'grande': b'x' * 40}, [], limite=16))
+    assert resultado['status'] == 413
+    assert os.listdir(tmp_path) == []
+    
+    # Con el cache desactivado el archivo se entrega como iterador de bloques
+    cache.configure(enabled=False)
+    resultado = cache.get('abc', _loader({'abc': b'0123456789'}, []))
+    assert 'ruta' not in resultado and b''.join(resultado['chunks']) == b'0123456789'
+
+
+def test_send_file_condicional_y_rangos(tmp_path):
+    cache = DriveFileCache(directorio=str(tmp_path))
+    entrada = cache.get('abc', _loader({'abc': b'0123456789'}, []))
+    app = Flask(__name__)
+    
+    def responder(**headers):
+        with app.test_request_context(headers=headers):
+            respuesta = send_file(entrada['ruta'], mimetype='application/pdf', etag=entrada['etag'],
+                                  conditional=True, download_name=entrada['file_name'])
+            respuesta.direct_passthrough = False
+            return respuesta
+    
+    assert responder(**{'If-None-Match': f'"{entrada["etag"]}"'}).status_code == 304
+    parcial = responder(Range='bytes=2-4')
+    assert parcial.status_code == 206 and parcial.get_data() == b'234'
@@ -0,0 +1,127 @@
+"""
+Pruebas de la bandeja de salida de correos
+"""
+from datetime import datetime, timedelta
+
+from app.models.models import db, CorreoSaliente, Trabajo
+from app.integrations.google_drive import drive_integration
+from app.utils import email_outbox
+from app.utils.job_service import claim_next, run_job, ESTADO_COMPLETADO, ESTADO_PENDIENTE
+
+
+def _vencer_esperas():
+    """Simula que pasó el tiempo de espera antes de los reintentos"""
+    pasado = datetime.utcnow() - timedelta(seconds=1)
+    for correo in CorreoSaliente.query.filter(CorreoSaliente.disponibleDesde.isnot(None)):
+        correo.disponibleDesde = pasado
+    for trabajo in Trabajo.query.filter(Trabajo.disponibleDesde.isnot(None)):
+        trabajo.disponibleDesde = pasado
+    db.session.commit()
+
+
+def test_correos_se_envian_en_lotes_y_sin_duplicados(app, monkeypatch):
+    app.config.update(EMAIL_BATCH_SIZE=2)
+    lotes = []
+    
+    def enviar(mensajes):
+        lotes.append([mensaje['to'] for mensaje in mensajes])
+        return {'results': {mensaje['id']: None for mensaje in mensajes}}
+    monkeypatch.setattr(drive_integration, 'send_emails', enviar)
+    
+    for numero in range(3):
+        email_outbox.queue_email(f'usuario{numero}@crub.edu.ar', 'Bienvenido', '<p>Hola</p>')
+    # Un correo idéntico a uno en cola se descarta
+    repetido = email_outbox.queue_email('Usuario0@crub.edu.ar', 'Bienvenido', '<p>Hola</p>')
+    assert repetido.idCorreo == 1
+    assert CorreoSaliente.query.count() == 3
+    # Un solo trabajo de envío para todos los correos
+    assert Trabajo.query.filter_by(tipo=email_outbox.TIPO_ENVIO_CORREOS).count() == 1
+    
+    assert run_job(app, claim_next()) is True
+    assert lotes == [['usuario0@crub.edu.ar', 'usuario1@crub.edu.ar'], ['usuario2@crub.edu.ar']]
+    db.session.expire_all()
+    assert {correo.estado for correo in CorreoSaliente.query} == {email_outbox.CORREO_ENVIADO}
+    
+    # Recién enviado: también se descarta; con otro contenido se encola y reprograma el envío
+    email_outbox.queue_email('usuario1@crub.edu.ar', 'Bienvenido', '<p>Hola</p>')
+    email_outbox.queue_email('usuario1@crub.edu.ar', 'Bienvenido', '<p>Hola de nuevo</p>')
+    assert CorreoSaliente.query.count() == 4
+    assert run_job(app, claim_next()) is True
+    assert lotes[-1] == ['usuario1@crub.edu.ar']
+
+
+def test_correo_fallido_se_reintenta_con_espera(app, monkeypatch):
+    app.config.update(EMAIL_MAX_ATTEMPTS=2, EMAIL_RETRY_SECONDS=60)
+    fallan = {'malo@crub.edu.ar'}
+    
+    def enviar(mensajes):
+        return {'results': {mensaje['id']: 'Invalid email' if mensaje['to'] in fallan else None
+                            for mensaje in mensajes}}
+    monkeypatch.setattr(drive_integration, 'send_emails', enviar)
+    
+    bueno = email_outbox.queue_email('bueno@crub.edu.ar', 'Aviso', '<p>A</p>').idCorreo
+    malo = email_outbox.queue_email('malo@crub.edu.ar', 'Aviso', '<p>A</p>').idCorreo
+    
+    # El trabajo queda en cola hasta el reintento del correo fallido
+    assert run_job(app, claim_next()) is False
+    db.session.expire_all()
+    assert db.session.get(CorreoSaliente, bueno).estado == email_outbox.CORREO_ENVIADO
+    correo = db.session.get(CorreoSaliente, malo)
+    assert correo.estado == email_outbox.CORREO_PENDIENTE and correo.intentos == 1
+    assert correo.disponibleDesde > datetime.utcnow() + timedelta(seconds=50)
+    assert correo.ultimoError == 'Invalid email'
+    trabajo = Trabajo.query.filter_by(tipo=email_outbox.TIPO_ENVIO_CORREOS).one()
+    assert trabajo.estado == ESTADO_PENDIENTE and trabajo.disponibleDesde > datetime.utcnow()
+    assert claim_next() is None
+    
+    # Agotados los intentos, el correo queda en error y el trabajo termina
+    _vencer_esperas()
+    assert run_job(app, claim_next()) is True
+    db.session.expire_all()
+    correo = db.session.get(CorreoSaliente, malo)
+    assert correo.estado == email_outbox.CORREO_ERROR and correo.intentos == 2
+    assert db.session.get(Trabajo, trabajo.idTrabajo).estado == ESTADO_COMPLETADO
+
+
+def test_script_sin_envio_por_lotes_envia_de_a_uno(app, monkeypatch):
+    enviados = []
+    monkeypatch.setattr(drive_integration, 'send_emails', lambda mensajes: {'error': 'Unknown action'})
+    monkeypatch.setattr(drive_integration, 'send_email',
+                        lambda **kwargs: enviados.append(kwargs['to']) or True)
+    
+    email_outbox.queue_email('a@crub.edu.ar', 'Aviso', '<p>A</p>')
+    email_outbox.queue_email('b@crub.edu.ar', 'Aviso', '<p>B</p>')
+    assert run_job(app, claim_next()) is True
+    assert enviados == ['a@crub.edu.ar', 'b@crub.edu.ar']
+
+
+def test_cuota_agotada_posterga_sin_gastar_intentos(app, monkeypatch):
+    app.config.update(EMAIL_BATCH_SIZE=1, EMAIL_MAX_ATTEMPTS=1, EMAIL_QUOTA_RETRY_SECONDS=3600)
+    lotes = []
+    
+    def enviar(mensajes):
+        lotes.append([mensaje['to'] for mensaje in mensajes])
+        return {'results': {mensaje['id']: 'Daily email quota exceeded' for mensaje in mensajes},
+                'quota_exceeded': {mensaje['id'] for mensaje in mensajes}}
+    monkeypatch.setattr(drive_integration, 'send_emails', enviar)
+    
+    for numero in range(3):
+        email_outbox.queue_email(f'usuario{numero}@crub.edu.ar', 'Restablecer contraseña', '<p>Hola</p>')
+    
+    # Con la cuota agotada no se toman más lotes y ningún correo queda en error
+    assert run_job(app, claim_next()) is False
+    assert lotes == [['usuario0@crub.edu.ar']]
+    db.session.expire_all()
+    correos = CorreoSaliente.query.all()
+    assert {(correo.estado, correo.intentos) for correo in correos} == {(email_outbox.CORREO_PENDIENTE, 0)}
+    assert all(correo.disponibleDesde > datetime.utcnow() + timedelta(seconds=3500) for correo in correos)
+    trabajo = Trabajo.query.filter_by(tipo=email_outbox.TIPO_ENVIO_CORREOS).one()
+    assert trabajo.disponibleDesde > datetime.utcnow() + timedelta(seconds=3500)
+    
+    # Con cuota de nuevo, se envían todos
+    monkeypatch.setattr(drive_integration, 'send_emails',
+                        lambda mensajes: {'results': {mensaje['id']: None for mensaje in mensajes}})
+    _vencer_esperas()
+    assert run_job(app, claim_next()) is True
+    db.session.expire_all()
+    assert {correo.estado for correo in CorreoSaliente.query} == {email_outbox.CORREO_ENVIADO}
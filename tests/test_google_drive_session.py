@@ -0,0 +1,146 @@
+"""
+Pruebas de la sesión HTTP compartida con el Apps Script (servidor HTTP local)
+"""
+import base64
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.integrations.google_drive import AppsScriptSession, GoogleDriveIntegration
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def do_POST(self):
+        servidor = self.server
+        datos = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        servidor.acciones.append(datos['action'])
+        servidor.puertos.add(self.client_address[1])
+        estado = servidor.respuestas.pop(0) if servidor.respuestas else 200
+        cuerpo = json.dumps({'success': True, 'streamUrl': 'https://drive/x'}).encode()
+        self.send_response(estado)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+    
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    servidor.acciones, servidor.puertos, servidor.respuestas = [], set(), []
+    hilo = threading.Thread(target=servidor.serve_forever, daemon=True)
+    hilo.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _url(servidor):
+    return f'http://127.0.0.1:{servidor.server_address[1]}/exec'
+
+
+def test_conexion_reutilizada_y_metricas(servidor):
+    sesion = AppsScriptSession()
+    for _ in range(3):
+        assert sesion.post(_url(servidor), {'action': 'getFileStreamUrl'}).status_code == 200
+    
+    assert len(servidor.puertos) == 1
+    metricas = sesion.stats()['getFileStreamUrl']
+    assert (metricas['calls'], metricas['errors'], metricas['retries']) == (3, 0, 0)
+    assert metricas['max_ms'] >= metricas['avg_ms'] > 0
+
+
+def test_reintentos_solo_para_acciones_idempotentes(servidor):
+    sesion = AppsScriptSession(max_retries=2, backoff=0.01)
+    
+    servidor.respuestas = [503, 502]
+    assert sesion.post(_url(servidor), {'action': 'downloadFile'}).status_code == 200
+    assert sesion.stats()['downloadFile']['retries'] == 2
+    
+    servidor.respuestas = [503]
+    assert sesion.post(_url(servidor), {'action': 'sendEmail'}).status_code == 503
+    assert servidor.acciones.count('sendEmail') == 1
+    assert sesion.stats()['sendEmail']['errors'] == 1
+
+
+def test_integracion_usa_la_sesion_compartida(servidor, monkeypatch):
+    drive = GoogleDriveIntegration()
+    monkeypatch.setattr(drive, 'script_url', _url(servidor))
+    monkeypatch.setattr(drive, 'http', AppsScriptSession())
+    
+    assert drive.get_file_stream_url('abc')['stream_url'] == 'https://drive/x'
+    assert drive.delete_laboratory_folders({'lab_folder_id': 'x'}) is True
+    assert servidor.acciones == ['getFileStreamUrl', 'deleteLabFolders']
+
+
+class _HandlerDescarga(_Handler):
+    """Apps Script que entrega los archivos por rangos (acción getFileChunk)"""
+    
+    def do_POST(self):
+        servidor = self.server
+        datos = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        servidor.acciones.append((datos['action'], datos.get('offset')))
+        if datos['action'] == 'getFileChunk' and servidor.rangos:
+            inicio = datos['offset']
+            respuesta = {
+                'success': True, 'fileName': 'ficha.pdf', 'mimeType': 'application/pdf',
+                'fileSize': len(servidor.contenido), 'offset': inicio,
+                'data': base64.b64encode(servidor.contenido[inicio:inicio + datos['length']]).decode(),
+            }
+        elif datos['action'] == 'downloadFile':
+            respuesta = {
+                'success': True, 'fileName': 'ficha.pdf', 'mimeType': 'application/pdf',
+                'fileSize': len(servidor.contenido), 'fileData': base64.b64encode(servidor.contenido).decode(),
+            }
+        else:
+            respuesta = {'success': False, 'error': 'Unknown action'}
+        cuerpo = json.dumps(respuesta).encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+@pytest.fixture
+def servidor_descarga():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _HandlerDescarga)
+    servidor.acciones, servidor.contenido, servidor.rangos = [], bytes(range(256)) * 1024, True
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def test_descarga_por_rangos_con_limite(servidor_descarga, monkeypatch):
+    drive = GoogleDriveIntegration()
+    monkeypatch.setattr(drive, 'script_url', _url(servidor_descarga))
+    monkeypatch.setattr(drive, 'http', AppsScriptSession())
+    
+    archivo = drive.open_file_stream('abc', max_bytes=1024 * 1024, chunk_size=16 * 1024, range_size=100 * 1024)
+    # Sólo el primer rango se pide al abrir; los demás a medida que se consumen
+    assert servidor_descarga.acciones == [('getFileChunk', 0)]
+    bloques = list(archivo['chunks'])
+    assert b''.join(bloques) == servidor_descarga.contenido
+    assert max(len(bloque) for bloque in bloques) <= 16 * 1024
+    assert servidor_descarga.acciones == [('getFileChunk', 0), ('getFileChunk', 100 * 1024),
+                                          ('getFileChunk', 200 * 1024)]
+    
+    assert drive.open_file_stream('abc', max_bytes=1000)['status'] == 413
+
+
+def test_descarga_con_script_sin_rangos(servidor_descarga, monkeypatch):
+    drive = GoogleDriveIntegration()
+    monkeypatch.setattr(drive, 'script_url', _url(servidor_descarga))
+    monkeypatch.setattr(drive, 'http', AppsScriptSession())
+    servidor_descarga.rangos = False
+    
+    archivo = drive.open_file_stream('abc', max_bytes=1024 * 1024)
+    assert b''.join(archivo['chunks']) == servidor_descarga.contenido
+    assert [accion for accion, _ in servidor_descarga.acciones] == ['getFileChunk', 'downloadFile']
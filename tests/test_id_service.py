@@ -0,0 +1,38 @@
+"""
+Pruebas de la secuencia de IDs de movimiento
+"""
+from datetime import datetime
+
+from app.models.models import db, Movimiento, Secuencia
+from app.utils.id_service import IdAllocator, movement_ids
+
+
+def test_ids_consecutivos_con_reserva_por_bloques(app):
+    movement_ids.configure(bloque=3)
+    ids = [movement_ids.next_id() for _ in range(4)]
+    
+    assert ids == ['MOV1000000', 'MOV1000001', 'MOV1000002', 'MOV1000003']
+    # Dos bloques reservados: la secuencia ya entregó hasta el 1000005
+    assert db.session.get(Secuencia, 'movimiento').valor == 1000005
+    assert movement_ids.reserve(2) == ['MOV1000006', 'MOV1000007']
+    assert movement_ids.next_id() == 'MOV1000004'
+
+
+def test_secuencia_se_siembra_sobre_los_ids_existentes(app):
+    db.session.add_all([
+        Movimiento(idMovimiento='MOV999999', tipoMovimiento='ingreso', cantidad=1, unidadMedida='u',
+                   idProducto='P001', idLaboratorio='L001', timestamp=datetime(2024, 1, 1)),
+        Movimiento(idMovimiento='MOV1000041', tipoMovimiento='ingreso', cantidad=1, unidadMedida='u',
+                   idProducto='P001', idLaboratorio='L001', timestamp=datetime(2024, 1, 2)),
+    ])
+    db.session.commit()
+    
+    assert movement_ids.reserve(1) == ['MOV1000042']
+
+
+def test_proceso_hijo_no_reutiliza_el_bloque(app, monkeypatch):
+    ids = IdAllocator('movimiento', Movimiento.idMovimiento, 'MOV', 7, inicio=1000000, bloque=10)
+    assert ids.next_id() == 'MOV1000000'
+    
+    monkeypatch.setattr('app.utils.id_service.os.getpid', lambda: -1)
+    assert ids.next_id() == 'MOV1000010'
@@ -0,0 +1,150 @@
+"""
+Pruebas de los trabajos en segundo plano
+"""
+from datetime import datetime, timedelta
+
+from app.models.models import db, Producto, Trabajo
+from app.utils import product_import  # noqa: F401 (registra el trabajo de importación)
+from app.utils.job_service import (enqueue, claim_next, run_job, job_status, job_handler,
+                                   job_directory, requeue_stale, heartbeat, ESTADO_COMPLETADO, ESTADO_ERROR,
+                                   ESTADO_EN_PROCESO, ESTADO_PENDIENTE)
+
+
+@job_handler('prueba_suma')
+def _sumar(contexto):
+    contexto.progress(50, 'Sumando')
+    return {'total': sum(contexto.params['valores']), 'mensaje': 'Suma lista'}
+
+
+@job_handler('prueba_lotes', reanudable=False)
+def _confirmar_por_lotes(contexto):
+    return {}
+
+
+@job_handler('prueba_latido')
+def _latir(contexto):
+    # Simula un trabajo largo cuyo último latido fue hace dos horas
+    db.session.get(Trabajo, contexto.id).ultimoLatido = datetime.utcnow() - timedelta(hours=2)
+    db.session.commit()
+    return {'renovados': heartbeat(), 'reencolados': requeue_stale(3600)}
+
+
+@job_handler('prueba_falla')
+def _fallar(contexto):
+    raise RuntimeError('sin conexión')
+
+
+def _estado(id_trabajo):
+    db.session.expire_all()
+    return job_status(db.session.get(Trabajo, id_trabajo))
+
+
+def test_trabajo_se_toma_una_vez_y_guarda_resultado(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    id_trabajo = enqueue('prueba_suma', {'valores': [1, 2, 3]}).idTrabajo
+    
+    assert claim_next() == id_trabajo
+    assert claim_next() is None
+    assert _estado(id_trabajo)['estado'] == ESTADO_EN_PROCESO
+    
+    assert run_job(app, id_trabajo) is True
+    estado = _estado(id_trabajo)
+    assert estado['estado'] == ESTADO_COMPLETADO
+    assert estado['terminado'] and estado['progreso'] == 100
+    assert estado['mensaje'] == 'Suma lista'
+    assert estado['resultado'] == {'total': 6}
+
+
+def test_error_del_manejador_queda_en_el_trabajo(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    id_trabajo = enqueue('prueba_falla').idTrabajo
+    
+    assert run_job(app, claim_next()) is False
+    estado = _estado(id_trabajo)
+    assert estado['estado'] == ESTADO_ERROR
+    assert 'sin conexión' in estado['mensaje']
+
+
+def test_trabajos_abandonados_vuelven_a_la_cola(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    id_trabajo = enqueue('prueba_suma', {'valores': []}).idTrabajo
+    claim_next()
+    
+    assert requeue_stale(3600) == 0
+    assert requeue_stale(-1) == 1
+    assert _estado(id_trabajo)['estado'] == ESTADO_PENDIENTE
+
+
+def test_trabajo_largo_con_latido_no_se_considera_abandonado(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    id_trabajo = enqueue('prueba_suma', {'valores': []}).idTrabajo
+    claim_next()
+    # Empezó hace dos horas pero sigue informando su avance
+    trabajo = db.session.get(Trabajo, id_trabajo)
+    trabajo.fechaInicio = datetime.utcnow() - timedelta(hours=2)
+    db.session.commit()
+    assert requeue_stale(3600) == 0
+    
+    trabajo = db.session.get(Trabajo, id_trabajo)
+    trabajo.ultimoLatido = datetime.utcnow() - timedelta(hours=2)
+    db.session.commit()
+    assert requeue_stale(3600) == 1
+
+
+def test_latido_renueva_los_trabajos_en_ejecucion(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    id_trabajo = enqueue('prueba_latido').idTrabajo
+    
+    assert run_job(app, claim_next()) is True
+    # El runner renovó el latido del trabajo en ejecución y no se reencoló
+    assert _estado(id_trabajo)['resultado'] == {'renovados': 1, 'reencolados': 0}
+    # Terminado, ya no se renueva
+    assert heartbeat() == 0
+
+
+def test_trabajos_no_reanudables_abandonados_quedan_en_error(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    id_trabajo = enqueue('prueba_lotes').idTrabajo
+    claim_next()
+    # Último progreso informado antes de la interrupción
+    db.session.get(Trabajo, id_trabajo).mensaje = '3 lotes guardados'
+    db.session.commit()
+    
+    assert requeue_stale(-1) == 0
+    estado = _estado(id_trabajo)
+    assert estado['estado'] == ESTADO_ERROR
+    assert '3 lotes guardados' in estado['mensaje']
+    assert claim_next() is None
+
+
+def test_importacion_de_productos_en_segundo_plano(app, tmp_path):
+    app.config['JOBS_DIR'] = str(tmp_path)
+    from app.utils.job_service import new_job_id
+    
+    id_trabajo = new_job_id()
+    ruta = tmp_path / id_trabajo / 'entrada.csv'
+    job_directory(app, id_trabajo)
+    ruta.write_text('ID Producto;Nombre;Tipo de Producto;Estado Físico;URL Ficha de Seguridad;'
+                    'Descripción;Control Sedronar\n'
+                    'P010;Etanol;Droguero;Líquido;;;No\n', encoding='utf-8')
+    enqueue('importar_productos', {'archivo': str(ruta), 'nombre_archivo': 'productos.csv'},
+            id_trabajo=id_trabajo)
+    
+    assert run_job(app, claim_next()) is True
+    estado = _estado(id_trabajo)
+    assert estado['estado'] == ESTADO_COMPLETADO, estado['mensaje']
+    assert estado['resultado']['creados'] == 1
+    assert db.session.get(Producto, 'P010').nombre == 'Etanol'
+    assert not ruta.exists()
+
+
+def test_excel_del_reporte(tmp_path):
+    from openpyxl import load_workbook
+    from app.utils.report_service import write_movements_report_excel, COLUMNAS_EXCEL
+    
+    destino = tmp_path / 'reporte.xlsx'
+    write_movements_report_excel([{'fecha': '01/03/2024', 'producto_nombre': 'Etanol', 'cantidad': 5}],
+                                 str(destino))
+    filas = list(load_workbook(destino).active.values)
+    assert list(filas[0]) == [encabezado for _, encabezado in COLUMNAS_EXCEL]
+    assert filas[1][:2] == ('01/03/2024', 'Etanol')
@@ -0,0 +1,76 @@
+"""
+Pruebas de la importación masiva de movimientos históricos
+"""
+import io
+from datetime import datetime
+
+from app.models.models import db, Movimiento, Proveedor, Stock, StockCheckpoint
+from app.utils.count_service import get_count
+from app.utils.movement_import import COLUMNAS_REQUERIDAS, COLUMNAS_OPCIONALES, import_movements_stream
+from app.utils.stock_service import get_stock_for_product_in_lab, compute_stock_from_movements
+
+
+def _csv(*filas):
+    lineas = [';'.join(COLUMNAS_REQUERIDAS + COLUMNAS_OPCIONALES)] + [';'.join(fila) for fila in filas]
+    return io.BytesIO('\n'.join(lineas).encode('utf-8'))
+
+
+def _saldo(lab_id, product_id):
+    ledger = db.session.query(Stock.cantidad).filter_by(idLaboratorio=lab_id, idProducto=product_id).scalar()
+    return ledger, compute_stock_from_movements(lab_id=lab_id, product_ids=[product_id]).get((lab_id, product_id), 0.0)
+
+
+def test_importacion_actualiza_ledger_contadores_y_transferencias(app):
+    db.session.add(Proveedor(nombre='Prov SA', cuit='20-12345678-9'))
+    db.session.commit()
+    assert get_count(Movimiento) == 0
+    
+    resultado = import_movements_stream(_csv(
+        ['2024-01-10', 'Compra', 'P001', 'L001', '100', 'ml', '', 'Factura', 'A-1', '20123456789', '05/01/2024'],
+        ['15/01/2024', 'Uso', 'P001', 'L001', '30,5', 'ml', '', '', '', '', ''],
+        ['2024-02-01', 'Transferencia', 'P001', 'L001', '20', 'ml', 'L002', '', '', '', ''],
+        ['2024-02-02', 'Uso', 'P009', 'L001', '1', 'ml', '', '', '', '', ''],
+    ), 'movimientos.csv', tamano_lote=2)
+    
+    assert (resultado['creados'], resultado['movimientos'], resultado['saltados']) == (3, 4, 1)
+    assert resultado['errores'] == ["Fila 5: Producto 'P009' no existe"]
+    assert _saldo('L001', 'P001') == (49.5, 49.5)
+    assert _saldo('L002', 'P001') == (20.0, 20.0)
+    assert get_stock_for_product_in_lab('P001', 'L001') == 49.5
+    assert get_count(Movimiento) == 4
+    assert get_count(Movimiento, 'idLaboratorio', 'L002') == 1
+    
+    compra = Movimiento.query.filter_by(tipoMovimiento='compra').one()
+    assert compra.idProveedor is not None and compra.fechaFactura == datetime(2024, 1, 5).date()
+    ingreso = Movimiento.query.filter_by(idLaboratorio='L002').one()
+    assert (ingreso.tipoMovimiento, ingreso.tipoDocumento, ingreso.laboratorioDestino) == ('ingreso', 'transferencia', 'L001')
+
+
+def test_saldos_negativos_se_rechazan_en_orden_cronologico(app):
+    # Historial existente: ingreso anterior al archivo y uso posterior a sus filas
+    db.session.add_all([
+        Movimiento(idMovimiento='MOV000001', tipoMovimiento='ingreso', cantidad=40, unidadMedida='ml',
+                   idProducto='P001', idLaboratorio='L001', timestamp=datetime(2024, 1, 1)),
+        Movimiento(idMovimiento='MOV000002', tipoMovimiento='uso', cantidad=40, unidadMedida='ml',
+                   idProducto='P001', idLaboratorio='L001', timestamp=datetime(2024, 6, 1)),
+        StockCheckpoint(idLaboratorio='L001', idProducto='P001', fechaCorte=datetime(2024, 7, 1),
+                        cantidad=0, desactualizado=False),
+    ])
+    db.session.commit()
+    
+    resultado = import_movements_stream(_csv(
+        ['2024-03-01', 'Uso', 'P001', 'L001', '10', 'ml', '', '', '', '', ''],
+        ['2024-03-01', 'Ingreso', 'P001', 'L001', '30', 'ml', '', '', '', '', ''],
+        ['2024-05-01', 'Uso', 'P001', 'L001', '25', 'ml', '', '', '', '', ''],
+        ['2024-05-02', 'Transferencia', 'P002', 'L001', '5', 'u', 'L002', '', '', '', ''],
+    ), 'movimientos.csv')
+    
+    # 40 + 30 - 10 - 25 - 40 (uso existente del 01/06) = -5: se descarta el uso del 01/05
+    assert resultado['creados'] == 2
+    assert resultado['errores'] == [
+        'Fila 4: Stock insuficiente: el saldo de P001 en L001 quedaría negativo',
+        'Fila 5: Stock insuficiente: el saldo de P002 en L001 quedaría negativo',
+    ]
+    assert _saldo('L001', 'P001') == (20.0, 20.0)
+    assert db.session.query(StockCheckpoint.desactualizado).scalar() is True
+    assert Movimiento.query.filter_by(idProducto='P002').count() == 0
@@ -0,0 +1,47 @@
+"""
+Pruebas de la paginación por cursor de movimientos
+"""
+from datetime import datetime, timedelta
+
+from app.models.models import db, Movimiento
+from app.utils.pagination import paginate_keyset, encode_cursor, decode_cursor
+
+
+def test_cursor_ida_y_vuelta():
+    ts = datetime(2025, 3, 1, 10, 30, 15, 123)
+    assert decode_cursor(encode_cursor(ts, 'MOV000001')) == (ts, 'MOV000001')
+    assert decode_cursor('no-es-un-cursor') is None
+
+
+def test_paginacion_keyset_recorre_el_historial(app):
+    base = datetime(2025, 1, 1)
+    # Dos movimientos por timestamp para ejercitar el desempate por ID
+    db.session.add_all([
+        Movimiento(idMovimiento=f'MOV{i:06d}', tipoMovimiento='ingreso', cantidad=1,
+                   unidadMedida='u', idProducto='P001', idLaboratorio='L001',
+                   timestamp=base + timedelta(days=i // 2))
+        for i in range(7)
+    ])
+    db.session.commit()
+    
+    def ids(pagina):
+        return [m.idMovimiento for m in pagina.items]
+    
+    query = Movimiento.query.filter_by(idLaboratorio='L001')
+    primera = paginate_keyset(query, Movimiento.timestamp, Movimiento.idMovimiento, 3)
+    assert ids(primera) == ['MOV000006', 'MOV000005', 'MOV000004']
+    assert not primera.has_prev and primera.has_next
+    
+    segunda = paginate_keyset(query, Movimiento.timestamp, Movimiento.idMovimiento, 3,
+                              after=primera.next_cursor)
+    assert ids(segunda) == ['MOV000003', 'MOV000002', 'MOV000001']
+    
+    tercera = paginate_keyset(query, Movimiento.timestamp, Movimiento.idMovimiento, 3,
+                              after=segunda.next_cursor)
+    assert ids(tercera) == ['MOV000000']
+    assert not tercera.has_next
+    
+    volver = paginate_keyset(query, Movimiento.timestamp, Movimiento.idMovimiento, 3,
+                             before=tercera.prev_cursor)
+    assert ids(volver) == ids(segunda)
+    assert volver.has_prev and volver.has_next
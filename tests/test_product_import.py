@@ -0,0 +1,122 @@
+"""
+Pruebas de la importación masiva de productos desde Excel
+"""
+import io
+
+import pandas as pd
+import pytest
+
+from app.models.models import db, Producto
+from app.utils.count_service import get_count
+from app.utils.product_import import (
+    COLUMNAS_REQUERIDAS,
+    validate_products_frame,
+    import_products,
+    import_products_stream,
+    iter_product_chunks,
+)
+from app.utils.import_reader import ArchivoImportacionError
+from app.utils.product_index import product_index
+from app.utils.search_service import apply_product_search
+
+
+def _frame(*filas):
+    return pd.DataFrame(list(filas), columns=COLUMNAS_REQUERIDAS)
+
+
+def test_validacion_reporta_el_primer_error_por_fila():
+    validos, errores = validate_products_frame(_frame(
+        ['P100', 'Etanol', 'Droguero', 'Líquido', None, None, 'Sí'],
+        [None, 'Sin ID', 'Droguero', 'Líquido', None, None, None],
+        ['P1', 'ID corto', 'Droguero', 'Líquido', None, None, None],
+        ['P101', 'Pipeta', 'Vidrio roto', 'Sólido', None, None, None],
+        ['P102', 'Guantes', 'seguridad', 'solido', 'ftp://x', None, None],
+        ['P103', 'Jeringa', 'Botiquín', 'Sólido', 'https://x.org/f.pdf', 'x' * 501, 'no'],
+    ))
+    
+    assert errores['fila'].tolist() == [3, 4, 5, 6, 7]
+    assert errores['error'].iloc[0] == 'ID Producto está vacío'
+    assert errores['error'].iloc[1] == "ID Producto 'P1' debe tener entre 4 y 10 caracteres"
+    assert errores['error'].iloc[2].startswith("Tipo de producto 'Vidrio roto' no válido")
+    assert errores['error'].iloc[3].startswith('URL de ficha de seguridad no válida')
+    assert errores['error'].iloc[4].startswith('Descripción es demasiado larga')
+    
+    fila = validos.iloc[0]
+    assert (fila['idProducto'], fila['tipoProducto'], fila['estadoFisico'], fila['controlSedronar']) == \
+        ('P100', 'droguero', 'liquido', True)
+
+
+def test_importacion_crea_actualiza_y_sincroniza_indices(app):
+    assert product_index.search('etanol') == []
+    
+    resultado = import_products(_frame(
+        ['P001', 'Ácido clorhídrico 37%', 'Droguero', 'Líquido', None, 'Actualizado', 'si'],
+        ['P100', 'Etanol', 'Droguero', 'Líquido', None, None, 'no'],
+        ['P101', 'Pipeta', 'Materiales de vidrio', 'Sólido', None, None, None],
+        ['P10', 'Inválido', 'Droguero', 'Líquido', None, None, None],
+    ))
+    db.session.commit()
+    
+    assert (resultado['creados'], resultado['actualizados'], resultado['saltados']) == (2, 1, 1)
+    assert resultado['errores'] == ["Fila 5: ID Producto 'P10' debe tener entre 4 y 10 caracteres"]
+    assert db.session.get(Producto, 'P001').descripcion == 'Actualizado'
+    assert get_count(Producto) == 4
+    assert get_count(Producto, 'tipoProducto', 'droguero') == 2
+    assert [p.idProducto for p in apply_product_search(Producto.query, 'etanol')] == ['P100']
+    assert product_index.search('etanol') == [('P100', 'Etanol')]
+
+
+def _csv(*filas):
+    lineas = [';'.join(COLUMNAS_REQUERIDAS)] + [';'.join(fila) for fila in filas]
+    return io.BytesIO('\n'.join(lineas).encode('utf-8-sig'))
+
+
+def test_importacion_en_streaming_por_lotes(app):
+    from openpyxl import Workbook
+    
+    libro = Workbook()
+    hoja = libro.active
+    hoja.append(['Extra'] + COLUMNAS_REQUERIDAS)
+    for i in range(5):
+        hoja.append(['x', f'P2{i:02d}', f'Reactivo {i}', 'Droguero', 'Sólido', None, None, 'No'])
+    hoja.append([None] * 8)
+    hoja.append(['x', 'P299', 'Malo', 'Droguero', 'Plasma', None, None, None])
+    archivo = io.BytesIO()
+    libro.save(archivo)
+    archivo.seek(0)
+    
+    resultado = import_products_stream(archivo, 'productos.xlsx', tamano_lote=2)
+    
+    assert (resultado['creados'], resultado['saltados'], resultado['lotes']) == (5, 1, 4)
+    assert resultado['errores'][0].startswith("Fila 8: Estado físico 'Plasma' no válido")
+    assert get_count(Producto) == 7
+
+
+def test_lote_fallido_no_revierte_los_anteriores(app, monkeypatch):
+    from app.utils import product_import
+    
+    original = product_import.import_products
+    
+    def _falla_en_el_segundo_lote(lote):
+        if lote.index[0] == 2:
+            raise RuntimeError('restricción violada')
+        return original(lote)
+    
+    monkeypatch.setattr(product_import, 'import_products', _falla_en_el_segundo_lote)
+    resultado = import_products_stream(_csv(
+        ['P300', 'Uno', 'Droguero', 'Sólido', '', '', ''],
+        ['P301', 'Dos', 'Droguero', 'Sólido', '', '', ''],
+        ['P302', 'Tres', 'Droguero', 'Sólido', '', '', ''],
+        ['P303', 'Cuatro', 'Droguero', 'Sólido', '', '', ''],
+        ['P304', 'Cinco', 'Droguero', 'Sólido', '', '', ''],
+    ), 'productos.csv', tamano_lote=2)
+    
+    assert (resultado['creados'], resultado['saltados'], resultado['lotes_fallidos']) == (3, 2, 1)
+    assert resultado['errores'] == ['Filas 4-5: no se pudieron guardar (restricción violada)']
+    assert sorted(p.idProducto for p in Producto.query.filter(Producto.idProducto.like('P30%'))) == \
+        ['P300', 'P301', 'P304']
+
+
+def test_encabezados_faltantes():
+    with pytest.raises(ArchivoImportacionError, match='Faltan: Tipo de Producto'):
+        list(iter_product_chunks(io.BytesIO(b'ID Producto,Nombre\nP001,X\n'), 'p.csv'))
@@ -0,0 +1,45 @@
+"""
+Pruebas del índice de prefijos para la búsqueda typeahead de productos
+"""
+from app.models.models import db, Producto
+from app.utils.product_index import product_index
+
+
+def _ids(termino):
+    return [id_producto for id_producto, _ in product_index.search(termino)]
+
+
+def test_busqueda_por_prefijo_de_id_y_palabras(app):
+    assert _ids('aci') == ['P001']
+    assert _ids('CLORH') == ['P001']
+    assert _ids('nitr guan') == ['P002']
+    assert _ids('p00') == ['P001', 'P002']
+    assert _ids('') == []
+    assert product_index.choices_for('P002') == [('P002', 'Guantes de nitrilo')]
+    assert product_index.choices_for('P999') == []
+
+
+def test_indice_incremental_tras_confirmar(app):
+    assert _ids('hidrox') == []
+    
+    db.session.add(Producto(idProducto='P003', nombre='Hidróxido de sodio',
+                            tipoProducto='droguero', estadoFisico='solido'))
+    db.session.commit()
+    assert _ids('hidrox') == ['P003']
+    
+    producto = db.session.get(Producto, 'P003')
+    producto.nombre = 'Soda cáustica'
+    db.session.commit()
+    assert _ids('hidrox') == []
+    assert _ids('caustica') == ['P003']
+    
+    db.session.delete(producto)
+    db.session.commit()
+    assert _ids('soda') == []
+    
+    # Los cambios revertidos no llegan al índice
+    db.session.add(Producto(idProducto='P004', nombre='Etanol', tipoProducto='droguero',
+                            estadoFisico='liquido'))
+    db.session.flush()
+    db.session.rollback()
+    assert _ids('etanol') == []
@@ -0,0 +1,37 @@
+"""
+Pruebas del reporte de movimientos con saldos por funciones de ventana
+"""
+from datetime import datetime
+
+from app.models.models import db, Movimiento
+from app.utils.report_service import build_movements_report
+
+
+def _movimiento(id_mov, tipo, cantidad, timestamp, lab='L001', producto='P001'):
+    return Movimiento(idMovimiento=id_mov, tipoMovimiento=tipo, cantidad=cantidad,
+                      unidadMedida='ml', idProducto=producto, idLaboratorio=lab,
+                      timestamp=timestamp)
+
+
+def test_reporte_calcula_saldos_con_apertura(app):
+    db.session.add_all([
+        _movimiento('MOV000001', 'compra', 100, datetime(2024, 12, 1)),
+        _movimiento('MOV000002', 'uso', 10, datetime(2025, 1, 10)),
+        _movimiento('MOV000003', 'ingreso', 5, datetime(2025, 1, 20)),
+        _movimiento('MOV000004', 'ingreso', 4, datetime(2025, 1, 15), producto='P002'),
+        _movimiento('MOV000005', 'ingreso', 50, datetime(2025, 1, 12), lab='L002'),
+    ])
+    db.session.commit()
+    
+    filas = build_movements_report(datetime(2025, 1, 1), datetime(2025, 1, 31), lab_id='L001')
+    
+    assert [(f['producto_id'], f['stock_inicial_cantidad'], f['stock_final_cantidad']) for f in filas] == [
+        ('P001', 100, 90),
+        ('P002', 0, 4),
+        ('P001', 90, 95),
+    ]
+    
+    sedronar = build_movements_report(datetime(2025, 1, 1), datetime(2025, 1, 31), control_sedronar=True)
+    assert [(f['stock_inicial_cantidad'], f['stock_final_cantidad']) for f in sedronar] == [
+        (100, 90), (90, 140), (140, 145)
+    ]
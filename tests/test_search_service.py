@@ -0,0 +1,43 @@
+"""
+Pruebas del índice de búsqueda de productos
+"""
+from app.models.models import db, Producto
+from app.utils.search_service import normalize_text, apply_product_search, reindex_products
+
+
+def _buscar(termino):
+    return sorted(p.idProducto for p in apply_product_search(Producto.query, termino).all())
+
+
+def test_normalizacion_sin_tildes():
+    assert normalize_text('  Ácido   CLORHÍDRICO ') == 'acido clorhidrico'
+    assert normalize_text(None) == ''
+
+
+def test_busqueda_insensible_a_tildes_y_por_prefijo(app):
+    assert _buscar('acido') == ['P001']
+    assert _buscar('ÁCIDO clorh') == ['P001']
+    assert _buscar('nitrilo guantes') == ['P002']
+    assert _buscar('p002') == ['P002']
+    assert _buscar('acido guantes') == []
+
+
+def test_indice_sigue_altas_ediciones_y_bajas(app):
+    db.session.add(Producto(idProducto='P003', nombre='Hidróxido de sodio', marca='Cicarelli',
+                            tipoProducto='droguero', estadoFisico='solido'))
+    db.session.commit()
+    assert _buscar('hidroxido') == ['P003']
+    assert _buscar('cicarelli') == ['P003']
+    
+    producto = db.session.get(Producto, 'P003')
+    producto.nombre = 'Soda cáustica'
+    db.session.commit()
+    assert _buscar('hidroxido') == []
+    assert _buscar('caustica') == ['P003']
+    
+    db.session.delete(db.session.get(Producto, 'P003'))
+    db.session.commit()
+    assert _buscar('caustica') == []
+    
+    assert reindex_products() == 2
+    assert _buscar('guantes') == ['P002']
@@ -0,0 +1,74 @@
+"""
+Pruebas del cache compartido entre workers
+"""
+import time
+
+from app.utils import shared_cache
+from app.utils.shared_cache import SharedCache, SQLiteCacheBackend, GENERACION_MOVIMIENTOS, cache_namespace
+from app.utils.stock_cache import StockCache
+
+
+def test_backend_sqlite_guarda_expira_e_incrementa(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    backend.set('a', '1', ttl=60)
+    backend.set('b', '2', ttl=0.01)
+    time.sleep(0.02)
+    assert backend.get('a') == '1'
+    assert backend.get('b') is None
+    assert backend.incr('contador') == 1
+    assert backend.incr('contador', 5) == 6
+    # Otro proceso ve el mismo archivo
+    assert SQLiteCacheBackend(backend.path).get('contador') == '6'
+
+
+def test_generacion_invalida_el_cache_de_otros_workers(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    worker_a, worker_b = StockCache(ttl=60), StockCache(ttl=60)
+    worker_a.configure(shared=SharedCache(SQLiteCacheBackend(path)))
+    worker_b.configure(shared=SharedCache(SQLiteCacheBackend(path)))
+    datos = {'P1': 5.0}
+    consultas = []
+    
+    def loader(ids):
+        consultas.append(ids)
+        return dict(datos)
+    
+    assert worker_a.get_map('L1', None, loader) == {'P1': 5.0}
+    # El segundo worker obtiene el mapa completo del cache compartido
+    assert worker_b.get_map('L1', None, loader) == {'P1': 5.0}
+    assert consultas == [None]
+    assert worker_b.stats()['hits_compartidos'] == 1
+    
+    # El worker A registra un movimiento: invalida su clave y avanza la generación
+    datos['P1'] = 2.0
+    worker_a.invalidate('L1', 'P1')
+    worker_a.notify_write()
+    assert worker_a.stats()['invalidaciones_remotas'] == 0
+    assert worker_a.shared.get_counter(GENERACION_MOVIMIENTOS) == 1
+    
+    # El worker B detecta la generación nueva y descarta su cache local
+    assert worker_b.get_map('L1', ['P1'], loader) == {'P1': 2.0}
+    assert worker_b.stats()['invalidaciones_remotas'] == 1
+
+
+def test_backend_sqlite_reabre_la_conexion_en_un_proceso_hijo(tmp_path, monkeypatch):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    backend.set('a', '1')
+    heredada = backend._conexion()
+    
+    # Después de un fork el PID cambia: no se reutiliza la conexión del padre
+    monkeypatch.setattr(shared_cache.os, 'getpid', lambda: -1)
+    assert backend._conexion() is not heredada
+    assert backend.get('a') == '1'
+
+
+def test_espacios_de_nombres_no_comparten_claves(tmp_path):
+    backend = SQLiteCacheBackend(str(tmp_path / 'cache.sqlite3'))
+    staging = SharedCache(backend, namespace=cache_namespace({'SQLALCHEMY_DATABASE_URI': 'sqlite:///staging.db'}))
+    produccion = SharedCache(backend, namespace=cache_namespace({'SQLALCHEMY_DATABASE_URI': 'sqlite:///prod.db'}))
+    
+    staging.set_json('catalogo:productos:1', [['P1', 'Staging']])
+    staging.incr(GENERACION_MOVIMIENTOS)
+    assert produccion.get_json('catalogo:productos:1') is None
+    assert produccion.get_counter(GENERACION_MOVIMIENTOS) == 0
+    assert staging.get_counter(GENERACION_MOVIMIENTOS) == 1
@@ -0,0 +1,56 @@
+"""
+Pruebas del cache en proceso de stock
+"""
+from datetime import datetime
+
+from app.models.models import db, Movimiento
+from app.utils.stock_cache import StockCache, stock_cache
+from app.utils.stock_service import get_stock_map_for_lab, get_global_stock_map
+
+
+def test_cache_completa_solo_los_productos_faltantes():
+    cache = StockCache(max_espacios=2, ttl=60)
+    consultas = []
+    
+    def loader(ids):
+        consultas.append(ids)
+        datos = {'P1': 1.0, 'P2': 2.0}
+        return datos if ids is None else {k: v for k, v in datos.items() if k in ids}
+    
+    assert cache.get_map('L1', None, loader) == {'P1': 1.0, 'P2': 2.0}
+    assert cache.get_map('L1', ['P2', 'P3'], loader) == {'P2': 2.0}
+    assert consultas == [None]
+    
+    cache.invalidate('L1', 'P1')
+    assert cache.get_map('L1', None, loader) == {'P1': 1.0, 'P2': 2.0}
+    assert consultas == [None, ['P1']]
+    assert cache.stats()['hits'] == 1
+
+
+def test_cache_respeta_el_limite_de_espacios():
+    cache = StockCache(max_espacios=2, ttl=60)
+    for lab in ('L1', 'L2', 'L3'):
+        cache.get_map(lab, None, lambda ids: {})
+    assert cache.stats()['espacios'] == 2
+    assert cache.stats()['evicciones'] == 1
+
+
+def test_movimiento_invalida_las_claves_afectadas(app):
+    db.session.add(Movimiento(idMovimiento='MOV000001', tipoMovimiento='ingreso', cantidad=10,
+                              unidadMedida='ml', idProducto='P001', idLaboratorio='L001',
+                              timestamp=datetime(2025, 1, 1)))
+    db.session.commit()
+    
+    assert get_stock_map_for_lab('L001') == {'P001': 10}
+    assert get_global_stock_map(['P001']) == {'P001': 10}
+    hits = stock_cache.stats()['hits']
+    assert get_stock_map_for_lab('L001') == {'P001': 10}
+    assert stock_cache.stats()['hits'] == hits + 1
+    
+    db.session.add(Movimiento(idMovimiento='MOV000002', tipoMovimiento='uso', cantidad=4,
+                              unidadMedida='ml', idProducto='P001', idLaboratorio='L001',
+                              timestamp=datetime(2025, 1, 2)))
+    db.session.commit()
+    
+    assert get_stock_map_for_lab('L001') == {'P001': 6}
+    assert get_global_stock_map(['P001']) == {'P001': 6}
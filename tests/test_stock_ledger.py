@@ -0,0 +1,155 @@
+"""
+Pruebas del ledger de stock materializado (tabla Stock)
+"""
+from datetime import datetime
+
+from app.models.models import db, Movimiento, Stock
+from app.utils.stock_service import (
+    get_stock_for_product_in_lab,
+    get_stock_map_for_lab,
+    get_global_stock_map,
+    get_stock_by_lab_map,
+    recalculate_stock_from_movements,
+)
+
+
+def _movimiento(id_mov, tipo, cantidad, lab='L001', producto='P001', **kwargs):
+    return Movimiento(idMovimiento=id_mov, tipoMovimiento=tipo, cantidad=cantidad,
+                      unidadMedida='ml', idProducto=producto, idLaboratorio=lab,
+                      timestamp=kwargs.pop('timestamp', datetime(2025, 1, 1)), **kwargs)
+
+
+def test_ledger_se_actualiza_en_alta_y_baja(app):
+    db.session.add(_movimiento('MOV000001', 'compra', 100))
+    db.session.add(_movimiento('MOV000002', 'uso', 30))
+    db.session.commit()
+    
+    assert get_stock_for_product_in_lab('P001', 'L001') == 70
+    
+    db.session.delete(Movimiento.query.get('MOV000002'))
+    db.session.commit()
+    
+    assert get_stock_for_product_in_lab('P001', 'L001') == 100
+
+
+def test_transferencia_actualiza_ambos_laboratorios(app):
+    db.session.add(_movimiento('MOV000001', 'ingreso', 50))
+    db.session.commit()
+    
+    db.session.add(_movimiento('MOV000002', 'transferencia', 20, laboratorioDestino='L002'))
+    db.session.add(_movimiento('MOV000003', 'ingreso', 20, lab='L002',
+                               tipoDocumento='transferencia', laboratorioDestino='L001'))
+    db.session.commit()
+    
+    assert get_stock_map_for_lab('L001') == {'P001': 30}
+    assert get_stock_map_for_lab('L002') == {'P001': 20}
+    assert get_global_stock_map(['P001']) == {'P001': 50}
+    assert get_stock_by_lab_map(['P001']) == {'P001': {'L001': 30, 'L002': 20}}
+
+
+def test_rollback_no_modifica_el_ledger(app):
+    db.session.add(_movimiento('MOV000001', 'ingreso', 10))
+    db.session.commit()
+    
+    db.session.add(_movimiento('MOV000002', 'ingreso', 5))
+    db.session.flush()
+    db.session.rollback()
+    
+    assert get_stock_for_product_in_lab('P001', 'L001') == 10
+
+
+def test_modificacion_mueve_el_saldo(app):
+    movimiento = _movimiento('MOV000001', 'ingreso', 10)
+    db.session.add(movimiento)
+    db.session.commit()
+    
+    movimiento.cantidad = 15
+    movimiento.idLaboratorio = 'L002'
+    db.session.commit()
+    
+    assert get_stock_for_product_in_lab('P001', 'L001') == 0
+    assert get_stock_for_product_in_lab('P001', 'L002') == 15
+
+
+def test_delta_persistido_sigue_al_tipo_y_cantidad(app):
+    db.session.add(_movimiento('MOV000001', 'compra', 12))
+    db.session.add(_movimiento('MOV000002', 'transferencia', 5, laboratorioDestino='L002'))
+    db.session.commit()
+    assert db.session.get(Movimiento, 'MOV000001').delta == 12
+    assert db.session.get(Movimiento, 'MOV000002').delta == -5
+    
+    movimiento = db.session.get(Movimiento, 'MOV000001')
+    movimiento.tipoMovimiento = 'uso'
+    db.session.commit()
+    assert db.session.get(Movimiento, 'MOV000001').delta == -12
+    assert get_stock_for_product_in_lab('P001', 'L001') == -17
+
+
+def test_reconstruccion_coincide_con_el_historial(app):
+    db.session.add_all([
+        _movimiento('MOV000001', 'compra', 40),
+        _movimiento('MOV000002', 'uso', 15),
+        _movimiento('MOV000003', 'ingreso', 7, producto='P002', lab='L002'),
+    ])
+    db.session.commit()
+    
+    Stock.query.delete()
+    db.session.commit()
+    assert get_stock_map_for_lab('L001') == {}
+    
+    assert recalculate_stock_from_movements() == 2
+    db.session.commit()
+    
+    assert get_stock_map_for_lab('L001') == {'P001': 25}
+    assert get_stock_map_for_lab('L002') == {'P002': 7}
+
+
+def test_checkpoint_mas_movimientos_posteriores(app):
+    from app.models.models import StockCheckpoint
+    from app.utils.stock_service import compute_stock_from_movements, roll_forward_checkpoints
+    
+    db.session.add_all([
+        _movimiento('MOV000001', 'compra', 100, timestamp=datetime(2024, 3, 1)),
+        _movimiento('MOV000002', 'uso', 40, timestamp=datetime(2024, 6, 1)),
+    ])
+    db.session.commit()
+    
+    assert roll_forward_checkpoints(datetime(2025, 1, 1)) == 1
+    db.session.commit()
+    
+    db.session.add(_movimiento('MOV000003', 'uso', 10, timestamp=datetime(2025, 2, 1)))
+    db.session.commit()
+    assert compute_stock_from_movements(lab_id='L001') == {('L001', 'P001'): 50}
+    
+    # Borrar un movimiento anterior al corte invalida el checkpoint
+    db.session.delete(Movimiento.query.get('MOV000002'))
+    db.session.commit()
+    checkpoint = StockCheckpoint.query.one()
+    assert checkpoint.desactualizado is True
+    assert compute_stock_from_movements(lab_id='L001') == {('L001', 'P001'): 90}
+    
+    roll_forward_checkpoints(datetime(2025, 3, 1))
+    db.session.commit()
+    checkpoint = StockCheckpoint.query.one()
+    assert (checkpoint.cantidad, checkpoint.desactualizado) == (90, False)
+
+
+def test_stock_al_instante(app):
+    from app.utils.stock_service import get_stock_as_of, roll_forward_checkpoints
+    
+    db.session.add_all([
+        _movimiento('MOV000001', 'compra', 100, timestamp=datetime(2024, 3, 1)),
+        _movimiento('MOV000002', 'uso', 40, timestamp=datetime(2024, 6, 1)),
+        _movimiento('MOV000003', 'ingreso', 8, lab='L002', timestamp=datetime(2024, 7, 1)),
+        _movimiento('MOV000004', 'ingreso', 3, producto='P002', timestamp=datetime(2025, 2, 1)),
+    ])
+    db.session.commit()
+    
+    assert get_stock_as_of(datetime(2024, 6, 1)) == {'P001': 100}
+    assert get_stock_as_of(datetime(2025, 1, 1)) == {'P001': 68}
+    assert get_stock_as_of(datetime(2025, 1, 1), lab_id='L001') == {'P001': 60}
+    
+    # El resultado no cambia al apoyarse en un checkpoint anterior a la fecha pedida
+    roll_forward_checkpoints(datetime(2024, 12, 1))
+    db.session.commit()
+    assert get_stock_as_of(datetime(2026, 1, 1), product_ids=['P001', 'P002']) == {'P001': 68, 'P002': 3}
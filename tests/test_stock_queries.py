@@ -0,0 +1,59 @@
+"""
+Pruebas de las consultas paginadas de stock
+"""
+from datetime import datetime
+
+from app.models.models import db, Movimiento, Producto
+from app.utils.stock_queries import local_stock_page, global_stock_page, labs_with_stock
+
+
+def _ingreso(id_mov, producto, cantidad, lab='L001'):
+    return Movimiento(idMovimiento=id_mov, tipoMovimiento='ingreso', cantidad=cantidad,
+                      unidadMedida='u', idProducto=producto, idLaboratorio=lab,
+                      timestamp=datetime(2025, 1, 1))
+
+
+def test_pagina_local_filtra_y_pagina_en_la_base(app):
+    db.session.add_all([
+        Producto(idProducto='P003', nombre='Bureta', tipoProducto='vidrio', estadoFisico='solido'),
+        Producto(idProducto='P004', nombre='Pipeta', tipoProducto='vidrio', estadoFisico='solido'),
+    ])
+    db.session.add_all([
+        _ingreso('MOV000001', 'P001', 5),
+        _ingreso('MOV000002', 'P003', 2),
+        _ingreso('MOV000003', 'P004', 7),
+        _ingreso('MOV000004', 'P002', 9, lab='L002'),
+    ])
+    db.session.commit()
+    
+    pagina = local_stock_page('L001', page=1, per_page=2, stock_filtro='inStock')
+    assert pagina.total == 3
+    assert pagina.pages == 2
+    assert [(p.idProducto, stock) for p, stock in pagina.items] == [('P003', 2), ('P004', 7)]
+    
+    pagina = local_stock_page('L001', page=2, per_page=2, stock_filtro='inStock')
+    assert [p.idProducto for p, _ in pagina.items] == ['P001']
+    
+    sin_stock = local_stock_page('L001', stock_filtro='outOfStock')
+    assert [(p.idProducto, stock) for p, stock in sin_stock.items] == [('P002', 0)]
+    
+    vidrio = local_stock_page('L001', tipo_producto='vidrio', search_term='pip')
+    assert [p.idProducto for p, _ in vidrio.items] == ['P004']
+
+
+def test_pagina_global_incluye_stock_local_y_laboratorios(app):
+    db.session.add_all([
+        _ingreso('MOV000001', 'P001', 5),
+        _ingreso('MOV000002', 'P001', 3, lab='L002'),
+        _ingreso('MOV000003', 'P002', 4, lab='L002'),
+    ])
+    db.session.commit()
+    
+    pagina = global_stock_page('L001', stock_filtro='inStock')
+    assert [(p.idProducto, total, local) for p, total, local in pagina.items] == [
+        ('P002', 4, 0), ('P001', 8, 5)
+    ]
+    assert global_stock_page('L001', stock_filtro='outOfStock').total == 0
+    
+    labs = labs_with_stock(['P001'])
+    assert [(lab['id'], lab['stock']) for lab in labs['P001']] == [('L001', 5), ('L002', 3)]
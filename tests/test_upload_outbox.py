@@ -0,0 +1,108 @@
+"""
+Pruebas de la bandeja de salida de archivos hacia Google Drive
+"""
+import io
+import os
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import FileStorage
+
+from app.models.models import db, Movimiento, Producto, Trabajo
+from app.integrations.google_drive import drive_integration
+from app.utils import upload_outbox
+from app.utils.job_service import claim_next, run_job, retry_job, ESTADO_COMPLETADO, ESTADO_PENDIENTE
+
+
+def _archivo(nombre='factura.pdf'):
+    return FileStorage(stream=io.BytesIO(b'%PDF-1.4 factura'), filename=nombre)
+
+
+def _vencer_espera(id_trabajo):
+    """Simula que pasó el tiempo de espera antes del reintento"""
+    trabajo = db.session.get(Trabajo, id_trabajo)
+    trabajo.disponibleDesde = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_documento_se_sube_con_reintento_y_completa_la_url(app, tmp_path, monkeypatch):
+    app.config.update(JOBS_DIR=str(tmp_path), DRIVE_UPLOAD_RETRY_SECONDS=60)
+    respuestas = [None, {'file_id': 'f1', 'file_url': 'https://drive/f1'}]
+    llamadas = []
+    
+    def subir(**kwargs):
+        llamadas.append(kwargs)
+        return respuestas.pop(0)
+    monkeypatch.setattr(drive_integration, 'upload_movimiento_documento', subir)
+    
+    db.session.add(Movimiento(idMovimiento='MOV1000001', tipoMovimiento='compra', cantidad=5,
+                              unidadMedida='l', idProducto='P001', idLaboratorio='L001'))
+    trabajo = upload_outbox.queue_movement_document('MOV1000001', 'L001', upload_outbox.spool_upload(_archivo()),
+                                                   usuario_id=None)
+    ruta = os.path.join(tmp_path, trabajo.idTrabajo, 'factura.pdf')
+    referencia = upload_outbox.movement_reference('MOV1000001')
+    
+    # El movimiento quedó confirmado antes de la subida
+    assert db.session.get(Movimiento, 'MOV1000001').urlDocumento is None
+    assert upload_outbox.upload_states([referencia])[referencia]['estado'] == 'pendiente'
+    
+    # Primer intento fallido: vuelve a la cola con espera
+    assert run_job(app, claim_next()) is False
+    db.session.expire_all()
+    trabajo = db.session.get(Trabajo, trabajo.idTrabajo)
+    assert trabajo.estado == ESTADO_PENDIENTE and trabajo.intentos == 1
+    assert trabajo.disponibleDesde > datetime.utcnow()
+    assert claim_next() is None
+    
+    _vencer_espera(trabajo.idTrabajo)
+    assert run_job(app, claim_next()) is True
+    db.session.expire_all()
+    assert db.session.get(Movimiento, 'MOV1000001').urlDocumento == 'https://drive/f1'
+    assert upload_outbox.upload_states([referencia]) == {}
+    assert not os.path.exists(ruta)
+    assert llamadas[-1]['movimiento_id'] == 'MOV1000001' and llamadas[-1]['file_name'] == 'factura.pdf'
+
+
+def test_ficha_fallida_queda_en_error_y_se_reintenta_manualmente(app, tmp_path, monkeypatch):
+    app.config.update(JOBS_DIR=str(tmp_path), DRIVE_UPLOAD_MAX_ATTEMPTS=2)
+    monkeypatch.setattr(drive_integration, 'upload_ficha_seguridad',
+                        lambda producto_id, datos, extension: {'error': 'Drive no disponible'})
+    
+    id_trabajo = upload_outbox.queue_safety_sheet('P002', upload_outbox.spool_upload(_archivo('ficha.pdf')), 'pdf').idTrabajo
+    referencia = upload_outbox.product_reference('P002')
+    
+    run_job(app, claim_next())
+    _vencer_espera(id_trabajo)
+    run_job(app, claim_next())
+    
+    estado = upload_outbox.upload_states([referencia])[referencia]
+    assert estado['estado'] == 'error' and 'Drive no disponible' in estado['mensaje']
+    assert os.path.exists(os.path.join(tmp_path, id_trabajo, 'ficha.pdf'))
+    
+    monkeypatch.setattr(drive_integration, 'upload_ficha_seguridad',
+                        lambda producto_id, datos, extension: {'file_id': 'ficha-1'})
+    assert retry_job(id_trabajo) is True
+    assert retry_job(id_trabajo) is False
+    assert run_job(app, claim_next()) is True
+    db.session.expire_all()
+    assert db.session.get(Producto, 'P002').urlFichaSeguridad == 'ficha-1'
+    assert db.session.get(Trabajo, id_trabajo).estado == ESTADO_COMPLETADO
+
+
+def test_confirmacion_fallida_se_propaga_y_descarta_el_archivo(app, tmp_path):
+    app.config.update(JOBS_DIR=str(tmp_path))
+    db.session.add(Movimiento(idMovimiento='MOV1000001', tipoMovimiento='compra', cantidad=5,
+                              unidadMedida='l', idProducto='P001', idLaboratorio='L001'))
+    db.session.commit()
+    
+    # Un movimiento con el mismo ID hace fallar la confirmación junto con el trabajo
+    db.session.add(Movimiento(idMovimiento='MOV1000001', tipoMovimiento='compra', cantidad=1,
+                              unidadMedida='l', idProducto='P001', idLaboratorio='L001'))
+    guardado = upload_outbox.spool_upload(_archivo())
+    assert os.path.exists(guardado['ruta'])
+    with pytest.raises(IntegrityError):
+        upload_outbox.queue_movement_document('MOV1000001', 'L001', guardado)
+    db.session.rollback()
+    assert not os.path.exists(os.path.dirname(guardado['ruta']))
+    assert Trabajo.query.count() == 0